@@ -149,17 +149,98 @@ class DMCamera(CameraInterface):
             The image object
         """
 
+        return self._createImage(self._acquire(), additional_tags, 
+                                 annotation_kwargs)
+    
+    def getFrameFormat(self) -> typing.Optional[typing.Tuple[typing.Tuple[int, ...], np.dtype]]:
+        """Get the shape and the data type of the recorded images.
+
+        The shape is the readout area divided by the binning. The images are
+        expected to contain float values, this is true for processed images 
+        and an upper bound for unprocessed ones.
+
+        Returns
+        -------
+        tuple or None
+            The shape and the data type, None if the settings are not loaded
+        """
+
+        if (None in (self.binning_x, self.binning_y) or 
+            not isinstance(self.ccd_area, (list, tuple)) or 
+            len(self.ccd_area) != 4 or None in self.ccd_area):
+            return None
+        
+        top, right, bottom, left = self.ccd_area
+        return ((max(0, int(bottom - top) // int(self.binning_y)), 
+                 max(0, int(right - left) // int(self.binning_x))), 
+                np.dtype(np.float32))
+    
+    def startAcquisition(self, **annotation_kwargs) -> "AcquisitionHandle":
+        """Start recording an image and return immediately.
+
+        Only the acquisition is executed in the worker thread, the tags and 
+        the annotations are created in `DMCamera.collect()` so they can use
+        the tags that are created while the camera acquires.
+
+        Parameters
+        ----------
+        annotation_kwargs : dict, optional
+            The annotation kwargs, those are used for the 
+            `pylolib.expand_vars()` function, note that the 'tags' and the 
+            'controller' will be overwritten, default: None
+
+        Returns
+        -------
+        AcquisitionHandle
+            The handle of the running acquisition
+        """
+
+        return self._startAcquisitionWorker(self._acquire, **annotation_kwargs)
+    
+    def collect(self, handle: "AcquisitionHandle", 
+                additional_tags: typing.Optional[dict]=None, 
+                timeout: typing.Optional[float]=None) -> "DMImage":
+        """Wait until the acquisition of the `handle` is finished and return
+        the image.
+
+        Parameters
+        ----------
+        handle : AcquisitionHandle
+            The handle returned by `DMCamera.startAcquisition()`
+        additional_tags : dict, optional
+            Additonal tags to add to the image, note that they will be 
+            overwritten by other tags if there are set tags in this method
+        timeout : float, optional
+            The maximum time to wait in seconds, None to wait until the 
+            acquisition is finished, default: None
+
+        Returns
+        -------
+        DMImage
+            The image object
+        """
+
+        return self._createImage(handle.result(timeout), additional_tags, 
+                                 handle.kwargs)
+    
+    def _acquire(self, **kwargs) -> "DigitalMicrograph.Py_Image":
+        """Acquire the image with the current settings.
+
+        Parameters
+        ----------
+        kwargs : dict, optional
+            Ignored, the annotation kwargs are used when creating the image
+
+        Returns
+        -------
+        DigitalMicrograph.Py_Image
+            The acquired image
+        """
+
         if (None in (self.show_images, self.exposure_time, self.binning_x, 
                      self.binning_y, self.process_level, self.ccd_area, 
                      self.tags, self.annotations_height_fraction)):
             self._loadSettings()
-        
-        if isinstance(additional_tags, dict):
-            tags = copy.deepcopy(additional_tags)
-        else:
-            tags = {}
-        
-        tags["camera"] = copy.deepcopy(self.tags)
 
         logginglib.log_debug(self._logger, ("Acquiring image with exposure " + 
                                             "time '{}', binning '{}', process " + 
@@ -173,6 +254,39 @@ class DMCamera(CameraInterface):
             self.process_level, self.ccd_area[0], self.ccd_area[3],
             self.ccd_area[2], self.ccd_area[1])
         
+        return image
+    
+    def _createImage(self, image: "DigitalMicrograph.Py_Image", 
+                     additional_tags: typing.Optional[dict]=None, 
+                     annotation_kwargs: typing.Optional[dict]=None) -> "DMImage":
+        """Create the image object of the acquired `image` with the tags and
+        the annotations.
+
+        Parameters
+        ----------
+        image : DigitalMicrograph.Py_Image
+            The acquired image
+        additional_tags : dict, optional
+            Additonal tags to add to the image, note that they will be 
+            overwritten by other tags if there are set tags in this method
+        annotation_kwargs : dict, optional
+            The annotation kwargs, those are used for the 
+            `pylolib.expand_vars()` function, note that the 'tags' and the 
+            'controller' will be overwritten, default: None
+
+        Returns
+        -------
+        DMImage
+            The image object
+        """
+        
+        if isinstance(additional_tags, dict):
+            tags = copy.deepcopy(additional_tags)
+        else:
+            tags = {}
+        
+        tags["camera"] = copy.deepcopy(self.tags)
+
         logginglib.log_debug(self._logger, "Getting image tags, converting " + 
                                            "from DigitalMicrograph.Py_TagGroup "+ 
                                            "to dict")
@@ -198,6 +312,8 @@ class DMCamera(CameraInterface):
                                                 annotations))
             if not isinstance(annotation_kwargs, dict):
                 annotation_kwargs = {}
+            else:
+                annotation_kwargs = copy.copy(annotation_kwargs)
             
             annotation_kwargs["tags"] = tags
             annotation_kwargs["controller"] = self.controller
@@ -89,6 +89,23 @@ class DMMicroscope(MicroscopeInterface):
         self.supports_parallel_measurement_variable_setting = False
         self._tolerances = {}
 
+        # the maximum time to wait until a value is reached
+        self.wait_timeout = self.controller.configuration.getValue(
+            self.config_group_name, "wait-timeout", datatype=float, 
+            default_value=None)
+        
+        if (not isinstance(self.wait_timeout, (int, float)) or 
+            self.wait_timeout <= 0):
+            self.wait_timeout = MAX_LOOP_COUNT * 0.1
+
+        # the lenses and the stage can be accessed at the same time
+        self.measurement_variable_lock_domains.update({
+            "om-current": "lens",
+            "ol-current": "lens",
+            "x-tilt": "stage",
+            "y-tilt": "stage"
+        })
+
         # the factor to multiply the focus with to show it to the user, 
         # the user entered values will be divided by this factor and then 
         # passed to the PyJEM functions
@@ -149,7 +166,8 @@ class DMMicroscope(MicroscopeInterface):
                 uncalibration=focus_uncalibration,
                 calibrated_name="Focus",
                 calibrated_unit="um", # micrometer
-                calibrated_format=Datatype.int
+                calibrated_format=Datatype.int,
+                min_increment=1
             ),
             self._getObjectiveMiniLensCurrent,
             self._setObjectiveMiniLensCurrent
@@ -239,7 +257,8 @@ class DMMicroscope(MicroscopeInterface):
                 calibrated_unit=magnetic_field_unit,
                 calibrated_name="Magnetic Field",
                 calibration=magnetic_field_calibration_factor,
-                calibrated_format=Datatype.float_np(1)
+                calibrated_format=Datatype.float_np(1),
+                min_increment=1
             ),
             self._getObjectiveLensCurrent,
             self._setObjectiveLensCurrent
@@ -326,13 +345,23 @@ class DMMicroscope(MicroscopeInterface):
         logginglib.log_debug(self._logger, "User selected '{}' holder '{}'".format(
                              installed_holder_label, self.installed_holder))
         
+        # the maximum speed of the goniometer in degrees per second
+        tilt_slew_rate = self.controller.configuration.getValue(
+            self.config_group_name, "max-tilt-slew-rate", datatype=float,
+            default_value=None)
+        
+        if (not isinstance(tilt_slew_rate, (int, float)) or 
+            tilt_slew_rate <= 0):
+            tilt_slew_rate = None
+        
         # tilt limits depend on holder
         variable = self.registerMeasurementVariable(
             MeasurementVariable("x-tilt", "X Tilt", 
                                 self.installed_holder.min_x_tilt, 
                                 self.installed_holder.max_x_tilt, 
                                 "deg",
-                                format=Datatype.float_np(1)),
+                                format=Datatype.float_np(1),
+                                max_slew_rate=tilt_slew_rate),
             self._getXTilt,
             self._setXTilt
         )
@@ -378,7 +407,8 @@ class DMMicroscope(MicroscopeInterface):
                                     self.installed_holder.min_y_tilt, 
                                     self.installed_holder.max_y_tilt, 
                                     "deg",
-                                    format=Datatype.float_np(1)),
+                                    format=Datatype.float_np(1),
+                                    max_slew_rate=tilt_slew_rate),
                 self._getYTilt,
                 self._setYTilt
             )
@@ -513,6 +543,10 @@ class DMMicroscope(MicroscopeInterface):
 
             logginglib.log_debug(self._logger, "User confirmed that the microscope is " + 
                                    "in lorentz mode now")
+        
+        # the optics mode changes the objective lens, never reuse the values
+        # that were read before
+        self.invalidate()
     
     def getInLorentzMode(self) -> bool:
         """Get whether the microscope is in the lorentz mode.
@@ -936,14 +970,16 @@ class DMMicroscope(MicroscopeInterface):
     
     def _waitForVariableValue(self, id_: str, getter: typing.Callable, 
                               value: typing.Any, 
-                              sleep_time: typing.Optional[typing.Union[float, int]]=0.1) -> None:
+                              sleep_time: typing.Optional[typing.Union[float, int]]=0.1,
+                              timeout: typing.Optional[typing.Union[float, int]]=None) -> None:
         """Wait for the variable with the `id_` to reach the `value`.
 
         If there is no entry for the `id_` in the `DMMicroscope._tolerances`, 
         the function will return immediately. Otherwise the thread is blocked 
-        until the `getter` returns a value close to the desired `value`. If not
-        the function will raise a RuntimeError after 
-        `pylo.config.MAX_LOOP_COUNT * sleep_time` seconds.
+        until the `getter` returns a value close to the desired `value`. The
+        `getter` is asked with an exponential backoff by the 
+        `MicroscopeInterface.completion_waiter`. If the value is not reached 
+        within the `timeout`, a RuntimeError is raised.
 
         Raises
         ------
@@ -958,44 +994,42 @@ class DMMicroscope(MicroscopeInterface):
         getter : callable
             The getter callback to get the actual value from the microscope
         sleep_time : float or int, optional
-            The number of seconds to wait between asking the microscope again
-            what the actual value is, default: 0.1
+            The maximum number of seconds to wait between asking the 
+            microscope again what the actual value is, default: 0.1
+        timeout : float or int, optional
+            The maximum time to wait in seconds, None to use the 
+            `DMMicroscope.wait_timeout`, default: None
         """
         if (id_ in self._tolerances and 
             isinstance(self._tolerances[id_], (int, float))):
 
             logginglib.log_debug(self._logger, ("Waiting until '{}' '{}' is " + 
                                  "reached").format(id_, value))
-
-            v = None
-            security_counter = 0
-            while security_counter < MAX_LOOP_COUNT:
-                v = getter()
-                if math.isclose(v, value, abs_tol=self._tolerances[id_]):
-                    break
-                
-                security_counter += 1
-                time.sleep(0.1)
             
-            if security_counter + 1 == MAX_LOOP_COUNT:
+            if timeout is None:
+                timeout = self.wait_timeout
+
+            # save the last value for the error message
+            last_value = [None]
+            def is_reached() -> bool:
+                last_value[0] = getter()
+                return math.isclose(last_value[0], value, 
+                                    abs_tol=self._tolerances[id_])
+
+            if not self.completion_waiter.wait(id_, is_reached, timeout, 
+                                               sleep_time):
                 err = RuntimeError(("The microscope was told to set the " + 
-                                    "'{}' to '{}' but after '{}' times " + 
-                                    "trying plus waiting the value is '{}' " + 
-                                    "which is not in the tolerance of '{}'. " + 
-                                    "Either the microscope takes extremely " + 
-                                    "long to reach the value, there is a " + 
-                                    "problem with the communication or the " + 
-                                    "waiting count '{}' is very low.").format(
-                                    id_, value, security_counter, v, 
-                                    self._tolerances[id_], MAX_LOOP_COUNT))
+                                    "'{}' to '{}' but after waiting '{}' " + 
+                                    "seconds the value is '{}' which is not " + 
+                                    "in the tolerance of '{}'. Either the " + 
+                                    "microscope takes extremely long to " + 
+                                    "reach the value, there is a problem " + 
+                                    "with the communication or the waiting " + 
+                                    "timeout is very low.").format(
+                                    id_, value, timeout, last_value[0], 
+                                    self._tolerances[id_]))
                 logginglib.log_error(self._logger, err)
                 raise err
-            else:
-                logginglib.log_debug(self._logger, ("Reached value '{}' for " + 
-                                     "'{}' after '{}' runs (='{}' " + 
-                                     "seconds)").format(v, id_, 
-                                     security_counter, 
-                                     sleep_time * security_counter))
 
     def resetToSafeState(self) -> None:
         """Set the microscope into its safe state.
@@ -1004,8 +1038,7 @@ class DMMicroscope(MicroscopeInterface):
         In addition the stage is driven to its origin, with resolving the tilt 
         in all axes.
 
-        This function blocks the `MicroscopeInterface.action_lock` while 
-        operating.
+        This function blocks the *beam* lock domain while operating.
         """
 
         logginglib.log_debug(self._logger, "Setting microscope to safe state")
@@ -1013,18 +1046,17 @@ class DMMicroscope(MicroscopeInterface):
         # reset the lorentz mode
         self.setInLorentzMode(False)
 
-        # lock the microscope after the lorentz mode, otherwise there is a 
-        # deadlock (this function blocks the lock, 
-        # PyJEMMicroscope::setInLorentzMode() waits for the lock)
-        self.action_lock.acquire()
+        # lock the beam after the lorentz mode, the lorentz mode may be set 
+        # by the user
+        lock = self.lockDomains("beam")
+        lock.acquire()
 
         if self.dm_microscope.HasBeamBlanker():
             logginglib.log_debug(self._logger, "Blanking beam")
             
             self.dm_microscope.SetBeamBlanked(True)
 
-        # release the lock, the setCurrentState() needs the lock again
-        self.action_lock.release()
+        lock.release()
     
     @staticmethod
     def defineConfigurationOptions(configuration: "AbstractConfiguration", 
@@ -1153,6 +1185,36 @@ class DMMicroscope(MicroscopeInterface):
             default_value=config_defaults["abs-wait-tolerance-y-tilt"]
         )
 
+        # add the option for the speed of the goniometer
+        if not "max-tilt-slew-rate" in config_defaults:
+            config_defaults["max-tilt-slew-rate"] = 0
+        configuration.addConfigurationOption(
+            config_group_name, 
+            "max-tilt-slew-rate", 
+            datatype=float, 
+            description=("The maximum speed the goniometer tilts with in " + 
+                         "degrees per second. Tilt changes are ramped so " + 
+                         "that they do not exceed this speed. Use 0 for no " + 
+                         "limit."), 
+            restart_required=False,
+            default_value=config_defaults["max-tilt-slew-rate"]
+        )
+
+        # add the option for the maximum wait time
+        if not "wait-timeout" in config_defaults:
+            config_defaults["wait-timeout"] = 10
+        configuration.addConfigurationOption(
+            config_group_name, 
+            "wait-timeout", 
+            datatype=float, 
+            description=("The maximum time in seconds to wait until the " + 
+                         "microscope has reached a value that was set. If " + 
+                         "the value is not reached in this time, the " + 
+                         "measurement is stopped with an error."), 
+            restart_required=False,
+            default_value=config_defaults["wait-timeout"]
+        )
+
         # add the option for the mini lens tolerance
         if not "abs-wait-tolerance-objective-mini-lens" in config_defaults:
             config_defaults["abs-wait-tolerance-objective-mini-lens"] = 0x2
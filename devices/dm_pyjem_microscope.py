@@ -33,6 +33,16 @@ class DMPyJEMMicroscope(DMMicroscope):
         self.pyjem_olcurrent_args = ["--output", "json"]
         self.initialized = True
 
+        # each read of the objective lens current starts a new process, reuse
+        # the read value for a short time
+        ol_current_cache_ttl = self.controller.configuration.getValue(
+            self.config_group_name, "ol-current-cache-ttl", datatype=float,
+            default_value=None)
+        
+        if (isinstance(ol_current_cache_ttl, (int, float)) and 
+            ol_current_cache_ttl > 0):
+            self.measurement_variable_cache_ttl["ol-current"] = ol_current_cache_ttl
+
     def _ensureExecutablePaths(self, raise_error: typing.Optional[bool]=True) -> None:
         """Ensure that the `DMPyJEMMicroscope.pyjem_olcurrent_path` is set.
 
@@ -347,4 +357,18 @@ class DMPyJEMMicroscope(DMMicroscope):
             configuration.addConfigurationOption(config_group_name, 
                                                  "python-35-path",
                                                  default_value=config_defaults["python-35-path"])
-
+        
+        # add the option for caching the objective lens current
+        configuration.addConfigurationOption(
+            config_group_name, 
+            "ol-current-cache-ttl", 
+            datatype=float, 
+            default_value=(config_defaults["ol-current-cache-ttl"] 
+                           if "ol-current-cache-ttl" in config_defaults 
+                           else 1),
+            description=("The time in seconds a read objective lens current " + 
+                         "is reused without starting the `pyjem_olcurrent.py` " + 
+                         "again. Setting the current or the lorentz mode " + 
+                         "always discards the reused value. Use 0 to read " + 
+                         "the current every time.")
+        )
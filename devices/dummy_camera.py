@@ -1,4 +1,5 @@
 import copy
+import time
 import typing
 import random
 import numpy as np
@@ -21,6 +22,9 @@ class DummyCamera(CameraInterface):
     use_dummy_images : bool
         Whether to use image objects created from the `DummyImage` class or 
         normal `pylo.Image` objects
+    exposure_time : float
+        The simulated exposure time in seconds, recording an image takes this
+        time
     """
 
     def __init__(self, *args, **kwargs) -> None:
@@ -29,6 +33,7 @@ class DummyCamera(CameraInterface):
         self.imagesize = (32, 32)
         self.tags = {"Camera": "Dummy Camera"}
         self.use_dummy_images = False
+        self.exposure_time = 0
     
     def recordImage(self, additional_tags: typing.Optional[dict]=None, **kwargs) -> "Image":
         """Get the image of the current camera.
@@ -45,6 +50,8 @@ class DummyCamera(CameraInterface):
             The image object
         """
 
+        time.sleep(self.exposure_time)
+
         image_data = np.random.rand(self.imagesize[0], self.imagesize[1])
         image_data = (image_data * 255).astype(dtype=np.uint8)
 
@@ -63,6 +70,18 @@ class DummyCamera(CameraInterface):
             return DummyImage(image_data, image_tags)
         else:
             return Image(image_data, image_tags)
+    
+    def getFrameFormat(self) -> typing.Tuple[typing.Tuple[int, ...], np.dtype]:
+        """Get the shape and the data type of the recorded images.
+
+        Returns
+        -------
+        tuple
+            The `DummyCamera.imagesize` and the 8 bit unsigned integer data 
+            type of the random data
+        """
+
+        return tuple(self.imagesize), np.dtype(np.uint8)
 
     
     def resetToSafeState(self) -> None:
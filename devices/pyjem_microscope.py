@@ -1,6 +1,7 @@
 import math
 import time
 import typing
+import concurrent.futures
 
 # python <3.6 does not define a ModuleNotFoundError, use this fallback
 from pylo import FallbackModuleNotFoundError
@@ -41,6 +42,7 @@ if OFFLINE_MODE == True or error is not None:
 from pylo import Datatype
 from pylo import MicroscopeInterface
 from pylo import MeasurementVariable
+from pylo.emergency_executor import inherit_emergency
 
 # the function modes for TEM mode
 FUNCTION_MODE_TEM_MAG = 0
@@ -103,6 +105,32 @@ FL_RATIO_LENSE_ID = 21
 # reserved = 24
 # reserved = 25
 
+# the modes of the state, they are written before the lenses because changing
+# the modes re-arranges the lense currents, the probe mode has to be set 
+# before the function mode because the function modes depend on the probe mode
+STATE_MODES = ("probe-mode", "function-mode")
+
+# the lenses of the state with the name of the Lens3 getter and the free lense
+# control id (or the name of the Lens3 setter), in the order they are written:
+# from the gun to the screen, the coarse objective lense before the fine one
+STATE_LENSES = (
+    ("cl1", "GetCL1", CL1_LENSE_ID),
+    ("cl2", "GetCL2", CL2_LENSE_ID),
+    ("cl3", "GetCL3", "SetCL3"),
+    ("om1", "GetOM", OM1_LENSE_ID),
+    ("om2", "GetOM2", OM2_LENSE_ID),
+    ("olc", "GetOLc", "SetOLc"),
+    ("olf", "GetOLf", "SetOLf"),
+    ("il1", "GetIL1", IL1_LENSE_ID),
+    ("il2", "GetIL2", IL2_LENSE_ID),
+    ("il3", "GetIL3", IL3_LENSE_ID),
+    ("il4", "GetIL4", IL4_LENSE_ID),
+    ("pl1", "GetPL1", PL1_LENSE_ID),
+    ("pl2", "GetPL2", PL2_LENSE_ID),
+    ("pl3", "GetPL3", PL3_LENSE_ID),
+    # cannot set the om2 flag (GetOM2Flag()), there is no setter
+)
+
 class PyJEMMicroscope(MicroscopeInterface):
     """This class is the interface for communicating with the JEOL PyJEM 
     python interface.
@@ -208,6 +236,17 @@ class PyJEMMicroscope(MicroscopeInterface):
         else:
             max_ol_current = 0xFFFF
 
+        # the maximum speed of the goniometer in degrees per second
+        try:
+            tilt_slew_rate = self.controller.configuration.getValue(
+                self.config_group_name, "max-tilt-slew-rate")
+        except KeyError:
+            tilt_slew_rate = None
+        
+        if (not isinstance(tilt_slew_rate, (int, float)) or 
+            tilt_slew_rate <= 0):
+            tilt_slew_rate = None
+
         # limits taken from 
         # PyJEM/doc/interface/TEM3.html#PyJEM.TEM3.EOS3.SetObjFocus
         self.registerMeasurementVariable(
@@ -220,7 +259,8 @@ class PyJEMMicroscope(MicroscopeInterface):
                 unit="um", # micrometer
                 format=Datatype.int,
                 # step by one increases the focus (in LOWMag-Mode) by 3 microns
-                calibration=focus_calibration_factor
+                calibration=focus_calibration_factor,
+                min_increment=1
             ),
             self._getFocus,
             self._setFocus
@@ -228,13 +268,15 @@ class PyJEMMicroscope(MicroscopeInterface):
         
         # tilt limits depend on holder
         self.registerMeasurementVariable(
-            MeasurementVariable("x-tilt", "X Tilt", -10, 10, "deg"),
+            MeasurementVariable("x-tilt", "X Tilt", -10, 10, "deg", 
+                                max_slew_rate=tilt_slew_rate),
             self._getXTilt,
             self._setXTilt
         )
         
         self.registerMeasurementVariable(
-            MeasurementVariable("y-tilt", "Y Tilt", 0, 0, "deg"),
+            MeasurementVariable("y-tilt", "Y Tilt", 0, 0, "deg", 
+                                max_slew_rate=tilt_slew_rate),
             self._getYTilt,
             self._setYTilt
         )
@@ -250,12 +292,23 @@ class PyJEMMicroscope(MicroscopeInterface):
                 calibrated_unit=magnetic_field_unit,
                 calibrated_name="Magnetic Field",
                 calibration=magnetic_field_calibration_factor,
-                calibrated_format=float
+                calibrated_format=float,
+                min_increment=1
             ),
             self._getObjectiveLensCurrent,
             self._setObjectiveLensCurrent
         )
 
+        # the tilt is driven by the stage and is independent of the lenses, 
+        # the objective focus is set by the electron optical system which 
+        # changes the lenses
+        self.measurement_variable_lock_domains.update({
+            "focus": ("eos", "lens"),
+            "x-tilt": "stage",
+            "y-tilt": "stage",
+            "ol-current": "lens"
+        })
+
         # lenses
         self._lense_control = Lens3()
         # stage
@@ -269,6 +322,21 @@ class PyJEMMicroscope(MicroscopeInterface):
         # aperture
         self._aperture = Apt3()
 
+        # the number of threads to read the state with
+        try:
+            self.state_read_workers = self.controller.configuration.getValue(
+                self.config_group_name, "state-read-workers")
+        except KeyError:
+            self.state_read_workers = None
+        
+        if (not isinstance(self.state_read_workers, int) or 
+            self.state_read_workers < 1):
+            self.state_read_workers = 1
+
+        # the last known state, this is used to write only the changed values
+        # when a state is restored, None if it is unknown
+        self._current_state = None
+
         # save current focus, there is no get function
         self._focus = 0
         # save the initial state to reset the microscope to this state in the 
@@ -299,38 +367,96 @@ class PyJEMMicroscope(MicroscopeInterface):
         - probe-mode: The probe mode as a `PROBE_MODE_*` constant
         - function-mode: The probe mode as a `FUNCTION_MODE_*` constant
 
+        The values are read in parallel, the state is remembered as the last 
+        known state for `PyJEMMicroscope::setCurrentState()`.
+
         Returns
         -------
         dict
             The state dict
         """
 
-        get = lambda v, i: v[i] if isinstance(v, (list, tuple)) else v
-
-        state = {
-            "cl1": get(self._lense_control.GetCL1(), 1),
-            "cl2": get(self._lense_control.GetCL2(), 1),
-            "cl3": get(self._lense_control.GetCL3(), 1),
-            "il1": get(self._lense_control.GetIL1(), 1),
-            "il2": get(self._lense_control.GetIL2(), 1),
-            "il3": get(self._lense_control.GetIL3(), 1),
-            "il4": get(self._lense_control.GetIL4(), 1),
-            "pl1": get(self._lense_control.GetPL1(), 1),
-            "pl2": get(self._lense_control.GetPL2(), 1),
-            "pl3": get(self._lense_control.GetPL3(), 1),
-            "olc": get(self._lense_control.GetOLc(), 1),
-            "olf": get(self._lense_control.GetOLf(), 1),
-            "om1": get(self._lense_control.GetOM(), 1),
-            "om2": get(self._lense_control.GetOM2(), 1),
-            # cannot set this value, there is no setter
-            # "om2f": get(self._lense_control.GetOM2Flag(), 1),
-            "probe-mode": get(self._eos.GetProbeMode(), 0),
-            "function-mode": get(self._eos.GetFunctionMode(), 0),
-        }
+        state = self._readState(STATE_MODES + tuple(l[0] for l in STATE_LENSES))
+        self._current_state = state.copy()
 
         return state
     
-    def setCurrentState(self, state: dict, ignore_invalid_keys: typing.Optional[bool]=False) -> None:
+    def _readStateValue(self, key: str) -> int:
+        """Read the value of the `key` of the state from the microscope.
+
+        Parameters
+        ----------
+        key : str
+            The key, one of the `STATE_MODES` or the first entries of the 
+            `STATE_LENSES`
+
+        Returns
+        -------
+        int
+            The value
+        """
+        if key == "probe-mode":
+            value, index = self._eos.GetProbeMode(), 0
+        elif key == "function-mode":
+            value, index = self._eos.GetFunctionMode(), 0
+        else:
+            getter = [l[1] for l in STATE_LENSES if l[0] == key][0]
+            value, index = getattr(self._lense_control, getter)(), 1
+        
+        return value[index] if isinstance(value, (list, tuple)) else value
+    
+    def _readState(self, keys: typing.Sequence[str]) -> dict:
+        """Read the values of the `keys` of the state from the microscope.
+
+        The values are read in parallel by the `PyJEMMicroscope.state_read_workers`
+        threads.
+
+        Parameters
+        ----------
+        keys : sequence of str
+            The keys to read
+
+        Returns
+        -------
+        dict
+            The state dict containing the `keys`
+        """
+        if self.state_read_workers > 1 and len(keys) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self.state_read_workers, len(keys))) as executor:
+                # keep the emergency thread state, this may be executed while 
+                # setting the microscope to the safe state
+                values = list(executor.map(
+                    inherit_emergency(self._readStateValue), keys))
+        else:
+            values = [self._readStateValue(k) for k in keys]
+        
+        return dict(zip(keys, values))
+    
+    def _writeStateValue(self, key: str, value: int) -> None:
+        """Write the `value` of the `key` of the state to the microscope.
+
+        Parameters
+        ----------
+        key : str
+            The key, one of the `STATE_MODES` or the first entries of the 
+            `STATE_LENSES`
+        value : int
+            The value to set
+        """
+        if key == "probe-mode":
+            self._eos.SelectProbMode(value)
+        elif key == "function-mode":
+            self._eos.SelectFunctionMode(value)
+        else:
+            setter = [l[2] for l in STATE_LENSES if l[0] == key][0]
+            if isinstance(setter, str):
+                getattr(self._lense_control, setter)(value)
+            else:
+                self._lense_control.SetFLCAbs(setter, value)
+    
+    def setCurrentState(self, state: dict, ignore_invalid_keys: typing.Optional[bool]=False,
+                        use_cache: typing.Optional[bool]=True) -> None:
         """Sets the `state`.
 
         The `state` is a dict that contains the value of an internal instrument
@@ -342,7 +468,10 @@ class PyJEMMicroscope(MicroscopeInterface):
         `PyJEMMicroscope::getCurrentState()` function. Note that the `state` 
         does not have to contain all the keys.
 
-        This function blocks the `MicroscopeInterface::action_lock`.
+        Only the values that differ from the current state are written. The 
+        modes are written first, then the lenses from the gun to the screen.
+
+        This function blocks the *lens* and the *eos* lock domains.
 
         Raises
         ------ 
@@ -358,49 +487,48 @@ class PyJEMMicroscope(MicroscopeInterface):
         ignore_invalid_keys : bool, optional
             Whether to raise an error if a key is not known (True) or to ignore
             this key (False), default: False
+        use_cache : bool, optional
+            Whether to compare the `state` with the last known state (True) or
+            to read the current state from the microscope first (False), 
+            default: True
         """
 
-        self.action_lock.acquire()
-
-        for key, value in state.items():
-            if key == "cl1": 
-                self._lense_control.SetFLCAbs(CL1_LENSE_ID, value)
-            elif key == "cl2": 
-                self._lense_control.SetFLCAbs(CL2_LENSE_ID, value)
-            elif key == "cl3": 
-                self._lense_control.SetCL3(value)
-            elif key == "il1": 
-                self._lense_control.SetFLCAbs(IL1_LENSE_ID, value)
-            elif key == "il2": 
-                self._lense_control.SetFLCAbs(IL2_LENSE_ID, value)
-            elif key == "il3": 
-                self._lense_control.SetFLCAbs(IL3_LENSE_ID, value)
-            elif key == "il4": 
-                self._lense_control.SetFLCAbs(IL4_LENSE_ID, value)
-            elif key == "pl1": 
-                self._lense_control.SetFLCAbs(PL1_LENSE_ID, value)
-            elif key == "pl2": 
-                self._lense_control.SetFLCAbs(PL2_LENSE_ID, value)
-            elif key == "pl3": 
-                self._lense_control.SetFLCAbs(PL3_LENSE_ID, value)
-            elif key == "olf": 
-                self._lense_control.SetOLf(value)
-            elif key == "olc": 
-                self._lense_control.SetOLc(value)
-            elif key == "om1": 
-                # self._lense_control.SetOM(value)
-                self._lense_control.SetFLCAbs(OM1_LENSE_ID, value)
-            elif key == "om2": 
-                self._lense_control.SetFLCAbs(OM2_LENSE_ID, value)
-            elif key == "probe-mode":
-                self._eos.SelectProbMode(value)
-            elif key == "function-mode":
-                self._eos.SelectFunctionMode(value)
-            elif not ignore_invalid_keys:
-                self.action_lock.release()
-                raise KeyError("The key '{}' is invalid.".format(key))
+        keys = STATE_MODES + tuple(l[0] for l in STATE_LENSES)
+        invalid_keys = [k for k in state if k not in keys]
+        if len(invalid_keys) > 0 and not ignore_invalid_keys:
+            raise KeyError("The key '{}' is invalid.".format(invalid_keys[0]))
+
+        with self.lockDomains("eos", "lens"):
+            if use_cache and self._current_state is not None:
+                current = self._current_state.copy()
+            else:
+                current = self._readState(keys)
+            
+            # invalidate the state while writing, if writing fails the state
+            # is unknown
+            self._current_state = None
+            
+            modes_changed = False
+            for key in STATE_MODES:
+                if key in state and state[key] != current[key]:
+                    self._writeStateValue(key, state[key])
+                    current[key] = state[key]
+                    modes_changed = True
+            
+            if modes_changed:
+                # the modes re-arrange the lense currents
+                current.update(self._readState([l[0] for l in STATE_LENSES]))
+
+            for key, *_ in STATE_LENSES:
+                if key in state and state[key] != current[key]:
+                    self._writeStateValue(key, state[key])
+                    current[key] = state[key]
+            
+            self._current_state = current
         
-        self.action_lock.release()
+        # the lenses are written directly, never reuse the values that were 
+        # read before
+        self.invalidate()
     
     def setInLorentzMode(self, lorentz_mode : bool) -> None:
         """Set the microscope to be in lorentz mode.
@@ -422,31 +550,39 @@ class PyJEMMicroscope(MicroscopeInterface):
         # if self._stage.GetHolderStts() == 0:
         #     raise IOError("The holder is not inserted.")
 
-        if lorentz_mode:
-            # select TEM mode
-            self._eos.SelectProbMode(PROBE_MODE_TEM)
-            # select low mag mode, this is the most important step because this
-            # will re-arrange the lense currents and apply the focus using the 
-            # objective mini lense
-            self._eos.SelectFunctionMode(FUNCTION_MODE_TEM_LowMAG)
-
-            # switch off fine and coarse objective lense, even though this is 
-            # done by the low mag mode anyway
-            self._lense_control.SetOLc(0)
-            self._lense_control.SetOLf(0)
-
-            # self._lense_control.SetOLSuperFineNeutral()
-
-        else:
-            # keep tem mode
-            self._eos.SelectProbMode(PROBE_MODE_TEM)
-            # select normal mag mode
-            self._eos.SelectFunctionMode(FUNCTION_MODE_TEM_MAG)
-
-            # set neutral?
-            # self._lense_control.SetNtrl((Lens3)arg1, (int)arg2)
-            # NTRL within only value range.
-            # 0:Brightness, 1:OBJ Focus, 2:DIFF Focus, 3:IL Focus, 4:PL Focus, 5:FL Focus
+        with self.lockDomains("eos", "lens"):
+            # the modes re-arrange the lense currents
+            self._current_state = None
+
+            if lorentz_mode:
+                # select TEM mode
+                self._eos.SelectProbMode(PROBE_MODE_TEM)
+                # select low mag mode, this is the most important step because this
+                # will re-arrange the lense currents and apply the focus using the 
+                # objective mini lense
+                self._eos.SelectFunctionMode(FUNCTION_MODE_TEM_LowMAG)
+
+                # switch off fine and coarse objective lense, even though this is 
+                # done by the low mag mode anyway
+                self._lense_control.SetOLc(0)
+                self._lense_control.SetOLf(0)
+
+                # self._lense_control.SetOLSuperFineNeutral()
+
+            else:
+                # keep tem mode
+                self._eos.SelectProbMode(PROBE_MODE_TEM)
+                # select normal mag mode
+                self._eos.SelectFunctionMode(FUNCTION_MODE_TEM_MAG)
+
+                # set neutral?
+                # self._lense_control.SetNtrl((Lens3)arg1, (int)arg2)
+                # NTRL within only value range.
+                # 0:Brightness, 1:OBJ Focus, 2:DIFF Focus, 3:IL Focus, 4:PL Focus, 5:FL Focus
+        
+        # the modes change the lens currents, never reuse the values that 
+        # were read before
+        self.invalidate()
     
     def getInLorentzMode(self) -> bool:
         """Get whether the microscope is in the lorentz mode.
@@ -491,6 +627,8 @@ class PyJEMMicroscope(MicroscopeInterface):
         # self._lense_control.SetILFocus(value)
         # self._lense_control.SetPLFocus(value)
         self._focus = value
+        # the focus changes the lense currents
+        self._current_state = None
 
     def _setObjectiveLensCurrent(self, value : float) -> None:
         """Set the objective lense current.
@@ -513,6 +651,8 @@ class PyJEMMicroscope(MicroscopeInterface):
             self._lense_control.SetOLf(value % self.objective_lense_coarse_fine_stepwidth)
         else:
             self._lense_control.SetOLf(value)
+        
+        self._current_state = None
     
     def _setXTilt(self, value : float) -> None:
         """Set the x tilt in degrees.
@@ -649,17 +789,17 @@ class PyJEMMicroscope(MicroscopeInterface):
         In addition the stage is driven to its origin, with resolving the tilt 
         in all axes.
 
-        This function blocks the `MicroscopeInterface.action_lock` while 
+        This function blocks the *gun* and the *stage* lock domains while 
         operating.
         """
 
         # reset the lorentz mode
         self.setInLorentzMode(False)
 
-        # lock the microscope after the lorentz mode, otherwise there is a 
-        # deadlock (this function blocks the lock, 
-        # PyJEMMicroscope::setInLorentzMode() waits for the lock)
-        self.action_lock.acquire()
+        # lock only the gun and the stage, the lenses are set by 
+        # PyJEMMicroscope::setCurrentState() which locks them itself
+        lock = self.lockDomains("gun", "stage")
+        lock.acquire()
 
         # close the beam valve
         # documentation sais: "This works for FEG and 3100EF" for 
@@ -681,11 +821,11 @@ class PyJEMMicroscope(MicroscopeInterface):
         # set the stage to the original position
         self._stage.SetOrg()
 
-        # release the lock, the setCurrentState() needs the lock again
-        self.action_lock.release()
+        lock.release()
 
-        # restore the starting state
-        self.setCurrentState(self._init_state)
+        # restore the starting state, do not trust the last known state here,
+        # the microscope may have been changed from outside
+        self.setCurrentState(self._init_state, use_cache=False)
     
     @staticmethod
     def defineConfigurationOptions(configuration: "AbstractConfiguration", 
@@ -763,4 +903,32 @@ class PyJEMMicroscope(MicroscopeInterface):
                 "calibration factor is given."), 
             restart_required=True,
             default_value=config_defaults["magnetic-field-unit"]
+        )
+
+        # add the option for the speed of the goniometer
+        if not "max-tilt-slew-rate" in config_defaults:
+            config_defaults["max-tilt-slew-rate"] = 0
+        configuration.addConfigurationOption(
+            config_group_name, 
+            "max-tilt-slew-rate", 
+            datatype=float, 
+            description=("The maximum speed the goniometer tilts with in " + 
+            "degrees per second. Tilt changes are ramped so that they do " + 
+            "not exceed this speed. Use 0 for no limit."), 
+            restart_required=True,
+            default_value=config_defaults["max-tilt-slew-rate"]
+        )
+
+        # add the option for the number of threads to read the state with
+        if not "state-read-workers" in config_defaults:
+            config_defaults["state-read-workers"] = 4
+        configuration.addConfigurationOption(
+            config_group_name, 
+            "state-read-workers", 
+            datatype=int, 
+            description=("The number of threads to read the lense currents " + 
+                "and the modes with when the microscope state is saved, use " + 
+                "1 to read them one after another."), 
+            restart_required=True,
+            default_value=config_defaults["state-read-workers"]
         )
\ No newline at end of file
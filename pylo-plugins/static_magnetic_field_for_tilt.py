@@ -1,4 +1,5 @@
-import math
+import numpy as np
+
 import pylo
 
 class StaticMagneticFieldForTilt(pylo.Device):
@@ -6,10 +7,10 @@ class StaticMagneticFieldForTilt(pylo.Device):
         super().__init__(*args, **kwargs)
 
         self.init_event_id = "static_magnetic_field_init"
-        self.modify_step_event_id = "static_magnetic_field_modify_step"
+        self.transformer_id = "static_magnetic_field_transform_steps"
         self.clearEvents()
         pylo.init_ready[self.init_event_id] = self.initialize
-        pylo.before_approach[self.modify_step_event_id] = self.modifyStep
+        pylo.step_transformers[self.transformer_id] = self.transformSteps
 
         self._logger = pylo.logginglib.get_logger(self)
         self.hint_shown = False
@@ -21,8 +22,8 @@ class StaticMagneticFieldForTilt(pylo.Device):
         """Clear the events from the bound functions"""
         if self.init_event_id in pylo.init_ready:
             del pylo.init_ready[self.init_event_id]
-        if self.modify_step_event_id in pylo.before_approach:
-            del pylo.before_approach[self.modify_step_event_id]
+        if self.transformer_id in pylo.step_transformers:
+            del pylo.step_transformers[self.transformer_id]
     
     def initialize(self, controller, *args, **kwargs) -> None:
         """Initialize the plugin."""
@@ -63,8 +64,9 @@ class StaticMagneticFieldForTilt(pylo.Device):
         raise KeyError(("Could not find a measurement variable with the " + 
                        "name '{}'.").format(name))
     
-    def modifyStep(self, controller: pylo.Controller, *args, **kwargs):
-        """Modify the step to keep a constant field."""
+    def transformSteps(self, controller: pylo.Controller, 
+                       table: pylo.StepTable) -> dict:
+        """Modify the field of all steps to keep a constant field."""
 
         if self.hint_shown:
             return
@@ -112,32 +114,29 @@ class StaticMagneticFieldForTilt(pylo.Device):
                                                      tilt_id, field_id, 
                                                      constant, "" if in_deg else "not "))
 
-        if (tilt_id in controller.measurement.current_step and 
-            field_id in controller.measurement.current_step and
-            isinstance(controller.measurement.current_step[tilt_id], (int, float)) and 
-            isinstance(controller.measurement.current_step[field_id], (int, float))):
-            tilt = controller.measurement.current_step[tilt_id]
-            field = controller.measurement.current_step[field_id]
+        if (tilt_id in table.columns and field_id in table.columns and
+            np.issubdtype(table.columns[tilt_id].dtype, np.number) and 
+            np.issubdtype(table.columns[field_id].dtype, np.number)):
+            tilt = table.columns[tilt_id]
+            field = table.columns[field_id]
 
             if in_deg:
-                calc = "[rad({})".format(tilt)
-                tilt = math.radians(tilt)
-                calc += "={}]".format(tilt)
-            else:
-                calc = "{}".format(tilt)
+                tilt = np.radians(tilt)
             
             if constant == "In-plane":
-                controller.measurement.current_step[field_id] = field / math.sin(tilt)
-                calc = "sin({})".format(calc)
+                corrected = field / np.sin(tilt)
             elif constant == "Out-of-plane":
-                controller.measurement.current_step[field_id] = field / math.cos(tilt)
-                calc = "cos({})".format(calc)
+                corrected = field / np.cos(tilt)
+            else:
+                return
             
             pylo.logginglib.log_debug(self._logger, ("Changing '{}' to new " + 
-                                                     "value '{}' = {} / {}").format(
-                                                         field_id, 
-                                                         controller.measurement.current_step[field_id],
-                                                         field, calc))
+                                                     "values '{}' by keeping " + 
+                                                     "the {} field " + 
+                                                     "constant").format(
+                                                         field_id, corrected,
+                                                         constant))
+            return {field_id: corrected}
     
     @staticmethod
     def defineConfigurationOptions(configuration, group, defaults, *args, **kwargs):
@@ -1,19 +1,21 @@
 import math
 import logging
 
+import numpy as np
+
 import pylo
 
 tilt_corrector = None
-tilt_corrector_reset_event_id = "tilt_corrector_reset"
+tilt_corrector_transform_id = "tilt_corrector_transform_steps"
 tilt_corrector_correct_tilt_event_id = "tilt_corrector_correct_tilt"
 tilt_corrector_create_event_id = "tilt_corrector_create"
 
 def create_tilt_corrector(controller):
-    global tilt_corrector, tilt_corrector_reset_event_id, tilt_corrector_correct_tilt_event_id
+    global tilt_corrector, tilt_corrector_transform_id, tilt_corrector_correct_tilt_event_id
     tilt_corrector = TiltCorrection(controller)
 
-    if tilt_corrector_reset_event_id not in pylo.events.series_ready:
-        pylo.events.series_ready[tilt_corrector_reset_event_id] = tilt_corrector.reset
+    # always replace the transformer, it is bound to the current corrector
+    pylo.step_transformers[tilt_corrector_transform_id] = tilt_corrector.transformSteps
 
     if tilt_corrector_correct_tilt_event_id not in pylo.events.before_record:
         pylo.events.before_record[tilt_corrector_correct_tilt_event_id] = tilt_corrector.correctTilts
@@ -111,8 +113,19 @@ class TiltCorrection:
                                 ""
                                  ).format(sd=sd, d=d))
 
-    def reset(self, *args, **kwargs):
-        """Check if there is a tilt series done when the series is ready."""
+    def _getChangedColumnName(self, direction):
+        return "{}-changed".format(self._getTiltConfigName(direction))
+
+    def transformSteps(self, controller, table):
+        """Calculate the stage correction for all steps before the measurement 
+        starts.
+
+        The stage is moved by l (cos(a_0) - cos(a)) relative to its target 
+        where a_0 is the tilt of the first step. The absolute targets are set
+        in the steps so the stage is moved together with the tilt when 
+        approaching the step. Whether the tilt changed compared to the previous step is 
+        added as a derived column for the manual correction.
+        """
 
         pylo.logginglib.log_debug(self.logger, ("Checking if the current " + 
                                                 "series contains tilts."))
@@ -120,17 +133,9 @@ class TiltCorrection:
         for d in self.tilt_directions:
             self.tilt_cache_values[d] = {}
         
-        if isinstance(self.controller.measurement.steps, pylo.MeasurementSteps):
-            # measurement steps object contains a set of all used variables for 
-            # direct access
-            iterator = self.controller.measurement.steps.series_variables
-        else:
-            # use a map in a normal list of dicts
-            iterator = map(lambda s: s["variable"], 
-                           self.controller.measurement.steps)
-        
+        columns = {}
         for d in self.tilt_directions:
-            self.tilt_cache_values[d]["type"] = self.controller.configuration.getValue(
+            self.tilt_cache_values[d]["type"] = controller.configuration.getValue(
                 self._getTiltConfigName(d), "correction-type", datatype=str, 
                 default_value=None)
             
@@ -139,130 +144,86 @@ class TiltCorrection:
                                                     "is '{}'").format(d,
                                                     self.tilt_cache_values[d]["type"]))
                                                 
-            if self.tilt_cache_values[d]["type"] == "Off":
+            if self.tilt_cache_values[d]["type"] in ("Off", None):
                 continue
 
-            self.tilt_cache_values[d]["id"] = self.controller.configuration.getValue(
+            tilt_id = controller.configuration.getValue(
                 self._getTiltConfigName(d), "tilt-id", datatype=str, 
                 default_value=None)
+            self.tilt_cache_values[d]["id"] = tilt_id
 
-            self.tilt_cache_values[d]["present-in-series"] = False
-
-            if self.tilt_cache_values[d]["id"] in iterator:
-                pylo.logginglib.log_info(self.logger, ("Found a tilt id '{}' in "+ 
-                                                       "the measurement steps, " + 
-                                                       "tilt correction for '{}' " + 
-                                                       "tilt is available").format(
-                                                           self.tilt_cache_values[d]["id"], 
-                                                           d))
-                self.tilt_cache_values[d]["present-in-series"] = True
-
-            if not self.tilt_cache_values[d]["present-in-series"]:
+            if (tilt_id not in table.columns or 
+                not np.issubdtype(table.columns[tilt_id].dtype, np.number)):
                 pylo.logginglib.log_debug(self.logger, ("Tilt id '{}' is not " + 
                                                         "used in the current " + 
                                                         "series. No tilt " + 
                                                         "correction for the " + 
                                                         "'{}' direction").format(
-                                                            self.tilt_cache_values[d]["id"],
-                                                            d))
-
-    def correctTilts(self, *args, **kwargs):
-        """Realign the stage before every measurement step."""
-
-        for d in self.tilt_directions:
-            if (self.tilt_cache_values[d]["type"] != "Off" and 
-                self.tilt_cache_values[d]["present-in-series"]):
-                try:
-                    tilt = self.controller.microscope.getMeasurementVariableValue(
-                        self.tilt_cache_values[d]["id"])
-                except ValueError:
-                    continue
+                                                            tilt_id, d))
+                continue
+            
+            tilt = table.columns[tilt_id].astype(float)
+            changed = np.zeros(len(table), dtype=bool)
+            changed[1:] = ~np.isclose(tilt[1:], tilt[:-1])
+            columns[self._getChangedColumnName(d)] = changed
+            
+            if "Automatic" not in self.tilt_cache_values[d]["type"]:
+                continue
+            
+            for sd in ("x", "y"):
+                stage_id = controller.configuration.getValue(
+                    self._getTiltConfigName(d), 
+                    "stage-{}-variable-id".format(sd), datatype=str,
+                    default_value=None)
+                l = controller.configuration.getValue(
+                    self._getTiltConfigName(d), "stage-{}".format(sd), 
+                    datatype=float, default_value=0)
                 
-                if ("last-value" not in self.tilt_cache_values[d] or 
-                    math.isclose(self.tilt_cache_values[d]["last-value"], tilt)):
-                    self.tilt_cache_values[d]["last-value"] = tilt
-                    pylo.logginglib.log_debug(self.logger, ("Skipping tilt " + 
-                                                            "correction in '{}' " + 
-                                                            "direction, the " + 
-                                                            "tilts did not " + 
-                                                            "change since " + 
-                                                            "the last step " + 
-                                                            "or this is the " + 
-                                                            "first step."))
+                if (not isinstance(l, (int, float)) or 
+                    math.isclose(l, 0, abs_tol=1e-6) or 
+                    stage_id not in table.columns):
+                    pylo.logginglib.log_debug(self.logger, 
+                        ("Skipping '{}' tilt correction in '{}' direction, " + 
+                         "the either the stage variable id '{}' or " + 
+                         "the stage correction factor '{}' is " + 
+                         "invalid.").format(d, sd, stage_id, l))
                     continue
                 
-                if "Automatic" in self.tilt_cache_values[d]["type"]:
-                    for sd in ("x", "y"):
-                        stage_key = "stage-{}".format(sd)
-                        if not stage_key in self.tilt_cache_values[d]:
-                            self.tilt_cache_values[d][stage_key] = self.controller.configuration.getValue(
-                                self._getTiltConfigName(d), 
-                                "stage-{}-variable-id".format(sd), datatype=str,
-                                default_value=None)
-                            
-                        l_key = "l{}".format(sd)
-                        if not l_key in self.tilt_cache_values[d]:
-                            self.tilt_cache_values[d][l_key] = self.controller.configuration.getValue(
-                                self._getTiltConfigName(d), "stage-{}".format(sd), 
-                                datatype=float, default_value=0)
-                        
-                        if (isinstance(self.tilt_cache_values[d][l_key], (int, float)) and 
-                            not math.isclose(self.tilt_cache_values[d][l_key], 0, abs_tol=1e-6) and
-                            self.tilt_cache_values[d][stage_key] is not None and
-                            self.tilt_cache_values[d][stage_key] != ""):
-
-                            stage_d = (self.tilt_cache_values[d][l_key] * 
-                                    (math.cos(math.radians(self.tilt_cache_values[d]["last-value"])) - 
-                                     math.cos(math.radians(tilt))))
-                            
-                            pylo.logginglib.log_debug(self.logger, 
-                                ("Calculating stage difference by " + 
-                                 "d = {} * (cos(a) - cos(b)) with " + 
-                                 "{}='{}', a='{}' and b='{}' => d='{}'").format(
-                                     l_key, l_key, 
-                                     self.tilt_cache_values[d][l_key],
-                                     self.tilt_cache_values[d]["last-value"],
-                                     tilt, stage_d))
+                stage_d = l * (np.cos(np.radians(tilt[0])) - 
+                               np.cos(np.radians(tilt)))
+                
+                if stage_id in columns:
+                    # the other tilt direction corrects the same stage axis
+                    stage = columns[stage_id]
+                else:
+                    stage = table.columns[stage_id].astype(float)
+                
+                columns[stage_id] = stage + stage_d
+                pylo.logginglib.log_info(self.logger, 
+                    ("Correcting '{}' tilt in '{}' direction by moving the " + 
+                     "stage by up to '{}'.").format(d, sd, 
+                     np.max(np.abs(stage_d))))
+        
+        return columns
 
-                            try:
-                                stage_value = self.controller.microscope.getMeasurementVariableValue(
-                                    self.tilt_cache_values[d][stage_key])
-                            except KeyError:
-                                # stage variable is invalid, disable for future
-                                # runs
-                                self.tilt_cache_values[d][stage_key] = None
-                                self.tilt_cache_values[d][l_key] = 0
-                                continue
+    def correctTilts(self, controller, *args, **kwargs):
+        """Pause for the manual correction when the tilt changed."""
 
-                            try:
-                                self.controller.microscope.setMeasurementVariableValue(
-                                    self.tilt_cache_values[d][stage_key], 
-                                    stage_value + stage_d)
-                                pylo.logginglib.log_info(self.logger, 
-                                    ("Correcting '{}' tilt in '{}' direction, " + 
-                                    "by moving stage by '{}' (target value " + 
-                                    "is '{}').").format(d, sd, stage_d,
-                                        stage_value + stage_d))
-                            except ValueError as e:
-                                pylo.logginglib.log_error(e)
-                        else:
-                            pylo.logginglib.log_debug(self.logger, 
-                                ("Skipping '{}' tilt correction in '{}' direction, " + 
-                                 "the either the stage variable id '{}' or " + 
-                                 "the stage correction factor '{}' is " + 
-                                 "invalid.").format(d, sd, 
-                                    self.tilt_cache_values[d][stage_key], 
-                                    self.tilt_cache_values[d][l_key]))
+        if not isinstance(controller.measurement.steps, pylo.MeasurementSteps):
+            return
+        
+        derived = controller.measurement.steps.getDerived(
+            controller.measurement.step_index)
 
-                if "Manual" in self.tilt_cache_values[d]["type"]:
-                    self.controller.view.showHint("Pausing for tilt " + 
-                                                  "correction.\n\n" + 
-                                                  "Please move the stage " + 
-                                                  "to compensate translation "+ 
-                                                  "caused by tilting. Press " + 
-                                                  "'Ok' if you want to " + 
-                                                  "continue.")
-                    pylo.logginglib.log_debug(self.logger, ("Showing correction " + 
-                                                            "tilt dialog."))
-                
-                self.tilt_cache_values[d]["last-value"] = tilt
\ No newline at end of file
+        for d in self.tilt_directions:
+            if ("Manual" in str(self.tilt_cache_values[d].get("type", "")) and
+                derived.get(self._getChangedColumnName(d), False)):
+                self.controller.view.showHint("Pausing for tilt " + 
+                                              "correction.\n\n" + 
+                                              "Please move the stage " + 
+                                              "to compensate translation "+ 
+                                              "caused by tilting. Press " + 
+                                              "'Ok' if you want to " + 
+                                              "continue.")
+                pylo.logginglib.log_debug(self.logger, ("Showing correction " + 
+                                                        "tilt dialog."))
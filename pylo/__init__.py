@@ -33,6 +33,8 @@ __doc__ += str(__config_docs__)
 
 from .event import Event
 from .events import emergency
+from .events import safe_state_timeout
+from .events import device_call_hang
 from .events import after_stop
 from .events import before_start
 from .events import before_init
@@ -43,6 +45,7 @@ from .events import microscope_ready
 from .events import before_approach
 from .events import before_record
 from .events import after_record
+from .events import after_log_row
 from .events import measurement_ready
 
 __doc__ += "\n\nEvents (.events)\n----------------\n"
@@ -60,6 +63,8 @@ from .errors import DeviceImportError
 from .errors import DeviceCreationError
 from .errors import BlockedFunctionError
 from .errors import DeviceClassNotDefined
+from .errors import PreflightError
+from .errors import DeviceCallTimeoutError
 from .errors import FallbackModuleNotFoundError
 from .errors import ExecutionOutsideEnvironmentError
 
@@ -75,23 +80,43 @@ for handler in logginglib.create_handlers():
 
 from .image import Image
 from .device import Device
+from .timeline import Timeline
 from .cli_view import CLIView
 from .datatype import Datatype
 from .datatype import OptionDatatype
+from .batch_runner import BatchRunner
 from .log_thread import LogThread
 from .controller import Controller
+from .control_server import ControlServer
+from .processing_stage import ProcessingStage
+from .drift_correction import DriftCorrector
+from .quality_metrics import QualityMonitor
+from .preview import PreviewWriter
+from .preview import read_preview_index
+from .tie_reconstruction import TIEReconstructor
 from .measurement import Measurement
 from .stop_program import StopProgram
 from .abstract_view import AbstractView
+from .headless_view import HeadlessView
 from .device_loader import DeviceLoader
 from .blocked_function import BlockedFunction
 from .camera_interface import CameraInterface
+from .camera_interface import MAIN_CAMERA_ROLE
+from .camera_interface import AcquisitionHandle
 from .exception_thread import ExceptionThread
 from .ini_configuration import IniConfiguration
 from .measurement_steps import MeasurementSteps
+from .step_transformer import StepTable
+from .step_transformer import StepTransformers
+from .step_transformer import step_transformers
+from .call_supervisor import CallSupervisor
+from .progress_model import ProgressModel
+from .preflight import Preflight
+from .preflight import PreflightReport
 from .vulnerable_machine import VulnerableMachine
 from .measurement_variable import MeasurementVariable
 from .microscope_interface import MicroscopeInterface
+from .domain_locks import DEFAULT_LOCK_DOMAIN
 from .abstract_configuration import AbstractConfiguration
 
 try:
@@ -237,4 +262,79 @@ def execute(view: AbstractView, configuration: AbstractConfiguration) -> Control
     controller = start(view, configuration)
     controller.waitForProgram()
 
-    return controller
\ No newline at end of file
+    return controller
+
+def run_batch(configuration: AbstractConfiguration, 
+              batch_file: typing.Union[str, "pathlib.PurePath"],
+              view: typing.Optional[AbstractView]=None, 
+              continue_on_error: typing.Optional[bool]=False) -> BatchRunner:
+    """Execute all measurements in the `batch_file` without user interaction.
+
+    Parameter
+    ---------
+    configuration : AbstractConfiguration
+        The configuration that defines how values are saved persistently
+    batch_file : str, pathlib.PurePath
+        The json file that contains the jobs, for the format see the 
+        `BatchRunner`
+    view : AbstractView, optional
+        The view to use for displaying the measurement status, if not given a
+        `HeadlessView` is used, default: None
+    continue_on_error : bool, optional
+        Whether to continue with the next job if a job fails, default: False
+    
+    Returns
+    -------
+    BatchRunner
+        The runner, the summaries of the jobs are in the 
+        `BatchRunner.summaries`
+    """
+
+    if view is None:
+        view = HeadlessView()
+    
+    controller = setup(view, configuration)
+    runner = BatchRunner.fromFile(controller, batch_file, 
+                                  continue_on_error=continue_on_error)
+    runner.setup()
+    runner.run()
+
+    return runner
+
+def serve(configuration: AbstractConfiguration, 
+          host: typing.Optional[str]=None, port: typing.Optional[int]=None,
+          view: typing.Optional[AbstractView]=None) -> Controller:
+    """Load the devices and start the control server.
+
+    The server runs in the background, use `Controller.stopControlServer()` to
+    stop it.
+
+    Parameter
+    ---------
+    configuration : AbstractConfiguration
+        The configuration that defines how values are saved persistently
+    host : str, optional
+        The host to listen on, if not given the `CONTROL_SERVER_HOST` is used,
+        default: None
+    port : int, optional
+        The port to listen on, if not given the `CONTROL_SERVER_PORT` is used,
+        default: None
+    view : AbstractView, optional
+        The view to use for displaying the measurement status, if not given a
+        `HeadlessView` is used, default: None
+    
+    Returns
+    -------
+    Controller
+        The controller that runs the server
+    """
+
+    if view is None:
+        view = HeadlessView()
+    
+    controller = setup(view, configuration)
+    controller.initialize()
+    init_ready(controller)
+    controller.startControlServer(host, port)
+
+    return controller
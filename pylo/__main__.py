@@ -1,6 +1,7 @@
 if __name__ == "__main__":
     import os
     import sys
+    import time
     import argparse
 
     try:
@@ -16,6 +17,8 @@ if __name__ == "__main__":
         raise RuntimeError("Please use 'python -m pylo' to start PyLo") from e
     
     from pylo import execute
+    from pylo import run_batch
+    from pylo import serve
     from pylo import CLIView
     from pylo import StopProgram
     from pylo import IniConfiguration
@@ -33,9 +36,22 @@ if __name__ == "__main__":
                        action="store_true")
     group.add_argument("-r", "--reset", help="Reset the settings", 
                        action="store_true")
+    parser.add_argument("command", nargs="?", choices=("run", "serve"), 
+                        help="Use 'run' to execute the measurements in the " + 
+                             "batch file without user interaction, use " + 
+                             "'serve' to start the local control server")
+    parser.add_argument("batch_file", nargs="?", 
+                        help="The json file containing the jobs to run")
+    parser.add_argument("--continue-on-error", action="store_true",
+                        help="Continue with the next job if a job fails")
+    parser.add_argument("--port", type=int, 
+                        help="The port of the control server")
 
     program_args = parser.parse_args()
 
+    if program_args.command == "run" and program_args.batch_file is None:
+        parser.error("The 'run' command requires a batch file")
+
     view = CLIView()
     configuration = IniConfiguration()
 
@@ -48,6 +64,29 @@ if __name__ == "__main__":
         elif program_args.reset:
             configuration.reset()
             print("Configuration is reset.")
+        elif program_args.command == "run":
+            runner = run_batch(configuration, program_args.batch_file, 
+                               continue_on_error=program_args.continue_on_error)
+            
+            for summary in runner.summaries:
+                print("{}: {}{}".format(summary["name"], summary["status"], 
+                      " ({})".format(summary["error"]) 
+                      if summary["error"] is not None else ""))
+            
+            if any(s["status"] != "finished" for s in runner.summaries):
+                sys.exit(1)
+        elif program_args.command == "serve":
+            controller = serve(configuration, port=program_args.port)
+            print(("Control server is listening on {}, press Ctrl+C to " + 
+                   "stop.").format(controller.control_server.url))
+
+            try:
+                while controller.control_server.running:
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                controller.stopControlServer()
         else:
             # execute pylo if it is run as a program
             execute(view, configuration)
@@ -1,11 +1,19 @@
+import time
 import typing
 import logging
+import threading
 
 from .datatype import Datatype
 from .pylolib import parse_value
 from .pylolib import human_concat_list
 from .logginglib import log_debug
+from .logginglib import log_error
 from .logginglib import get_logger
+from .progress_model import ProgressModel
+
+# the time in seconds the thread that updates the running indicator waits for
+# new updates before it stops
+RUNNING_UPDATE_IDLE_TIMEOUT = 1
 
 if hasattr(typing, "TypedDict"):
     AskInput = typing.TypedDict("AskInput", {
@@ -24,12 +32,23 @@ class AbstractView:
         The maximum number the progress can have
     progress : int
         The current progress
+    progress_model : ProgressModel
+        The model that calculates the rate and the eta of the progress
     """
 
     def __init__(self):
         """Get the view object."""
         self._logger = get_logger(self)
         self.show_running = False
+        self.progress_model = ProgressModel()
+
+        # the running indicator is updated in its own thread, all updates 
+        # that are requested while it is updating are combined
+        self._running_update_condition = threading.Condition()
+        self._running_update_pending = False
+        self._running_update_active = False
+        self._running_update_thread = None
+
         self.progress_max = 100
         self.progress = 0
 
@@ -52,8 +71,10 @@ class AbstractView:
         log_debug(self._logger, "Setting progress to '{}' (was initially '{}')".format(
                                self.__progress, progress))
         
+        self.progress_model.update(self.__progress, self.progress_max)
+        
         if self.show_running:
-            self._updateRunning()
+            self._requestRunningUpdate()
 
     def showProgramDialogs(self, controller: "Controller",
                            series: typing.Optional[dict]=None,
@@ -388,8 +409,81 @@ class AbstractView:
         self.show_running = False
 
     def _updateRunning(self) -> None:
-        """Update the running indicator, the progress has updated."""
+        """Update the running indicator, the progress has updated.
+        
+        This is executed in the running update thread, at most 
+        `config.PROGRESS_MAX_REFRESH_RATE` times per second.
+        """
         raise NotImplementedError()
+    
+    def _requestRunningUpdate(self) -> None:
+        """Request to update the running indicator and return immediately.
+
+        The `AbstractView._updateRunning()` is executed in the running update
+        thread, all requests until it is executed are combined.
+        """
+        with self._running_update_condition:
+            self._running_update_pending = True
+
+            if self._running_update_thread is None:
+                self._running_update_thread = threading.Thread(
+                    target=self._runningUpdateLoop, daemon=True,
+                    name="{} running update".format(self.__class__.__name__))
+                self._running_update_thread.start()
+            
+            self._running_update_condition.notify_all()
+    
+    def _runningUpdateLoop(self) -> None:
+        """Execute the requested updates of the running indicator, this is 
+        executed in the running update thread."""
+
+        # import as late as possible to allow changes by extensions
+        from .config import PROGRESS_MAX_REFRESH_RATE
+
+        while True:
+            with self._running_update_condition:
+                if not self._running_update_pending:
+                    self._running_update_condition.wait(
+                        RUNNING_UPDATE_IDLE_TIMEOUT)
+                
+                if not self._running_update_pending:
+                    self._running_update_thread = None
+                    return
+                
+                self._running_update_pending = False
+                self._running_update_active = True
+            
+            try:
+                if self.show_running:
+                    self._updateRunning()
+            except Exception as e:
+                log_error(self._logger, e)
+            finally:
+                with self._running_update_condition:
+                    self._running_update_active = False
+                    self._running_update_condition.notify_all()
+            
+            time.sleep(1 / PROGRESS_MAX_REFRESH_RATE)
+    
+    def flushRunning(self, timeout: typing.Optional[float]=None) -> bool:
+        """Wait until all requested updates of the running indicator are 
+        executed.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in seconds, None to wait until the 
+            updates are done, default: None
+        
+        Returns
+        -------
+        bool
+            Whether all updates are executed
+        """
+        with self._running_update_condition:
+            return self._running_update_condition.wait_for(
+                lambda: (not self._running_update_pending and 
+                         not self._running_update_active), timeout)
 
     def askForDecision(self, text: str, options: typing.Optional[typing.Sequence[str]]=("Ok", "Cancel")) -> int:
         """Ask for a decision between the given `options`.
@@ -0,0 +1,442 @@
+import copy
+import math
+import heapq
+import typing
+import itertools
+
+import numpy as np
+
+from .logginglib import log_info
+from .logginglib import log_debug
+from .logginglib import get_logger
+from .datatype import Datatype
+from .sweep import get_sweep_series
+from .measurement_steps import MeasurementSteps
+
+REFINEMENT_TAGS_KEY = "Adaptive refinement"
+
+# the default normalized image difference between two neighbouring points from
+# on the interval between them is refined
+DEFAULT_REFINEMENT_THRESHOLD = 0.05
+# the default maximum number of inserted points per refined series
+DEFAULT_REFINEMENT_BUDGET = 50
+# the default number of times the step width of the series may be halved if
+# no minimum step width is given
+DEFAULT_REFINEMENT_DEPTH = 4
+# the maximum side length of the images the difference is calculated of
+THUMBNAIL_SIZE = 64
+
+def downsample(image_data: typing.Any, size: typing.Optional[int]=THUMBNAIL_SIZE) -> np.ndarray:
+    """Reduce the `image_data` by averaging blocks of pixels so no side is
+    longer than about `size`.
+
+    Parameters
+    ----------
+    image_data : numpy.array_like
+        The image, colour channels are averaged
+    size : int, optional
+        The approximate maximum side length, default: `THUMBNAIL_SIZE`
+
+    Returns
+    -------
+    numpy.ndarray
+        The two dimensional float32 thumbnail
+    """
+    data = np.asarray(image_data, dtype=np.float32)
+
+    if data.ndim < 2:
+        data = data.reshape((1, -1))
+    elif data.ndim > 2:
+        data = data.mean(axis=tuple(range(2, data.ndim)))
+
+    fy, fx = (max(1, s // size) for s in data.shape)
+    height = data.shape[0] // fy * fy
+    width = data.shape[1] // fx * fx
+
+    return data[:height, :width].reshape(
+        (height // fy, fy, width // fx, fx)).mean(axis=(1, 3))
+
+def difference_metric(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Get the mean absolute difference of each image pair relative to the
+    mean intensity of the pair.
+
+    Parameters
+    ----------
+    first, second : numpy.ndarray
+        The stacked images with the shape (n, height, width)
+
+    Returns
+    -------
+    numpy.ndarray
+        The n differences, 0 for equal images
+    """
+    difference = np.abs(first - second).mean(axis=(1, 2))
+    intensity = (np.abs(first).mean(axis=(1, 2)) +
+                 np.abs(second).mean(axis=(1, 2))) / 2
+
+    return difference / np.maximum(intensity, np.finfo(np.float32).eps)
+
+def is_integer_format(format: typing.Any) -> bool:
+    """Get whether the `format` of a measurement variable only allows 
+    integers.
+
+    Parameters
+    ----------
+    format : type, Datatype or any
+        The `MeasurementVariable.format`
+
+    Returns
+    -------
+    bool
+        Whether the format is `int`, `Datatype.int` or `Datatype.hex_int`
+    """
+    return format is int or format is Datatype.int or format is Datatype.hex_int
+
+def interpolate_step(first: dict, second: dict, 
+                     integer_ids: typing.Optional[typing.Collection[str]]=()) -> dict:
+    """Get the step in the middle of the `first` and the `second` step.
+
+    Parameters
+    ----------
+    first, second : dict
+        The steps
+    integer_ids : collection of str, optional
+        The ids of the variables that only allow integers, their mean is 
+        rounded down, default: ()
+
+    Returns
+    -------
+    dict
+        The step with the mean of all numeric values, other values are taken
+        from the `first` step
+    """
+    step = copy.deepcopy(first)
+    for key, value in first.items():
+        other = second.get(key, None)
+        if (isinstance(value, (int, float)) and
+            isinstance(other, (int, float)) and
+            not isinstance(value, bool) and not isinstance(other, bool)):
+            step[key] = (value + other) / 2
+
+            if key in integer_ids:
+                step[key] = int(math.floor(step[key]))
+
+    return step
+
+class RefinementPoint:
+    """A measurement point of the adaptive refinement.
+
+    Attributes
+    ----------
+    step : dict
+        The target values of the point
+    level : int
+        The number of bisections that created the point, 0 for points of the
+        coarse grid
+    change : float or None
+        The image difference of the interval the point was inserted in, None
+        for points of the coarse grid
+    thumbnail : numpy.ndarray or None
+        The downsampled image that was recorded at the point, None if there is
+        no image (yet)
+    """
+
+    def __init__(self, step: dict, level: typing.Optional[int]=0,
+                 change: typing.Optional[float]=None) -> None:
+        """Create the point.
+
+        Parameters
+        ----------
+        step : dict
+            The target values of the point
+        level : int, optional
+            The number of bisections that created the point, default: 0
+        change : float, optional
+            The image difference of the interval the point was inserted in,
+            default: None
+        """
+        self.step = step
+        self.level = level
+        self.change = change
+        self.thumbnail = None
+
+class AdaptiveSteps:
+    """The steps of a measurement whose most inner series is refined where
+    the images change.
+
+    The most inner series is used as the coarse grid. After all points of the
+    coarse grid are recorded, the difference of the images of each two
+    neighbouring points is calculated. Intervals whose difference exceeds the
+    `threshold` are bisected, the interval with the largest difference first.
+    The difference of the new point to both neighbours is calculated after it
+    is recorded, this is repeated until no difference exceeds the
+    `threshold`, the `budget` is used up or the intervals would become
+    smaller than the `min_step_width`. The outer series are iterated normally,
+    the most inner series is refined for each of their steps.
+
+    The images are passed back by `AdaptiveSteps.addImage()` after each step.
+    The length grows while iterating, it is the number of steps that are
+    known so far.
+
+    Attributes
+    ----------
+    steps : MeasurementSteps
+        The steps of the coarse grid
+    series : dict
+        The series definition that is used to create the steps
+    start : dict
+        The start definition that is used to create the steps
+    refine_series : dict
+        The most inner series that is refined
+    variable_id : str
+        The id of the measurement variable of the `refine_series`
+    threshold : float
+        The image difference from on an interval is refined
+    budget : int
+        The maximum number of inserted points for each refined series
+    min_step_width : float
+        The minimum distance of two points of the refined variable, at least 1
+        if the variable only allows integers
+    integer_ids : set of str
+        The ids of the measurement variables that only allow integers, their
+        interpolated values are rounded
+    inserted : int
+        The number of points that are inserted in the current iteration
+    """
+
+    def __init__(self, steps: MeasurementSteps,
+                 threshold: typing.Optional[float]=DEFAULT_REFINEMENT_THRESHOLD,
+                 budget: typing.Optional[int]=DEFAULT_REFINEMENT_BUDGET,
+                 min_step_width: typing.Optional[float]=None) -> None:
+        """Create the adaptive steps.
+
+        Parameters
+        ----------
+        steps : MeasurementSteps
+            The steps of the coarse grid
+        threshold : float, optional
+            The image difference from on an interval is refined,
+            default: `DEFAULT_REFINEMENT_THRESHOLD`
+        budget : int, optional
+            The maximum number of inserted points for each refined series,
+            default: `DEFAULT_REFINEMENT_BUDGET`
+        min_step_width : float, optional
+            The minimum distance of two points, None or 0 to allow halving the
+            'step-width' of the series `DEFAULT_REFINEMENT_DEPTH` times, 
+            variables that only allow integers use at least 1, default: None
+        """
+        self._logger = get_logger(self)
+        self.steps = steps
+        self.series = steps.series
+        self.start = steps.start
+        self.refine_series = get_sweep_series(steps.series)
+        self.variable_id = self.refine_series["variable"]
+        self.threshold = threshold
+        self.budget = max(0, int(budget))
+
+        if not isinstance(min_step_width, (int, float)) or min_step_width <= 0:
+            min_step_width = (self.refine_series["step-width"] /
+                              2 ** DEFAULT_REFINEMENT_DEPTH)
+
+        self.integer_ids = set()
+        microscope = getattr(steps.controller, "microscope", None)
+        for variable in getattr(microscope, "supported_measurement_variables", ()):
+            if is_integer_format(getattr(variable, "format", None)):
+                self.integer_ids.add(variable.unique_id)
+
+        if self.variable_id in self.integer_ids:
+            # integer intervals of the width 1 cannot be bisected
+            min_step_width = max(1, min_step_width)
+        self.min_step_width = min_step_width
+
+        self._inner_length = list(steps._getNestLengths())[-1]
+        self.inserted = 0
+        self._current = None
+
+    def __len__(self) -> int:
+        """Get the number of steps that are known so far.
+
+        Returns
+        -------
+        int
+            The steps of the coarse grid and the inserted steps
+        """
+        return len(self.steps) + self.inserted
+
+    def getMaximumLength(self) -> int:
+        """Get the number of steps if the budget is used up for every refined
+        series.
+
+        Returns
+        -------
+        int
+            The maximum number of steps
+        """
+        # the number of times the step width can be halved
+        depth = math.floor(math.log2(self.refine_series["step-width"] /
+                                     self.min_step_width) + 1e-9)
+        per_series = min(self.budget,
+                         (self._inner_length - 1) * (2 ** max(0, depth) - 1))
+
+        return len(self.steps) + len(self.steps) // self._inner_length * per_series
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        """Iterate over the coarse grid and the inserted steps.
+
+        Returns
+        -------
+        Iterator
+            The iterator of the step dicts, the steps are copies so they can
+            be modified
+        """
+        self.inserted = 0
+        self._current = None
+        return self._iterateSteps()
+
+    def _iterateSteps(self) -> typing.Generator[dict, None, None]:
+        """Yield the steps of each refined series.
+
+        Returns
+        -------
+        Generator
+            The generator of the step dicts
+        """
+        for offset in range(0, len(self.steps), self._inner_length):
+            points = []
+            for index in range(offset, offset + self._inner_length):
+                point = RefinementPoint(self.steps[index])
+                points.append(point)
+                yield self._visit(point)
+
+            yield from self._refine(points)
+
+    def _refine(self, points: typing.List[RefinementPoint]) -> typing.Generator[dict, None, None]:
+        """Yield the steps that are inserted between the recorded `points`.
+
+        Parameters
+        ----------
+        points : list of RefinementPoint
+            The points of the coarse grid in the order of the series
+
+        Returns
+        -------
+        Generator
+            The generator of the step dicts
+        """
+        # the intervals as a heap, largest change first, the counter prevents
+        # comparing the points
+        intervals = []
+        counter = itertools.count()
+
+        def push(left, right, change):
+            if change is None or change <= self.threshold:
+                return
+
+            width = abs(right.step[self.variable_id] - left.step[self.variable_id])
+            if width / 2 < self.min_step_width - MeasurementSteps.abs_tol:
+                return
+
+            heapq.heappush(intervals, (-change, next(counter), left, right))
+
+        for left, right, change in zip(points, points[1:],
+                                       self.getChanges(points)):
+            push(left, right, change)
+
+        inserted = 0
+        while len(intervals) > 0 and inserted < self.budget:
+            change, _, left, right = heapq.heappop(intervals)
+            point = RefinementPoint(interpolate_step(left.step, right.step,
+                                                     self.integer_ids),
+                                    max(left.level, right.level) + 1, -change)
+            inserted += 1
+            self.inserted += 1
+
+            log_info(self._logger, ("Refining the interval from '{}' to " +
+                                    "'{}' of '{}' at '{}' because the images " +
+                                    "differ by '{:.4f}'").format(
+                                    left.step[self.variable_id],
+                                    right.step[self.variable_id],
+                                    self.variable_id,
+                                    point.step[self.variable_id], -change))
+            yield self._visit(point)
+
+            changes = self.getChanges((left, point, right))
+            push(left, point, changes[0])
+            push(point, right, changes[1])
+
+        log_debug(self._logger, ("Inserted '{}' points, '{}' intervals " +
+                                 "remain above the threshold").format(
+                                 inserted, len(intervals)))
+
+    def _visit(self, point: RefinementPoint) -> dict:
+        """Set the `point` as the point the next image belongs to.
+
+        Parameters
+        ----------
+        point : RefinementPoint
+            The point that is measured next
+
+        Returns
+        -------
+        dict
+            A copy of the step of the `point`
+        """
+        self._current = point
+        return copy.deepcopy(point.step)
+
+    def addImage(self, image: "Image") -> None:
+        """Set the image that is recorded at the current step.
+
+        Parameters
+        ----------
+        image : Image
+            The recorded image
+        """
+        if self._current is not None:
+            self._current.thumbnail = downsample(image.image_data)
+
+    def getTags(self) -> dict:
+        """Get the refinement information of the current step.
+
+        Returns
+        -------
+        dict
+            The tags to add to the image
+        """
+        tags = {"Variable": self.variable_id}
+        if self._current is not None:
+            tags["Level"] = self._current.level
+            if self._current.change is not None:
+                tags["Change"] = self._current.change
+
+        return tags
+
+    def getChanges(self, points: typing.Sequence[RefinementPoint]) -> typing.List[typing.Optional[float]]:
+        """Get the image differences of each two neighbouring `points`.
+
+        Parameters
+        ----------
+        points : sequence of RefinementPoint
+            The points
+
+        Returns
+        -------
+        list of float or None
+            The difference for each pair of neighbours, None if one of them
+            has no image
+        """
+        changes = [None] * max(0, len(points) - 1)
+        pairs = [i for i in range(len(changes))
+                 if points[i].thumbnail is not None and
+                    points[i + 1].thumbnail is not None and
+                    points[i].thumbnail.shape == points[i + 1].thumbnail.shape]
+
+        if len(pairs) > 0:
+            metric = difference_metric(
+                np.stack([points[i].thumbnail for i in pairs]),
+                np.stack([points[i + 1].thumbnail for i in pairs]))
+
+            for i, change in zip(pairs, metric):
+                changes[i] = float(change)
+
+        return changes
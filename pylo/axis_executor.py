@@ -0,0 +1,235 @@
+import queue
+import typing
+import threading
+import concurrent.futures
+
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import get_logger
+from .stop_program import StopProgram
+
+class AxisFuture(concurrent.futures.Future):
+    """A future of a task of the `AxisExecutor`.
+
+    The future can be used like an `ExceptionThread`, it has a `name`, the
+    `exceptions` and it can be joined.
+
+    Attributes
+    ----------
+    name : str
+        The name of the task
+    axis : str
+        The axis the task is executed on
+    """
+
+    def __init__(self, axis: str, name: typing.Optional[str]="") -> None:
+        """Create a new future.
+
+        Parameters
+        ----------
+        axis : str
+            The axis the task is executed on
+        name : str, optional
+            The name of the task, default: ""
+        """
+        super().__init__()
+        self.axis = axis
+        self.name = name
+
+    @property
+    def exceptions(self) -> typing.List[BaseException]:
+        """The exception of the task as a list like in the `ExceptionThread`,
+        empty if the task is not done or did not raise an exception."""
+        if not self.done() or self.cancelled():
+            return []
+
+        error = self.exception()
+        if error is None:
+            return []
+        else:
+            return [error]
+
+    def join(self, timeout: typing.Optional[float]=None) -> None:
+        """Wait until the task is done.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in seconds, default: None
+        """
+        concurrent.futures.wait((self, ), timeout)
+
+    def is_alive(self) -> bool:
+        """Whether the task is not done yet."""
+        return not self.done()
+
+class AxisExecutor:
+    """An executor with one long-lived worker thread per axis.
+
+    Tasks of the same axis are executed one after the other in the order
+    they are submitted, tasks of different axes are executed in parallel.
+    The worker threads are created when the first task of an axis is
+    submitted and they are reused for all following tasks.
+
+    Attributes
+    ----------
+    name : str
+        The name that is used as a prefix for the thread names
+    """
+
+    def __init__(self, name: typing.Optional[str]="axis") -> None:
+        """Create a new executor.
+
+        Parameters
+        ----------
+        name : str, optional
+            The name that is used as a prefix for the thread names,
+            default: "axis"
+        """
+        self.name = name
+        self._logger = get_logger(self)
+        self._queues = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    @property
+    def axes(self) -> typing.List[str]:
+        """The axes that have a worker thread."""
+        with self._lock:
+            return list(self._threads.keys())
+
+    def submit(self, axis: str, fn: typing.Callable, *args,
+               name: typing.Optional[str]=None, **kwargs) -> AxisFuture:
+        """Execute the `fn` in the worker of the `axis`.
+
+        Raises
+        ------
+        RuntimeError
+            When the executor is shut down
+
+        Parameters
+        ----------
+        axis : str
+            The axis to execute the function on
+        fn : callable
+            The function to execute
+        args, kwargs
+            The arguments to pass to the `fn`
+        name : str, optional
+            The name of the task, default: the function name
+
+        Returns
+        -------
+        AxisFuture
+            The future of the task
+        """
+        if name is None:
+            name = getattr(fn, "__name__", str(fn))
+
+        future = AxisFuture(axis, name)
+
+        with self._lock:
+            if self._shutdown:
+                err = RuntimeError(("Cannot submit '{}', the executor is " +
+                                    "shut down.").format(name))
+                log_error(self._logger, err)
+                raise err
+
+            if axis not in self._threads:
+                log_debug(self._logger, "Creating worker for axis '{}'".format(
+                                        axis))
+                self._queues[axis] = queue.Queue()
+                thread = threading.Thread(target=self._work,
+                                          args=(self._queues[axis], ),
+                                          name="{} {}".format(self.name, axis))
+                thread.daemon = True
+                thread.start()
+                self._threads[axis] = thread
+
+            self._queues[axis].put((future, fn, args, kwargs))
+
+        return future
+
+    def _work(self, tasks: queue.Queue) -> None:
+        """Execute the `tasks` until None is received, this is executed in
+        the worker threads.
+
+        Parameters
+        ----------
+        tasks : queue.Queue
+            The queue with the tasks
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            log_debug(self._logger, "Executing '{}' on axis '{}'".format(
+                                    future.name, future.axis))
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                if isinstance(e, StopProgram):
+                    log_debug(self._logger, "Stopping program", exc_info=e)
+                else:
+                    log_error(self._logger, e)
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def cancelPending(self) -> int:
+        """Cancel all tasks that are submitted but not started yet, the 
+        currently running tasks are finished.
+
+        Returns
+        -------
+        int
+            The number of cancelled tasks
+        """
+        cancelled = 0
+        with self._lock:
+            for tasks in self._queues.values():
+                while True:
+                    try:
+                        task = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    
+                    if task is None:
+                        # keep the shutdown signal
+                        tasks.put(None)
+                        break
+
+                    if task[0].cancel():
+                        cancelled += 1
+        
+        if cancelled > 0:
+            log_debug(self._logger, "Cancelled '{}' pending tasks".format(
+                                    cancelled))
+        return cancelled
+
+    def shutdown(self, wait: typing.Optional[bool]=True) -> None:
+        """Stop all workers after they finished their submitted tasks.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait until the workers are stopped, default: True
+        """
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads.values())
+            for tasks in self._queues.values():
+                tasks.put(None)
+
+            self._threads = {}
+            self._queues = {}
+
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,507 @@
+import os
+import json
+import time
+import typing
+import datetime
+import collections
+
+from .events import user_ready
+from .events import init_ready
+from .events import series_ready
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import log_info
+from .logginglib import get_logger
+from .pylolib import path_like
+from .measurement import Measurement
+from .measurement import CONFIG_MEASUREMENT_GROUP
+from .stop_program import StopProgram
+from .exception_thread import ExceptionThread
+from .measurement_steps import MeasurementSteps
+
+class BatchRunner:
+    """Execute a queue of measurements back-to-back without any user
+    interaction.
+
+    Each job is a dict with the following keys:
+    - 'series' : dict, required - The series definition as it is passed to
+      `Measurement.fromSeries()`
+    - 'start' : dict, optional - The start values, missing measurement
+      variables use the value the microscope has when the batch is validated
+    - 'name' : str, optional - The name of the job, used for the save
+      directory and the summary, default: 'job-<number>'
+    - 'configuration' : dict, optional - Configuration values to use for this
+      job only, the key is the group, the value is a dict with the key and
+      the value
+    - 'tags' : dict, optional - The custom tags of the measurement
+
+    All jobs are validated before the first job starts. If the job does not
+    overwrite the 'save-directory' or the 'log-save-path', the job is saved
+    in a sub directory with the job name of the configured save directory.
+
+    The microscope stays in the lorentz mode between the jobs, only after the
+    last job (or if the batch is aborted) the devices are set to the safe
+    state if this is set in the configuration.
+
+    After each job a summary is written to the jobs save directory.
+
+    Example batch file:
+    ```json
+    {"jobs": [
+        {"name": "field", "start": {"x-tilt": 0},
+         "series": {"variable": "ol-current", "start": 0, "end": 10,
+                    "step-width": 5},
+         "configuration": {"measurement": {"relaxation-time": 1}},
+         "tags": {"sample": "FeGe"}}
+    ]}
+    ```
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller to use
+    jobs : list of dict
+        The jobs to execute, after the validation they contain the formatted
+        values
+    continue_on_error : bool
+        Whether to continue with the next job if a job fails (True) or to
+        abort the batch (False)
+    summaries : list of dict
+        The summaries of the executed jobs of the last run
+    summary_file_name : str
+        The file name of the summary that is saved in each jobs save directory
+    """
+
+    summary_file_name = "batch-summary.json"
+
+    def __init__(self, controller: "Controller",
+                 jobs: typing.Sequence[dict],
+                 continue_on_error: typing.Optional[bool]=False) -> None:
+        """Create a new batch runner.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller to use, the view of the controller should not ask
+            for user inputs, e.g. use the `HeadlessView`
+        jobs : sequence of dict
+            The job definitions
+        continue_on_error : bool, optional
+            Whether to continue with the next job if a job fails (True) or to
+            abort the batch (False), default: False
+        """
+        self.controller = controller
+        self.jobs = [dict(j) if isinstance(j, dict) else j for j in jobs]
+        self.continue_on_error = continue_on_error
+        self.summaries = []
+        self._validated = False
+        self._logger = get_logger(self)
+
+    @classmethod
+    def fromFile(class_, controller: "Controller",
+                 file_path: typing.Union[path_like], **kwargs) -> "BatchRunner":
+        """Create a batch runner from a json batch file.
+
+        The file has to contain either a list of jobs or an object with a
+        'jobs' key that contains the list.
+
+        Raises
+        ------
+        OSError
+            When the file cannot be read
+        ValueError
+            When the file does not contain valid json or no job list
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller to use
+        file_path : str, pathlib.PurePath
+            The path to the batch file
+
+        Keyword Arguments
+        -----------------
+        Any additional argument is passed to the constructor
+
+        Returns
+        -------
+        BatchRunner
+            The runner
+        """
+
+        with open(file_path, "r") as f:
+            batch = json.load(f)
+
+        if isinstance(batch, dict):
+            batch = batch.get("jobs", None)
+
+        if not isinstance(batch, list):
+            raise ValueError(("The batch file '{}' does not contain a list " +
+                              "of jobs.").format(file_path))
+
+        return class_(controller, batch, **kwargs)
+
+    def setup(self) -> None:
+        """Load the devices and the configuration of the controller.
+
+        Fired Events
+        ------------
+        init_ready
+            Fired after the initializiation is done
+        """
+
+        self.controller.initialize()
+
+        log_debug(self._logger, "Firing 'init_ready' event")
+        init_ready(self.controller)
+
+    def validate(self) -> None:
+        """Validate and format all jobs.
+
+        All jobs are checked before an error is raised, the error contains all
+        invalid jobs.
+
+        Raises
+        ------
+        ValueError
+            When at least one job is invalid
+        """
+
+        measurement_variables = self.controller.microscope.supported_measurement_variables
+
+        # missing start values are taken from the current microscope state
+        current_start = {}
+        for v in measurement_variables:
+            current_start[v.unique_id] = self.controller.microscope.getMeasurementVariableValue(
+                v.unique_id)
+
+        errors = []
+        names = set()
+        for i, job in enumerate(self.jobs):
+            if not isinstance(job, dict):
+                errors.append("Job {}: The job is not a dict.".format(i + 1))
+                continue
+
+            name = str(job.get("name", "job-{}".format(i + 1)))
+            if name in names:
+                errors.append("Job {}: The name '{}' is used twice.".format(
+                              i + 1, name))
+            names.add(name)
+            job["name"] = name
+
+            for key in ("configuration", "tags"):
+                if not isinstance(job.get(key, {}), dict):
+                    errors.append("Job '{}': The '{}' is not a dict.".format(
+                                  name, key))
+
+            if (isinstance(job.get("configuration", {}), dict) and 
+                not all(isinstance(v, dict) for v in
+                        job.get("configuration", {}).values())):
+                errors.append(("Job '{}': Each configuration group has to " +
+                               "be a dict.").format(name))
+
+            start = current_start.copy()
+            if isinstance(job.get("start", None), dict):
+                start.update(job["start"])
+            elif "start" in job:
+                errors.append("Job '{}': The 'start' is not a dict.".format(
+                              name))
+                continue
+
+            try:
+                job["series"] = MeasurementSteps.formatSeries(
+                    measurement_variables, job["series"], parse=True,
+                    start=start, logger=self._logger)
+                job["start"] = MeasurementSteps.formatStart(
+                    measurement_variables, start, job["series"], parse=True,
+                    logger=self._logger)
+            except (KeyError, ValueError, TypeError) as e:
+                errors.append("Job '{}': {}: {}".format(
+                              name, e.__class__.__name__, e))
+
+        if len(errors) > 0:
+            err = ValueError("The batch contains invalid jobs:\n{}".format(
+                             "\n".join(errors)))
+            log_error(self._logger, err)
+            raise err
+
+        self._validated = True
+
+    def run(self) -> typing.List[dict]:
+        """Validate and execute all jobs.
+
+        If a job is stopped by a `StopProgram` exception, the summary of the
+        job is written and the exception is raised.
+
+        Raises
+        ------
+        ValueError
+            When at least one job is invalid
+        StopProgram
+            When the program is stopped while a job is running
+
+        Returns
+        -------
+        list of dict
+            The summaries of all jobs, jobs that were not executed because the
+            batch was aborted have the status 'skipped'
+        """
+
+        if not self._validated:
+            self.validate()
+
+        self.summaries = []
+        lorentz_mode = False
+        try:
+            for i, job in enumerate(self.jobs):
+                if (len(self.summaries) > 0 and
+                    self.summaries[-1]["status"] != "finished" and
+                    not self.continue_on_error):
+                    self.summaries.append(self._createSummary(job, "skipped"))
+                    continue
+
+                summary = self._runJob(job, i == len(self.jobs) - 1,
+                                       lorentz_mode)
+                self.summaries.append(summary)
+                lorentz_mode = summary["status"] == "finished"
+        except StopProgram as e:
+            self._setSafe()
+            raise e
+
+        if any(s["status"] == "skipped" for s in self.summaries):
+            # the batch is aborted, only the last job sets the devices to the
+            # safe state so this has to be done here
+            self._setSafe()
+
+        return self.summaries
+
+    def _runJob(self, job: dict, is_last: bool, lorentz_mode: bool) -> dict:
+        """Execute the `job`.
+
+        Raises
+        ------
+        StopProgram
+            When the program is stopped while the job is running
+
+        Parameters
+        ----------
+        job : dict
+            The validated job
+        is_last : bool
+            Whether this is the last job in the batch
+        lorentz_mode : bool
+            Whether the microscope is in the lorentz mode already
+
+        Returns
+        -------
+        dict
+            The summary
+        """
+
+        log_info(self._logger, "Starting job '{}'".format(job["name"]))
+        self.controller.view.print("Starting job '{}'...".format(job["name"]))
+
+        configuration = self.controller.configuration
+        state_id = configuration.markState()
+
+        summary = None
+        try:
+            self._applyConfiguration(job)
+
+            measurement = Measurement(self.controller, MeasurementSteps(
+                self.controller, job["start"], job["series"]))
+            measurement.tags = job.get("tags", {}).copy()
+            measurement.set_lorentz_mode = not lorentz_mode
+
+            if not is_last:
+                # keep the lorentz mode for the next job
+                measurement.microscope_safe_after = False
+                measurement.camera_safe_after = False
+
+            self.controller.measurement = measurement
+
+            log_debug(self._logger, "Firing 'user_ready' event")
+            user_ready(self.controller)
+            log_debug(self._logger, "Firing 'series_ready' event")
+            series_ready(self.controller)
+
+            self.controller.view.progress_max = len(measurement.steps)
+            self.controller.view.progress = 0
+
+            start = time.time()
+            error = None
+            try:
+                measurement.runPreflight()
+                measurement.start()
+            except StopProgram as e:
+                summary = self._createSummary(job, "stopped", measurement,
+                                              start, e)
+                raise e
+            except Exception as e:
+                error = e
+
+            if error is not None:
+                status = "failed"
+            elif measurement.finished:
+                status = "finished"
+            else:
+                status = "stopped"
+
+            summary = self._createSummary(job, status, measurement, start,
+                                          error)
+        except StopProgram as e:
+            raise e
+        except Exception as e:
+            # the measurement could not be created
+            log_error(self._logger, e)
+            summary = self._createSummary(job, "failed", error=e)
+        finally:
+            configuration.resetChanges(state_id)
+            if summary is not None:
+                self._saveSummary(summary)
+
+        self.controller.view.print("Job '{}' {}.".format(job["name"],
+                                                       summary["status"]))
+        return summary
+
+    def _applyConfiguration(self, job: dict) -> None:
+        """Set the configuration values of the `job` and the job specific
+        save directory and log path if they are not given in the job.
+
+        Parameters
+        ----------
+        job : dict
+            The validated job
+        """
+
+        configuration = self.controller.configuration
+        job_configuration = job.get("configuration", {})
+        configuration.loadFromMapping(job_configuration)
+
+        measurement_configuration = job_configuration.get(
+            CONFIG_MEASUREMENT_GROUP, {})
+
+        if "save-directory" not in measurement_configuration:
+            try:
+                save_dir = configuration.getValue(CONFIG_MEASUREMENT_GROUP,
+                                                  "save-directory")
+            except KeyError:
+                # import as late as possible to allow changes by extensions
+                from .config import DEFAULT_SAVE_DIRECTORY
+                save_dir = DEFAULT_SAVE_DIRECTORY
+
+            save_dir = os.path.join(save_dir, job["name"])
+            configuration.setValue(CONFIG_MEASUREMENT_GROUP, "save-directory",
+                                   save_dir)
+        else:
+            save_dir = measurement_configuration["save-directory"]
+
+        if "log-save-path" not in measurement_configuration:
+            configuration.setValue(CONFIG_MEASUREMENT_GROUP, "log-save-path",
+                                   os.path.join(save_dir, "measurement.log"))
+
+    def _createSummary(self, job: dict, status: str,
+                       measurement: typing.Optional[Measurement]=None,
+                       start: typing.Optional[float]=None,
+                       error: typing.Optional[Exception]=None) -> dict:
+        """Create the summary of the `job`.
+
+        Parameters
+        ----------
+        job : dict
+            The job
+        status : str
+            The status, 'finished', 'stopped', 'failed' or 'skipped'
+        measurement : Measurement, optional
+            The executed measurement
+        start : float, optional
+            The `time.time()` when the measurement was started
+        error : Exception, optional
+            The error that occurred
+
+        Returns
+        -------
+        dict
+            The summary
+        """
+
+        summary = collections.OrderedDict((
+            ("name", job.get("name", "")),
+            ("status", status),
+            ("error", None if error is None else "{}: {}".format(
+                                            error.__class__.__name__, error)),
+        ))
+
+        if start is not None:
+            summary["start"] = datetime.datetime.fromtimestamp(
+                start).isoformat()
+            summary["end"] = datetime.datetime.now().isoformat()
+            summary["duration"] = time.time() - start
+
+        if isinstance(measurement, Measurement):
+            summary["steps"] = len(measurement.steps)
+            summary["recorded-images"] = len(
+                measurement.timeline.getPhaseDurations().get("record", []))
+            summary["save-directory"] = measurement.save_dir
+            summary["average-durations"] = measurement.timeline.getAverageDurations()
+
+        summary["series"] = job.get("series", None)
+        summary["start-values"] = job.get("start", None)
+        summary["tags"] = job.get("tags", {})
+        summary["configuration"] = job.get("configuration", {})
+
+        return summary
+
+    def _saveSummary(self, summary: dict) -> None:
+        """Save the `summary` to the jobs save directory.
+
+        Errors while saving are logged only.
+
+        Parameters
+        ----------
+        summary : dict
+            The summary
+        """
+
+        if "save-directory" not in summary:
+            return
+
+        path = os.path.join(summary["save-directory"], self.summary_file_name)
+        log_debug(self._logger, "Saving summary of job '{}' to '{}'".format(
+                                summary["name"], path))
+        try:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=4, default=str)
+        except OSError as e:
+            log_error(self._logger, e)
+
+    def _setSafe(self) -> None:
+        """Set the microscope and the camera to the safe state if this is
+        set in the configuration."""
+
+        devices = [(self.controller.microscope,
+                    "microscope-to-safe-state-after-measurement")]
+        devices += [(camera, "camera-to-safe-state-after-measurement")
+                    for camera in self.controller.cameras.values()]
+
+        threads = []
+        for device, key in devices:
+            try:
+                safe_after = self.controller.configuration.getValue(
+                    CONFIG_MEASUREMENT_GROUP, key)
+            except KeyError:
+                safe_after = False
+
+            if safe_after == True:
+                log_debug(self._logger, "Setting '{}' to safe state".format(
+                                        device.__class__.__name__))
+                thread = ExceptionThread(target=device.resetToSafeState,
+                                         name="reset {} to safe state".format(
+                                         device.__class__.__name__))
+                thread.start()
+                threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+            for error in thread.exceptions:
+                log_error(self._logger, error)
@@ -1,14 +1,18 @@
+import typing
 import logging
 
 from .logginglib import log_debug
 from .logginglib import get_logger
 
 from .errors import BlockedFunctionError
+from .emergency_executor import is_emergency_thread
 
 class BlockedFunction:
     """This class represents a object method which is currently not executable.
 
-    This is used for protecting machines in emergency case.
+    This is used for protecting machines in emergency case. The emergency 
+    threads that set the machine to the safe state can still execute the 
+    function.
 
     Attributes
     ----------
@@ -33,8 +37,9 @@ class BlockedFunction:
         self.func_name = func_name
         self._logger = get_logger(self)
     
-    def __call__(self, *args, **kwargs) -> None:
-        """Allow calling this, this will always raise an error.
+    def __call__(self, *args, **kwargs) -> typing.Any:
+        """Allow calling this, this will always raise an error except for the
+        emergency threads.
 
         The object method is replaced with this object so it. To allow calling
         the functions, this object is callable
@@ -42,9 +47,12 @@ class BlockedFunction:
         Raises
         ------
         BlockedFunctionError
-            Always
+            Always if the current thread is no emergency thread
         """
 
+        if is_emergency_thread():
+            return self.func(*args, **kwargs)
+
         log_debug(self._logger, "Blocked function '{}' is called".format(self.func_name),
                             stack_info=True)
         raise BlockedFunctionError(
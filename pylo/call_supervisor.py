@@ -0,0 +1,540 @@
+import time
+import queue
+import typing
+import logging
+import threading
+import collections
+import concurrent.futures
+
+from .errors import DeviceCallTimeoutError
+from .events import device_call_hang
+from .logginglib import log
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import get_logger
+from .emergency_executor import inherit_emergency
+
+# the actions a policy of the `CallSupervisor` can decide for
+CALL_POLICY_ACTIONS = ("retry", "skip-step", "emergency", "raise")
+
+# the operations whose deadlines can be set in the configuration of a device
+SUPERVISED_OPERATIONS = ("set", "get", "record")
+
+# the maximum number of idle workers each supervisor keeps
+MAX_IDLE_WORKERS = 4
+
+# the minimum number of finished calls before the expected duration is known
+MIN_HISTORY_LENGTH = 3
+
+class _SupervisedWorker(threading.Thread):
+    """A worker thread of the `CallSupervisor` that executes one call after
+    the other until it is abandoned because a call hangs."""
+
+    def __init__(self, supervisor: "CallSupervisor") -> None:
+        """Create the worker.
+
+        Parameters
+        ----------
+        supervisor : CallSupervisor
+            The supervisor the worker belongs to
+        """
+        super().__init__(name="{} supervised call".format(supervisor.name),
+                         daemon=True)
+        self.supervisor = supervisor
+        self.tasks = queue.Queue()
+        self.abandoned = False
+
+    def run(self) -> None:
+        while True:
+            task = self.tasks.get()
+
+            if task is None:
+                return
+
+            future, func, args, kwargs = task
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+            if not self.supervisor._releaseWorker(self):
+                return
+
+class CallSupervisor:
+    """Execute the calls of a device driver on supervised worker threads with
+    deadlines.
+
+    Calls without a deadline are executed directly. Calls with a deadline are
+    executed in a worker thread while the calling thread waits. The calling
+    thread checks the call every `config.DEVICE_CALL_HEARTBEAT_INTERVAL`
+    seconds. If the call takes longer than `config.DEVICE_CALL_HANG_FACTOR`
+    times the average duration of the previous calls, a warning is logged and
+    the `device_call_hang` event is fired. If the deadline is over, the worker
+    is abandoned (the next call uses a new worker) and the `policy` decides
+    what to do.
+
+    Most drivers are not thread-safe. Therefore no new call is sent to the 
+    driver as long as an abandoned call is still running. A "retry" waits for
+    the same call for another deadline instead of calling the driver again. 
+    Later calls wait for the abandoned call until their own deadline is over,
+    if it does not return they raise a `DeviceCallTimeoutError` with the 
+    "emergency" action without calling the driver.
+
+    Attributes
+    ----------
+    name : str
+        The name of the device for the log and the thread names
+    deadlines : dict
+        The operation (e.g. "set", "get" or "record") or the name of the call
+        (e.g. "set focus") as the key and the maximum time in seconds a call
+        may take as the value, the name of the call is used before the
+        operation, `math.inf` to supervise the calls without a deadline, calls
+        without a deadline are executed directly
+    policy : callable or None
+        Decides what to do when a call exceeds its deadline, it gets the
+        `DeviceCallTimeoutError` and the number of the attempt (starting with
+        1) and returns one of the `CALL_POLICY_ACTIONS` or None, "retry"
+        waits for the call for another deadline, all other values are saved in
+        the `DeviceCallTimeoutError.action` of the raised error, None to retry
+        `CallSupervisor.retries` times
+    retries : int
+        The number of retries if there is no `policy`
+    hanging : bool
+        Whether an abandoned call is still running, no new calls are sent to 
+        the driver then
+    history : dict
+        The name of the call as the key and a deque with the durations of the
+        last calls in seconds as the value
+    """
+
+    def __init__(self, name: str,
+                 deadlines: typing.Optional[typing.Dict[str, float]]=None,
+                 policy: typing.Optional[typing.Callable[[DeviceCallTimeoutError, int], typing.Optional[str]]]=None,
+                 retries: typing.Optional[int]=0) -> None:
+        """Create the supervisor.
+
+        Parameters
+        ----------
+        name : str
+            The name of the device for the log and the thread names
+        deadlines : dict, optional
+            The deadlines of the operations or calls, default: None
+        policy : callable, optional
+            The policy that decides what to do if a call exceeds its deadline,
+            default: None
+        retries : int, optional
+            The number of retries if there is no `policy`, default: 0
+        """
+        self._logger = get_logger(self)
+        self.name = name
+        self.deadlines = dict(deadlines) if isinstance(deadlines, dict) else {}
+        self.policy = policy
+        self.retries = retries
+        self.history = {}
+        self._idle = []
+        self._abandoned = []
+        self._lock = threading.Lock()
+        self._abandoned_returned = threading.Condition(self._lock)
+
+    @property
+    def hanging(self) -> bool:
+        with self._lock:
+            return len(self._abandoned) > 0
+
+    @staticmethod
+    def defineDeviceConfigurationOptions(configuration: "AbstractConfiguration",
+                                         group: str) -> None:
+        """Define the deadline and the retry options in the `group` of a
+        device.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration to define the options in
+        group : str
+            The configuration group of the device
+        """
+
+        # import as late as possible to allow changes by extensions
+        from .config import DEFAULT_DEVICE_CALL_TIMEOUTS
+        from .config import DEFAULT_DEVICE_CALL_RETRIES
+
+        descriptions = {
+            "set": "setting a measurement variable",
+            "get": "reading a measurement variable",
+            "record": "recording an image"
+        }
+
+        for operation in SUPERVISED_OPERATIONS:
+            configuration.addConfigurationOption(
+                group, "{}-timeout".format(operation), 
+                datatype=float, 
+                default_value=DEFAULT_DEVICE_CALL_TIMEOUTS.get(operation, 0),
+                description=("The maximum time in seconds {} may take " + 
+                "before the 'device-timeout-policy' of the measurement " + 
+                "decides what to do, 0 to wait forever.").format(
+                    descriptions[operation])
+            )
+
+        configuration.addConfigurationOption(
+            group, "call-retries", 
+            datatype=int, 
+            default_value=DEFAULT_DEVICE_CALL_RETRIES,
+            description="How many times to wait for a call again after its " + 
+            "deadline is over before the 'device-timeout-policy' of the " + 
+            "measurement decides what to do."
+        )
+
+    def loadConfiguration(self, configuration: "AbstractConfiguration",
+                          group: str) -> None:
+        """Load the deadlines and the retries from the `group` of the
+        `configuration`.
+
+        The deadline of each of the `SUPERVISED_OPERATIONS` is read from the
+        "<operation>-timeout" key, the retries from the "call-retries" key.
+        Missing keys do not change the current values, timeouts less or equal
+        to zero remove the deadline.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration
+        group : str
+            The configuration group of the device
+        """
+        for operation in SUPERVISED_OPERATIONS:
+            try:
+                timeout = float(configuration.getValue(group,
+                    "{}-timeout".format(operation)))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            if timeout > 0:
+                self.deadlines[operation] = timeout
+            elif operation in self.deadlines:
+                del self.deadlines[operation]
+
+        try:
+            self.retries = max(0, int(configuration.getValue(group,
+                                                             "call-retries")))
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    def getDeadline(self, operation: str, name: str) -> typing.Optional[float]:
+        """Get the deadline of a call.
+
+        Parameters
+        ----------
+        operation : str
+            The operation, e.g. "set"
+        name : str
+            The name of the call, e.g. "set focus"
+
+        Returns
+        -------
+        float or None
+            The deadline in seconds, None if the call is not supervised
+        """
+        deadline = self.deadlines.get(name, self.deadlines.get(operation))
+
+        if isinstance(deadline, (int, float)) and deadline > 0:
+            return deadline
+        else:
+            return None
+
+    def getExpectedDuration(self, name: str) -> typing.Optional[float]:
+        """Get the average duration of the last calls.
+
+        Parameters
+        ----------
+        name : str
+            The name of the call, e.g. "set focus"
+
+        Returns
+        -------
+        float or None
+            The average duration in seconds, None if there are less than
+            `MIN_HISTORY_LENGTH` finished calls
+        """
+        with self._lock:
+            durations = self.history.get(name)
+
+            if durations is None or len(durations) < MIN_HISTORY_LENGTH:
+                return None
+
+            return sum(durations) / len(durations)
+
+    def _addDuration(self, name: str, duration: float) -> None:
+        """Add the `duration` of a finished call to the history.
+
+        Parameters
+        ----------
+        name : str
+            The name of the call
+        duration : float
+            The duration in seconds
+        """
+        with self._lock:
+            if name not in self.history:
+                # import as late as possible to allow changes by extensions
+                from .config import DEVICE_CALL_HISTORY_LENGTH
+
+                self.history[name] = collections.deque(
+                    maxlen=DEVICE_CALL_HISTORY_LENGTH)
+
+            self.history[name].append(duration)
+
+    def call(self, operation: str, name: str, func: typing.Callable, *args,
+             **kwargs) -> typing.Any:
+        """Execute the `func` and return its result.
+
+        Raises
+        ------
+        DeviceCallTimeoutError
+            When the call exceeds its deadline and the policy does not retry 
+            or when an abandoned call is still running
+        Exception
+            Any error the `func` raises
+
+        Parameters
+        ----------
+        operation : str
+            The operation, e.g. "set", "get" or "record"
+        name : str
+            The name of the called object, e.g. the measurement variable id
+        func : callable
+            The driver function to call
+
+        Additional Parameters
+        ---------------------
+        The `args` and `kwargs` are passed to the `func`
+
+        Returns
+        -------
+        any
+            The return value of the `func`
+        """
+        name = "{} {}".format(operation, name)
+        deadline = self.getDeadline(operation, name)
+
+        self._waitForAbandonedCalls(name, deadline)
+
+        if deadline is None:
+            start = time.time()
+            result = func(*args, **kwargs)
+            self._addDuration(name, time.time() - start)
+            return result
+
+        future = concurrent.futures.Future()
+        worker = self._acquireWorker()
+        start = time.time()
+        worker.tasks.put((future, inherit_emergency(func), args, kwargs))
+
+        attempt = 1
+        while True:
+            try:
+                return self._supervise(name, deadline, future, start)
+            except DeviceCallTimeoutError as error:
+                if callable(self.policy):
+                    action = self.policy(error, attempt)
+                elif attempt <= self.retries:
+                    action = "retry"
+                else:
+                    action = None
+
+                if action == "retry":
+                    log(self._logger, logging.WARNING, ("Waiting for call " + 
+                        "'{}' of '{}' again after attempt {}: {}").format(name, 
+                        self.name, attempt, error))
+                    attempt += 1
+                    continue
+
+                # the worker may hang forever, do not use it anymore
+                self._abandonWorker(worker)
+                future.cancel()
+
+                error.action = action
+                log_error(self._logger, error)
+                raise error
+
+    def _waitForAbandonedCalls(self, name: str, 
+                               deadline: typing.Optional[float]) -> None:
+        """Wait until all abandoned calls have returned.
+
+        Raises
+        ------
+        DeviceCallTimeoutError
+            When an abandoned call is still running after the `deadline`, the 
+            `action` of the error is "emergency"
+
+        Parameters
+        ----------
+        name : str
+            The name of the call that wants to use the driver
+        deadline : float or None
+            The maximum time in seconds to wait, None to not wait
+        """
+        start = time.time()
+        with self._abandoned_returned:
+            if len(self._abandoned) == 0:
+                return
+            
+            log_debug(self._logger, ("Call '{}' of '{}' waits for the " + 
+                                     "abandoned calls").format(name, self.name))
+            
+            if deadline is not None:
+                self._abandoned_returned.wait_for(
+                    lambda: len(self._abandoned) == 0, deadline)
+            
+            if len(self._abandoned) == 0:
+                return
+            
+        err = DeviceCallTimeoutError(("The call '{}' of '{}' is not " + 
+            "executed because a previous call of the device still " + 
+            "hangs.").format(name, self.name), name, time.time() - start, 
+            "emergency")
+        log_error(self._logger, err)
+        raise err
+
+    def _supervise(self, name: str, deadline: float, 
+                   future: concurrent.futures.Future, 
+                   start: float) -> typing.Any:
+        """Wait for the `future` of a call that is executed in a worker until 
+        the `deadline` is over.
+
+        Raises
+        ------
+        DeviceCallTimeoutError
+            When the call exceeds the deadline, the `action` of the error is
+            not set
+        Exception
+            Any error the `func` raises
+
+        Parameters
+        ----------
+        name : str
+            The name of the call
+        deadline : float
+            The maximum duration in seconds to wait
+        future : concurrent.futures.Future
+            The future of the call
+        start : float
+            The timestamp when the call was started
+
+        Returns
+        -------
+        any
+            The return value of the `func`
+        """
+        # import as late as possible to allow changes by extensions
+        from .config import DEVICE_CALL_HEARTBEAT_INTERVAL
+        from .config import DEVICE_CALL_HANG_FACTOR
+
+        expected = self.getExpectedDuration(name)
+        reported = False
+        wait_start = time.time()
+
+        while True:
+            waited = time.time() - wait_start
+            if waited >= deadline:
+                break
+
+            concurrent.futures.wait((future, ), timeout=min(
+                DEVICE_CALL_HEARTBEAT_INTERVAL, deadline - waited))
+
+            if future.done():
+                if future.exception() is None:
+                    self._addDuration(name, time.time() - start)
+                return future.result()
+
+            elapsed = time.time() - start
+            if (not reported and expected is not None and
+                elapsed > DEVICE_CALL_HANG_FACTOR * expected):
+                reported = True
+                log(self._logger, logging.WARNING, ("Call '{}' of '{}' is " +
+                    "running for '{:.3f}' seconds, expected are '{:.3f}' " +
+                    "seconds").format(name, self.name, elapsed, expected))
+                device_call_hang(self, name, elapsed, expected)
+
+        err = DeviceCallTimeoutError(("The call '{}' of '{}' did not " +
+            "finish within the deadline of '{}' seconds.").format(name,
+            self.name, deadline), name, time.time() - start)
+        raise err
+
+    def _acquireWorker(self) -> _SupervisedWorker:
+        """Get an idle worker or start a new one.
+
+        Returns
+        -------
+        _SupervisedWorker
+            The worker
+        """
+        with self._lock:
+            while len(self._idle) > 0:
+                worker = self._idle.pop()
+                if not worker.abandoned:
+                    return worker
+
+        log_debug(self._logger, "Starting new supervised worker for '{}'".format(
+                                self.name))
+        worker = _SupervisedWorker(self)
+        worker.start()
+        return worker
+
+    def _releaseWorker(self, worker: _SupervisedWorker) -> bool:
+        """Add the `worker` to the idle workers after it has finished a call.
+
+        Parameters
+        ----------
+        worker : _SupervisedWorker
+            The worker
+
+        Returns
+        -------
+        bool
+            Whether the worker is kept, if not the worker has to stop
+        """
+        with self._lock:
+            if worker.abandoned:
+                if worker in self._abandoned:
+                    # the hanging call returned, the driver can be used again
+                    self._abandoned.remove(worker)
+                    self._abandoned_returned.notify_all()
+                return False
+            elif len(self._idle) >= MAX_IDLE_WORKERS:
+                return False
+
+            self._idle.append(worker)
+            return True
+
+    def _abandonWorker(self, worker: _SupervisedWorker) -> None:
+        """Never use the `worker` again because its call hangs.
+
+        Parameters
+        ----------
+        worker : _SupervisedWorker
+            The worker
+        """
+        with self._lock:
+            worker.abandoned = True
+            if worker in self._idle:
+                # the call returned just now, only stop the worker
+                self._idle.remove(worker)
+                worker.tasks.put(None)
+            else:
+                self._abandoned.append(worker)
+
+        log_debug(self._logger, "Abandoning supervised worker '{}'".format(
+                                worker.name))
+
+    def shutdown(self) -> None:
+        """Stop all idle workers, new workers are started on the next call."""
+        with self._lock:
+            workers = self._idle
+            self._idle = []
+
+        for worker in workers:
+            worker.tasks.put(None)
@@ -1,8 +1,63 @@
+import os
+import copy
+import time
 import typing
+import functools
+import threading
+import concurrent.futures
 
+import numpy as np
+
+from .image import Image
 from .device import Device
+from .call_supervisor import CallSupervisor
 from .vulnerable_machine import VulnerableMachine
 
+MAIN_CAMERA_ROLE = "main"
+BURST_TAGS_KEY = "Burst"
+BURST_MEAN_SUFFIX = "-mean.npy"
+
+def _save_burst_mean(mean: "numpy.ndarray", image: Image, 
+                     file_path: str) -> None:
+    """Save the unrounded `mean` of a burst next to the `file_path` of the 
+    `image`."""
+    np.save(os.path.splitext(file_path)[0] + BURST_MEAN_SUFFIX, mean)
+
+class AcquisitionHandle(concurrent.futures.Future):
+    """The handle of an acquisition that is started by 
+    `CameraInterface.startAcquisition()`.
+
+    The result of the future is whatever the camera needs to create the image
+    in `CameraInterface.collect()`, by default this is the image recorded 
+    without any additional tags.
+
+    Attributes
+    ----------
+    camera : CameraInterface
+        The camera that acquires
+    kwargs : dict
+        The keyword arguments the acquisition was started with
+    start_time : float
+        The `time.time()` when the acquisition was started
+    """
+
+    def __init__(self, camera: "CameraInterface", 
+                 kwargs: typing.Optional[dict]=None) -> None:
+        """Create a new handle.
+
+        Parameters
+        ----------
+        camera : CameraInterface
+            The camera that acquires
+        kwargs : dict, optional
+            The keyword arguments the acquisition was started with, 
+            default: None
+        """
+        super().__init__()
+        self.camera = camera
+        self.kwargs = kwargs if isinstance(kwargs, dict) else {}
+        self.start_time = time.time()
+
 class CameraInterface(Device, VulnerableMachine):
     """This class represents the camera.
 
@@ -12,6 +67,15 @@ class CameraInterface(Device, VulnerableMachine):
         Any values that should be saved for the camera
     controller : Controller
         The controller
+    role : str
+        The role of the camera in the measurement, the main camera has the 
+        role `MAIN_CAMERA_ROLE`, additional cameras get their role when they 
+        are loaded
+    call_supervisor : CallSupervisor
+        The supervisor that executes the acquisitions of 
+        `CameraInterface._startAcquisitionWorker()`, the "record" deadline 
+        can be set in the `CallSupervisor.deadlines` or in the configuration 
+        group of the camera
     """
 
     def __init__(self, controller: "Controller", name: typing.Optional[str]=None, 
@@ -41,6 +105,8 @@ class CameraInterface(Device, VulnerableMachine):
         
         self.tags = {}
         self.controller = controller
+        self.role = MAIN_CAMERA_ROLE
+        self.call_supervisor = CallSupervisor(self.__class__.__name__)
     
     def recordImage(self, additional_tags: typing.Optional[dict]=None, **kwargs) -> "Image":
         """Get the image of the current camera.
@@ -57,4 +123,265 @@ class CameraInterface(Device, VulnerableMachine):
             The image object
         """
 
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+    
+    def getFrameFormat(self) -> typing.Optional[typing.Tuple[typing.Tuple[int, ...], np.dtype]]:
+        """Get the shape and the data type of the images that the camera 
+        records with the current settings.
+
+        This is used to estimate the storage a measurement needs before it is
+        started. Cameras that know their image size should overwrite this 
+        function.
+
+        Returns
+        -------
+        tuple or None
+            The shape of the image data and the numpy data type, None if they
+            are not known
+        """
+        return None
+    
+    def startAcquisition(self, **kwargs) -> AcquisitionHandle:
+        """Start recording an image and return immediately.
+
+        The image is received by passing the returned handle to 
+        `CameraInterface.collect()`. Each acquisition has to be collected 
+        before the next one is started.
+
+        By default the `CameraInterface.recordImage()` is executed in a worker
+        thread, cameras with non-blocking acquisitions can overwrite this 
+        function and `CameraInterface.collect()`.
+
+        Parameters
+        ----------
+        kwargs : dict, optional
+            The keyword arguments that are passed to 
+            `CameraInterface.recordImage()`
+
+        Returns
+        -------
+        AcquisitionHandle
+            The handle of the running acquisition
+        """
+
+        # the additional tags are added when collecting
+        return self._startAcquisitionWorker(self.recordImage, {}, **kwargs)
+    
+    def _startAcquisitionWorker(self, target: typing.Callable, *args, 
+                                **kwargs) -> AcquisitionHandle:
+        """Execute the `target` in a worker thread and return a handle whose 
+        result is the return value of the `target`.
+
+        The `target` is executed by the `CameraInterface.call_supervisor`, if
+        it does not finish within the "record" deadline, the handle receives 
+        the `DeviceCallTimeoutError`.
+
+        Parameters
+        ----------
+        target : callable
+            The function that acquires
+        args, kwargs
+            The arguments to pass to the `target`, the `kwargs` are saved in 
+            the `AcquisitionHandle.kwargs` too
+
+        Returns
+        -------
+        AcquisitionHandle
+            The handle of the running acquisition
+        """
+
+        handle = AcquisitionHandle(self, kwargs)
+        handle.set_running_or_notify_cancel()
+
+        def acquire():
+            try:
+                handle.set_result(self.call_supervisor.call("record", 
+                    self.role, functools.partial(target, *args, **kwargs)))
+            except BaseException as e:
+                handle.set_exception(e)
+
+        thread = threading.Thread(target=acquire, daemon=True, 
+                                  name="acquire {}".format(self.role))
+        thread.start()
+
+        return handle
+    
+    def collect(self, handle: AcquisitionHandle, 
+                additional_tags: typing.Optional[dict]=None, 
+                timeout: typing.Optional[float]=None) -> "Image":
+        """Wait until the acquisition of the `handle` is finished and return
+        the image.
+
+        The `additional_tags` can be created while the camera is acquiring. 
+        They are added to the image, tags that the camera sets overwrite 
+        them like in `CameraInterface.recordImage()`.
+
+        Raises
+        ------
+        concurrent.futures.TimeoutError
+            When the acquisition does not finish within the `timeout`
+        Exception
+            Any error that is raised while acquiring
+
+        Parameters
+        ----------
+        handle : AcquisitionHandle
+            The handle returned by `CameraInterface.startAcquisition()`
+        additional_tags : dict, optional
+            Additonal tags to add to the image
+        timeout : float, optional
+            The maximum time to wait in seconds, None to wait until the 
+            acquisition is finished, default: None
+
+        Returns
+        -------
+        Image
+            The image object
+        """
+
+        image = handle.result(timeout)
+
+        if isinstance(additional_tags, dict):
+            tags = copy.deepcopy(additional_tags)
+            if isinstance(image.tags, dict):
+                tags.update(image.tags)
+            image.tags = tags
+        
+        return image
+    
+    def recordBurst(self, count: int, 
+                    additional_tags: typing.Optional[dict]=None, 
+                    outlier_sigma: typing.Optional[float]=0, 
+                    variance: typing.Optional[bool]=True,
+                    dtype: typing.Optional[type]=np.float64, 
+                    **kwargs) -> "Image":
+        """Record `count` images and return their average.
+
+        The frames are recorded with `CameraInterface.startAcquisition()` and 
+        accumulated directly into a preallocated running mean (Welford's 
+        algorithm). The next frame is acquired while the current one is 
+        accumulated, so at most two frames are kept in memory at any time.
+
+        If `outlier_sigma` is greater than zero, pixels that deviate more than
+        `outlier_sigma` standard deviations from the current running mean are
+        not accumulated (e.g. cosmic rays). The standard deviation is at least
+        the shot noise of the mean (the square root of the mean but at least 
+        one count). Outliers are detected from the third frame on.
+
+        The returned image contains the tags of the first frame plus the 
+        statistics in the `BURST_TAGS_KEY` tag. As the `Image` holds 8 bit 
+        data, the mean is rounded to integers in the image. The unrounded mean
+        is saved next to the image when the image is saved, in a numpy file 
+        with the `BURST_MEAN_SUFFIX` instead of the extension.
+
+        Raises
+        ------
+        ValueError
+            When the `count` is less than one or the frames have different 
+            shapes
+
+        Parameters
+        ----------
+        count : int
+            The number of frames to record
+        additional_tags : dict, optional
+            Additonal tags to pass to `CameraInterface.collect()`
+        outlier_sigma : float, optional
+            The deviation in standard deviations from which on a pixel is 
+            rejected, zero to disable the rejection, default: 0
+        variance : bool, optional
+            Whether to calculate the running variance and add its statistics 
+            to the tags, default: True
+        dtype : type, optional
+            The type of the accumulator, use `numpy.float32` to half the 
+            memory usage, default: `numpy.float64`
+        
+        Returns
+        -------
+        Image
+            The averaged image
+        """
+
+        count = int(count)
+        if count < 1:
+            raise ValueError(("The burst count has to be at least 1 but it " + 
+                              "is {}.").format(count))
+        
+        reject = outlier_sigma is not None and outlier_sigma > 0
+        variance = variance or reject
+
+        mean = None
+        tags = None
+        handle = self.startAcquisition(**kwargs)
+        for i in range(count):
+            image = self.collect(handle, additional_tags)
+            if i + 1 < count:
+                # acquire the next frame while accumulating this one
+                handle = self.startAcquisition(**kwargs)
+            frame = image.image_data
+
+            if mean is None:
+                tags = image.tags
+                mean = np.zeros(frame.shape, dtype=dtype)
+                delta = np.empty(frame.shape, dtype=dtype)
+                if variance:
+                    m2 = np.zeros(frame.shape, dtype=dtype)
+                if reject:
+                    counts = np.zeros(frame.shape, dtype=np.uint32)
+                    threshold = np.empty(frame.shape, dtype=dtype)
+                    rejected = 0
+            elif frame.shape != mean.shape:
+                raise ValueError(("The frame {} has the shape {} but the " + 
+                                  "first frame has the shape {}.").format(
+                                  i, frame.shape, mean.shape))
+            
+            np.subtract(frame, mean, out=delta)
+
+            if reject:
+                if i >= 2:
+                    # standard deviation of the accepted values, at least the
+                    # shot noise of the mean
+                    np.divide(m2, np.maximum(counts, 2) - 1, out=threshold)
+                    np.maximum(threshold, np.maximum(np.abs(mean), 1), 
+                               out=threshold)
+                    np.sqrt(threshold, out=threshold)
+                    threshold *= outlier_sigma
+                    valid = np.abs(delta) <= threshold
+                    rejected += int(valid.size - np.count_nonzero(valid))
+                else:
+                    valid = np.ones(frame.shape, dtype=bool)
+
+                counts += valid
+                # invalid pixels have delta 0 so they do not change anything
+                delta *= valid
+                mean += delta / np.maximum(counts, 1)
+                m2 += delta * (frame - mean)
+            else:
+                mean += delta / (i + 1)
+                if variance:
+                    m2 += delta * (frame - mean)
+        
+        if not isinstance(tags, dict):
+            tags = {}
+        
+        statistics = {"frames": count, "accumulator": np.dtype(dtype).name,
+                      "mean": float(mean.mean())}
+        if variance:
+            if reject:
+                n = np.maximum(counts, 2) - 1
+            else:
+                n = max(count - 1, 1)
+            
+            pixel_variance = m2 / n
+            statistics["mean variance"] = float(pixel_variance.mean())
+            statistics["mean standard deviation of mean"] = float(
+                np.sqrt(pixel_variance / (n + 1)).mean())
+        if reject:
+            statistics["outlier sigma"] = float(outlier_sigma)
+            statistics["rejected pixels"] = rejected
+        
+        tags[BURST_TAGS_KEY] = statistics
+        
+        image = Image(np.clip(np.rint(mean), 0, 255), tags)
+        image.addSaveCallback(functools.partial(_save_burst_mean, mean))
+        return image
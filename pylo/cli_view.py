@@ -21,6 +21,10 @@ from .abstract_view import AskInput
 from .abstract_view import AbstractView
 from .measurement_steps import MeasurementSteps
 
+# the number of characters reserved for the rate and the eta behind the 
+# progress bar
+STATUS_WIDTH = 30
+
 class CLIView(AbstractView):
     """This class represents a very basic CLI view. It uses `print()` and 
     `input()` functions to display contents and react to user inputs.
@@ -513,20 +517,28 @@ class CLIView(AbstractView):
         super().showRunning()
     
     def _updateRunning(self):
-        """Update the running indicator, the progress has updated."""
+        """Update the running indicator, the progress has updated.
+        
+        The progress bar is followed by the counter, the steps per second and
+        the eta.
+        """
 
+        status = self.progress_model.formatStatus()
         counter_width = math.floor(math.log10(self.progress_max)) + 1
-        loader_width = self.line_length - 2 * counter_width - 2
+        loader_width = max(1, self.line_length - 2 * counter_width - 2 - 
+                              STATUS_WIDTH - 1)
         prog = round((self.progress / self.progress_max) * loader_width)
 
         line = ("{:" + str(loader_width) + "} " + 
                 "{:" + str(counter_width) + "}/" + 
-                "{:" + str(counter_width) + "}")
+                "{:" + str(counter_width) + "} " + 
+                "{:" + str(STATUS_WIDTH) + "." + str(STATUS_WIDTH) + "}")
         
         self.print("\b" * self.line_length + line.format(
             "█" * prog + "▒" * (loader_width - prog),
             self.progress,
-            self.progress_max
+            self.progress_max,
+            status
         ), sep="", end="")
         log_debug(self._logger, ("Updating the running indicator, progress is " + 
                                 "now '{}'/'{}'").format(self.progress, self.progress_max))
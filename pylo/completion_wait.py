@@ -0,0 +1,183 @@
+import time
+import typing
+import threading
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+
+class CompletionWaiter:
+    """Wait until measurement variables have reached their values.
+
+    The condition is checked with an exponential backoff, starting with a
+    short delay that grows until the maximum delay is reached. This way fast
+    hardware is only waited for as long as it needs while slow hardware is
+    not asked too often.
+
+    Drivers whose hardware reports when it is done can call
+    `CompletionWaiter.notify()` (e.g. from a callback of the hardware API),
+    this checks the condition immediately instead of after the current delay.
+
+    Attributes
+    ----------
+    initial_delay : float
+        The first delay between checking the condition in seconds
+    max_delay : float
+        The maximum delay between checking the condition in seconds
+    backoff : float
+        The factor to multiply the delay with after each check
+    """
+
+    def __init__(self, initial_delay: typing.Optional[float]=0.002,
+                 max_delay: typing.Optional[float]=0.1,
+                 backoff: typing.Optional[float]=2) -> None:
+        """Create a new waiter.
+
+        Parameters
+        ----------
+        initial_delay : float, optional
+            The first delay between checking the condition in seconds,
+            default: 0.002
+        max_delay : float, optional
+            The maximum delay between checking the condition in seconds,
+            default: 0.1
+        backoff : float, optional
+            The factor to multiply the delay with after each check,
+            default: 2
+        """
+        self._logger = get_logger(self)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+
+        self._events = {}
+        self._statistics = {}
+        self._lock = threading.Lock()
+
+    def _getEvent(self, id_: str) -> threading.Event:
+        """Get the event that is set by `CompletionWaiter.notify()`.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+
+        Returns
+        -------
+        threading.Event
+            The event
+        """
+        with self._lock:
+            if id_ not in self._events:
+                self._events[id_] = threading.Event()
+            return self._events[id_]
+
+    def notify(self, id_: typing.Optional[str]=None) -> None:
+        """Tell the waiting threads that the variable has probably reached its
+        value, this can be called from any thread.
+
+        Parameters
+        ----------
+        id_ : str, optional
+            The id of the measurement variable, None for all variables,
+            default: None
+        """
+        if id_ is None:
+            with self._lock:
+                events = list(self._events.values())
+        else:
+            events = [self._getEvent(id_)]
+
+        for event in events:
+            event.set()
+
+    def wait(self, id_: str, condition: typing.Callable[[], bool],
+             timeout: typing.Optional[float]=None,
+             max_delay: typing.Optional[float]=None) -> bool:
+        """Wait until the `condition` returns True.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable to wait for, this is used for
+            the statistics and for the `CompletionWaiter.notify()`
+        condition : callable
+            The condition, it has to return True if the value is reached
+        timeout : float, optional
+            The maximum time to wait in seconds, None to wait forever,
+            default: None
+        max_delay : float, optional
+            The maximum delay between checking the condition in seconds for
+            this wait, None to use the `CompletionWaiter.max_delay`,
+            default: None
+
+        Returns
+        -------
+        bool
+            Whether the condition is fulfilled, False if the `timeout` is
+            reached
+        """
+        event = self._getEvent(id_)
+        event.clear()
+
+        start = time.time()
+        deadline = start + timeout if timeout is not None else None
+        if max_delay is None:
+            max_delay = self.max_delay
+        delay = min(self.initial_delay, max_delay)
+        checks = 0
+
+        while True:
+            checks += 1
+            if condition():
+                reached = True
+                break
+
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    reached = False
+                    break
+            else:
+                remaining = delay
+
+            event.wait(min(delay, remaining))
+            event.clear()
+            delay = min(delay * self.backoff, max_delay)
+
+        duration = time.time() - start
+        log_debug(self._logger, ("Waited '{:.4f}' seconds for '{}' with '{}' " +
+                                 "checks, reached: '{}'").format(duration,
+                                 id_, checks, reached))
+
+        with self._lock:
+            if id_ not in self._statistics:
+                self._statistics[id_] = {"waits": 0, "checks": 0,
+                                         "timeouts": 0, "total-time": 0,
+                                         "max-time": 0}
+            statistics = self._statistics[id_]
+            statistics["waits"] += 1
+            statistics["checks"] += checks
+            statistics["total-time"] += duration
+            statistics["max-time"] = max(statistics["max-time"], duration)
+            if not reached:
+                statistics["timeouts"] += 1
+
+        return reached
+
+    def getStatistics(self) -> typing.Dict[str, typing.Dict[str, typing.Union[int, float]]]:
+        """Get the statistics of the waits.
+
+        Returns
+        -------
+        dict
+            The measurement variable id as the key and a dict with the number
+            of `waits`, condition `checks` and `timeouts` and the `total-time`
+            and the `max-time` in seconds as the value
+        """
+        with self._lock:
+            return {k: v.copy() for k, v in self._statistics.items()}
+
+    def resetStatistics(self) -> None:
+        """Reset the statistics."""
+        with self._lock:
+            self._statistics = {}
@@ -64,6 +64,98 @@ Default: 1
 """)
 MEASUREMENT_START_TIMEOUT = 1
 
+__config_docs__("EVENT_WORKER_COUNT",
+"""The number of worker threads that execute the non-blocking 
+(fire-and-forget) event handlers.
+Default: 4
+""")
+EVENT_WORKER_COUNT = 4
+
+__config_docs__("EMERGENCY_SAFE_STATE_TIMEOUT",
+"""The maximum time in seconds a device may take to reach the safe state after
+an emergency. If a device takes longer, the `safe_state_timeout` event is 
+fired. The emergency event waits at most this time for the devices.
+Default: 10
+""")
+EMERGENCY_SAFE_STATE_TIMEOUT = 10
+
+__config_docs__("DEVICE_CALL_HEARTBEAT_INTERVAL",
+"""The interval in seconds in which supervised device calls are checked 
+whether they take longer than expected.
+Default: 1
+""")
+DEVICE_CALL_HEARTBEAT_INTERVAL = 1
+
+__config_docs__("DEVICE_CALL_HANG_FACTOR",
+"""A supervised device call is reported as hanging if it takes longer than 
+this factor times the average duration of the previous calls.
+Default: 5
+""")
+DEVICE_CALL_HANG_FACTOR = 5
+
+__config_docs__("DEVICE_CALL_HISTORY_LENGTH",
+"""The number of durations that are remembered for each supervised device call
+to learn its expected duration.
+Default: 50
+""")
+DEVICE_CALL_HISTORY_LENGTH = 50
+
+__config_docs__("DEFAULT_DEVICE_CALL_TIMEOUTS",
+"""The default deadlines in seconds of the supervised device calls, the keys 
+are the operations "set", "get" and "record", 0 to wait forever.
+Default: {"set": 300, "get": 60, "record": 600}
+""")
+DEFAULT_DEVICE_CALL_TIMEOUTS = {"set": 300, "get": 60, "record": 600}
+
+__config_docs__("DEFAULT_DEVICE_CALL_RETRIES",
+"""The default number of times to wait for a supervised device call again 
+after its deadline is over.
+Default: 0
+""")
+DEFAULT_DEVICE_CALL_RETRIES = 0
+
+__config_docs__("PROGRESS_MAX_REFRESH_RATE",
+"""The maximum number of times per second the views redraw the progress, 
+progress changes in between are combined into one redraw.
+Default: 4
+""")
+PROGRESS_MAX_REFRESH_RATE = 4
+
+__config_docs__("PROGRESS_RATE_SMOOTHING",
+"""The weight of the newest rate in the exponentially smoothed steps per second
+that are shown by the views, between 0 and 1.
+Default: 0.3
+""")
+PROGRESS_RATE_SMOOTHING = 0.3
+
+__config_docs__("PREFLIGHT_PROBE_SIZE",
+"""The number of bytes the preflight check writes to the save directory to 
+measure the write throughput before a measurement starts.
+Default: 4194304 (4 MiB)
+""")
+PREFLIGHT_PROBE_SIZE = 4 * 1024 * 1024
+
+__config_docs__("CONTROL_SERVER_HOST",
+"""The host the control server listens on. Note that the server has no 
+authentication, only change this if the network is trusted.
+Default: "127.0.0.1"
+""")
+CONTROL_SERVER_HOST = "127.0.0.1"
+
+__config_docs__("CONTROL_SERVER_PORT",
+"""The port the control server listens on, use 0 to use a free port.
+Default: 8765
+""")
+CONTROL_SERVER_PORT = 8765
+
+__config_docs__("CONTROL_SERVER_STREAM_QUEUE_SIZE",
+"""The maximum number of messages that are buffered for each client of the 
+control server stream, if a client reads slower the oldest messages are 
+dropped.
+Default: 1000
+""")
+CONTROL_SERVER_STREAM_QUEUE_SIZE = 1000
+
 __config_docs__("TIFF_IMAGE_TAGS_INDEX",
 """The hexadecimal entry for tiff images where to save the tags as a json to
 Default: 0x010e (The image description)
@@ -0,0 +1,661 @@
+import json
+import queue
+import typing
+import asyncio
+import logging
+import functools
+import threading
+import collections
+
+from .events import emergency
+from .events import after_stop
+from .events import after_record
+from .events import after_log_row
+from .events import before_approach
+from .events import measurement_ready
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import log_info
+from .logginglib import get_logger
+from .measurement import Measurement
+from .batch_runner import BatchRunner
+from .stop_program import StopProgram
+from .exception_thread import ExceptionThread
+
+class HTTPError(Exception):
+    """An error that is sent to the client of the `ControlServer` with the
+    `status` code."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+class ControlServer:
+    """A local http server that allows other programs to control the
+    measurements of the controller.
+
+    The server runs an asyncio event loop in its own thread. All hardware
+    actions are executed in worker threads, the event loop never blocks the
+    measurement thread and the measurement never waits for clients.
+
+    All request and response bodies are json. The following routes exist:
+    - `GET /status`: The current measurement state and the progress
+    - `GET /jobs`: All submitted jobs and their state
+    - `GET /jobs/<id>`: One submitted job including its summary
+    - `POST /jobs`: Submit a job, the body is one job as it is defined in the
+      `BatchRunner`, the job is validated before it is queued, jobs are
+      executed in the order they are submitted
+    - `POST /stop`: Stop the current measurement
+    - `POST /emergency`: Fire the `emergency` event and cancel all queued
+      jobs
+    - `GET /stream`: A stream of json objects separated by new lines, each
+      object has a 'type' which is 'step', 'image', 'log', 'finished',
+      'stopped' or 'job'
+
+    Note that the server does not load the devices, the controller has to be
+    initialized before, e.g. by `Controller.initialize()`.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    host : str
+        The host the server listens on
+    port : int
+        The port the server listens on, if 0 is given to the constructor this
+        is the port that is used when the server is started
+    event_id : str
+        The key that is used for the event handlers
+    """
+
+    event_id = "control_server"
+
+    def __init__(self, controller: "Controller",
+                 host: typing.Optional[str]=None,
+                 port: typing.Optional[int]=None) -> None:
+        """Create the server.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        host : str, optional
+            The host to listen on, if not given the `CONTROL_SERVER_HOST` is
+            used, default: None
+        port : int, optional
+            The port to listen on, use 0 for any free port, if not given the
+            `CONTROL_SERVER_PORT` is used, default: None
+        """
+
+        # import as late as possible to allow changes by extensions
+        from .config import CONTROL_SERVER_HOST
+        from .config import CONTROL_SERVER_PORT
+
+        self.controller = controller
+        self.host = host if isinstance(host, str) else CONTROL_SERVER_HOST
+        self.port = port if isinstance(port, int) else CONTROL_SERVER_PORT
+
+        self._logger = get_logger(self)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._clients = set()
+
+        self._jobs = collections.OrderedDict()
+        self._runners = {}
+        self._jobs_lock = threading.Lock()
+        self._job_queue = queue.Queue()
+        self._job_thread = None
+        self._job_counter = 0
+        self._current_job = None
+
+    @property
+    def url(self) -> str:
+        """The url of the server."""
+        return "http://{}:{}".format(self.host, self.port)
+
+    @property
+    def running(self) -> bool:
+        """Whether the server is running."""
+        return (isinstance(self._thread, threading.Thread) and
+                self._thread.is_alive())
+
+    def start(self) -> None:
+        """Start the server and the job worker in background threads.
+
+        Raises
+        ------
+        OSError
+            When the server cannot listen on the host and port
+        """
+
+        if self.running:
+            return
+
+        log_debug(self._logger, "Starting control server on '{}:{}'".format(
+                                self.host, self.port))
+
+        self._started.clear()
+        self._thread = ExceptionThread(target=self._runLoop,
+                                       name="control server")
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait()
+
+        if len(self._thread.exceptions) > 0:
+            self._thread.join()
+            err = self._thread.exceptions[0]
+            log_error(self._logger, err)
+            raise err
+
+        self._job_thread = ExceptionThread(target=self._executeJobs,
+                                           name="control server jobs")
+        self._job_thread.daemon = True
+        self._job_thread.start()
+
+        # the step handlers copy the current step before the measurement 
+        # continues, the copies are serialized in the server thread
+        for event, handler in ((before_approach, self._onBeforeApproach),
+                               (after_record, self._onAfterRecord)):
+            event.register(self.event_id, handler, isolate_errors=True)
+        
+        for event, handler in ((after_log_row, self._onAfterLogRow),
+                               (measurement_ready, self._onMeasurementReady),
+                               (after_stop, self._onAfterStop)):
+            event.register(self.event_id, handler, blocking=False)
+
+        log_info(self._logger, "Control server is listening on '{}'".format(
+                               self.url))
+
+    def stop(self) -> None:
+        """Stop the server, close all streams and wait for the threads.
+
+        A job that is currently running is finished, queued jobs are
+        cancelled.
+        """
+
+        for event in (before_approach, after_record, after_log_row,
+                      measurement_ready, after_stop):
+            if self.event_id in event:
+                del event[self.event_id]
+
+        self._cancelQueuedJobs()
+        if isinstance(self._job_thread, threading.Thread):
+            self._job_queue.put(None)
+            self._job_thread.join()
+            self._job_thread = None
+
+        if self.running:
+            log_debug(self._logger, "Stopping control server")
+            self._loop.call_soon_threadsafe(self._closeServer)
+            self._thread.join()
+
+        self._thread = None
+
+    def _runLoop(self) -> None:
+        """Create and run the event loop, this is executed in the server
+        thread."""
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._server = self._loop.run_until_complete(asyncio.start_server(
+                self._handleConnection, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            self._loop.close()
+            raise e
+        finally:
+            self._started.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def _closeServer(self) -> None:
+        """Close all streams and stop the event loop, this has to be executed
+        in the event loop."""
+
+        for client in list(self._clients):
+            client.put_nowait(None)
+
+        # let the streams finish before stopping the loop
+        self._loop.call_later(0.05, self._loop.stop)
+
+    def _broadcast(self, message: dict) -> None:
+        """Send the `message` to all stream clients, this can be called from
+        any thread.
+
+        Parameters
+        ----------
+        message : dict
+            The json serializable message
+        """
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            loop.call_soon_threadsafe(self._putMessage, message)
+        except RuntimeError:
+            # the loop is closed in the meantime
+            pass
+
+    def _putMessage(self, message: dict) -> None:
+        """Add the `message` to the queue of each client, if a queue is full
+        the oldest message is dropped, this has to be executed in the event
+        loop.
+
+        Parameters
+        ----------
+        message : dict
+            The json serializable message
+        """
+
+        for client in self._clients:
+            if client.full():
+                client.get_nowait()
+            client.put_nowait(message)
+
+    async def _handleConnection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Handle one http request.
+
+        Parameters
+        ----------
+        reader : asyncio.StreamReader
+            The reader of the request
+        writer : asyncio.StreamWriter
+            The writer for the response
+        """
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            parts = request_line.split()
+            if len(parts) < 2:
+                raise HTTPError(400, "Invalid request line.")
+            method, path = parts[0].upper(), parts[1]
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line.strip() == "":
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            body = b""
+            if "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+
+            log_debug(self._logger, "Received request '{} {}'".format(method,
+                                                                      path))
+
+            if method == "GET" and path == "/stream":
+                await self._stream(writer)
+            else:
+                status, data = await self._dispatch(method, path, body)
+                await self._respond(writer, status, data)
+        except HTTPError as e:
+            await self._respond(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            log_debug(self._logger, "Client connection is lost", exc_info=e)
+        except Exception as e:
+            log_error(self._logger, e)
+            try:
+                await self._respond(writer, 500, {"error": "{}: {}".format(
+                                    e.__class__.__name__, e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int,
+                       data: typing.Any) -> None:
+        """Send the `data` as json with the http `status`.
+
+        Parameters
+        ----------
+        writer : asyncio.StreamWriter
+            The writer for the response
+        status : int
+            The http status code
+        data : any
+            The json serializable data
+        """
+
+        reasons = {200: "OK", 202: "Accepted", 400: "Bad Request",
+                   404: "Not Found", 405: "Method Not Allowed",
+                   500: "Internal Server Error"}
+        body = json.dumps(data, default=str).encode("utf-8")
+        writer.write(("HTTP/1.1 {} {}\r\n" +
+                      "Content-Type: application/json\r\n" +
+                      "Content-Length: {}\r\n" +
+                      "Connection: close\r\n\r\n").format(
+                      status, reasons.get(status, ""), len(body)).encode(
+                      "latin-1") + body)
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter) -> None:
+        """Send all broadcasted messages to the client until the server is
+        stopped or the client disconnects.
+
+        Parameters
+        ----------
+        writer : asyncio.StreamWriter
+            The writer for the response
+        """
+
+        # import as late as possible to allow changes by extensions
+        from .config import CONTROL_SERVER_STREAM_QUEUE_SIZE
+
+        client = asyncio.Queue(maxsize=max(1, CONTROL_SERVER_STREAM_QUEUE_SIZE))
+        self._clients.add(client)
+
+        try:
+            writer.write(("HTTP/1.1 200 OK\r\n" +
+                          "Content-Type: application/x-ndjson\r\n" +
+                          "Connection: close\r\n\r\n").encode("latin-1"))
+            writer.write(self._encodeMessage(dict(type="status",
+                                                  **self.getStatus())))
+            await writer.drain()
+
+            while True:
+                message = await client.get()
+                if message is None:
+                    break
+
+                writer.write(self._encodeMessage(message))
+                await writer.drain()
+        finally:
+            self._clients.discard(client)
+
+    def _encodeMessage(self, message: dict) -> bytes:
+        """Encode the `message` to one line of the stream.
+
+        Parameters
+        ----------
+        message : dict
+            The json serializable message
+
+        Returns
+        -------
+        bytes
+            The encoded message including the line break
+        """
+        return json.dumps(message, default=str).encode("utf-8") + b"\n"
+
+    async def _dispatch(self, method: str, path: str,
+                        body: bytes) -> typing.Tuple[int, typing.Any]:
+        """Execute the request.
+
+        Raises
+        ------
+        HTTPError
+            When the request is invalid
+
+        Parameters
+        ----------
+        method : str
+            The http method in upper case
+        path : str
+            The requested path
+        body : bytes
+            The request body
+
+        Returns
+        -------
+        int, any
+            The http status and the json serializable response data
+        """
+
+        path = path.split("?", 1)[0].rstrip("/")
+        loop = self._loop
+
+        if path == "/status":
+            self._checkMethod(method, "GET")
+            return 200, self.getStatus()
+        elif path == "/jobs" and method == "POST":
+            try:
+                job = json.loads(body.decode("utf-8"))
+            except ValueError as e:
+                raise HTTPError(400, "The body is not valid json: {}".format(e))
+
+            if not isinstance(job, dict):
+                raise HTTPError(400, "The body has to be one job object.")
+
+            try:
+                job_id = await loop.run_in_executor(None, self.submit, job)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+
+            return 202, self.getJob(job_id)
+        elif path == "/jobs":
+            self._checkMethod(method, "GET")
+            return 200, self.getJobs()
+        elif path.startswith("/jobs/"):
+            self._checkMethod(method, "GET")
+            try:
+                return 200, self.getJob(int(path[len("/jobs/"):]))
+            except (KeyError, ValueError):
+                raise HTTPError(404, "There is no job '{}'.".format(
+                                path[len("/jobs/"):]))
+        elif path == "/stop":
+            self._checkMethod(method, "POST")
+            await loop.run_in_executor(None, self.stopMeasurement)
+            return 200, self.getStatus()
+        elif path == "/emergency":
+            self._checkMethod(method, "POST")
+            await loop.run_in_executor(None, self.setEmergency)
+            return 200, self.getStatus()
+
+        raise HTTPError(404, "The path '{}' does not exist.".format(path))
+
+    def _checkMethod(self, method: str, allowed: str) -> None:
+        """Check if the `method` is the `allowed` method.
+
+        Raises
+        ------
+        HTTPError
+            When the method is not allowed
+        """
+        if method != allowed:
+            raise HTTPError(405, "The method '{}' is not allowed.".format(
+                            method))
+
+    def getStatus(self) -> dict:
+        """Get the current measurement state.
+
+        Returns
+        -------
+        dict
+            The 'running', 'finished', 'step_index', 'current_step',
+            'progress', 'progress_max', 'job' and the 'queued' jobs count
+        """
+
+        measurement = self.controller.measurement
+        view = self.controller.view
+        status = {"running": False, "finished": False, "step_index": -1,
+                  "current_step": None, "job": self._current_job,
+                  "queued": self._job_queue.qsize()}
+
+        if isinstance(measurement, Measurement):
+            status["running"] = measurement.running
+            status["finished"] = measurement.finished
+            status["step_index"] = measurement.step_index
+            status["current_step"] = measurement.current_step
+
+        if view is not None:
+            status["progress"] = view.progress
+            status["progress_max"] = view.progress_max
+
+        return status
+
+    def submit(self, job: dict) -> int:
+        """Validate the `job` and add it to the queue.
+
+        Raises
+        ------
+        ValueError
+            When the job is invalid
+
+        Parameters
+        ----------
+        job : dict
+            The job as it is defined in the `BatchRunner`
+
+        Returns
+        -------
+        int
+            The job id
+        """
+
+        runner = BatchRunner(self.controller, [job])
+        runner.validate()
+
+        with self._jobs_lock:
+            self._job_counter += 1
+            job_id = self._job_counter
+            self._jobs[job_id] = {"id": job_id, "name": runner.jobs[0]["name"],
+                                  "status": "queued", "summary": None}
+            self._runners[job_id] = runner
+
+        log_debug(self._logger, "Queueing job '{}' with id '{}'".format(
+                                runner.jobs[0]["name"], job_id))
+        self._job_queue.put(job_id)
+        self._broadcast({"type": "job", "id": job_id, "status": "queued"})
+
+        return job_id
+
+    def getJob(self, job_id: int) -> dict:
+        """Get the state of the job with the `job_id`.
+
+        Raises
+        ------
+        KeyError
+            When there is no job with the `job_id`
+
+        Returns
+        -------
+        dict
+            The 'id', 'name', 'status' and 'summary' of the job
+        """
+        with self._jobs_lock:
+            return dict(self._jobs[job_id])
+
+    def getJobs(self) -> typing.List[dict]:
+        """Get all jobs without their summaries.
+
+        Returns
+        -------
+        list of dict
+            The 'id', 'name' and 'status' of all jobs
+        """
+        with self._jobs_lock:
+            return [{k: v for k, v in j.items() if k != "summary"}
+                    for j in self._jobs.values()]
+
+    def stopMeasurement(self) -> None:
+        """Stop the current measurement, the next queued job is started
+        afterwards."""
+
+        measurement = self.controller.measurement
+        if isinstance(measurement, Measurement) and measurement.running:
+            log_info(self._logger, "Stopping measurement by request")
+            measurement.stop()
+
+    def setEmergency(self) -> None:
+        """Cancel all queued jobs and fire the emergency event.
+
+        Fired Events
+        ------------
+        emergency
+            Fired always
+        """
+
+        log_info(self._logger, "Emergency by request")
+        self._cancelQueuedJobs()
+        emergency(self.controller)
+
+    def _cancelQueuedJobs(self) -> None:
+        """Set all queued jobs to be cancelled."""
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                if job["status"] == "queued":
+                    job["status"] = "cancelled"
+                    self._broadcast({"type": "job", "id": job["id"],
+                                     "status": "cancelled"})
+
+    def _executeJobs(self) -> None:
+        """Execute the queued jobs until None is received, this is executed
+        in the job thread."""
+
+        while True:
+            job_id = self._job_queue.get()
+            if job_id is None:
+                break
+
+            with self._jobs_lock:
+                if self._jobs[job_id]["status"] != "queued":
+                    continue
+                self._jobs[job_id]["status"] = "running"
+                runner = self._runners.pop(job_id)
+
+            self._current_job = job_id
+            self._broadcast({"type": "job", "id": job_id, "status": "running"})
+
+            try:
+                summary = runner.run()[0]
+            except StopProgram as e:
+                log_debug(self._logger, "Job '{}' is stopped".format(job_id),
+                          exc_info=e)
+                summary = {"status": "stopped", "error": str(e)}
+            except Exception as e:
+                log_error(self._logger, e, logging.WARNING)
+                summary = {"status": "failed", "error": "{}: {}".format(
+                                                e.__class__.__name__, e)}
+
+            with self._jobs_lock:
+                self._jobs[job_id]["status"] = summary["status"]
+                self._jobs[job_id]["summary"] = summary
+
+            self._current_job = None
+            self._broadcast({"type": "job", "id": job_id,
+                             "status": summary["status"]})
+
+    def _onBeforeApproach(self, controller: "Controller") -> None:
+        measurement = controller.measurement
+        self._broadcast({"type": "step", "step_index": measurement.step_index,
+                         "step": dict(measurement.current_step),
+                         "progress_max": len(measurement.steps)})
+
+    def _onAfterRecord(self, controller: "Controller") -> None:
+        measurement = controller.measurement
+        for role, image in measurement.current_images.items():
+            # announce the image when the file exists, copy the step because
+            # the measurement continues
+            image.addSaveCallback(functools.partial(self._onImageSaved, role,
+                measurement.step_index, dict(measurement.current_step)))
+
+    def _onImageSaved(self, role: str, step_index: int, step: dict,
+                      image: "Image", file_path: str) -> None:
+        # copy, the message is serialized in the server thread
+        self._broadcast({"type": "image", "camera": role,
+                         "step_index": step_index, "step": step,
+                         "path": file_path, "tags": dict(image.tags)})
+
+    def _onAfterLogRow(self, controller: "Controller",
+                       cells: typing.List[str]) -> None:
+        self._broadcast({"type": "log", "row": list(cells)})
+
+    def _onMeasurementReady(self, controller: "Controller") -> None:
+        self._broadcast({"type": "finished"})
+
+    def _onAfterStop(self, controller: "Controller") -> None:
+        self._broadcast({"type": "stopped"})
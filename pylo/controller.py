@@ -6,6 +6,7 @@ import inspect
 import logging
 import importlib
 import threading
+import collections
 
 from .events import init_ready
 from .events import user_ready
@@ -15,6 +16,7 @@ from .events import series_ready
 
 from .errors import DeviceImportError
 from .errors import DeviceCreationError
+from .errors import PreflightError
 from .errors import BlockedFunctionError
 from .errors import DeviceClassNotDefined
 
@@ -26,10 +28,22 @@ from .logginglib import get_logger
 from .pylolib import defineConfigurationOptions
 from .measurement import Measurement
 from .stop_program import StopProgram
+from .control_server import ControlServer
+from .call_supervisor import CallSupervisor
+from .drift_correction import DriftCorrector
+from .drift_correction import CONFIG_DRIFT_CORRECTION_GROUP
+from .quality_metrics import QualityMonitor
+from .quality_metrics import CONFIG_QUALITY_METRICS_GROUP
+from .preview import PreviewWriter
+from .preview import CONFIG_PREVIEW_GROUP
+from .tie_reconstruction import TIEReconstructor
+from .tie_reconstruction import CONFIG_TIE_RECONSTRUCTION_GROUP
 from .abstract_view import AbstractView
 from .camera_interface import CameraInterface
+from .camera_interface import MAIN_CAMERA_ROLE
 from .exception_thread import ExceptionThread
 from .vulnerable_machine import VulnerableMachine
+from .emergency_executor import get_emergency_executor
 from .microscope_interface import MicroscopeInterface
 from .abstract_configuration import AbstractConfiguration
 
@@ -44,6 +58,56 @@ class TooManyRepetitionsError(RuntimeError):
 CONFIG_SETUP_GROUP = "setup"
 CONFIG_DEVICE_GROUP = "devices"
 
+def parseCameraRoles(definition: str) -> typing.Dict[str, str]:
+    """Parse the additional cameras setting.
+
+    Example:
+    ```python
+    >>> parseCameraRoles("preview=Dummy Camera, eels = DM Camera")
+    OrderedDict([('preview', 'Dummy Camera'), ('eels', 'DM Camera')])
+    ```
+
+    Raises
+    ------
+    ValueError
+        When a pair does not contain a role or when the role is used twice or 
+        when the `MAIN_CAMERA_ROLE` is used
+
+    Parameters
+    ----------
+    definition : str
+        Comma separated pairs of the role and the camera name, separated by 
+        an equal sign
+    
+    Returns
+    -------
+    OrderedDict
+        The role as the key, the camera name as the value
+    """
+
+    roles = collections.OrderedDict()
+    if not isinstance(definition, str):
+        return roles
+    
+    for pair in definition.split(","):
+        if pair.strip() == "":
+            continue
+
+        role, sep, name = pair.partition("=")
+        role = role.strip()
+        name = name.strip()
+
+        if sep == "" or role == "" or name == "":
+            raise ValueError(("The camera definition '{}' is not in the " + 
+                              "form 'role=camera name'.").format(pair.strip()))
+        elif role == MAIN_CAMERA_ROLE or role in roles:
+            raise ValueError(("The camera role '{}' is used " + 
+                              "twice.").format(role))
+        
+        roles[role] = name
+    
+    return roles
+
 class Controller:
     """This is the controller for the pylo program.
 
@@ -60,8 +124,27 @@ class Controller:
         The configuration
     camera : CameraInterface
         The camera that is used for receiving the images
+    additional_cameras : OrderedDict of CameraInterface
+        The cameras that record images additionally to the `camera` in each 
+        measurement step, the key is the role of the camera, the value the 
+        camera, the role is also used in the file names
     measurement : Measurement or None
         The measurement to do, this only exists while the program is executed
+    control_server : ControlServer or None
+        The server that allows other programs to control the measurements, 
+        None if it is not started
+    drift_corrector : DriftCorrector or None
+        The drift correction that measures the drift of each image, None if 
+        it is not enabled in the configuration
+    quality_monitor : QualityMonitor or None
+        The quality metrics of each image, None if they are not enabled in
+        the configuration
+    preview_writer : PreviewWriter or None
+        The writer of the downsampled previews of each image, None if it is
+        not enabled in the configuration
+    tie_reconstructor : TIEReconstructor or None
+        The phase reconstruction of the focus series, None if it is not 
+        enabled in the configuration
     """
 
     def __init__(self, view: typing.Union[AbstractView, None],
@@ -92,7 +175,13 @@ class Controller:
 
         self.microscope = None
         self.camera = None
+        self.additional_cameras = collections.OrderedDict()
         self.measurement = None
+        self.control_server = None
+        self.drift_corrector = None
+        self.quality_monitor = None
+        self.preview_writer = None
+        self.tie_reconstructor = None
         self._running_thread = None
         self._measurement_thread = None
 
@@ -103,6 +192,22 @@ class Controller:
         log_debug(self._logger, "Firing 'before_start' event")
         before_start(self)
         
+    @property
+    def cameras(self) -> typing.Dict[str, CameraInterface]:
+        """All cameras with their role as the key, the `Controller.camera` is
+        the first one with the `MAIN_CAMERA_ROLE`, the additional cameras 
+        follow in their order."""
+
+        cameras = collections.OrderedDict()
+        if isinstance(self.camera, CameraInterface):
+            cameras[MAIN_CAMERA_ROLE] = self.camera
+        
+        for role, camera in self.additional_cameras.items():
+            if isinstance(camera, CameraInterface):
+                cameras[role] = camera
+        
+        return cameras
+
     def getConfigurationValuesOrAsk(self, *config_lookup: typing.List[typing.Union[typing.Tuple[str, str], typing.Tuple[str, str, typing.Iterable]]],
                                     save_if_not_exists: typing.Optional[bool]=True,
                                     fallback_default: typing.Optional[bool]=False) -> typing.Tuple[typing.Union[str, int, float, bool, None]]:
@@ -471,6 +576,63 @@ class Controller:
         else:
             return True
     
+    def _loadAdditionalCameras(self) -> None:
+        """Load the additional cameras defined in the 'additional-cameras' 
+        setting in the `CONFIG_DEVICE_GROUP`.
+
+        The setting contains comma separated pairs of the role and the device
+        name, e.g. 'preview=Dummy Camera, eels=DM Camera'. Cameras that cannot
+        be loaded are skipped after showing the error, they never prevent the
+        main camera from being used.
+
+        Raises
+        ------
+        StopProgram
+            When a class is loaded from the file and the class raises a 
+            `StopProgram` exception anywhere
+        """
+
+        try:
+            definition = self.configuration.getValue(CONFIG_DEVICE_GROUP, 
+                                                     "additional-cameras")
+        except KeyError:
+            definition = ""
+        
+        try:
+            roles = parseCameraRoles(definition)
+        except ValueError as e:
+            log_error(self._logger, e)
+            self.view.showError(e, "Fix the 'additional-cameras' setting in " + 
+                                   "the '{}' group.".format(CONFIG_DEVICE_GROUP))
+            return
+        
+        from . import loader
+
+        for role, name in roles.items():
+            device = None
+            try:
+                log_debug(self._logger, ("Loading additional camera '{}' " + 
+                                         "with role '{}'").format(name, role))
+                device = loader.getDevice(name, self)
+            except StopProgram as e:
+                log_debug(self._logger, "Stopping program", exc_info=e)
+                raise e
+            except Exception as e:
+                log_error(self._logger, e)
+                self.view.showError(e, self._getFixForError(e))
+                continue
+            
+            if not isinstance(device, CameraInterface):
+                msg = ("The additional camera '{}' for the role '{}' is not " + 
+                       "a camera or it is not defined in one of the " + 
+                       "devices.ini files, it is skipped.").format(name, role)
+                log_debug(self._logger, msg, logging_level=logging.ERROR)
+                self.view.showError(msg)
+                continue
+            
+            device.role = role
+            self.additional_cameras[role] = device
+
     def _configurationChangesNeedRestart(self, state_id: int, 
                                          show_hint: typing.Optional[bool]=True) -> typing.List[typing.Tuple[str, str]]:
         """Check if there are configuration changes in between the state made
@@ -550,6 +712,101 @@ class Controller:
                                      "need a restart").format(config_changes))
             return []
 
+    def initialize(self) -> bool:
+        """Load the devices and make sure all required configuration values 
+        exist.
+
+        The microscope and the camera are only loaded if they are not set from
+        outside. Missing configuration values are asked via the view. This is
+        the first part of the `Controller.startProgramLoop()`, it can be used
+        to set up the controller without showing the program dialogs.
+        
+        Fired Events
+        ------------
+        before_init
+            Fired right after the function start, before everything is 
+            initialize
+
+        Returns
+        -------
+        bool
+            Whether the microscope was loaded from the configuration (True) or
+            whether it was set from outside (False)
+        """
+        log_debug(self._logger, "Firing 'before_init' event")
+        before_init(self)
+        
+        if not isinstance(self.microscope, MicroscopeInterface):
+            load_microscope = True
+        else:
+            load_microscope = False
+        
+        if not isinstance(self.camera, CameraInterface):
+            load_camera = True
+        else:
+            load_camera = False
+        
+        log_debug(self._logger, ("Microscope {} be loaded, camera {} be " + 
+                  "loaded").format(
+                      "must" if load_microscope else "does not need to",
+                      "must" if load_camera else "does not need to"))
+
+        if load_microscope or load_camera:
+            # the function will check itself if it has to load something,
+            # this has to be one function so the user will get asked only
+            # once for the microscope AND the camera if both are missing,
+            # if only one is missing, this function will ask for the 
+            # missing one only
+            self._loadCameraAndMicroscope()
+
+        if len(self.additional_cameras) == 0:
+            # the additional cameras are optional, if they are set from 
+            # outside they are used as they are
+            self._loadAdditionalCameras()
+
+        if not load_microscope:
+            # microscope is set from outside, load configuration options
+            if (hasattr(self.microscope, "defineConfigurationOptions") and 
+                callable(self.microscope.defineConfigurationOptions)):
+                log_debug(self._logger, "Defining configuration options of microscope")
+                self.microscope.defineConfigurationOptions(self.configuration,
+                    self.microscope.config_group_name, 
+                    self.microscope.config_defaults)
+
+        if not load_camera:
+            # camera is set from outside, load configuration options
+            if (hasattr(self.camera, "defineConfigurationOptions") and 
+                callable(self.camera.defineConfigurationOptions)):
+                log_debug(self._logger, "Defining configuration options of camera")
+                self.camera.defineConfigurationOptions(self.configuration,
+                    self.camera.config_group_name, 
+                    self.camera.config_defaults)
+        
+        for device in (self.microscope, *self.cameras.values()):
+            if (isinstance(getattr(device, "call_supervisor", None), 
+                           CallSupervisor) and 
+                isinstance(getattr(device, "config_group_name", None), str)):
+                # the deadlines of the driver calls
+                CallSupervisor.defineDeviceConfigurationOptions(
+                    self.configuration, device.config_group_name)
+        
+        if do_log(self._logger, logging.INFO):
+            self._logger.info("Using camera '{}' and microscope '{}'".format(
+                self.camera.__class__.__name__,
+                self.microscope.__class__.__name__))
+
+        # ask all non-existing but required configuration values
+        self.askIfNotPresentConfigurationOptions()
+        
+        self.measurement = None
+        self._setupProcessing()
+
+        # save the config
+        log_debug(self._logger, "Saving configuration")
+        self.configuration.saveConfiguration()
+
+        return load_microscope
+
     def startProgramLoop(self) -> None:
         """Start the program loop.
         
@@ -574,63 +831,7 @@ class Controller:
             log_debug(self._logger, "Marking configuration state")
             state_id = self.configuration.markState()
 
-            log_debug(self._logger, "Firing 'before_init' event")
-            before_init(self)
-            
-            if not isinstance(self.microscope, MicroscopeInterface):
-                load_microscope = True
-            else:
-                load_microscope = False
-            
-            if not isinstance(self.camera, CameraInterface):
-                load_camera = True
-            else:
-                load_camera = False
-            
-            log_debug(self._logger, ("Microscope {} be loaded, camera {} be " + 
-                      "loaded").format(
-                          "must" if load_microscope else "does not need to",
-                          "must" if load_camera else "does not need to"))
-
-            if load_microscope or load_camera:
-                # the function will check itself if it has to load something,
-                # this has to be one function so the user will get asked only
-                # once for the microscope AND the camera if both are missing,
-                # if only one is missing, this function will ask for the 
-                # missing one only
-                self._loadCameraAndMicroscope()
-
-            if not load_microscope:
-                # microscope is set from outside, load configuration options
-                if (hasattr(self.microscope, "defineConfigurationOptions") and 
-                    callable(self.microscope.defineConfigurationOptions)):
-                    log_debug(self._logger, "Defining configuration options of microscope")
-                    self.microscope.defineConfigurationOptions(self.configuration,
-                        self.microscope.config_group_name, 
-                        self.microscope.config_defaults)
-
-            if not load_camera:
-                # camera is set from outside, load configuration options
-                if (hasattr(self.camera, "defineConfigurationOptions") and 
-                    callable(self.camera.defineConfigurationOptions)):
-                    log_debug(self._logger, "Defining configuration options of camera")
-                    self.camera.defineConfigurationOptions(self.configuration,
-                        self.camera.config_group_name, 
-                        self.camera.config_defaults)
-            
-            if do_log(self._logger, logging.INFO):
-                self._logger.info("Using camera '{}' and microscope '{}'".format(
-                    self.camera.__class__.__name__,
-                    self.microscope.__class__.__name__))
-
-            # ask all non-existing but required configuration values
-            self.askIfNotPresentConfigurationOptions()
-            
-            self.measurement = None
-
-            # save the config
-            log_debug(self._logger, "Saving configuration")
-            self.configuration.saveConfiguration()
+            load_microscope = self.initialize()
 
             # not needed to check changes here, the user did not have a chance
             # of changing anything so all values are startup values
@@ -708,6 +909,10 @@ class Controller:
                     # was auto-loaded to reload changed camera properties 
                     # (not auto-loading is maily for testing or for plugins, 
                     # both should know what to do)
+                    if ((CONFIG_DEVICE_GROUP, "additional-cameras") in 
+                        restart_required_changes):
+                        self.additional_cameras = collections.OrderedDict()
+
                     if ((CONFIG_DEVICE_GROUP, "camera") in 
                         restart_required_changes):
                         from .config import KEEP_REMOVED_DIVICE_SETTINGS
@@ -757,6 +962,16 @@ class Controller:
             log_debug(self._logger, "Firing 'series_ready' event")
             series_ready(self)
 
+            try:
+                self.measurement.runPreflight()
+            except PreflightError as e:
+                fix = ("Free space in the save directory, choose another " + 
+                       "save directory or reduce the number of steps. Set " + 
+                       "the 'preflight-check' to 'warn' to start anyway.")
+                self.stopProgramLoop()
+                self.view.showError(e, fix)
+                return
+
             log_debug(self._logger, "Creating measurement thread")
             self._measurement_thread = ExceptionThread(
                 target=self.measurement.start, name="measurement"
@@ -934,33 +1149,40 @@ class Controller:
                     raise error
     
     def _setEmergency(self) -> None:
-        """Set the microscope and the camera to be in emergency state."""
+        """Set the microscope and the camera to be in emergency state.
+        
+        The safe state of all devices is started in parallel before waiting
+        for any of them.
+        """
 
-        try:
-            if isinstance(self.microscope, VulnerableMachine):
-                log_debug(self._logger, "Setting microscope to emergency state")
-                self.microscope.resetToEmergencyState()
-            else:
-                log_debug(self._logger, ("Skipping setting microscope to " + 
-                          "emergency mode, microscope '{}' is not a " + 
-                          "VulnerableMachine").format(self.microscope))
-        except BlockedFunctionError:
-            # emergency event is called, microscope goes in emergency state by 
-            # itself
-            pass
+        if isinstance(self.microscope, MicroscopeInterface):
+            # do not set any more values that are waiting to be set
+            self.microscope.cancelPendingSettings()
 
-        try:
-            if isinstance(self.camera, VulnerableMachine):
-                log_debug(self._logger, "Setting camera to emergency state")
-                self.camera.resetToEmergencyState()
-            else:
-                log_debug(self._logger, ("Skipping setting camera to " + 
-                          "emergency mode, camera '{}' is not a " + 
-                          "VulnerableMachine").format(self.camera))
-        except BlockedFunctionError:
-            # emergency event is called, camera goes in emergency state by 
-            # itself
-            pass
+        devices = [("microscope", self.microscope)]
+        devices += [("camera '{}'".format(r), c) for r, c in self.cameras.items()]
+
+        futures = []
+        for name, device in devices:
+            try:
+                if isinstance(device, VulnerableMachine):
+                    log_debug(self._logger, ("Setting {} to emergency " + 
+                                             "state").format(name))
+                    futures.append(device.startEmergencyState())
+                else:
+                    log_debug(self._logger, ("Skipping setting {} to " + 
+                              "emergency mode, '{}' is not a " + 
+                              "VulnerableMachine").format(name, device))
+            except BlockedFunctionError:
+                # emergency event is called, the device goes in emergency 
+                # state by itself
+                pass
+        
+        get_emergency_executor().wait(futures)
+
+        for future in futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
     
     def _getFixForError(self, error: Exception) -> typing.Union[None, str]:
         """Get a possible fix for the given error.
@@ -1036,6 +1258,77 @@ class Controller:
         self._measurement_thread = None
         self._running_thread = None
     
+    def startControlServer(self, host: typing.Optional[str]=None, 
+                           port: typing.Optional[int]=None) -> ControlServer:
+        """Start the local server that allows other programs to submit 
+        measurements, to stop them and to receive the progress.
+
+        The microscope and the camera have to be loaded before, e.g. by 
+        `Controller.initialize()`. If the server is running already, the 
+        running server is returned.
+
+        Raises
+        ------
+        OSError
+            When the server cannot listen on the host and port
+
+        Parameters
+        ----------
+        host : str, optional
+            The host to listen on, if not given the `CONTROL_SERVER_HOST` is
+            used, default: None
+        port : int, optional
+            The port to listen on, use 0 for any free port, if not given the
+            `CONTROL_SERVER_PORT` is used, default: None
+        
+        Returns
+        -------
+        ControlServer
+            The running server
+        """
+
+        if (not isinstance(self.control_server, ControlServer) or 
+            not self.control_server.running):
+            log_debug(self._logger, "Starting control server")
+            self.control_server = ControlServer(self, host, port)
+            self.control_server.start()
+        
+        return self.control_server
+    
+    def stopControlServer(self) -> None:
+        """Stop the control server if it is running."""
+
+        if isinstance(self.control_server, ControlServer):
+            log_debug(self._logger, "Stopping control server")
+            self.control_server.stop()
+            self.control_server = None
+
+    def _setupProcessing(self) -> None:
+        """Install or uninstall the `DriftCorrector`, the `QualityMonitor`, 
+        the `PreviewWriter` and the `TIEReconstructor` depending on the 
+        configuration."""
+
+        for attr, class_, group in (
+            ("drift_corrector", DriftCorrector, CONFIG_DRIFT_CORRECTION_GROUP),
+            ("quality_monitor", QualityMonitor, CONFIG_QUALITY_METRICS_GROUP),
+            ("preview_writer", PreviewWriter, CONFIG_PREVIEW_GROUP),
+            ("tie_reconstructor", TIEReconstructor, 
+             CONFIG_TIE_RECONSTRUCTION_GROUP)):
+            try:
+                enabled = self.configuration.getValue(group, "enabled")
+            except KeyError:
+                enabled = False
+            
+            if isinstance(getattr(self, attr), class_):
+                log_debug(self._logger, "Removing '{}'".format(attr))
+                getattr(self, attr).uninstall()
+                setattr(self, attr, None)
+            
+            if enabled == True:
+                log_debug(self._logger, "Installing '{}'".format(attr))
+                setattr(self, attr, class_(self))
+                getattr(self, attr).install()
+
     def restartProgramLoop(self) -> None:
         """Stop and restart the program loop."""
         log_debug(self._logger, "Restarting program loop")
@@ -1084,4 +1377,19 @@ class Controller:
             datatype=Datatype.options(loader.getInstalledDeviceNames("camera")),
             description=descr.format(kind="camera"),
             restart_required=True
+        )
+        # add the option for additional cameras
+        configuration.addConfigurationOption(
+            CONFIG_DEVICE_GROUP, 
+            "additional-cameras", 
+            datatype=str,
+            default_value="",
+            description=("Cameras that record images in each measurement " + 
+                         "step additionally to the 'camera'. Use comma " + 
+                         "separated pairs of the role and the camera name, " + 
+                         "e.g. 'preview=Dummy Camera'. The role can be used " + 
+                         "with the '{camera}' placeholder in the file " + 
+                         "name. The role of the 'camera' is '" + 
+                         MAIN_CAMERA_ROLE + "'."),
+            restart_required=True
         )
\ No newline at end of file
@@ -400,7 +400,8 @@ class DMView(AbstractView):
 
         self._out += text
         # self._out = text + self._out
-        self._updateRunning()
+        if self.show_running:
+            self._requestRunningUpdate()
     
     def _createKillDialog(self) -> None:
         """A dialog that shows the kill button only."""
@@ -573,7 +574,11 @@ class DMView(AbstractView):
         super().hideRunning()
 
     def _updateRunning(self) -> None:
-        """Update the running indicator, the progress has updated."""
+        """Update the running indicator, the progress has updated.
+        
+        The progress and the text are passed to the dialog via persistent 
+        tags, the text starts with the rate and the eta.
+        """
         if DM is not None:
             if self._progress_dialog_progress_tagname is not None:
                 log_debug(self._logger, ("Setting persistent tag '{}' to long " + 
@@ -585,12 +590,14 @@ class DMView(AbstractView):
                 )
             
             if self._progress_dialog_text_tagname is not None:
+                # show the rate and the eta above the outputs
+                text = self.progress_model.formatStatus() + "\n\n" + self._out
                 log_debug(self._logger, ("Setting persistent tag '{}' to string " + 
                                         "value '{}'").format(
                                         self._progress_dialog_text_tagname,
-                                        self._out))
+                                        text))
                 DM.GetPersistentTagGroup().SetTagAsString(
-                    self._progress_dialog_text_tagname, self._out
+                    self._progress_dialog_text_tagname, text
                 )
             
             self._created_tagnames.add(self._progress_dialog_progress_tagname)
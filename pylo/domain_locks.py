@@ -0,0 +1,226 @@
+import typing
+import threading
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+
+# the domain of all measurement variables that do not define a domain
+DEFAULT_LOCK_DOMAIN = "microscope"
+
+class DomainLocks:
+    """A collection of locks, one for each lock domain.
+
+    A lock domain is an independent subsystem of a device, for example the
+    stage or the lenses of a microscope. Operations that only touch one
+    domain do not block operations on other domains. Operations that touch
+    multiple domains acquire the locks always in the sorted order of the
+    domain names so two operations can never deadlock each other.
+
+    The domain locks are reentrant, the same thread can acquire a domain
+    multiple times.
+    """
+
+    def __init__(self, domains: typing.Optional[typing.Iterable[str]]=None) -> None:
+        """Create the domain locks.
+
+        Parameters
+        ----------
+        domains : iterable of str, optional
+            The domains that are known from the beginning, the
+            `DEFAULT_LOCK_DOMAIN` is always contained, default: None
+        """
+        self._logger = get_logger(self)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+        self.addDomains(DEFAULT_LOCK_DOMAIN)
+        if domains is not None:
+            self.addDomains(*domains)
+
+    @property
+    def domains(self) -> typing.List[str]:
+        """All known domains in the order they are locked."""
+        with self._locks_lock:
+            return sorted(self._locks.keys())
+
+    def addDomains(self, *domains: str) -> None:
+        """Add the `domains` if they do not exist yet.
+
+        Parameters
+        ----------
+        domains : str
+            The domain names
+        """
+        with self._locks_lock:
+            for domain in domains:
+                if domain not in self._locks:
+                    self._locks[domain] = threading.RLock()
+
+    def _getLocks(self, domains: typing.Optional[typing.Iterable[str]]) -> typing.List[typing.Tuple[str, threading.RLock]]:
+        """Get the locks of the `domains` in the locking order.
+
+        Parameters
+        ----------
+        domains : iterable of str or None
+            The domains, None for all domains
+
+        Returns
+        -------
+        list of tuples
+            A list of tuples with the domain name at index 0 and the lock at
+            index 1, sorted by the domain name
+        """
+        if domains is not None:
+            self.addDomains(*domains)
+
+        with self._locks_lock:
+            if domains is None:
+                domains = self._locks.keys()
+
+            return [(d, self._locks[d]) for d in sorted(set(domains))]
+
+    def acquire(self, domains: typing.Optional[typing.Iterable[str]]=None,
+                blocking: typing.Optional[bool]=True,
+                timeout: typing.Optional[float]=-1) -> typing.Union[typing.List[str], None]:
+        """Acquire the locks of the `domains` in the sorted order.
+
+        If not all locks can be acquired, the already acquired locks are
+        released again.
+
+        Parameters
+        ----------
+        domains : iterable of str, optional
+            The domains to lock, None for all known domains, default: None
+        blocking : bool, optional
+            Whether to wait for the locks, default: True
+        timeout : float, optional
+            The maximum time to wait for each of the locks in seconds, -1 for
+            no limit, default: -1
+
+        Returns
+        -------
+        list of str or None
+            The locked domains that have to be passed to
+            `DomainLocks.release()` or None if the locks could not be
+            acquired
+        """
+        acquired = []
+        for domain, lock in self._getLocks(domains):
+            log_debug(self._logger, "Locking domain '{}'".format(domain))
+            if lock.acquire(blocking, timeout):
+                acquired.append((domain, lock))
+            else:
+                for d, l in reversed(acquired):
+                    l.release()
+                return None
+
+        return [d for d, l in acquired]
+
+    def release(self, domains: typing.Iterable[str]) -> None:
+        """Release the locks of the `domains` in the reversed locking order.
+
+        Parameters
+        ----------
+        domains : iterable of str
+            The domains to release, typically the return value of
+            `DomainLocks.acquire()`
+        """
+        for domain, lock in reversed(self._getLocks(domains)):
+            log_debug(self._logger, "Releasing domain '{}'".format(domain))
+            lock.release()
+
+    def getLock(self, domains: typing.Optional[typing.Union[typing.Iterable[str], typing.Callable[[], typing.Iterable[str]]]]=None) -> "DomainsLock":
+        """Get a lock object that locks all the `domains` at once.
+
+        Parameters
+        ----------
+        domains : iterable of str or callable, optional
+            The domains to lock or a callable that returns the domains when 
+            the lock is acquired, None for all domains that are known when the
+            lock is acquired, default: None
+
+        Returns
+        -------
+        DomainsLock
+            The lock that can be used like a `threading.Lock`
+        """
+        return DomainsLock(self, domains)
+
+class DomainsLock:
+    """A lock that acquires multiple domains of `DomainLocks`.
+
+    The lock can be used like a `threading.Lock`, either with the `acquire()`
+    and `release()` functions or in a `with` statement.
+    """
+
+    def __init__(self, domain_locks: DomainLocks,
+                 domains: typing.Optional[typing.Union[typing.Iterable[str], typing.Callable[[], typing.Iterable[str]]]]=None) -> None:
+        """Create the lock.
+
+        Parameters
+        ----------
+        domain_locks : DomainLocks
+            The domain locks
+        domains : iterable of str or callable, optional
+            The domains to lock or a callable that returns the domains when 
+            the lock is acquired, None for all domains that are known when the
+            lock is acquired, default: None
+        """
+        self.domain_locks = domain_locks
+        if domains is not None and not callable(domains):
+            domains = tuple(domains)
+        self.domains = domains
+        self._acquired = threading.local()
+
+    def acquire(self, blocking: typing.Optional[bool]=True,
+                timeout: typing.Optional[float]=-1) -> bool:
+        """Acquire the domains.
+
+        Parameters
+        ----------
+        blocking : bool, optional
+            Whether to wait for the locks, default: True
+        timeout : float, optional
+            The maximum time to wait in seconds, -1 for no limit, default: -1
+
+        Returns
+        -------
+        bool
+            Whether the domains are acquired
+        """
+        if callable(self.domains):
+            domains = self.domains()
+        else:
+            domains = self.domains
+
+        acquired = self.domain_locks.acquire(domains, blocking, timeout)
+
+        if acquired is None:
+            return False
+
+        # save the actually locked domains per thread, domains may be added
+        # while the lock is held
+        if not hasattr(self._acquired, "stack"):
+            self._acquired.stack = []
+        self._acquired.stack.append(acquired)
+        return True
+
+    def release(self) -> None:
+        """Release the domains.
+
+        Raises
+        ------
+        RuntimeError
+            When the lock is not acquired by the current thread
+        """
+        if not getattr(self._acquired, "stack", None):
+            raise RuntimeError("Cannot release an unacquired lock.")
+
+        self.domain_locks.release(self._acquired.stack.pop())
+
+    def __enter__(self) -> "DomainsLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
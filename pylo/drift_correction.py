@@ -0,0 +1,533 @@
+import math
+import typing
+import datetime
+import functools
+import concurrent.futures
+
+import numpy as np
+
+from .events import after_record
+from .events import series_ready
+from .events import before_record
+from .logginglib import log_info
+from .logginglib import log_debug
+from .logginglib import log_error
+from .processing_stage import ProcessingStage
+
+CONFIG_DRIFT_CORRECTION_GROUP = "drift-correction"
+DRIFT_TAGS_KEY = "Drift"
+
+@functools.lru_cache(maxsize=8)
+def _get_window(shape: typing.Tuple[int, int]) -> np.ndarray:
+    """Get the hann window for the given `shape`, the result is cached.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The image shape
+
+    Returns
+    -------
+    numpy.ndarray
+        The window
+    """
+    window = np.outer(np.hanning(shape[0]), np.hanning(shape[1]))
+    window.flags.writeable = False
+    return window
+
+def downsample(image_data: np.ndarray, factor: int) -> np.ndarray:
+    """Bin the `image_data` by the `factor` in both directions.
+
+    Pixels that do not fill a complete bin at the right and bottom edge are
+    dropped.
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    factor : int
+        The binning factor, 1 returns the data as float
+
+    Returns
+    -------
+    numpy.ndarray
+        The binned data
+    """
+    image_data = np.asarray(image_data, dtype=np.float64)
+    factor = int(factor)
+
+    if factor <= 1:
+        return image_data
+
+    h = image_data.shape[0] // factor
+    w = image_data.shape[1] // factor
+    return image_data[:h * factor, :w * factor].reshape(
+        h, factor, w, factor).mean(axis=(1, 3))
+
+def get_spectrum(image_data: np.ndarray, factor: typing.Optional[int]=1) -> np.ndarray:
+    """Get the windowed fourier transform of the `image_data` binned by the
+    `factor`.
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    factor : int, optional
+        The binning factor, default: 1
+
+    Returns
+    -------
+    numpy.ndarray
+        The complex spectrum
+    """
+    data = downsample(image_data, factor)
+    data = (data - data.mean()) * _get_window(data.shape)
+    return np.fft.fft2(data)
+
+def _refine_peak(cross_power: np.ndarray, py: float, px: float, 
+                 upsample: int) -> typing.Tuple[float, float]:
+    """Find the correlation peak around `py`, `px` with a precision of 
+    1/`upsample` pixels.
+
+    The correlation is calculated only in a 1.5 pixel wide area around the 
+    peak by a matrix multiplied discrete fourier transform.
+
+    Parameters
+    ----------
+    cross_power : numpy.ndarray
+        The (normalized) cross power spectrum
+    py, px : float
+        The position of the peak in pixels
+    upsample : int
+        The number of sub-pixels per pixel
+
+    Returns
+    -------
+    tuple of float
+        The refined position of the peak
+    """
+    h, w = cross_power.shape
+    n = int(math.ceil(1.5 * upsample))
+    offsets = (np.arange(n) - n // 2) / upsample
+    ys = py + offsets
+    xs = px + offsets
+
+    kernel_y = np.exp(2j * np.pi * np.outer(ys, np.fft.fftfreq(h)))
+    kernel_x = np.exp(2j * np.pi * np.outer(np.fft.fftfreq(w), xs))
+    local = np.dot(np.dot(kernel_y, cross_power), kernel_x).real
+
+    iy, ix = np.unravel_index(np.argmax(local), local.shape)
+    return float(ys[iy]), float(xs[ix])
+
+def phase_correlation(reference_spectrum: np.ndarray, spectrum: np.ndarray,
+                      center: typing.Optional[typing.Tuple[float, float]]=None,
+                      radius: typing.Optional[float]=None,
+                      whitening: typing.Optional[float]=0.5,
+                      upsample: typing.Optional[int]=20) -> typing.Tuple[float, float]:
+    """Get the sub-pixel shift of the image of the `spectrum` relative to the
+    image of the `reference_spectrum`.
+
+    The cross power spectrum is divided by its amplitude to the power of the 
+    `whitening` (1 is the classic phase correlation, 0 the cross correlation,
+    values in between are more robust for images with few high frequencies).
+    The peak is refined by an upsampled fourier transform around the peak. If
+    the `center` and the `radius` are given, only peaks in this area are 
+    considered.
+
+    Parameters
+    ----------
+    reference_spectrum, spectrum : numpy.ndarray
+        The spectra as returned by `get_spectrum()`
+    center : tuple of float, optional
+        The expected shift in y and x direction in pixels
+    radius : float, optional
+        The maximum distance of the peak from the `center` in pixels
+    whitening : float, optional
+        The exponent of the amplitude normalization, default: 0.5
+    upsample : int, optional
+        The number of sub-pixels per pixel, 1 to return integer shifts only,
+        default: 20
+
+    Returns
+    -------
+    tuple of float
+        The shift in y and x direction in pixels
+    """
+    cross_power = spectrum * np.conj(reference_spectrum)
+    if whitening > 0:
+        cross_power /= (np.abs(cross_power) ** whitening + 
+                        np.finfo(np.float64).eps)
+    correlation = np.fft.ifft2(cross_power).real
+    h, w = correlation.shape
+
+    if center is not None and radius is not None:
+        y, x = np.ogrid[:h, :w]
+        # distances with wrapping at the borders
+        dy = (y - center[0] + h / 2) % h - h / 2
+        dx = (x - center[1] + w / 2) % w - w / 2
+        search = np.where((dy ** 2 + dx ** 2) <= radius ** 2, correlation,
+                          -np.inf)
+    else:
+        search = correlation
+
+    py, px = np.unravel_index(np.argmax(search), correlation.shape)
+    
+    # signed shifts
+    if py > h / 2:
+        py -= h
+    if px > w / 2:
+        px -= w
+
+    if upsample > 1:
+        return _refine_peak(cross_power, py, px, upsample)
+    else:
+        return float(py), float(px)
+
+class DriftCorrector(ProcessingStage):
+    """Measure the drift of each recorded image relative to the first image of
+    the series.
+
+    The shift is calculated by a phase correlation of the fourier spectra. The
+    spectra of the reference images are calculated once per series and
+    camera. The shift is first searched in the most binned image and then
+    refined in the less binned images (pyramid).
+
+    The calculation runs in a thread pool, the measurement does not wait for
+    it. The shift is added to the image tags before the image is saved
+    (`Image.addPendingTags()`) and it is added as a row to the measurement
+    log.
+
+    If the feedback threshold is greater than zero and there are feedback
+    variables defined, a drift that is greater than the threshold is
+    corrected by changing the feedback variables (e.g. the image shift) before
+    the next image is recorded. Only images that are recorded after the last
+    correction can cause a new correction.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    factors : tuple of int
+        The binning factors of the pyramid levels, the most binned first
+    workers : int
+        The number of threads to calculate the shifts in
+    feedback_threshold : float
+        The shift in pixels from which on the drift is corrected, 0 for no
+        correction
+    feedback_variables : dict
+        The direction ('x' or 'y') as the key and a tuple of the measurement
+        variable id and the change of the variable per pixel as the value
+    shifts : list of dict
+        All measured shifts of the current series in the order they are
+        calculated, each dict contains the 'step-index', the 'camera', the 'x'
+        and the 'y' shift in pixels
+    """
+
+    config_group = CONFIG_DRIFT_CORRECTION_GROUP
+    event_id = "drift_correction"
+    allow_negative = False
+
+    def __init__(self, controller: "Controller",
+                 downsample: typing.Optional[int]=None,
+                 levels: typing.Optional[int]=None,
+                 workers: typing.Optional[int]=None,
+                 feedback_threshold: typing.Optional[float]=None) -> None:
+        """Create a new drift corrector, all values that are not given are
+        taken from the configuration.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        downsample : int, optional
+            The binning factor of the least binned pyramid level
+        levels : int, optional
+            The number of pyramid levels, each level is binned by two more
+        workers : int, optional
+            The number of threads to calculate the shifts in
+        feedback_threshold : float, optional
+            The shift in pixels from which on the drift is corrected, 0 for
+            no correction
+        """
+        super(DriftCorrector, self).__init__(controller)
+
+        downsample = self._getValue("downsample", downsample, int, 1)
+        levels = self._getValue("pyramid-levels", levels, int, 1)
+        self.workers = self._getValue("workers", workers, int, 1)
+        self.factors = tuple(max(1, downsample) * 2 ** i
+                             for i in reversed(range(max(1, levels))))
+        self.feedback_threshold = self._getValue("feedback-threshold",
+                                                 feedback_threshold, float, 0)
+
+        self.feedback_variables = {}
+        for d in ("x", "y"):
+            id_ = self._getValue("feedback-{}-variable-id".format(d), None,
+                                 str, "")
+            if id_ != "":
+                self.feedback_variables[d] = (
+                    id_, self._getValue("feedback-{}-factor".format(d), None,
+                                        float, 1))
+
+        self.shifts = []
+        self._references = {}
+        self._pending_correction = None
+        self._correction_generation = 0
+
+    def getEventHandlers(self) -> typing.List[typing.Tuple["Event", typing.Callable, dict]]:
+        """Get the event handlers to register.
+
+        Returns
+        -------
+        list of tuple
+            The event, the handler and the keyword arguments for
+            `Event.register()`
+        """
+        return [(series_ready, self.reset, {"isolate_errors": True}),
+                (before_record, self.applyFeedback, {"isolate_errors": True}),
+                (after_record, self.processImages, {"isolate_errors": True})]
+
+    def reset(self, *args) -> None:
+        """Forget the reference images, the shifts and the corrections, this
+        is called when a new series starts."""
+        log_debug(self._logger, "Resetting drift correction")
+        super(DriftCorrector, self).reset()
+
+        with self._lock:
+            self.shifts = []
+            self._references = {}
+            self._pending_correction = None
+            self._correction_generation = 0
+
+    def processImages(self, controller: "Controller") -> None:
+        """Submit all current images of the measurement to the thread pool.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        if self._executor is None:
+            self.install()
+
+        measurement = controller.measurement
+        if measurement is not self._measurement:
+            # the series_ready event is not fired for every measurement
+            self.reset()
+            self._measurement = measurement
+
+        with self._lock:
+            generation = self._correction_generation
+
+            for role, image in measurement.current_images.items():
+                if role not in self._references:
+                    # the first image of the series is the reference
+                    self._references[role] = self._executor.submit(
+                        self._createReference, image.image_data)
+                    future = self._executor.submit(
+                        lambda: {DRIFT_TAGS_KEY: {"x": 0.0, "y": 0.0,
+                                                  "unit": "px",
+                                                  "reference": True}})
+                else:
+                    future = self._executor.submit(
+                        self._processImage, role, self._references[role],
+                        image.image_data, dict(measurement.current_step),
+                        measurement.step_index,
+                        measurement.formatName(camera=role), generation)
+
+                self._futures.append(future)
+                image.addPendingTags(future)
+
+    def _createReference(self, image_data: np.ndarray) -> typing.Dict[int, np.ndarray]:
+        """Get the spectra of the reference image for all pyramid levels.
+
+        Parameters
+        ----------
+        image_data : numpy.ndarray
+            The reference image data
+
+        Returns
+        -------
+        dict
+            The binning factor as the key, the spectrum as the value
+        """
+        return {f: get_spectrum(image_data, f) for f in self.factors}
+
+    def estimateShift(self, reference: typing.Dict[int, np.ndarray],
+                      image_data: np.ndarray) -> typing.Tuple[float, float]:
+        """Get the shift of the `image_data` relative to the `reference` in
+        pixels.
+
+        Parameters
+        ----------
+        reference : dict
+            The reference spectra as returned by
+            `DriftCorrector._createReference()`
+        image_data : numpy.ndarray
+            The image data
+
+        Returns
+        -------
+        tuple of float
+            The shift in y and x direction in pixels of the not binned image
+        """
+        shift = None
+        for factor in self.factors:
+            spectrum = get_spectrum(image_data, factor)
+
+            if shift is None:
+                center = None
+            else:
+                center = (shift[0] / factor, shift[1] / factor)
+
+            dy, dx = phase_correlation(reference[factor], spectrum, center, 2)
+            shift = (dy * factor, dx * factor)
+
+        return shift
+
+    def _processImage(self, role: str, reference: concurrent.futures.Future,
+                      image_data: np.ndarray, step: dict, step_index: int,
+                      name: str, generation: int) -> dict:
+        """Calculate the shift of one image, this is executed in the thread
+        pool.
+
+        Parameters
+        ----------
+        role : str
+            The camera role
+        reference : concurrent.futures.Future
+            The future that returns the reference spectra
+        image_data : numpy.ndarray
+            The image data
+        step : dict
+            The measurement step the image is recorded at
+        step_index : int
+            The index of the step
+        name : str
+            The file name of the image
+        generation : int
+            The number of corrections that were applied when the image was
+            recorded
+
+        Returns
+        -------
+        dict
+            The tags to add to the image
+        """
+        dy, dx = self.estimateShift(reference.result(), image_data)
+
+        log_info(self._logger, ("Image '{}' of camera '{}' has a drift of " +
+                                "x={:.2f}px, y={:.2f}px").format(name, role,
+                                dx, dy))
+
+        with self._lock:
+            self.shifts.append({"step-index": step_index, "camera": role,
+                                "x": dx, "y": dy})
+
+            if (self.feedback_threshold > 0 and
+                len(self.feedback_variables) > 0 and
+                generation == self._correction_generation and
+                self._pending_correction is None and
+                math.hypot(dx, dy) > self.feedback_threshold):
+                self._pending_correction = {}
+                for d, s in (("x", dx), ("y", dy)):
+                    if d in self.feedback_variables:
+                        id_, factor = self.feedback_variables[d]
+                        self._pending_correction[id_] = -s * factor
+
+        measurement = self.controller.measurement
+        if measurement is not None and measurement.measurement_logging:
+            try:
+                measurement.addToMeasurementLog(step,
+                    "Drift x={:.2f}px, y={:.2f}px".format(dx, dy), name,
+                    datetime.datetime.now().isoformat())
+            except Exception as e:
+                # the measurement log may be closed already
+                log_error(self._logger, e)
+
+        return {DRIFT_TAGS_KEY: {"x": dx, "y": dy, "unit": "px",
+                                 "reference": False}}
+
+    def applyFeedback(self, controller: "Controller") -> None:
+        """Apply the pending drift correction to the microscope, this is
+        executed before each image is recorded.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        with self._lock:
+            correction = self._pending_correction
+            self._pending_correction = None
+            if correction is not None:
+                self._correction_generation += 1
+
+        if correction is None:
+            return
+
+        for id_, change in correction.items():
+            value = controller.microscope.getMeasurementVariableValue(id_)
+            log_info(self._logger, ("Correcting drift by setting '{}' from " +
+                                    "'{}' to '{}'").format(id_, value,
+                                    value + change))
+            controller.microscope.setMeasurementVariableValue(id_,
+                                                              value + change)
+
+    @staticmethod
+    def defineConfigurationOptions(configuration: "AbstractConfiguration") -> None:
+        """Define which configuration options this class requires.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration to define the required options in
+        """
+
+        configuration.addConfigurationOption(
+            CONFIG_DRIFT_CORRECTION_GROUP, "enabled", datatype=bool,
+            default_value=False,
+            description="Whether to measure the drift of each image " +
+            "relative to the first image of the series."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_DRIFT_CORRECTION_GROUP, "downsample", datatype=int,
+            default_value=1,
+            description="The binning factor of the images to measure the " +
+            "drift with, higher values are faster but less precise."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_DRIFT_CORRECTION_GROUP, "pyramid-levels", datatype=int,
+            default_value=2,
+            description="The number of binning levels, the drift is " +
+            "searched in the most binned image first and then refined in " +
+            "the less binned images."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_DRIFT_CORRECTION_GROUP, "workers", datatype=int,
+            default_value=2,
+            description="The number of threads to measure the drift in."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_DRIFT_CORRECTION_GROUP, "feedback-threshold",
+            datatype=float, default_value=0,
+            description="The drift in pixels from which on the drift is " +
+            "corrected by the feedback variables, use 0 to only measure the " +
+            "drift."
+        )
+
+        for d in ("x", "y"):
+            configuration.addConfigurationOption(
+                CONFIG_DRIFT_CORRECTION_GROUP,
+                "feedback-{}-variable-id".format(d), datatype=str,
+                default_value="",
+                description=("The id of the measurement variable to correct " +
+                             "the drift in {} direction with, e.g. the image " +
+                             "shift, leave empty for no correction.").format(d)
+            )
+            configuration.addConfigurationOption(
+                CONFIG_DRIFT_CORRECTION_GROUP,
+                "feedback-{}-factor".format(d), datatype=float,
+                default_value=1,
+                description=("The change of the {} feedback variable that " +
+                             "moves the image by one pixel.").format(d)
+            )
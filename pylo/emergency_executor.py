@@ -0,0 +1,278 @@
+import time
+import typing
+import logging
+import threading
+import concurrent.futures
+
+from .events import safe_state_timeout
+from .logginglib import do_log
+from .logginglib import log_info
+from .logginglib import log_error
+from .logginglib import get_logger
+
+_thread_state = threading.local()
+
+def is_emergency_thread() -> bool:
+    """Whether the current thread executes an emergency command.
+
+    Returns
+    -------
+    bool
+        True if the current thread is started by the `EmergencyExecutor`
+    """
+    return getattr(_thread_state, "emergency", False)
+
+def inherit_emergency(func: typing.Callable) -> typing.Callable:
+    """Wrap the `func` so it is executed as an emergency command if the 
+    current thread is an emergency thread.
+
+    Use this for functions that are executed in helper threads (e.g. in a 
+    thread pool) while setting a machine to the safe state, otherwise the 
+    blocked functions of the machine raise errors in the helper threads.
+
+    Parameters
+    ----------
+    func : callable
+        The function to wrap
+
+    Returns
+    -------
+    callable
+        The wrapped function or the `func` if the current thread is no 
+        emergency thread
+    """
+    if not is_emergency_thread():
+        return func
+    
+    def wrapper(*args, **kwargs):
+        previous = is_emergency_thread()
+        _thread_state.emergency = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _thread_state.emergency = previous
+    
+    return wrapper
+
+class EmergencyExecutor:
+    """Execute the safe state commands of the devices in an emergency.
+
+    Each command is started immediately in its own thread, so it never waits
+    for other commands or for a worker of a pool that is blocked by a hanging
+    hardware call. A watchdog measures the time each device needs to reach
+    the safe state. If a device takes longer than the `timeout`, the
+    `safe_state_timeout` event is fired.
+
+    Attributes
+    ----------
+    timeout : float or None
+        The maximum time in seconds a device may take to reach the safe
+        state, None to use the `config.EMERGENCY_SAFE_STATE_TIMEOUT`
+    durations : dict
+        The name of the device as the key and the time in seconds it took to
+        reach the safe state as the value
+    """
+
+    def __init__(self, timeout: typing.Optional[float]=None) -> None:
+        """Create the executor.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time in seconds a device may take to reach the safe
+            state, None to use the `config.EMERGENCY_SAFE_STATE_TIMEOUT`,
+            default: None
+        """
+        self._logger = get_logger(self)
+        self.timeout = timeout
+        self.durations = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def getTimeout(self) -> float:
+        """Get the maximum time a device may take to reach the safe state.
+
+        Returns
+        -------
+        float
+            The timeout in seconds
+        """
+        if self.timeout is not None:
+            return self.timeout
+
+        # import as late as possible to allow changes by extensions
+        from .config import EMERGENCY_SAFE_STATE_TIMEOUT
+        return EMERGENCY_SAFE_STATE_TIMEOUT
+
+    def submit(self, name: str, device: typing.Any,
+               func: typing.Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Start executing the `func` in a new emergency thread.
+
+        Parameters
+        ----------
+        name : str
+            The name of the device for the log and the thread name
+        device : any
+            The device, this is passed to the `safe_state_timeout` event
+        func : callable
+            The function that sets the device to the safe state
+
+        Additional Parameters
+        ---------------------
+        The `args` and `kwargs` are passed to the `func`
+
+        Returns
+        -------
+        concurrent.futures.Future
+            The future of the `func`
+        """
+        future = concurrent.futures.Future()
+        start = time.time()
+
+        def run():
+            _thread_state.emergency = True
+            if not future.set_running_or_notify_cancel():
+                return
+
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        watchdog = threading.Timer(self.getTimeout(), self._escalate,
+                                   args=(name, device, future, start))
+        watchdog.daemon = True
+
+        def done(future):
+            watchdog.cancel()
+            self._finish(name, future, start)
+
+        with self._lock:
+            self._pending.add(future)
+
+        thread = threading.Thread(target=run, name="emergency {}".format(name),
+                                  daemon=True)
+        thread.start()
+        watchdog.start()
+        future.add_done_callback(done)
+
+        return future
+
+    def _finish(self, name: str, future: concurrent.futures.Future,
+                start: float) -> None:
+        """Log the time the device took to reach the safe state.
+
+        Parameters
+        ----------
+        name : str
+            The name of the device
+        future : concurrent.futures.Future
+            The finished future
+        start : float
+            The `time.time()` when the command was started
+        """
+        duration = time.time() - start
+
+        with self._lock:
+            self._pending.discard(future)
+            self.durations[name] = duration
+
+        error = future.exception()
+        if error is not None:
+            log_error(self._logger, error)
+            if do_log(self._logger, logging.CRITICAL):
+                self._logger.critical(("Setting '{}' to the safe state failed " +
+                                       "after '{:.3f}' seconds: {}").format(
+                                       name, duration, error))
+        else:
+            log_info(self._logger, ("Device '{}' reached the safe state after " +
+                                    "'{:.3f}' seconds").format(name, duration))
+
+    def _escalate(self, name: str, device: typing.Any,
+                  future: concurrent.futures.Future, start: float) -> None:
+        """Escalate that the device did not reach the safe state in time, this
+        is executed by the watchdog.
+
+        Parameters
+        ----------
+        name : str
+            The name of the device
+        device : any
+            The device
+        future : concurrent.futures.Future
+            The future of the safe state command
+        start : float
+            The `time.time()` when the command was started
+        """
+        if future.done():
+            return
+
+        elapsed = time.time() - start
+        if do_log(self._logger, logging.CRITICAL):
+            self._logger.critical(("Device '{}' did not reach the safe state " +
+                                   "within '{:.3f}' seconds").format(name,
+                                   elapsed))
+
+        safe_state_timeout(device, elapsed)
+
+    def wait(self, futures: typing.Optional[typing.Iterable[concurrent.futures.Future]]=None,
+             timeout: typing.Optional[float]=None) -> bool:
+        """Wait until the devices have reached the safe state.
+
+        Parameters
+        ----------
+        futures : iterable of Future, optional
+            The futures to wait for, None to wait for all pending commands,
+            default: None
+        timeout : float, optional
+            The maximum time to wait in seconds, None to use the
+            `EmergencyExecutor.getTimeout()`, default: None
+
+        Returns
+        -------
+        bool
+            Whether all commands are finished
+        """
+        if futures is None:
+            with self._lock:
+                futures = list(self._pending)
+
+        if timeout is None:
+            timeout = self.getTimeout()
+
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        return len(not_done) == 0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_emergency_executor() -> EmergencyExecutor:
+    """Get the (shared) emergency executor.
+
+    Returns
+    -------
+    EmergencyExecutor
+        The executor
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = EmergencyExecutor()
+
+    return _executor
+
+def wait_for_safe_states(*args, **kwargs) -> bool:
+    """Wait until all devices that are set to the safe state because of an
+    emergency have reached the safe state or the timeout is over.
+
+    This is executed as the last handler of the `emergency` event.
+
+    Returns
+    -------
+    bool
+        Whether all devices are in the safe state
+    """
+    return get_emergency_executor().wait()
@@ -1,3 +1,5 @@
+import typing
+
 try:
     test_error = ModuleNotFoundError()
 except NameError:
@@ -31,4 +33,32 @@ class DeviceClassNotDefined(AttributeError):
 class DeviceCreationError(RuntimeError):
     """An error indicating that the `Device` file and class are found but when 
     creating the instance an error occurred."""
-    pass
\ No newline at end of file
+    pass
+
+class PreflightError(RuntimeError):
+    """An error indicating that the preflight check found that the measurement
+    cannot be executed, e.g. because there is not enough disk space."""
+    pass
+
+class DeviceCallTimeoutError(TimeoutError):
+    """An error indicating that a call of a device driver did not finish 
+    within its deadline.
+
+    Attributes
+    ----------
+    name : str
+        The name of the call, e.g. "set focus"
+    elapsed : float
+        The time in seconds the call was running when it was given up
+    action : str or None
+        The action the policy of the `CallSupervisor` decided for, None if the
+        policy did not decide
+    """
+
+    def __init__(self, message: str, name: typing.Optional[str]="", 
+                 elapsed: typing.Optional[float]=0, 
+                 action: typing.Optional[str]=None) -> None:
+        super().__init__(message)
+        self.name = name
+        self.elapsed = elapsed
+        self.action = action
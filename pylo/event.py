@@ -1,4 +1,73 @@
+import time
+import typing
+import logging
+import threading
 import collections
+import concurrent.futures
+
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import get_logger
+from .stop_program import StopProgram
+
+HandlerOptions = collections.namedtuple("HandlerOptions",
+    ("blocking", "priority", "timeout", "isolate_errors"))
+HandlerOptions.__doc__ = """The dispatch options of one event handler.
+
+Attributes
+----------
+blocking : bool
+    Whether the handler has to finish before the event call returns (True) or
+    whether it is executed in the event worker pool (False)
+priority : int or float
+    Handlers with higher priorities are executed first, handlers with the same
+    priority are executed in insertion order
+timeout : float or None
+    The maximum time in seconds a blocking handler may take, None for no limit
+isolate_errors : bool
+    Whether exceptions (and timeouts) of this handler are logged only (True) or
+    raised to the caller of the event (False)
+"""
+
+HandlerTiming = collections.namedtuple("HandlerTiming",
+    ("key", "start", "duration", "blocking", "error"))
+HandlerTiming.__doc__ = """The timing of one executed event handler.
+
+Attributes
+----------
+key : str
+    The key of the handler in the event
+start : float
+    The `time.time()` when the handler was started
+duration : float
+    The execution time in seconds
+blocking : bool
+    Whether the handler was executed blocking or in the worker pool
+error : Exception or None
+    The exception the handler raised or None if it finished successfully
+"""
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the (shared) worker pool that executes the non-blocking handlers.
+
+    Returns
+    -------
+    concurrent.futures.ThreadPoolExecutor
+        The executor
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # import as late as possible to allow changes by extensions
+            from .config import EVENT_WORKER_COUNT
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, EVENT_WORKER_COUNT))
+
+    return _executor
 
 class Event(collections.OrderedDict):
     """Event subscription.
@@ -6,6 +75,15 @@ class Event(collections.OrderedDict):
     A dict of callable objects. Calling an instance of this will cause a
     call to each item in the dict in ascending order by index.
 
+    Handlers that are added via the `Event.register()` function can define a
+    priority, whether they are blocking or fire-and-forget handlers, a timeout
+    and whether their errors should be isolated. Handlers that are added by
+    setting the item directly are blocking handlers without timeout with the
+    priority 0 that raise their errors.
+
+    Each execution of a handler is timed. The timings can be received (and
+    removed) by `Event.popTimings()`.
+
     Example Usage:
     ```python
     >>> def f(x):
@@ -24,13 +102,249 @@ class Event(collections.OrderedDict):
     >>> e(10)
     f(10)
     g(10)
+    >>> e.register("g", g, priority=1)
+    >>> e(10)
+    g(10)
+    f(10)
     ```
+
+    Attributes
+    ----------
+    max_timings : int
+        The maximum number of timings that are kept, the oldest ones are
+        dropped if there are more timings
     """
+
+    max_timings = 10000
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create a new event."""
+        self._handler_options = {}
+        self._timings = collections.deque(maxlen=Event.max_timings)
+        self._timings_lock = threading.Lock()
+        self._logger = get_logger(self, create_msg=False)
+
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value) -> None:
+        # directly set handlers always use the default options
+        self._handler_options.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        self._handler_options.pop(key, None)
+        super().__delitem__(key)
+
+    def register(self, key: str, handler: callable,
+                 blocking: typing.Optional[bool]=True,
+                 priority: typing.Optional[typing.Union[int, float]]=0,
+                 timeout: typing.Optional[float]=None,
+                 isolate_errors: typing.Optional[bool]=False) -> None:
+        """Add the `handler` with the given dispatch options.
+
+        Parameters
+        ----------
+        key : str
+            The key to add the handler with, an existing handler with this key
+            is replaced
+        handler : callable
+            The handler, it receives the arguments the event is called with
+        blocking : bool, optional
+            Whether the handler has to finish before the event call returns
+            (True) or whether it is started in the worker pool and the event
+            does not wait for it (False), default: True
+        priority : int or float, optional
+            Handlers with higher priorities are executed first, handlers with
+            the same priority keep their insertion order, default: 0
+        timeout : float, optional
+            The maximum time in seconds a blocking handler may take, if it
+            takes longer a `TimeoutError` is raised (or logged if
+            `isolate_errors` is True) and the handler is left running in the
+            background, ignored for non-blocking handlers, default: None
+        isolate_errors : bool, optional
+            Whether exceptions of this handler are logged only (True) or raised
+            to the caller of the event (False), errors of non-blocking handlers
+            are always logged only, `StopProgram` exceptions of blocking
+            handlers are always raised, default: False
+        """
+
+        self[key] = handler
+        self._handler_options[key] = HandlerOptions(bool(blocking), priority,
+                                                    timeout,
+                                                    bool(isolate_errors))
+
+    def getHandlerOptions(self, key: str) -> HandlerOptions:
+        """Get the dispatch options of the handler with the `key`.
+
+        Raises
+        ------
+        KeyError
+            When there is no handler with the `key`
+
+        Parameters
+        ----------
+        key : str
+            The key of the handler
+
+        Returns
+        -------
+        HandlerOptions
+            The options
+        """
+
+        if key not in self:
+            raise KeyError("There is no handler with the key '{}'.".format(key))
+
+        return self._handler_options.get(key, HandlerOptions(True, 0, None,
+                                                             False))
+
     def __call__(self, *args, **kwargs) -> None:
-        for f in self.values():
-            if callable(f):
-                f(*args, **kwargs)
+        handlers = [(k, f, self.getHandlerOptions(k))
+                    for k, f in list(self.items()) if callable(f)]
+        # sorted() is stable so equal priorities keep the insertion order
+        handlers.sort(key=lambda h: h[2].priority, reverse=True)
+
+        for key, handler, options in handlers:
+            if options.blocking:
+                self._callBlocking(key, handler, options, args, kwargs)
+            else:
+                _get_executor().submit(self._callHandler, key, handler, False,
+                                       args, kwargs)
+
+    def _callBlocking(self, key: str, handler: callable,
+                      options: HandlerOptions, args: tuple,
+                      kwargs: dict) -> None:
+        """Execute the blocking `handler` and apply the `options`.
+
+        Parameters
+        ----------
+        key : str
+            The key of the handler
+        handler : callable
+            The handler to execute
+        options : HandlerOptions
+            The dispatch options
+        args, kwargs : tuple, dict
+            The arguments to pass to the handler
+        """
+
+        try:
+            if isinstance(options.timeout, (int, float)):
+                self._callWithTimeout(key, handler, options.timeout, args,
+                                      kwargs)
+            else:
+                self._callHandler(key, handler, True, args, kwargs,
+                                  reraise=True)
+        except StopProgram as e:
+            raise e
+        except Exception as e:
+            if options.isolate_errors:
+                log_error(self._logger, e, logging.WARNING)
+            else:
+                raise e
+
+    def _callWithTimeout(self, key: str, handler: callable, timeout: float,
+                         args: tuple, kwargs: dict) -> None:
+        """Execute the `handler` in a separate thread and wait at most
+        `timeout` seconds for it.
+
+        Raises
+        ------
+        TimeoutError
+            When the handler did not finish in time
+        Exception
+            Any exception the `handler` raised
+
+        Parameters
+        ----------
+        key : str
+            The key of the handler
+        handler : callable
+            The handler to execute
+        timeout : float
+            The timeout in seconds
+        args, kwargs : tuple, dict
+            The arguments to pass to the handler
+        """
+        result = {}
+
+        def target():
+            try:
+                self._callHandler(key, handler, True, args, kwargs,
+                                  reraise=True)
+            except Exception as e:
+                result["error"] = e
+
+        # a daemon thread does not prevent the program from ending if the
+        # handler hangs forever
+        thread = threading.Thread(target=target, daemon=True,
+                                  name="event handler {}".format(key))
+        thread.start()
+        thread.join(timeout)
+
+        if thread.is_alive():
+            # logged by the caller like the errors of the handler
+            raise TimeoutError(("The event handler '{}' did not finish " +
+                                "within {} seconds.").format(key, timeout))
+        elif "error" in result:
+            raise result["error"]
+
+    def _callHandler(self, key: str, handler: callable, blocking: bool,
+                     args: tuple, kwargs: dict,
+                     reraise: typing.Optional[bool]=False) -> None:
+        """Execute the `handler` and record its timing.
+
+        Parameters
+        ----------
+        key : str
+            The key of the handler
+        handler : callable
+            The handler to execute
+        blocking : bool
+            Whether the handler is executed as a blocking handler, for the
+            timings only
+        args, kwargs : tuple, dict
+            The arguments to pass to the handler
+        reraise : bool, optional
+            Whether to raise exceptions of the handler (True) or to log them
+            only (False), default: False
+        """
+
+        error = None
+        start = time.time()
+        try:
+            handler(*args, **kwargs)
+        except Exception as e:
+            error = e
+
+            if reraise:
+                raise e
+            elif isinstance(e, StopProgram):
+                log_debug(self._logger, ("Non-blocking event handler '{}' " +
+                                         "raised StopProgram, ignoring " +
+                                         "it").format(key), exc_info=e)
+            else:
+                log_error(self._logger, e)
+        finally:
+            with self._timings_lock:
+                self._timings.append(HandlerTiming(key, start,
+                                                   time.time() - start,
+                                                   blocking, error))
+
+    def popTimings(self) -> typing.List[HandlerTiming]:
+        """Get all recorded handler timings and remove them from this event.
+
+        Returns
+        -------
+        list of HandlerTiming
+            The timings in the order the handlers finished
+        """
+
+        with self._timings_lock:
+            timings = list(self._timings)
+            self._timings.clear()
+
+        return timings
 
     def __repr__(self) -> str:
         return "Event({})".format(dict.__repr__(self))
-    
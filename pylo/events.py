@@ -13,6 +13,19 @@ __event_docs__("emergency",
 current `controller` will be the first argument.""")
 emergency = Event()
 
+__event_docs__("safe_state_timeout", 
+"""Fired by the emergency watchdog when a device did not reach the safe state 
+within `config.EMERGENCY_SAFE_STATE_TIMEOUT` seconds after an emergency. The 
+device will be the first argument, the elapsed time in seconds the second.""")
+safe_state_timeout = Event()
+
+__event_docs__("device_call_hang", 
+"""Fired by the `CallSupervisor` when a device call takes much longer than the
+calls before. The supervisor will be the first argument, the name of the call 
+(e.g. "set focus") the second, the elapsed time and the expected duration in 
+seconds the third and fourth argument.""")
+device_call_hang = Event()
+
 __event_docs__("before_start", 
 """Fired before everything. This event is fired in the constructor of the
 controller which should be the first object that is created.. The current 
@@ -66,6 +79,11 @@ image but before saving the image to the directory. The current `controller`
 will be the first argument.""")
 after_record = Event()
 
+__event_docs__("after_log_row", 
+"""Fired after a row is added to the measurement log. The current `controller` 
+will be the first argument, the list of cells of the row the second.""")
+after_log_row = Event()
+
 __event_docs__("measurement_ready", 
 """Fired when the measurement has fully finished. The current `controller` 
 will be the first argument.""")
@@ -73,12 +91,16 @@ measurement_ready = Event()
 
 def redefine_events():
     """Redefine all events."""
-    global after_stop, emergency, before_start, before_init, init_ready
+    global after_stop, emergency, safe_state_timeout, device_call_hang
+    global before_start
+    global before_init, init_ready
     global user_ready, series_ready, microscope_ready, before_approach
-    global before_record, after_record, measurement_ready
+    global before_record, after_record, after_log_row, measurement_ready
 
     after_stop = Event()
     emergency = Event()
+    safe_state_timeout = Event()
+    device_call_hang = Event()
     before_start = Event()
     before_init = Event()
     init_ready = Event()
@@ -88,16 +110,21 @@ def redefine_events():
     before_approach = Event()
     before_record = Event()
     after_record = Event()
+    after_log_row = Event()
     measurement_ready = Event()
 
 def del_events():
     """Delete all events."""
-    global after_stop, emergency, before_start, before_init, init_ready
+    global after_stop, emergency, safe_state_timeout, device_call_hang
+    global before_start
+    global before_init, init_ready
     global user_ready, series_ready, microscope_ready, before_approach
-    global before_record, after_record, measurement_ready
+    global before_record, after_record, after_log_row, measurement_ready
 
     del after_stop
     del emergency
+    del safe_state_timeout
+    del device_call_hang
     del before_start
     del before_init
     del init_ready
@@ -107,4 +134,5 @@ def del_events():
     del before_approach
     del before_record
     del after_record
+    del after_log_row
     del measurement_ready
\ No newline at end of file
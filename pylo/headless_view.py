@@ -0,0 +1,136 @@
+import sys
+import typing
+
+from .logginglib import log_debug
+from .logginglib import log_error
+from .abstract_view import AbstractView
+from .stop_program import StopProgram
+
+class HeadlessView(AbstractView):
+    """A view that does not interact with the user.
+
+    All outputs are written to the `stream`, every function that would need
+    a user input raises a `StopProgram` exception instead. This is used for
+    executing measurements unattended, e.g. by the `BatchRunner`.
+
+    Attributes
+    ----------
+    stream : file-like or None
+        The stream to write the outputs to, None to only log them
+    """
+
+    def __init__(self, stream: typing.Optional[typing.TextIO]=sys.stdout) -> None:
+        """Create a new headless view.
+
+        Parameters
+        ----------
+        stream : file-like or None, optional
+            The stream to write the outputs to, None to only log them,
+            default: sys.stdout
+        """
+        self.stream = stream
+        super().__init__()
+
+    def _refuseInput(self, what: str) -> None:
+        """Raise a `StopProgram` exception because the `what` needs a user
+        input.
+
+        Raises
+        ------
+        StopProgram
+            Always
+
+        Parameters
+        ----------
+        what : str
+            The description of the input that is requested
+        """
+        err = StopProgram(("The headless view cannot ask for {}, make sure " +
+                           "the configuration and the batch file contain all " +
+                           "required values.").format(what))
+        log_error(self._logger, err)
+        raise err
+
+    def showProgramDialogs(self, controller: "Controller",
+                           series: typing.Optional[dict]=None,
+                           start: typing.Optional[dict]=None) -> typing.Tuple[typing.Tuple[dict, dict], dict, dict]:
+        self._refuseInput("the measurement")
+
+    def showCreateMeasurement(self, *args, **kwargs) -> typing.Tuple[dict, dict]:
+        self._refuseInput("the measurement")
+
+    def showSettings(self, *args, **kwargs) -> dict:
+        self._refuseInput("the settings")
+
+    def showCustomTags(self, *args, **kwargs) -> typing.Dict[str, str]:
+        self._refuseInput("the custom tags")
+
+    def askForDecision(self, text: str, options: typing.Optional[typing.Sequence[str]]=("Ok", "Cancel")) -> int:
+        self._refuseInput("a decision ({})".format(text))
+
+    def askFor(self, *inputs, **kwargs) -> tuple:
+        self._refuseInput(", ".join([str(i.get("name", ""))
+                                     if isinstance(i, dict) else str(i)
+                                     for i in inputs]))
+
+    def showHint(self, hint : str, **kwargs) -> None:
+        """Print the hint.
+
+        Parameters
+        ----------
+        hint : str
+            The text to show
+        """
+        self.print(hint)
+
+    def showError(self, error : typing.Union[str, Exception], how_to_fix: typing.Optional[str]=None) -> None:
+        """Print the error.
+
+        Parameters
+        ----------
+        error : str or Exception
+            The error to show
+        how_to_fix : str, optional
+            A text that helps the user to interpret and avoid this error,
+            default: None
+        """
+        if isinstance(error, Exception):
+            error = "{}: {}".format(error.__class__.__name__, error)
+
+        self.print("Error: {}".format(error))
+
+        if isinstance(how_to_fix, str) and how_to_fix != "":
+            self.print(how_to_fix)
+
+    def print(self, *values: object, sep: typing.Optional[str]=" ",
+              end: typing.Optional[str]="\n",
+              inset: typing.Optional[str]="") -> None:
+        """Print a line to the `stream`.
+
+        Parameters
+        ----------
+        values : str or object
+            The value to print
+        sep : str
+            The separator between two values, default: " "
+        end : str
+            The end character to end a line, default: "\n"
+        inset : str
+            A prefix for the line, default: ""
+        """
+        text = inset + sep.join(map(str, values))
+        log_debug(self._logger, "Printing '{}'".format(text))
+
+        if self.stream is not None:
+            self.stream.write(text + end)
+            self.stream.flush()
+
+    def clear(self) -> None:
+        """Clearing is not supported, nothing is done."""
+        pass
+
+    def _updateRunning(self) -> None:
+        """The progress is written to the log only."""
+        log_debug(self._logger, "Progress is now '{}'/'{}' ({})".format(
+                                self.progress, self.progress_max,
+                                self.progress_model.formatStatus()))
@@ -110,8 +110,82 @@ class Image:
         self.image_data = np.array(image_data, dtype=np.uint8)
         self.tags = tags
         self.tags["recording program"] = PROGRAM_NAME
+        self._pending_tags = []
+        self._save_callbacks = []
         self._logger = get_logger(self)
     
+    def addPendingTags(self, future: "concurrent.futures.Future") -> None:
+        """Add tags that are calculated in the background.
+
+        The `future` has to return a dict. The dict is added to the `tags` 
+        before the image is saved. The saving waits until the `future` is 
+        done.
+
+        Parameters
+        ----------
+        future : concurrent.futures.Future
+            The future that returns the tags dict
+        """
+        self._pending_tags.append(future)
+    
+    def addSaveCallback(self, callback: typing.Callable[["Image", str], None]) -> None:
+        """Add a function that is executed in the save thread after the image
+        is saved.
+
+        The `callback` receives the image and the file path. It is executed
+        even if the saving failed. Errors of the `callback` are logged only.
+
+        Parameters
+        ----------
+        callback : callable
+            The function to execute
+        """
+        self._save_callbacks.append(callback)
+    
+    def resolvePendingTags(self) -> None:
+        """Wait for all tags added by `Image.addPendingTags()` and add them to 
+        the `tags`.
+
+        Errors of the futures are logged only, the tags of the failed future
+        are missing then.
+        """
+        while len(self._pending_tags) > 0:
+            future = self._pending_tags.pop(0)
+            
+            try:
+                tags = future.result()
+            except Exception as e:
+                log_error(self._logger, e)
+                continue
+            
+            if isinstance(tags, dict):
+                self.tags.update(tags)
+    
+    def _resolveAndSave(self, file_type: str, file_path: str) -> None:
+        """Resolve the pending tags, save the image and execute the save 
+        callbacks, this is executed in the save thread.
+
+        Parameters
+        ----------
+        file_type : str
+            The file type, this is the extension that defines the save type in
+            lower case only
+        file_path : str
+            The file path to save the image to (including the extension), 
+            existing files will be silently overwritten
+        """
+        self.resolvePendingTags()
+        try:
+            self._executeSave(file_type, file_path)
+        finally:
+            while len(self._save_callbacks) > 0:
+                callback = self._save_callbacks.pop(0)
+
+                try:
+                    callback(self, file_path)
+                except Exception as e:
+                    log_error(self._logger, e)
+    
     def _executeSave(self, file_type: str, file_path: str) -> None:
         """Execute the save.
 
@@ -216,7 +290,7 @@ class Image:
 
             log_debug(self._logger, "Creating thread for saving image '{}'".format(
                                    file_path))
-            thread = ExceptionThread(target=self._executeSave, 
+            thread = ExceptionThread(target=self._resolveAndSave, 
                                      args=(file_type, file_path),
                                      name="save {}".format(os.path.basename(file_path)))
             log_debug(self._logger, "Starting thread")
@@ -3,9 +3,12 @@ import os
 import copy
 import math
 import time
+import queue
 import typing
 import logging
 import datetime
+import threading
+import collections
 
 import numpy as np
 
@@ -17,9 +20,12 @@ from .events import microscope_ready
 from .events import before_approach
 from .events import before_record
 from .events import after_record
+from .events import after_log_row
 from .events import measurement_ready
 
 from .errors import BlockedFunctionError
+from .errors import PreflightError
+from .errors import DeviceCallTimeoutError
 
 from .image import Image
 from .logginglib import log_info
@@ -28,18 +34,42 @@ from .logginglib import log_error
 from .datatype import Datatype
 from .logginglib import get_logger
 from .log_thread import LogThread
-from .pylolib import expand_vars
+from .timeline import Timeline
+from .pylolib import ExpandVarsTemplate
 from .pylolib import human_concat_list
 from .pylolib import get_expand_vars_text
 from .stop_program import StopProgram
+from .camera_interface import MAIN_CAMERA_ROLE
+from .axis_executor import AxisFuture
+from .call_supervisor import CallSupervisor
+from .progress_model import ProgressModel
+from .preflight import Preflight
+from .preflight import PreflightReport
+from .preflight import PREFLIGHT_MODES
 from .exception_thread import ExceptionThread
 from .measurement_steps import MeasurementSteps
+from .sweep import SweepSteps
+from .sweep import ReadbackPoller
+from .sweep import SWEEP_TAGS_KEY
+from .sweep import DEFAULT_POLL_INTERVAL
+from .sweep import DEFAULT_INCREMENTS_PER_SPACING
+from .adaptive_refinement import AdaptiveSteps
+from .adaptive_refinement import REFINEMENT_TAGS_KEY
+from .adaptive_refinement import DEFAULT_REFINEMENT_DEPTH
+from .adaptive_refinement import DEFAULT_REFINEMENT_BUDGET
+from .adaptive_refinement import DEFAULT_REFINEMENT_THRESHOLD
+from .motion_profile import MotionProfile
+from .motion_profile import create_profiles
+from .motion_profile import DEFAULT_ACCELERATION_FRACTION
 from .measurement_variable import MeasurementVariable
+from .microscope_interface import MicroscopeInterface
 
 # from .config import DEFAULT_SAVE_DIRECTORY
 # from .config import DEFAULT_SAVE_FILE_NAME
 
 CONFIG_MEASUREMENT_GROUP = "measurement"
+CAMERA_TRIGGER_MODES = ("concurrent", "synchronised", "sequential")
+DEVICE_TIMEOUT_POLICIES = ("raise", "skip-step", "emergency")
 
 class Measurement:
     """This class represents one measurement.
@@ -62,6 +92,10 @@ class Measurement:
     camera_safe_after : bool
         Whether to set the camera in its safe mode if the measurememt is 
         finished
+    set_lorentz_mode : bool
+        Whether to set the microscope to the lorentz mode when the measurement
+        starts, this can be disabled if the microscope is known to be in the
+        lorentz mode already, e.g. when measurements are executed back-to-back
     relaxation_time : float
         The relaxation time in seconds to wait after the microscope has reached 
         the measurement variable values after approaching each step
@@ -70,7 +104,37 @@ class Measurement:
         supported are all the extensions provided by the `CameraInterface`),
         placeholders are supported and described in the formatName() function
     current_image : Image
-        The last recorded image object
+        The last recorded image object of the main camera
+    current_images : OrderedDict of Image
+        The last recorded image objects of all cameras, the key is the camera
+        role
+    camera_trigger_mode : str
+        How to trigger the cameras if there are additional cameras, 
+        'concurrent' records with all cameras at the same time, 
+        'synchronised' additionally waits until all cameras are ready before
+        triggering, 'sequential' records with one camera after the other
+    burst_frames : int
+        The number of frames each camera records and averages per step, 1 to 
+        record single images
+    burst_outlier_sigma : float
+        The deviation in standard deviations from which on pixels are rejected
+        when averaging bursts, 0 to disable the rejection
+    sweep_series : dict or None
+        The most inner series if it is swept, then the `steps` contain only 
+        the steps where the sweeps start, None if every step is approached
+    sweep_rate : float
+        The rate in units per second to sweep with, 0 to sweep one 
+        'step-width' of the `sweep_series` per frame of the main camera
+    sweep_poll_interval : float
+        The time in seconds between two readbacks of the swept variable
+    sweep_increments : int
+        The number of values to set while the sweep moves by one 'step-width'
+        of the `sweep_series`, this is limited by the 
+        `MeasurementVariable.min_increment`
+    adaptive_refinement : bool
+        Whether the most inner series is a coarse grid that is refined where
+        the images change, then the `steps` are `AdaptiveSteps` whose length 
+        grows while measuring
     running : bool
         Whether the measurement is running or not, to stop the measurement 
         immediately set this to False
@@ -81,12 +145,26 @@ class Measurement:
         step is -1
     current_step : dict or None
         The current step that is used, if no measurement is running, the 
-        current step is None
-    substep_count : int, read-only
-        The number of sub steps to perform, each step will be divided into 
-        this number of steps to allow "continously" and "parallel" setting of 
-        the measurement variables, note that this is read-only since changing
-        this value does not have any effect
+        current step is None, after approaching the step the values are 
+        replaced by the values read from the microscope
+    target_step : dict or None
+        A copy of the current step as it is defined in the steps, it is not
+        changed by the values read from the microscope, None if no 
+        measurement is running
+    substep_count : int
+        The maximum number of increments each move of a measurement variable 
+        is divided into to allow "continously" and "parallel" setting of the 
+        measurement variables, small moves are divided into less increments
+        depending on the `MeasurementVariable.min_increment`
+    ramp_acceleration_fraction : float
+        The fraction of the ramp time that is used for accelerating and for 
+        decelerating each when moving the measurement variables to the next 
+        step, the ramps take at least as long as the slowest 
+        `MeasurementVariable.max_slew_rate` requires
+    timeline : Timeline
+        The durations of the actions (approaching, recording, event handlers, 
+        ...) of the current or last run, it is saved next to the measurement 
+        log when the measurement ends
         
     Listened Events
     ---------------
@@ -125,8 +203,19 @@ class Measurement:
             self.substep_count = 1
         elif self.substep_count < 1:
             self.substep_count = abs(self.substep_count)
+        
+        self.ramp_acceleration_fraction = controller.configuration.getValue(
+            CONFIG_MEASUREMENT_GROUP, "ramp-acceleration-fraction", 
+            default_value=DEFAULT_ACCELERATION_FRACTION)
+        
+        if (not isinstance(self.ramp_acceleration_fraction, (int, float)) or
+            not 0 <= self.ramp_acceleration_fraction <= 0.5):
+            self.ramp_acceleration_fraction = DEFAULT_ACCELERATION_FRACTION
 
         if isinstance(steps, MeasurementSteps):
+            # transform the whole series once so the names, the previews and 
+            # the time estimations use the real targets
+            self.steps.applyTransformers()
             self.series_start = self.steps.start
             self.series_definition = self.steps.series
         else:
@@ -182,6 +271,10 @@ class Measurement:
                 log_error(self._logger, err)
                 raise err
         
+        self._timeline_path = "{}.timeline.csv".format(
+            os.path.splitext(self._measurement_log_path)[0])
+        self.timeline = Timeline()
+        
         # prepare whether to go in safe mode after the measurement has finished
         try:
             self.microscope_safe_after = self.controller.configuration.getValue(
@@ -227,7 +320,107 @@ class Measurement:
         log_debug(self._logger, ("Setting relaxation time to " + 
                                  "'{}'").format(self.relaxation_time))
 
+        try:
+            self.camera_trigger_mode = self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "camera-trigger-mode")
+        except KeyError:
+            self.camera_trigger_mode = None
+        
+        if self.camera_trigger_mode not in CAMERA_TRIGGER_MODES:
+            self.camera_trigger_mode = CAMERA_TRIGGER_MODES[0]
+
+        try:
+            self.burst_frames = max(1, int(self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "burst-frames")))
+        except (KeyError, TypeError, ValueError):
+            self.burst_frames = 1
+        
+        try:
+            self.burst_outlier_sigma = max(0, float(
+                self.controller.configuration.getValue(
+                    CONFIG_MEASUREMENT_GROUP, "burst-outlier-sigma")))
+        except (KeyError, TypeError, ValueError):
+            self.burst_outlier_sigma = 0
+        
+        try:
+            self.device_timeout_policy = self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "device-timeout-policy")
+        except KeyError:
+            self.device_timeout_policy = None
+        
+        if self.device_timeout_policy not in DEVICE_TIMEOUT_POLICIES:
+            self.device_timeout_policy = DEVICE_TIMEOUT_POLICIES[0]
+        
+        try:
+            self.preflight_mode = self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "preflight-check")
+        except KeyError:
+            self.preflight_mode = None
+        
+        if self.preflight_mode not in PREFLIGHT_MODES:
+            self.preflight_mode = PREFLIGHT_MODES[0]
+        self.preflight_report = None
+        
+        try:
+            sweep = self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "sweep")
+        except KeyError:
+            sweep = False
+        
+        self.sweep_series = None
+        if sweep == True:
+            if isinstance(self.steps, MeasurementSteps):
+                self.steps = SweepSteps(self.steps)
+                self.sweep_series = self.steps.sweep_series
+                log_debug(self._logger, "Sweeping series '{}'".format(
+                                        self.sweep_series))
+            else:
+                log_debug(self._logger, ("Cannot sweep because the steps " + 
+                                         "are not created from a series"))
+        
+        try:
+            self.sweep_rate = max(0, float(
+                self.controller.configuration.getValue(
+                    CONFIG_MEASUREMENT_GROUP, "sweep-rate")))
+        except (KeyError, TypeError, ValueError):
+            self.sweep_rate = 0
+        
+        try:
+            refine = self.controller.configuration.getValue(
+                CONFIG_MEASUREMENT_GROUP, "adaptive-refinement")
+        except KeyError:
+            refine = False
+        
+        self.adaptive_refinement = False
+        if refine == True:
+            if (isinstance(self.steps, MeasurementSteps) and 
+                self.sweep_series is None):
+                self.steps = AdaptiveSteps(self.steps, 
+                    *self._getRefinementSettings())
+                self.adaptive_refinement = True
+                log_debug(self._logger, ("Refining series '{}' adaptively " + 
+                                         "with threshold '{}', budget '{}' " + 
+                                         "and minimum step width '{}'").format(
+                                         self.steps.refine_series, 
+                                         self.steps.threshold, 
+                                         self.steps.budget, 
+                                         self.steps.min_step_width))
+            else:
+                log_debug(self._logger, ("Cannot refine adaptively because " + 
+                                         "the steps are not created from a " + 
+                                         "series or the series is swept"))
+        
+        self.sweep_poll_interval = DEFAULT_POLL_INTERVAL
+        self.sweep_increments = DEFAULT_INCREMENTS_PER_SPACING
+        self._sweep_frame_counter = 0
+
+        # the compiled `expand_vars()` templates, the text and the camera as
+        # the key
+        self._templates = {}
+
+        self.set_lorentz_mode = True
         self.current_image = None
+        self.current_images = collections.OrderedDict()
         self.running = False
         self.finished = False
         self.measurement_logging = True
@@ -242,14 +435,56 @@ class Measurement:
         # the index in the steps that is currently being measured
         self.step_index = -1
         self.current_step = None
+        self.target_step = None
     
-    def formatName(self, name_format: typing.Optional[str]=None) -> str:
+    def _getRefinementSettings(self) -> typing.Tuple[float, int, float]:
+        """Get the settings of the adaptive refinement from the configuration.
+
+        Returns
+        -------
+        float, int, float
+            The threshold, the budget and the minimum step width, the minimum
+            step width is 0 to use the default
+        """
+        settings = []
+        for name, datatype, default in (
+            ("refinement-threshold", float, DEFAULT_REFINEMENT_THRESHOLD),
+            ("refinement-budget", int, DEFAULT_REFINEMENT_BUDGET),
+            ("refinement-min-step-width", float, 0)):
+            try:
+                value = max(0, datatype(self.controller.configuration.getValue(
+                    CONFIG_MEASUREMENT_GROUP, name)))
+            except (KeyError, TypeError, ValueError):
+                value = default
+
+            settings.append(value)
+
+        return tuple(settings)
+
+    def formatName(self, name_format: typing.Optional[str]=None, 
+                   camera: typing.Optional[str]=MAIN_CAMERA_ROLE,
+                   step: typing.Optional[dict]=None, 
+                   counter: typing.Optional[int]=None) -> str:
         """Return the name for the current measurement step
 
+        If the `camera` is not the main camera and the `name_format` does not
+        contain the '{camera}' placeholder, the camera role is appended to the
+        file name (before the extension) so the images of the cameras do not 
+        overwrite each other.
+
         Parameters
         ----------
         name_format : str, optional
             The name to use, if not given the `Measurement.name_format` is used
+        camera : str, optional
+            The role of the camera that recorded the image, 
+            default: `MAIN_CAMERA_ROLE`
+        step : dict, optional
+            The step to format the name for, if not given the 
+            `Measurement.current_step` is used
+        counter : int, optional
+            The counter to format the name with, if not given the 
+            `Measurement.step_index` is used
         
         Returns
         -------
@@ -260,14 +495,53 @@ class Measurement:
         if not isinstance(name_format, str):
             name_format = self.name_format
         
-        name, *_ = expand_vars(name_format, controller=self.controller, 
-                               step=self.current_step, 
-                               start=self.series_start, 
-                               series=self.series_definition, 
-                               tags=self.tags, counter=self.step_index)
+        if not isinstance(step, dict):
+            step = self.current_step
+        
+        if not isinstance(counter, int):
+            counter = self.step_index
+        
+        if camera != MAIN_CAMERA_ROLE and "{camera" not in name_format:
+            root, ext = os.path.splitext(name_format)
+            name_format = "{}-{{camera}}{}".format(root, ext)
+        
+        template = self._getTemplate(name_format, camera=camera)
+        name, *_ = template.render(step=step, tags=self.tags, counter=counter)
         log_debug(self._logger, "Formatting name to '{}'".format(name))
         return name
     
+    def _getTemplate(self, *text: str, 
+                     camera: typing.Optional[str]=None) -> ExpandVarsTemplate:
+        """Get the compiled `expand_vars()` template for the `text`.
+
+        The templates are compiled once per measurement with the series and
+        the start of this measurement.
+
+        Parameters
+        ----------
+        text : str
+            The text to format
+        camera : str, optional
+            The camera role to use in the text, default: None
+        
+        Returns
+        -------
+        ExpandVarsTemplate
+            The compiled template
+        """
+        key = (text, camera)
+
+        if key not in self._templates:
+            kwargs = {}
+            if camera is not None:
+                kwargs["camera"] = camera
+
+            self._templates[key] = ExpandVarsTemplate(*text, 
+                controller=self.controller, start=self.series_start, 
+                series=self.series_definition, **kwargs)
+        
+        return self._templates[key]
+    
     def _setSafe(self, force: typing.Optional[bool]=True, 
                  output: typing.Optional[bool]=False) -> typing.List[ExceptionThread]:
         """Set the microscope and the camera to be in safe state.
@@ -310,21 +584,69 @@ class Measurement:
                 self.controller.view.print("Setting microscope to safe state...")
         
         if force or self.camera_safe_after:
-            thread_name = "reset camera to safe state"
-            log_debug(self._logger, ("Setting microscope to safe state " + 
-                                     "in thread '{}'").format(thread_name))
-            thread = ExceptionThread(
-                target=self.controller.camera.resetToSafeState,
-                name=thread_name
-            )
-            thread.start()
-            reset_threads.append(thread)
+            for role, camera in self.controller.cameras.items():
+                if role == MAIN_CAMERA_ROLE:
+                    thread_name = "reset camera to safe state"
+                else:
+                    thread_name = "reset camera {} to safe state".format(role)
+                
+                log_debug(self._logger, ("Setting camera to safe state " + 
+                                         "in thread '{}'").format(thread_name))
+                thread = ExceptionThread(
+                    target=camera.resetToSafeState,
+                    name=thread_name
+                )
+                thread.start()
+                reset_threads.append(thread)
 
             if output:
                 self.controller.view.print("Setting camera to safe state...")
         
         return reset_threads
     
+    def runPreflight(self) -> typing.Optional[PreflightReport]:
+        """Check whether the storage can take the images of this measurement.
+
+        This is executed before the measurement is started. The report is 
+        shown in the view and saved in the `Measurement.preflight_report`. 
+        If the `Measurement.preflight_mode` is 'block' and the check found 
+        problems, a `PreflightError` is raised.
+
+        Raises
+        ------
+        PreflightError
+            When the check found problems and the mode is 'block'
+
+        Returns
+        -------
+        PreflightReport or None
+            The report, None if the check is switched off
+        """
+
+        if self.preflight_mode == "off":
+            log_debug(self._logger, "Skipping preflight check")
+            return None
+        
+        log_debug(self._logger, "Running preflight check")
+        self.controller.view.print("Checking the storage...")
+        self.preflight_report = Preflight(self).run()
+
+        for line in self.preflight_report.formatText():
+            self.controller.view.print(line, inset="  ")
+        
+        if len(self.preflight_report.errors) > 0:
+            if self.preflight_mode == "block":
+                err = PreflightError(("The measurement cannot be started: " + 
+                                      "{}").format(" ".join(
+                                      self.preflight_report.errors)))
+                log_error(self._logger, err)
+                raise err
+            else:
+                log_info(self._logger, "Ignoring preflight problems '{}'".format(
+                                       self.preflight_report.errors))
+        
+        return self.preflight_report
+    
     def start(self) -> None:
         """Start the measurement.
         
@@ -363,6 +685,24 @@ class Measurement:
         )
 
         self._image_save_threads = []
+        self._sweep_frame_counter = 0
+        self._templates = {}
+        self.timeline = Timeline()
+
+        if isinstance(getattr(self.controller.view, "progress_model", None),
+                      ProgressModel):
+            # the views show the phase averages of this measurement
+            self.controller.view.progress_model.timeline = self.timeline
+
+        if isinstance(self.controller.microscope, MicroscopeInterface):
+            self.controller.microscope.resetValueCacheStatistics()
+            self.controller.microscope.completion_waiter.resetStatistics()
+        
+        for device in (self.controller.microscope, 
+                       *self.controller.cameras.values()):
+            if isinstance(getattr(device, "call_supervisor", None), CallSupervisor):
+                device.call_supervisor.loadConfiguration(
+                    self.controller.configuration, device.config_group_name)
 
         if self.measurement_logging:
             log_debug(self._logger, "Initializing measurement log")
@@ -373,10 +713,15 @@ class Measurement:
             )
 
         try:
-            log_debug(self._logger, "Setting microscope to lorentz mode")
-            # set to lorentz mode
-            self.controller.view.print("Setting to lorentz mode...")
-            self.controller.microscope.setInLorentzMode(True)
+            if self.set_lorentz_mode:
+                log_debug(self._logger, "Setting microscope to lorentz mode")
+                # set to lorentz mode
+                self.controller.view.print("Setting to lorentz mode...")
+                self.controller.microscope.setInLorentzMode(True)
+            else:
+                log_debug(self._logger, ("Skipping setting the microscope " + 
+                                         "to lorentz mode, it is expected to " + 
+                                         "be in lorentz mode already"))
 
             if not self.running:
                 log_debug(self._logger, ("Stopping measurement because running " + 
@@ -391,10 +736,17 @@ class Measurement:
 
             last_step = None
             for self.step_index, self.current_step in enumerate(self.steps):
+                # the current step is overwritten by the read values
+                self.target_step = copy.deepcopy(self.current_step)
+
                 # start going through steps
                 log_debug(self._logger, "Starting step '{}': '{}'".format(
                                         self.step_index, self.current_step))
 
+                if self.adaptive_refinement:
+                    # the refinement inserts steps while measuring
+                    self.controller.view.progress_max = len(self.steps)
+
                 if not self.running:
                     log_debug(self._logger, ("Stopping measurement because " + 
                                             "running is now '{}'").format(self.running))
@@ -424,97 +776,42 @@ class Measurement:
                 self.controller.view.print("Approaching step {}: {}.".format(
                     self.step_index, step_descr
                 ))
-
-                for i in range(self.substep_count):
-                    # the asynchronous threads to set the values at the micrsocope
-                    measurement_variable_threads = []
-
-                    for variable_name in self.current_step:
-                        if (isinstance(last_step, dict) and
-                            variable_name in last_step):
-                            if (last_step[variable_name] == self.current_step[variable_name] or
-                                (isinstance(last_step[variable_name], float) and
-                                 isinstance(self.current_step[variable_name], float) and
-                                 math.isclose(last_step[variable_name], 
-                                              self.current_step[variable_name]))):
-                                log_debug(self._logger, ("Skipping '{}', the " + 
-                                                         "last value is the " + 
-                                                         "same as the current " + 
-                                                         "one.").format(
-                                                            variable_name))
-                                continue
-                                
-                            approach_value = (last_step[variable_name] + 
-                                              (self.current_step[variable_name] - 
-                                              last_step[variable_name]) / 
-                                              self.substep_count * (i + 1))
-                        else:
-                            approach_value = self.current_step[variable_name]
-                        
-                        log_debug(self._logger, ("Setting variable '{}' of " + 
-                                                 "step to value '{}'").format(
-                                                    variable_name,
-                                                    approach_value))
-                        # set each measurement variable
-                        if not self.running:
-                            log_debug(self._logger, ("Stopping measurement " + 
-                                                     "because running is " + 
-                                                     "now '{}'").format(self.running))
-                            # stop() is called
-                            return
-                        
-                        if self.controller.microscope.supports_parallel_measurement_variable_setting:
-                            # MicroscopeInterface.setMeasurementVariableValue() can
-                            # set parallel
-                            log_debug(self._logger, ("Microscope can set variables " + 
-                                                    "parallely, creating new " + 
-                                                    "thread for variable"))
-                            thread = ExceptionThread(
-                                target=self.controller.microscope.setMeasurementVariableValue,
-                                args=(variable_name, approach_value),
-                                name="microscope variable {} in step {}".format(
-                                    variable_name, self.step_index
-                                )
-                            )
-                            log_debug(self._logger, "Starting variable setting " + 
-                                                "thread")
-                            thread.start()
-                            measurement_variable_threads.append(thread)
-                        else:
-                            # set measurement variables sequential
-                            self.controller.microscope.setMeasurementVariableValue(
-                                variable_name, approach_value)
+                approach_start = time.time()
+
+                if isinstance(last_step, dict):
+                    # ramp all changed variables from the last step, half of
+                    # the relaxation time is spent while ramping
+                    profiles = create_profiles(self._getMeasurementVariables(),
+                        last_step, self.current_step, self.substep_count,
+                        self.relaxation_time / 2, 
+                        self.ramp_acceleration_fraction)
+                    ramped = [p.variable_id for p in profiles]
+                else:
+                    profiles = []
+                    ramped = []
                 
-                    log_debug(self._logger, ("Waiting for '{}' variable setting " + 
-                                            "threads").format(len(measurement_variable_threads)))
-                    # Wait for all measurement variable threads to finish
-                    for thread in measurement_variable_threads:
-                        thread.join()
-                    
-                    if not isinstance(last_step, dict):
-                        break
-                        
-                    if (isinstance(self.relaxation_time, (int, float)) and 
-                        self.relaxation_time > 0):
-                        wait_time = self.relaxation_time / 2 / self.substep_count
-                        text = ("Waiting relaxation time of '{}'/2/'{}'='{}' " + 
-                                "seconds").format(self.relaxation_time, 
-                                                  self.substep_count, 
-                                                  wait_time)
-                        log_info(self._logger, text)
-                        self.controller.view.print(text)
-                        start_time = time.time()
-
-                        while time.time() - start_time < wait_time:
-                            # allow calling stop() function while waiting
-                            time.sleep(0.01)
-
-                            if not self.running:
-                                # stop() is called
-                                return
-                        
-                        log_debug(self._logger, ("Continuing with measurement at " + 
-                                                 "time '{:%Y-%m-%d %H:%M:%S,%f}'").format(datetime.datetime.now()))
+                # set variables without a previous value directly
+                for variable_name, value in self.current_step.items():
+                    if (variable_name not in ramped and 
+                        (not isinstance(last_step, dict) or 
+                         variable_name not in last_step)):
+                        profiles.append(MotionProfile(variable_name, None, 
+                                                      value, [value], [0]))
+                
+                try:
+                    measurement_variable_threads = self._executeProfiles(profiles)
+                except DeviceCallTimeoutError as e:
+                    self._handleDeviceCallTimeout(e)
+                    # the microscope state is unknown, set all values directly
+                    self.controller.view.progress = self.step_index + 1
+                    last_step = None
+                    continue
+
+                if not self.running:
+                    log_debug(self._logger, ("Stopping measurement because " + 
+                                            "running is now '{}'").format(self.running))
+                    # stop() is called
+                    return
         
                 if (isinstance(self.relaxation_time, (int, float)) and 
                     self.relaxation_time > 0):
@@ -534,28 +831,40 @@ class Measurement:
                     log_debug(self._logger, ("Continuing with measurement at " + 
                                              "time '{:%Y-%m-%d %H:%M:%S,%f}'").format(datetime.datetime.now()))
                 
+                self.timeline.addEntry("approach", approach_start, 
+                                       time.time() - approach_start, 
+                                       step=self.step_index)
+                
                 log_debug(self._logger, "Receiving values from microscope and " + 
                                         "writing it to the current_step")
-                # get the actual values
-                for variable_name in self.current_step:
-                    self.current_step[variable_name] = (
-                        self.controller.microscope.getMeasurementVariableValue(variable_name)
-                    )
-                
-                log_debug(self._logger, "Got values '{}' from microscope".format(
-                                        self.current_step))
-                
-                # check all thread exceptions
-                self.raiseThreadErrors(*measurement_variable_threads)
+                try:
+                    # get the actual values
+                    with self.timeline.measure("readback", step=self.step_index):
+                        for variable_name in self.current_step:
+                            self.current_step[variable_name] = (
+                                self.controller.microscope.getMeasurementVariableValue(variable_name)
+                            )
+                    
+                    log_debug(self._logger, "Got values '{}' from microscope".format(
+                                            self.current_step))
+                    
+                    # check all thread exceptions
+                    self.raiseThreadErrors(*measurement_variable_threads)
+                except DeviceCallTimeoutError as e:
+                    self._handleDeviceCallTimeout(e)
+                    # the microscope state is unknown, set all values directly
+                    self.controller.view.progress = self.step_index + 1
+                    last_step = None
+                    continue
                 
                 info = "{{varname[{v}]}}: {{humanstep[{v}]}} {{varunit[{v}]}}"
                 info = human_concat_list(map(lambda v: info.format(v=v),
                                              self.current_step.keys()), 
                                              surround="", word=" and ")
-                info, *_ = expand_vars(("Reached point {counter} with values " + 
-                                        info), controller=self.controller, 
-                                        step=self.current_step, 
-                                        counter=self.step_index)
+                template = self._getTemplate("Reached point {counter} with " + 
+                                             "values " + info)
+                info, *_ = template.render(step=self.current_step, 
+                                           counter=self.step_index)
                 log_info(self._logger, info)
                 self.controller.view.print("Done.", inset="  ")
                 
@@ -568,18 +877,41 @@ class Measurement:
                                              "running is now '{}'").format(self.running))
                     # stop() is called
                     return
+                
+                if self.sweep_series is not None:
+                    # record while moving to the end of the sweep
+                    self._sweep()
+                    
+                    if not self.running:
+                        log_debug(self._logger, ("Stopping measurement " + 
+                                                 "because running is now " + 
+                                                 "'{}'").format(self.running))
+                        # stop() is called
+                        return
+                    
+                    self.raiseThreadErrors()
+                    self._collectEventTimings()
+                    self.controller.view.progress = self.step_index + 1
+                    last_step = copy.deepcopy(self.current_step)
+                    continue
 
                 log_debug(self._logger, "Recording image")
                 
                 self.controller.view.print("Recording image...", inset="  ")
                 # record measurement, add the real values to the image
-                self.current_image = self.controller.camera.recordImage(
-                    self.createTagsDict(self.current_step), 
-                    step=self.current_step, 
-                    series=self.series_definition, start=self.series_start, 
-                    counter=self.step_index)
+                try:
+                    with self.timeline.measure("record", step=self.step_index):
+                        self.current_images = self._recordImages()
+                except DeviceCallTimeoutError as e:
+                    self._handleDeviceCallTimeout(e)
+                    self.controller.view.progress = self.step_index + 1
+                    last_step = copy.deepcopy(self.current_step)
+                    continue
                 
-                name = self.formatName()
+                self.current_image = self.current_images[MAIN_CAMERA_ROLE]
+                names = collections.OrderedDict(
+                    (role, self.formatName(camera=role)) 
+                    for role in self.current_images.keys())
                 
                 if not self.running:
                     log_debug(self._logger, ("Stopping measurement because " + 
@@ -589,9 +921,10 @@ class Measurement:
                 
                 if self.measurement_logging:
                     # add the real values to the log
-                    self.addToMeasurementLog(self.current_step, 
-                                             "Recording image", name, 
-                                             datetime.datetime.now().isoformat())
+                    for name in names.values():
+                        self.addToMeasurementLog(self.current_step, 
+                                                 "Recording image", name, 
+                                                 datetime.datetime.now().isoformat())
                 
                 if not self.running:
                     log_debug(self._logger, ("Stopping measurement because " + 
@@ -608,30 +941,45 @@ class Measurement:
                                             "running is now '{}'").format(self.running))
                     # stop() is called, maybe by after_record() event handler
                     return
+
+                if self.adaptive_refinement:
+                    # the (maybe re-acquired) image decides which intervals
+                    # are refined
+                    with self.timeline.measure("refine", step=self.step_index):
+                        self.steps.addImage(self.current_image)
+                    
+                    for image in self.current_images.values():
+                        if not isinstance(image.tags, dict):
+                            image.tags = {}
+                        image.tags[REFINEMENT_TAGS_KEY] = self.steps.getTags()
                 
-                log_debug(self._logger, ("Starting image save thread for " +
-                                        "image '{}'").format(name))
-                
-                # save the image parallel to working on, saveTo() funciton
-                # returns a running thread
-                thread = self.current_image.saveTo(
-                    os.path.join(self.save_dir, name), overwrite=True, 
-                    create_directories=True
-                )
-                self._image_save_threads.append(thread)
-                self.controller.view.print("Saving image as {}...".format(name), 
-                                           inset="  ")
+                for role, image in self.current_images.items():
+                    name = names[role]
+                    log_debug(self._logger, ("Starting image save thread for " +
+                                            "image '{}'").format(name))
+                    
+                    # save the image parallel to working on, saveTo() funciton
+                    # returns a running thread
+                    thread = image.saveTo(
+                        os.path.join(self.save_dir, name), overwrite=True, 
+                        create_directories=True
+                    )
+                    self._image_save_threads.append(thread)
+                    self.controller.view.print("Saving image as {}...".format(name), 
+                                               inset="  ")
 
                 # check all thread exceptions
                 self.raiseThreadErrors()
 
                 log_debug(self._logger, "Increasing progress to '{}'".format(self.step_index + 1))
                 
+                self._collectEventTimings()
                 self.controller.view.progress = self.step_index + 1
                 last_step = copy.deepcopy(self.current_step)
 
             self.step_index = -1
             self.current_step = None
+            self.target_step = None
             log_debug(self._logger, "Done with all steps")
             
             self.controller.view.print("Done with measurement.")
@@ -641,6 +989,12 @@ class Measurement:
             # for the save threads to finish
             reset_threads = self._setSafe(False, True)
 
+            # the pending tags of the images may add rows to the log (e.g. the
+            # drift correction), wait for the images before stopping the log
+            for thread in self._image_save_threads:
+                if isinstance(thread, threading.Thread):
+                    thread.join()
+
             # stop log thread
             if isinstance(self._measurement_log_thread, LogThread):
                 self._measurement_log_thread.finishAndStop()
@@ -671,6 +1025,10 @@ class Measurement:
 
             log_debug(self._logger, "Firing 'measurement_ready' event")
             measurement_ready(self.controller)
+
+            self._collectEventTimings()
+            self._collectMicroscopeStatistics()
+            self._saveTimeline()
         except StopProgram as e:
             log_debug(self._logger, "Stopping program", exc_info=e)
             self.stop()
@@ -717,6 +1075,16 @@ class Measurement:
         log_debug(self._logger, "Stopping measurement")
         
         self.running = False
+
+        if isinstance(self.controller.microscope, MicroscopeInterface):
+            try:
+                # do not approach the next values after stopping
+                self.controller.microscope.cancelPendingSettings()
+            except BlockedFunctionError as e:
+                # the microscope is in the emergency state, nothing is 
+                # approached anymore
+                log_error(self._logger, e, logging.DEBUG)
+        
         reset_threads = self._setSafe(False, True)
 
         if isinstance(self._measurement_log_thread, LogThread):
@@ -727,6 +1095,10 @@ class Measurement:
         for thread in reset_threads:
             thread.join()
         
+        self._collectEventTimings()
+        self._collectMicroscopeStatistics()
+        self._saveTimeline()
+
         # raise error if there occurred some
         self.raiseThreadErrors(*reset_threads)
 
@@ -734,6 +1106,201 @@ class Measurement:
         log_debug(self._logger, "Firing 'after_stop' event")
         after_stop(self.controller)
     
+    def _collectEventTimings(self) -> None:
+        """Move the recorded handler timings of the measurement events to the
+        `Measurement.timeline`.
+
+        Handlers that are executed in the event worker pool are added to the 
+        step that is active when they are collected.
+        """
+
+        step = self.step_index if self.step_index >= 0 else None
+        for name, event in (("microscope_ready", microscope_ready), 
+                            ("before_approach", before_approach),
+                            ("before_record", before_record),
+                            ("after_record", after_record),
+                            ("after_log_row", after_log_row),
+                            ("measurement_ready", measurement_ready)):
+            for timing in event.popTimings():
+                details = {"blocking": timing.blocking}
+                if timing.error is not None:
+                    details["error"] = "{}: {}".format(
+                        timing.error.__class__.__name__, timing.error)
+                
+                self.timeline.addEntry("event", timing.start, timing.duration,
+                                       name="{}:{}".format(name, timing.key),
+                                       step=step, **details)
+    
+    def _collectMicroscopeStatistics(self) -> None:
+        """Log the statistics of the value cache and of the waits of the 
+        microscope and add them to the `Measurement.timeline` with the phases
+        "value-cache" and "variable-wait"."""
+
+        if not isinstance(self.controller.microscope, MicroscopeInterface):
+            return
+        
+        try:
+            cache_statistics = self.controller.microscope.getValueCacheStatistics()
+        except BlockedFunctionError as e:
+            # the microscope is in the emergency state
+            log_error(self._logger, e, logging.DEBUG)
+            return
+        
+        now = time.time()
+        for id_, statistics in cache_statistics.items():
+            log_info(self._logger, ("Value cache of '{}': '{}' hits, '{}' " + 
+                                    "misses, '{}' forced reads, '{}' " + 
+                                    "invalidations").format(id_, 
+                                    statistics["hits"], statistics["misses"],
+                                    statistics["forced"], 
+                                    statistics["invalidations"]))
+            self.timeline.addEntry("value-cache", now, 0, name=id_, 
+                                   **statistics)
+        
+        for id_, statistics in self.controller.microscope.completion_waiter.getStatistics().items():
+            log_info(self._logger, ("Waited '{}' times for '{}' in '{:.3f}' " + 
+                                    "seconds (max '{:.3f}' seconds), '{}' " + 
+                                    "checks, '{}' timeouts").format(
+                                    statistics["waits"], id_, 
+                                    statistics["total-time"], 
+                                    statistics["max-time"], 
+                                    statistics["checks"], 
+                                    statistics["timeouts"]))
+            self.timeline.addEntry("variable-wait", now, 
+                                   statistics["total-time"], name=id_, 
+                                   **statistics)
+    
+    def _saveTimeline(self) -> None:
+        """Save the `Measurement.timeline` next to the measurement log.
+
+        Errors while saving are logged only, they never stop the measurement.
+        """
+
+        if not self.measurement_logging:
+            return
+
+        try:
+            self.timeline.saveTo(self._timeline_path)
+        except OSError as e:
+            log_error(self._logger, e)
+
+    def _getMeasurementVariables(self) -> typing.Dict[str, MeasurementVariable]:
+        """Get the measurement variables of the microscope.
+
+        Returns
+        -------
+        dict
+            The measurement variables with their id as the key
+        """
+        return {v.unique_id: v for v in 
+                self.controller.microscope.supported_measurement_variables}
+    
+    def _sleepWhileRunning(self, duration: float) -> bool:
+        """Sleep the `duration` but stop sleeping if the measurement is 
+        stopped.
+
+        Parameters
+        ----------
+        duration : float
+            The time to sleep in seconds
+
+        Returns
+        -------
+        bool
+            Whether the measurement is still running
+        """
+        end_time = time.time() + duration
+        while self.running and time.time() < end_time:
+            time.sleep(min(0.01, max(0, end_time - time.time())))
+        
+        return self.running
+    
+    def _runProfile(self, profile: MotionProfile) -> None:
+        """Set all values of the `profile` one after another, each value is set
+        when its interval since the previous value has passed.
+
+        Parameters
+        ----------
+        profile : MotionProfile
+            The profile to run
+        """
+        due_time = time.time()
+        for value, interval in zip(profile.values, profile.intervals):
+            # wait for the absolute time so the time for setting the values 
+            # does not add up
+            due_time += interval
+            if not self._sleepWhileRunning(due_time - time.time()):
+                return
+            
+            log_debug(self._logger, ("Setting variable '{}' of step to value " + 
+                                     "'{}'").format(profile.variable_id, value))
+            self.controller.microscope.setMeasurementVariableValue(
+                profile.variable_id, value)
+    
+    def _executeProfiles(self, profiles: typing.Sequence[MotionProfile]) -> typing.List[AxisFuture]:
+        """Run all the `profiles` concurrently.
+
+        If the microscope supports parallel setting, each profile is run in 
+        the worker of the axis of its variable. Otherwise the values of all 
+        profiles are set one after another from this thread, the next value 
+        that is due is set first.
+
+        Parameters
+        ----------
+        profiles : sequence of MotionProfile
+            The profiles to run
+
+        Returns
+        -------
+        list of AxisFuture
+            The futures of the profiles, they are finished already, the list 
+            is empty if the profiles are set sequentially
+        """
+        microscope = self.controller.microscope
+        log_debug(self._logger, "Running motion profiles '{}'".format(profiles))
+
+        if microscope.supports_parallel_measurement_variable_setting:
+            # MicroscopeInterface.setMeasurementVariableValue() can set 
+            # parallel, use the long-lived workers of the microscope
+            futures = []
+            for profile in profiles:
+                futures.append(microscope.executor.submit(
+                    microscope.getMeasurementVariableAxis(profile.variable_id),
+                    self._runProfile, profile, 
+                    name="ramp {}".format(profile.variable_id)))
+            
+            log_debug(self._logger, ("Waiting for '{}' variable setting " + 
+                                     "ramps").format(len(futures)))
+            for future in futures:
+                future.join()
+            
+            return futures
+        
+        # set measurement variables sequential, interleave the profiles by 
+        # the time their next value is due
+        start_time = time.time()
+        due = [(start_time + profile.intervals[0], i, 0) 
+               for i, profile in enumerate(profiles) if len(profile) > 0]
+        while len(due) > 0 and self.running:
+            due.sort()
+            due_time, i, index = due.pop(0)
+            profile = profiles[i]
+
+            if not self._sleepWhileRunning(due_time - time.time()):
+                break
+            
+            log_debug(self._logger, ("Setting variable '{}' of step to value " + 
+                                     "'{}'").format(profile.variable_id,
+                                                    profile.values[index]))
+            microscope.setMeasurementVariableValue(profile.variable_id, 
+                                                   profile.values[index])
+            
+            if index + 1 < len(profile):
+                due.append((due_time + profile.intervals[index + 1], i, 
+                            index + 1))
+        
+        return []
+
     def raiseThreadErrors(self, *additional_threads: "ExceptionThread") -> None:
         """Check all thread collections of this class plus the 
         `additional_threads` if they contain exceptions and if so, raise them.
@@ -745,18 +1312,423 @@ class Measurement:
 
         Paramteres
         ----------
-        additional_threads : ExceptionThread
+        additional_threads : ExceptionThread or AxisFuture
             Additional threads to check
         """
 
         for thread in (*self._image_save_threads, self._measurement_log_thread, *additional_threads):
-            if (isinstance(thread, ExceptionThread) and len(thread.exceptions) > 0):
+            if (isinstance(thread, (ExceptionThread, AxisFuture)) and 
+                len(thread.exceptions) > 0):
                 for error in thread.exceptions:
                     log_error(self._logger, error)
 
                     if not isinstance(error, BlockedFunctionError):
                         raise error
     
+    def _handleDeviceCallTimeout(self, error: DeviceCallTimeoutError) -> None:
+        """Handle a device call of the current step that did not finish within
+        its deadline.
+
+        The action is the `DeviceCallTimeoutError.action` that the policy of 
+        the `CallSupervisor` decided for or the 
+        `Measurement.device_timeout_policy` if the policy did not decide. For
+        "skip-step" the error is logged and the function returns, the caller
+        skips the step then. For "emergency" the emergency event is fired and
+        the error is raised, otherwise the error is raised.
+
+        Raises
+        ------
+        DeviceCallTimeoutError
+            The `error` if the step is not skipped
+
+        Parameters
+        ----------
+        error : DeviceCallTimeoutError
+            The error
+        """
+
+        if error.action in DEVICE_TIMEOUT_POLICIES:
+            action = error.action
+        else:
+            action = self.device_timeout_policy
+        
+        self.timeline.addEntry("device-timeout", time.time() - error.elapsed, 
+                               error.elapsed, name=error.name, 
+                               step=self.step_index, action=action)
+
+        if action == "skip-step":
+            log_error(self._logger, error, logging.WARNING)
+            self.controller.view.print("Skipping step {}: {}".format(
+                                       self.step_index, error), inset="  ")
+
+            if isinstance(self.controller.microscope, MicroscopeInterface):
+                # do not set the remaining values of the skipped step
+                self.controller.microscope.cancelPendingSettings()
+
+            if self.measurement_logging:
+                self.addToMeasurementLog(self.current_step, "Skipping step",
+                                         "", datetime.datetime.now().isoformat())
+            return
+        
+        log_error(self._logger, error)
+        if action == "emergency":
+            log_debug(self._logger, "Firing 'emergency' event because of the " + 
+                                    "device timeout")
+            emergency(self.controller)
+        
+        raise error
+    
+    def reacquireImages(self, reason: typing.Optional[str]="") -> typing.Dict[str, Image]:
+        """Record the images of the current step again and replace the
+        `Measurement.current_images`.
+
+        This is intended to be called by the 'after_record' event handlers,
+        e.g. if the images are not usable. The handlers that are executed
+        after the calling handler receive the new images.
+
+        Parameters
+        ----------
+        reason : str, optional
+            Why the images are recorded again, this is added to the
+            measurement log and the timeline, default: ""
+
+        Returns
+        -------
+        OrderedDict of Image
+            The new images, the key is the camera role
+        """
+        log_info(self._logger, "Re-acquiring step '{}': {}".format(
+                               self.step_index, reason))
+        self.controller.view.print("Re-acquiring image...", inset="  ")
+
+        with self.timeline.measure("record", name="reacquire",
+                                   step=self.step_index, reason=reason):
+            self.current_images = self._recordImages()
+        self.current_image = self.current_images[MAIN_CAMERA_ROLE]
+
+        if self.measurement_logging:
+            for role in self.current_images.keys():
+                self.addToMeasurementLog(self.current_step,
+                                         "Re-acquiring image ({})".format(reason),
+                                         self.formatName(camera=role),
+                                         datetime.datetime.now().isoformat())
+
+        return self.current_images
+
+    def _recordImages(self) -> typing.Dict[str, Image]:
+        """Record the images of all cameras for the current step.
+
+        If there is only the main camera, the tags are created while the 
+        camera is acquiring. If there are additional cameras, each camera 
+        records in its own `ExceptionThread` depending on the 
+        `Measurement.camera_trigger_mode`.
+        Errors of additional cameras are logged and shown only, their image is
+        missing then. Errors of the main camera are raised.
+
+        Raises
+        ------
+        Exception
+            Any error the main camera raises while recording
+
+        Returns
+        -------
+        OrderedDict of Image
+            The recorded images, the key is the camera role
+        """
+
+        kwargs = {"step": self.current_step, "series": self.series_definition,
+                  "start": self.series_start, "counter": self.step_index}
+        cameras = self.controller.cameras
+
+        if len(cameras) <= 1 and self.burst_frames <= 1:
+            # create the tags while the camera is exposing
+            camera = self.controller.camera
+            handle = camera.startAcquisition(**kwargs)
+            tags = self.createTagsDict(self.current_step)
+            return collections.OrderedDict((
+                (MAIN_CAMERA_ROLE, camera.collect(handle, tags)), 
+            ))
+        
+        tags = self.createTagsDict(self.current_step)
+
+        if len(cameras) <= 1:
+            return collections.OrderedDict((
+                (MAIN_CAMERA_ROLE, 
+                 self._recordWith(self.controller.camera, tags, kwargs)), 
+            ))
+        
+        log_debug(self._logger, "Recording with cameras '{}' in mode '{}'".format(
+                                list(cameras.keys()), self.camera_trigger_mode))
+        
+        if self.camera_trigger_mode == "synchronised":
+            barrier = threading.Barrier(len(cameras))
+        else:
+            barrier = None
+
+        images = {}
+        threads = collections.OrderedDict()
+        for role, camera in cameras.items():
+            camera_tags = copy.deepcopy(tags)
+            camera_tags["Camera role"] = role
+
+            thread = ExceptionThread(
+                target=self._recordCameraImage, 
+                args=(role, camera, camera_tags, kwargs, images, barrier),
+                name="record {}".format(role)
+            )
+            threads[role] = thread
+            thread.start()
+
+            if self.camera_trigger_mode == "sequential":
+                thread.join()
+        
+        for thread in threads.values():
+            thread.join()
+        
+        for role, thread in threads.items():
+            for error in thread.exceptions:
+                if role == MAIN_CAMERA_ROLE:
+                    log_error(self._logger, error)
+                    raise error
+                
+                log_error(self._logger, error, logging.WARNING)
+                self.controller.view.print(("Camera '{}' could not record " + 
+                                            "the image: {}").format(role, error),
+                                           inset="  ")
+        
+        return collections.OrderedDict((role, images[role]) for role in threads 
+                                       if role in images)
+    
+    def _recordCameraImage(self, role: str, camera: "CameraInterface", 
+                           tags: dict, kwargs: dict, images: dict, 
+                           barrier: typing.Optional[threading.Barrier]) -> None:
+        """Record the image of one camera, this is executed in the camera 
+        thread.
+
+        Parameters
+        ----------
+        role : str
+            The role of the camera
+        camera : CameraInterface
+            The camera
+        tags : dict
+            The tags to pass to the camera
+        kwargs : dict
+            The keyword arguments to pass to the camera
+        images : dict
+            The dict to add the image to with the `role` as the key
+        barrier : threading.Barrier or None
+            The barrier to wait for before recording to synchronise the 
+            cameras
+        """
+
+        if barrier is not None:
+            barrier.wait()
+        
+        with self.timeline.measure("camera", name=role, step=self.step_index):
+            images[role] = self._recordWith(camera, tags, kwargs)
+    
+    def _recordWith(self, camera: "CameraInterface", tags: dict, 
+                    kwargs: dict) -> Image:
+        """Record one image with the `camera`, if `Measurement.burst_frames` 
+        is greater than one, a burst is recorded and averaged.
+
+        Parameters
+        ----------
+        camera : CameraInterface
+            The camera
+        tags : dict
+            The tags to pass to the camera
+        kwargs : dict
+            The keyword arguments to pass to the camera
+        
+        Returns
+        -------
+        Image
+            The recorded image
+        """
+
+        if self.burst_frames > 1:
+            return camera.recordBurst(self.burst_frames, tags, 
+                                      outlier_sigma=self.burst_outlier_sigma,
+                                      **kwargs)
+        else:
+            return camera.collect(camera.startAcquisition(**kwargs), tags)
+
+    def _sweep(self) -> None:
+        """Ramp the variable of the `Measurement.sweep_series` from the 
+        current step to the end of the sweep while the main camera records 
+        frames as fast as possible.
+
+        The value of the swept variable is read in a `ReadbackPoller` thread.
+        Each frame is timestamped with the middle of its recording and saved 
+        with the readback value interpolated at this time by a writer thread
+        while the next frames are recorded.
+
+        If the `Measurement.sweep_rate` is 0, the rate is the 'step-width' of 
+        the sweep divided by the time the first frame takes so the frames are
+        spaced by the 'step-width'. The rate is limited by the 
+        `MeasurementVariable.max_slew_rate`.
+
+        Events are not fired for the single frames. After the sweep the 
+        `Measurement.current_step` contains the last readback of the swept 
+        variable.
+        """
+        microscope = self.controller.microscope
+        camera = self.controller.camera
+        id_ = self.sweep_series["variable"]
+        start_value = self.current_step[id_]
+        end_value = self.sweep_series["end"]
+        spacing = abs(self.sweep_series["step-width"])
+        distance = abs(end_value - start_value)
+        variable = self._getMeasurementVariables().get(id_, None)
+
+        kwargs = {"step": self.current_step, "series": self.series_definition,
+                  "start": self.series_start, "counter": self.step_index}
+        frames = queue.Queue()
+        poller = ReadbackPoller(microscope, id_, self.sweep_poll_interval)
+        writer = ExceptionThread(target=self._writeSweepFrames, 
+                                 args=(frames, poller, 
+                                       copy.deepcopy(self.current_step)),
+                                 name="write sweep frames")
+        ramp = None
+
+        self.controller.view.print("Sweeping from {} to {}...".format(
+            start_value, end_value), inset="  ")
+        
+        with self.timeline.measure("sweep", name=id_, 
+                                   step=self.step_index) as details:
+            poller.start()
+            writer.start()
+            try:
+                duration = self._recordSweepFrame(camera, frames, kwargs)
+                count = 1
+
+                if self.sweep_rate > 0:
+                    rate = self.sweep_rate
+                else:
+                    rate = spacing / max(duration, 1e-6)
+                
+                max_slew_rate = getattr(variable, "max_slew_rate", None)
+                if (isinstance(max_slew_rate, (int, float)) and 
+                    max_slew_rate > 0):
+                    rate = min(rate, max_slew_rate)
+                
+                log_debug(self._logger, ("Sweeping '{}' from '{}' to '{}' " + 
+                                         "with '{}' per second").format(id_, 
+                                         start_value, end_value, rate))
+                
+                # a linear ramp that is as continuous as the variable allows
+                profiles = create_profiles(
+                    {id_: variable} if variable is not None else {}, 
+                    {id_: start_value}, {id_: end_value}, 
+                    max(1, math.ceil(distance / spacing * self.sweep_increments)),
+                    distance / rate, 0)
+                ramp = ExceptionThread(target=self._executeProfiles, 
+                                       args=(profiles, ), 
+                                       name="sweep {}".format(id_))
+                ramp.start()
+
+                while self.running and ramp.is_alive():
+                    self._recordSweepFrame(camera, frames, kwargs)
+                    count += 1
+                
+                ramp.join()
+
+                if self.running:
+                    # the frame at the end of the sweep
+                    self._recordSweepFrame(camera, frames, kwargs)
+                    count += 1
+            finally:
+                frames.put(None)
+                poller.stop()
+                writer.join()
+            
+            details["frames"] = count
+            details["rate"] = rate
+
+        self.raiseThreadErrors(ramp, writer, poller.thread)
+        self.current_step[id_] = poller.values[-1]
+        log_info(self._logger, ("Recorded '{}' frames while sweeping '{}' " + 
+                                "from '{}' to '{}'").format(count, id_, 
+                                start_value, self.current_step[id_]))
+    
+    def _recordSweepFrame(self, camera: "CameraInterface", 
+                          frames: queue.Queue, kwargs: dict) -> float:
+        """Record one frame of the sweep and put it in the `frames` queue 
+        together with the time in the middle of the recording.
+
+        Parameters
+        ----------
+        camera : CameraInterface
+            The camera
+        frames : queue.Queue
+            The queue of the writer thread
+        kwargs : dict
+            The keyword arguments to pass to the camera
+        
+        Returns
+        -------
+        float
+            The time the recording took in seconds
+        """
+        start = time.time()
+        image = camera.recordImage(None, **kwargs)
+        end = time.time()
+
+        frames.put((image, (start + end) / 2))
+        return end - start
+    
+    def _writeSweepFrames(self, frames: queue.Queue, poller: ReadbackPoller, 
+                          step: dict) -> None:
+        """Pair the frames of the sweep with the interpolated readback values
+        and save them until None is received, this is executed in the writer
+        thread.
+
+        Parameters
+        ----------
+        frames : queue.Queue
+            The queue containing tuples of the image and its timestamp
+        poller : ReadbackPoller
+            The poller that reads the swept variable
+        step : dict
+            The step the sweep started at
+        """
+        index = 0
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            
+            image, timestamp = frame
+            poller.waitFor(timestamp)
+
+            frame_step = copy.deepcopy(step)
+            frame_step[poller.variable_id] = poller.interpolate(timestamp)
+
+            if not isinstance(image.tags, dict):
+                image.tags = {}
+            image.tags.update(self.createTagsDict(frame_step))
+            image.tags[SWEEP_TAGS_KEY] = {
+                "Variable": poller.variable_id,
+                "Frame": index,
+                "Timestamp": timestamp,
+                "Readback": frame_step[poller.variable_id]
+            }
+
+            name = self.formatName(step=frame_step, 
+                                   counter=self._sweep_frame_counter)
+            self._sweep_frame_counter += 1
+            index += 1
+
+            if self.measurement_logging:
+                self.addToMeasurementLog(frame_step, "Recording sweep frame", 
+                    name, datetime.datetime.fromtimestamp(timestamp).isoformat())
+            
+            self._image_save_threads.append(image.saveTo(
+                os.path.join(self.save_dir, name), overwrite=True, 
+                create_directories=True))
+
     def createTagsDict(self, step: dict) -> dict:
         """Get the tags dictionary by the given step.
 
@@ -792,11 +1764,9 @@ class Measurement:
                                    id=var.unique_id))
             beautified_step.append("{{humanstep[{}]}}".format(var.unique_id))
         
-        beautified_step = expand_vars(*beautified_step, 
-                                      controller=self.controller, step=step,
-                                      start=self.series_start, 
-                                      series=self.series_definition,
-                                      tags=self.tags, counter=self.step_index)
+        template = self._getTemplate(*beautified_step)
+        beautified_step = template.render(step=step, tags=self.tags, 
+                                          counter=self.step_index)
         beautified_step = dict(zip(beautified_step[0::2], beautified_step[1::2]))
 
         tags = {
@@ -883,6 +1853,11 @@ class Measurement:
             Additional columns, they will be added before and/or after the 
             variables, depending on the column layout defined in the 
             `Measurement::setupMeasurementLog()` function
+
+        Fired Events
+        ------------
+        after_log_row
+            Fired after the row is added to the log
         """
         cells = []
         variable_ids = [v.unique_id for v in 
@@ -917,6 +1892,9 @@ class Measurement:
         log_debug(self._logger, "Adding cells '{}' to measurement log".format(cells))
         
         self._measurement_log_thread.addToLog(cells)
+
+        log_debug(self._logger, "Firing 'after_log_row' event")
+        after_log_row(self.controller, cells)
     
     @classmethod
     def fromSeries(class_, controller: "Controller", start_conditions: dict, 
@@ -1034,7 +2012,21 @@ class Measurement:
                         "are divided by this number. Then both alternating are " + 
                         "increased or decreased by this small step width " + 
                         "value. This way this emulates continously and " + 
-                        "parallel setting of the measurement values."
+                        "parallel setting of the measurement values. Small " + 
+                        "changes are divided into less steps if the " + 
+                        "measurement variable defines a minimum increment."
+        )
+        
+        # the shape of the ramps between the steps
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "ramp-acceleration-fraction", 
+            datatype=float, 
+            default_value=DEFAULT_ACCELERATION_FRACTION, 
+            description="The fraction of the time of moving to the next " + 
+                        "step that is used for accelerating and for " + 
+                        "decelerating each. The moves are trapezoidal ramps " + 
+                        "that are limited by the maximum slew rate of the " + 
+                        "measurement variables, use 0 for linear ramps."
         )
         
         # add whether to set the microscope to the safe state after the 
@@ -1057,6 +2049,113 @@ class Measurement:
             "after the measurement is finished."
         )
 
+        # add the burst acquisition
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "burst-frames", 
+            datatype=int, 
+            default_value=1, 
+            description="The number of frames to record and average at each " + 
+            "measurement step, use 1 to record single images."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "burst-outlier-sigma", 
+            datatype=float, 
+            default_value=0, 
+            description="Reject pixels (e.g. cosmic rays) that deviate more " + 
+            "than this number of standard deviations from the average when " + 
+            "recording bursts, use 0 to keep all pixels."
+        )
+
+        # add the continuous sweep
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "sweep", 
+            datatype=bool, 
+            default_value=False, 
+            description="Whether to sweep the most inner series continuously " + 
+            "instead of stopping at each step. The main camera records as " + 
+            "fast as possible while the variable is ramped from the start " + 
+            "to the end of the series, each frame is saved with the " + 
+            "interpolated readback of the variable."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "sweep-rate", 
+            datatype=float, 
+            default_value=0, 
+            description="The rate in units per second to sweep with, use 0 " + 
+            "to move one step width of the series per recorded frame."
+        )
+
+        # add the adaptive refinement
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "adaptive-refinement", 
+            datatype=bool, 
+            default_value=False, 
+            description="Whether to use the most inner series as a coarse " + 
+            "grid that is refined where the images change. After the coarse " + 
+            "grid is recorded, points are inserted in the middle of " + 
+            "neighbouring points whose images differ more than the " + 
+            "'refinement-threshold'."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "refinement-threshold", 
+            datatype=float, 
+            default_value=DEFAULT_REFINEMENT_THRESHOLD, 
+            description="The mean absolute difference of two neighbouring " + 
+            "images relative to their mean intensity from on a point is " + 
+            "inserted between them."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "refinement-budget", 
+            datatype=int, 
+            default_value=DEFAULT_REFINEMENT_BUDGET, 
+            description="The maximum number of points that are inserted in " + 
+            "each refined series."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "refinement-min-step-width", 
+            datatype=float, 
+            default_value=0, 
+            description="The minimum distance of two points of the refined " + 
+            "series, use 0 to allow halving the step width of the series " + 
+            "{} times.".format(DEFAULT_REFINEMENT_DEPTH)
+        )
+
+        # add how to trigger multiple cameras
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "camera-trigger-mode", 
+            datatype=Datatype.options(CAMERA_TRIGGER_MODES), 
+            default_value=CAMERA_TRIGGER_MODES[0], 
+            description="How to trigger the cameras if there are additional " + 
+            "cameras. 'concurrent' records with all cameras at the same " + 
+            "time, 'synchronised' waits until all cameras are ready and " + 
+            "then triggers them together, 'sequential' records with one " + 
+            "camera after the other."
+        )
+
+        # add what to do if a device does not respond
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "device-timeout-policy", 
+            datatype=Datatype.options(DEVICE_TIMEOUT_POLICIES), 
+            default_value=DEVICE_TIMEOUT_POLICIES[0], 
+            description="What to do if a device call does not finish within " + 
+            "its deadline (the deadlines are set with the 'set-timeout', " + 
+            "'get-timeout' and 'record-timeout' of the device). 'raise' " + 
+            "stops the measurement, 'skip-step' continues with the next " + 
+            "step, 'emergency' sets all devices to the emergency state."
+        )
+
+        # add whether to check the storage before starting
+        configuration.addConfigurationOption(
+            CONFIG_MEASUREMENT_GROUP, "preflight-check", 
+            datatype=Datatype.options(PREFLIGHT_MODES), 
+            default_value=PREFLIGHT_MODES[0], 
+            description="Whether to check the free space and the write " + 
+            "speed of the save directory before the measurement starts. " + 
+            "'block' does not start the measurement if the images do not " + 
+            "fit or cannot be saved fast enough, 'warn' shows the problems " + 
+            "only, 'off' skips the check."
+        )
+
         # add an entry to the config and ask the user if there is nothing
         # saved
         configuration.addConfigurationOption(
@@ -1076,7 +2175,7 @@ class Measurement:
             default_value=DEFAULT_SAVE_FILE_NAME, 
             ask_if_not_present=True,
             description=("The name format to use to save the recorded " + 
-                         "images. " + get_expand_vars_text())
+                         "images. " + get_expand_vars_text(camera_given=True))
         )
         
         # add the save path for the log
@@ -6,12 +6,17 @@ import functools
 import collections
 import collections.abc
 
+import numpy as np
+
 from .datatype import Datatype
 from .pylolib import parse_value
 from .logginglib import log_debug
 from .logginglib import log_error
 from .logginglib import get_logger
 from .pylolib import get_datatype_human_text
+from .step_transformer import StepTable
+from .step_transformer import StepTransformers
+from .step_transformer import step_transformers
 
 class MeasurementSteps(collections.abc.Sequence):
     """A sequence containing all measurement steps.
@@ -25,6 +30,13 @@ class MeasurementSteps(collections.abc.Sequence):
     series_variables : set
         The variable ids of the variables that are modified at least one time
         when performing all the steps
+    table : StepTable or None
+        The table of the transformed steps or None if the steps are not 
+        transformed
+    transformers : StepTransformers
+        The step transformers that are applied by 
+        `MeasurementSteps.applyTransformers()`, this is a copy of the 
+        `step_transformers` when the steps are created
     """
 
     abs_tol = 1e-10
@@ -103,6 +115,119 @@ class MeasurementSteps(collections.abc.Sequence):
 
         self._cached_len = None
         self._cached_nests = None
+        self.table = None
+        self.transformers = step_transformers.copy()
+    
+    def createTable(self) -> StepTable:
+        """Create the table of all (untransformed) steps.
+
+        The values are calculated with the same formula as 
+        `MeasurementSteps.__getitem__()` uses.
+
+        Returns
+        -------
+        StepTable
+            The table containing a column for each measurement variable
+        """
+        nest_count, commulative_nest_lengths, nest_series = self._getCachedNests()
+        length = len(self)
+        indices = np.arange(length)
+
+        columns = collections.OrderedDict()
+        for id_, value in self.start.items():
+            columns[id_] = np.full(length, value)
+        
+        for i, series in enumerate(nest_series):
+            if i + 1 < nest_count:
+                value_indices = ((indices // commulative_nest_lengths[i + 1]) % 
+                                 (commulative_nest_lengths[i] // 
+                                  commulative_nest_lengths[i + 1]))
+            else:
+                value_indices = indices % commulative_nest_lengths[i]
+            
+            columns[series["variable"]] = (series["start"] + value_indices * 
+                                           series["step-width"])
+        
+        return StepTable(columns)
+    
+    def applyTransformers(self, transformers: typing.Optional[StepTransformers]=None) -> None:
+        """Apply the step transformers to all steps.
+
+        The steps are created as a `StepTable` and transformed once. After 
+        that the steps are taken from the `MeasurementSteps.table`. If there 
+        are no transformers, nothing is changed.
+
+        Raises
+        ------
+        ValueError
+            When a transformed value is not finite or not valid for its 
+            measurement variable, the steps are not changed then
+
+        Parameters
+        ----------
+        transformers : StepTransformers, optional
+            The transformers to apply, if not given the 
+            `MeasurementSteps.transformers` are used, default: None
+        """
+        if transformers is None:
+            transformers = self.transformers
+        
+        if len(transformers) == 0:
+            log_debug(self._logger, "No step transformers registered")
+            return
+        
+        log_debug(self._logger, "Applying step transformers '{}'".format(
+                                ", ".join(transformers.keys())))
+        table = transformers.apply(self.controller, self.createTable())
+        self._checkTable(table)
+        self.table = table
+    
+    def _checkTable(self, table: StepTable) -> None:
+        """Check whether all values of the `table` can be set on the 
+        microscope.
+
+        Raises
+        ------
+        ValueError
+            When a value is not finite or not valid for its measurement 
+            variable
+
+        Parameters
+        ----------
+        table : StepTable
+            The transformed steps
+        """
+        microscope = self.controller.microscope
+
+        for index in range(len(table)):
+            for id_, value in table.getStep(index).items():
+                if ((isinstance(value, float) and not math.isfinite(value)) or 
+                    not microscope.isValidMeasurementVariableValue(id_, value)):
+                    err = ValueError(("The step transformers created the " + 
+                                      "invalid value '{}' for the '{}' in " + 
+                                      "the step {}.").format(value, id_, 
+                                                             index))
+                    log_error(self._logger, err)
+                    raise err
+    
+    def getDerived(self, index: int) -> dict:
+        """Get the derived values of the step at the `index`.
+
+        Parameters
+        ----------
+        index : int
+            The step index
+
+        Returns
+        -------
+        dict
+            The derived column names as the keys and their values, empty if 
+            the steps are not transformed
+        """
+        if self.table is None:
+            return {}
+        else:
+            return self.table.getDerived(index)
     
     @staticmethod
     def formatSeries(measurement_variables: typing.Iterable["MeasurementVariable"], 
@@ -1039,6 +1164,9 @@ class MeasurementSteps(collections.abc.Sequence):
             log_error(self._logger, err)
             raise err
         
+        if self.table is not None:
+            return self.table.getStep(index)
+        
         nest_count, commulative_nest_lengths, nest_series = self._getCachedNests()
         
         # all steps are based on the start, each series value adds on to this 
@@ -1096,6 +1224,10 @@ class MeasurementSteps(collections.abc.Sequence):
             This object
         """
         log_debug(self._logger, "Initializing iteration over measurement steps")
+
+        if self.table is not None:
+            return (self.table.getStep(i) for i in range(len(self.table)))
+
         self._current_step = None
         self._carry = False
         self._r_nest_series = tuple(reversed(tuple(self._getNestSeries())))
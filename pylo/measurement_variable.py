@@ -77,6 +77,13 @@ class MeasurementVariable:
     default_end : float or None
         The default end value when a new series is created as the uncalibrated
         value
+    max_slew_rate : float or None
+        The maximum (uncalibrated) change per second the variable can follow, 
+        this is used to calculate how long a ramp to a new value takes, None 
+        for no limit
+    min_increment : float or None
+        The smallest (uncalibrated) change that is worth setting, ramps to a 
+        new value are not split into smaller increments, None for no limit
     """
 
     def __init__(self, unique_id: str, name: str, 
@@ -90,7 +97,9 @@ class MeasurementVariable:
                  calibrated_name: typing.Optional[str]=None,
                  calibrated_min: typing.Optional[float]=None,
                  calibrated_max: typing.Optional[float]=None,
-                 calibrated_format : typing.Optional[typing.Union[type, "Datatype"]]=float):
+                 calibrated_format : typing.Optional[typing.Union[type, "Datatype"]]=float,
+                 max_slew_rate: typing.Optional[float]=None,
+                 min_increment: typing.Optional[float]=None):
         """Create a MeasurementVariable.
 
         Raises
@@ -149,6 +158,12 @@ class MeasurementVariable:
             optinonally the input for the calibrated value, in the same way as
             the normal `format` parameter, the calibrated value will be shown
             to the user, default: float
+        max_slew_rate : float, optional
+            The maximum (uncalibrated) change per second the variable can 
+            follow, None for no limit, default: None
+        min_increment : float, optional
+            The smallest (uncalibrated) change that is worth setting, None for
+            no limit, default: None
         """
         self._logger = get_logger(self, instance_args=(unique_id, name))
         self.unique_id = unique_id
@@ -167,6 +182,8 @@ class MeasurementVariable:
             self.default_step_width_value = None
         
         self.format = format
+        self.max_slew_rate = max_slew_rate
+        self.min_increment = min_increment
 
         if (callable(calibration) and 
             callable(uncalibration)):
@@ -1,12 +1,21 @@
+import time
 import typing
 import logging
 import threading
+import collections
 
 from .device import Device
 from .logginglib import log_debug
 from .datatype import Datatype
 from .logginglib import log_error
 from .logginglib import get_logger
+from .axis_executor import AxisFuture
+from .axis_executor import AxisExecutor
+from .call_supervisor import CallSupervisor
+from .domain_locks import DomainLocks
+from .completion_wait import CompletionWaiter
+from .domain_locks import DomainsLock
+from .domain_locks import DEFAULT_LOCK_DOMAIN
 from .vulnerable_machine import VulnerableMachine
 class MicroscopeInterface(Device, VulnerableMachine):
     """
@@ -24,11 +33,39 @@ class MicroscopeInterface(Device, VulnerableMachine):
     supports_parallel_measurement_variable_setting : bool
         Whether `MeasurementVariable`s can be set parallel, for example the 
         tilt can be set while the lense current is set
-    action_lock : bool
-        A lock that is used to prevent setting multiple measurement variables
-        at the same time if 
+    action_lock : DomainsLock
+        A lock that locks all lock domains at once, this can be used for 
+        operations that need the whole microscope
+    lock_domains : DomainLocks
+        The locks of the lock domains, if 
         `MicroscopeInterface.supports_parallel_measurement_variable_setting` is
-        False
+        False, only one measurement variable of each domain can be accessed at
+        the same time
+    measurement_variable_cache_ttl : dict
+        The measurement variable id as the key and the time in seconds a read
+        value is reused by `MicroscopeInterface.getMeasurementVariableValue()`
+        as the value, `math.inf` to reuse the value until it is invalidated, 
+        variables that are not contained are read from the hardware every 
+        time
+    completion_waiter : CompletionWaiter
+        The waiter to use for waiting until measurement variables have reached
+        their values, drivers call `CompletionWaiter.notify()` if the hardware
+        reports that it is done
+    measurement_variable_lock_domains : dict
+        The measurement variable id as the key and the name of the lock domain
+        or a tuple of lock domain names as the value, variables that are not
+        contained are in the `DEFAULT_LOCK_DOMAIN`
+    measurement_variable_axes : dict
+        The measurement variable id as the key and the name of the axis as the
+        value, variables of the same axis cannot be set independently (e.g. 
+        the stage x and y position), they are set one after the other by 
+        `MicroscopeInterface.submitMeasurementVariableValue()`, variables that
+        are not contained are their own axis
+    call_supervisor : CallSupervisor
+        The supervisor that executes the getters and setters of the 
+        measurement variables, the "set" and "get" deadlines can be set in 
+        the `CallSupervisor.deadlines` or in the configuration group of the 
+        microscope
     """
 
     def __init__(self, controller : "Controller", name: typing.Optional[str]=None, 
@@ -61,9 +98,30 @@ class MicroscopeInterface(Device, VulnerableMachine):
         self.supports_parallel_measurement_variable_setting = False
         self.controller = controller
         self._measurement_variable_getter_setter_map = {}
+        self.measurement_variable_axes = {}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        # the locks of the independent subsystems of the microscope, 
+        # variables of different domains can be accessed at the same time
+        self.measurement_variable_lock_domains = {}
+        self.lock_domains = DomainLocks()
+
+        # waiting until the hardware has reached the values
+        self.completion_waiter = CompletionWaiter()
+
+        # executing the driver calls with deadlines
+        self.call_supervisor = CallSupervisor(self.__class__.__name__)
+
+        # the read-through cache of the measurement variable values
+        self.measurement_variable_cache_ttl = {}
+        self._value_cache = {}
+        self._value_cache_generations = collections.defaultdict(int)
+        self._value_cache_statistics = {}
+        self._value_cache_lock = threading.Lock()
 
         # a lock so only one action can be performed at once at the microscope
-        self.action_lock = threading.Lock()
+        self.action_lock = self.lock_domains.getLock(self.getLockDomains)
     
     def registerMeasurementVariable(self, variable: "MeasurementVariable", 
                                     getter: typing.Callable[["MicroscopeInterface"], typing.Union[int, float, str]], 
@@ -178,6 +236,9 @@ class MicroscopeInterface(Device, VulnerableMachine):
             When the `id_` does not exist
         ValueError
             When the `value` is not allowed for this variable
+        DeviceCallTimeoutError
+            When the setter does not finish within the "set" deadline of the 
+            `MicroscopeInterface.call_supervisor`
 
         See Also
         --------
@@ -195,13 +256,38 @@ class MicroscopeInterface(Device, VulnerableMachine):
         """
 
         if not self.supports_parallel_measurement_variable_setting:
-            # make sure only this function is currently using the microscope,
-            # otherwise two functions may change microscope values at the same time
-            # which will mess up things
-            log_debug(self._logger, "Locking microscope")
-            
-            self.action_lock.acquire()
+            # make sure only this function is currently using the domains of
+            # the variable, otherwise two functions may change microscope 
+            # values at the same time which will mess up things
+            lock = self.lockMeasurementVariable(id_)
+            lock.acquire()
         
+        try:
+            self._setMeasurementVariableValue(id_, value)
+        finally:
+            # writing may change all variables that share a domain, the 
+            # value is unknown after failed writes too
+            self.invalidate(*self._getVariablesSharingLockDomains(id_))
+
+            if not self.supports_parallel_measurement_variable_setting:
+                # let other functions access the domains
+                lock.release()
+    
+    def _setMeasurementVariableValue(self, id_: str, value: typing.Union[int, float, str]) -> None:
+        """Set the measurement variable without locking.
+
+        Raises
+        ------
+        ValueError
+            When the `value` is not allowed for this variable
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+        value : int, float or str
+            The value to set in the variable specific type and units
+        """
         var = self.getMeasurementVariableById(id_)
 
         if not self.isValidMeasurementVariableValue(id_, value):
@@ -216,26 +302,179 @@ class MicroscopeInterface(Device, VulnerableMachine):
             
             log_debug(self._logger, "Setting '{}' to '{}'".format(id_, value))
             
-            self._measurement_variable_getter_setter_map[id_][1](value)
+            self.call_supervisor.call("set", id_, 
+                self._measurement_variable_getter_setter_map[id_][1], value)
         else:
             # this cannot happen, if the id doesn't exist the 
             # MicroscopeInterface::isValidMeasurementVariableValue returns 
             # false
-            if not self.supports_parallel_measurement_variable_setting:
-                log_debug(self._logger, "Releasing microscope lock")
-                self.action_lock.release()
-            
             err = ValueError("The id {} does not exist.".format(id_))
             log_error(self._logger, err)
             raise err
 
-        if not self.supports_parallel_measurement_variable_setting:
-            # let other functions access the microscope
-            log_debug(self._logger, "Releasing microscope lock")
-            
-            self.action_lock.release()
+    def getMeasurementVariableLockDomains(self, id_: str) -> typing.Tuple[str, ...]:
+        """Get the lock domains of the measurement variable.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+        
+        Returns
+        -------
+        tuple of str
+            The lock domain names, this is the `DEFAULT_LOCK_DOMAIN` if the 
+            variable is not contained in the 
+            `MicroscopeInterface.measurement_variable_lock_domains`
+        """
+        domains = self.measurement_variable_lock_domains.get(
+            id_, DEFAULT_LOCK_DOMAIN)
+        
+        if isinstance(domains, str):
+            return (domains, )
+        else:
+            return tuple(domains)
+    
+    def getLockDomains(self) -> typing.List[str]:
+        """Get all lock domains of this microscope.
+
+        Returns
+        -------
+        list of str
+            The names of all lock domains of the measurement variables and 
+            all domains that have been locked before, sorted in the locking
+            order
+        """
+        domains = set(self.lock_domains.domains)
+        for id_ in self.measurement_variable_lock_domains:
+            domains.update(self.getMeasurementVariableLockDomains(id_))
+        
+        return sorted(domains)
+    
+    def lockDomains(self, *domains: str) -> DomainsLock:
+        """Get a lock for the given lock `domains`.
+
+        The returned lock acquires the domains in a fixed order, therefore 
+        multiple domains can be locked without deadlocks. Use it in a `with`
+        statement:
+        ```python
+        with microscope.lockDomains("lens", "eos"):
+            # change lenses and the electron optical system
+        ```
+
+        Parameters
+        ----------
+        domains : str
+            The domain names, if no domain is given, all domains are locked
+        
+        Returns
+        -------
+        DomainsLock
+            The lock
+        """
+        if len(domains) == 0:
+            return self.action_lock
+        else:
+            return self.lock_domains.getLock(domains)
+    
+    def lockMeasurementVariable(self, *ids: str) -> DomainsLock:
+        """Get a lock for the lock domains of all the given measurement 
+        variables.
+
+        Parameters
+        ----------
+        ids : str
+            The ids of the measurement variables
+        
+        Returns
+        -------
+        DomainsLock
+            The lock
+        """
+        domains = set()
+        for id_ in ids:
+            domains.update(self.getMeasurementVariableLockDomains(id_))
+        
+        return self.lockDomains(*domains)
+
+    def getMeasurementVariableAxis(self, id_: str) -> str:
+        """Get the axis of the measurement variable.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+        
+        Returns
+        -------
+        str
+            The axis name, this is the `id_` if the variable is not contained
+            in the `MicroscopeInterface.measurement_variable_axes`
+        """
+        return self.measurement_variable_axes.get(id_, id_)
+    
+    @property
+    def executor(self) -> AxisExecutor:
+        """The executor that sets the measurement variables in parallel, it 
+        has one long-lived worker per axis, it is created on the first 
+        access."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = AxisExecutor("{} axis".format(
+                                              self.__class__.__name__))
+            return self._executor
+    
+    def submitMeasurementVariableValue(self, id_: str, value: typing.Union[int, float, str]) -> AxisFuture:
+        """Set the measurement variable in the worker of its axis.
+
+        The variable is set by `MicroscopeInterface.setMeasurementVariableValue()`
+        in the background. Variables of different axes are set in parallel, 
+        variables of the same axis are set in the order they are submitted.
 
-    def getMeasurementVariableValue(self, id_: str) -> typing.Union[int, float, str]:
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+        value : int, float or str
+            The value to set in the variable specific type and units
+
+        Returns
+        -------
+        AxisFuture
+            The future of the setting, it can be used like an 
+            `ExceptionThread`
+        """
+        return self.executor.submit(self.getMeasurementVariableAxis(id_),
+                                    self.setMeasurementVariableValue, id_, 
+                                    value, name="set {}".format(id_))
+    
+    def cancelPendingSettings(self) -> None:
+        """Cancel all measurement variable settings that are submitted by 
+        `MicroscopeInterface.submitMeasurementVariableValue()` but not started
+        yet."""
+        with self._executor_lock:
+            executor = self._executor
+        
+        if executor is not None:
+            executor.cancelPending()
+    
+    def shutdownExecutor(self, wait: typing.Optional[bool]=True) -> None:
+        """Stop the workers of the `MicroscopeInterface.executor`, a new 
+        executor is created on the next access.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait until the workers are stopped, default: True
+        """
+        with self._executor_lock:
+            executor = self._executor
+            self._executor = None
+        
+        if executor is not None:
+            executor.shutdown(wait)
+
+    def getMeasurementVariableValue(self, id_: str, force: typing.Optional[bool]=False) -> typing.Union[int, float, str]:
         """Get the value of the measurement variable defined by its id.
 
         A measurement variable is each variable that this microscope can 
@@ -244,6 +483,18 @@ class MicroscopeInterface(Device, VulnerableMachine):
         current value that this variable has will be returned in the value 
         specific units.
 
+        If the variable has a time to live in the 
+        `MicroscopeInterface.measurement_variable_cache_ttl`, the last read 
+        value is returned until it expires or until it is invalidated by 
+        setting a variable of the same lock domain or by 
+        `MicroscopeInterface.invalidate()`.
+
+        Raises
+        ------
+        DeviceCallTimeoutError
+            When the getter does not finish within the "get" deadline of the 
+            `MicroscopeInterface.call_supervisor`
+
         See Also
         --------
         supported_measurement_variables
@@ -254,6 +505,9 @@ class MicroscopeInterface(Device, VulnerableMachine):
         ----------
         id_ : str
             The id of the measurement variable
+        force : bool, optional
+            Whether to read the value from the hardware even if there is a 
+            valid cached value, the read value is cached, default: False
 
         Returns
         -------
@@ -261,36 +515,135 @@ class MicroscopeInterface(Device, VulnerableMachine):
             The value of the variable in the variable specific type and units
         """
 
-        if not self.supports_parallel_measurement_variable_setting:
-            # make sure only this function is currently using the microscope,
-            # otherwise two functions may change microscope values at the same time
-            # which will mess up things
-            log_debug(self._logger, "Locking microscope")
-
-            self.action_lock.acquire()
-
-        if id_ in self._measurement_variable_getter_setter_map:
-            log_debug(self._logger, "Asking for value of '{}'".format(id_))
-            
-            value = self._measurement_variable_getter_setter_map[id_][0]()
-            
-            log_debug(self._logger, "Received value '{}' for '{}'".format(value, id_))
-        else:
-            if not self.supports_parallel_measurement_variable_setting:
-                log_debug(self._logger, "Releasing microscope lock")
-                self.action_lock.release()
+        ttl = self.measurement_variable_cache_ttl.get(id_, 0)
+        cached = isinstance(ttl, (int, float)) and ttl > 0
+
+        if cached:
+            with self._value_cache_lock:
+                statistics = self._getValueCacheStatistics(id_)
+                if (not force and id_ in self._value_cache and 
+                    time.time() - self._value_cache[id_][1] < ttl):
+                    statistics["hits"] += 1
+                    log_debug(self._logger, "Using cached value '{}' for '{}'".format(
+                                            self._value_cache[id_][0], id_))
+                    return self._value_cache[id_][0]
+                
+                if force:
+                    statistics["forced"] += 1
+                else:
+                    statistics["misses"] += 1
+                generation = self._value_cache_generations[id_]
             
+            read_time = time.time()
+
+        if id_ not in self._measurement_variable_getter_setter_map:
             err = ValueError(("There is no MeasurementVariable for the " + 
                               "id {}.").format(id_))
             log_error(self._logger, err)
             raise err
 
         if not self.supports_parallel_measurement_variable_setting:
-            # let other functions access the microscope
-            log_debug(self._logger, "Releasing microscope lock")
-            self.action_lock.release()
+            # make sure only this function is currently using the domains of
+            # the variable, otherwise two functions may change microscope 
+            # values at the same time which will mess up things
+            lock = self.lockMeasurementVariable(id_)
+            lock.acquire()
+
+        try:
+            log_debug(self._logger, "Asking for value of '{}'".format(id_))
+            
+            value = self.call_supervisor.call("get", id_, 
+                self._measurement_variable_getter_setter_map[id_][0])
+            
+            log_debug(self._logger, "Received value '{}' for '{}'".format(value, id_))
+        finally:
+            if not self.supports_parallel_measurement_variable_setting:
+                # let other functions access the domains
+                lock.release()
+        
+        if cached:
+            with self._value_cache_lock:
+                # do not cache the value if it was invalidated while reading
+                if self._value_cache_generations[id_] == generation:
+                    self._value_cache[id_] = (value, read_time)
         
         return value
+    
+    def _getValueCacheStatistics(self, id_: str) -> dict:
+        """Get the statistics dict of the `id_`, the 
+        `MicroscopeInterface._value_cache_lock` has to be acquired.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+
+        Returns
+        -------
+        dict
+            The statistics
+        """
+        if id_ not in self._value_cache_statistics:
+            self._value_cache_statistics[id_] = {"hits": 0, "misses": 0, 
+                                                 "forced": 0, 
+                                                 "invalidations": 0}
+        return self._value_cache_statistics[id_]
+    
+    def _getVariablesSharingLockDomains(self, id_: str) -> typing.List[str]:
+        """Get the ids of all cached measurement variables that share a lock
+        domain with the `id_`, including the `id_` itself.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the measurement variable
+
+        Returns
+        -------
+        list of str
+            The ids
+        """
+        domains = set(self.getMeasurementVariableLockDomains(id_))
+        return [i for i in self.measurement_variable_cache_ttl if i == id_ or
+                len(domains.intersection(
+                    self.getMeasurementVariableLockDomains(i))) > 0]
+    
+    def invalidate(self, *ids: str) -> None:
+        """Remove the cached values of the measurement variables.
+
+        Parameters
+        ----------
+        ids : str
+            The ids of the measurement variables, if no id is given, all 
+            cached values are removed
+        """
+        with self._value_cache_lock:
+            if len(ids) == 0:
+                ids = list(self.measurement_variable_cache_ttl.keys())
+            
+            for id_ in ids:
+                self._value_cache_generations[id_] += 1
+                if id_ in self._value_cache:
+                    del self._value_cache[id_]
+                    self._getValueCacheStatistics(id_)["invalidations"] += 1
+    
+    def getValueCacheStatistics(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        """Get how often the cached values were used.
+
+        Returns
+        -------
+        dict
+            The measurement variable id as the key and a dict with the number
+            of `hits`, `misses`, `forced` reads and `invalidations` as the 
+            value
+        """
+        with self._value_cache_lock:
+            return {k: v.copy() for k, v in self._value_cache_statistics.items()}
+    
+    def resetValueCacheStatistics(self) -> None:
+        """Reset the statistics of the value cache."""
+        with self._value_cache_lock:
+            self._value_cache_statistics = {}
 
     def isValidMeasurementVariableValue(self, id_: str, value: float) -> bool:
         """Get whether the value is allowed for the measurement variable with 
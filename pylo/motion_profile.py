@@ -0,0 +1,245 @@
+import math
+import typing
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+
+logger = get_logger("motion_profile.py", create_msg=False)
+
+# the fraction of the ramp time that is used for accelerating and for
+# decelerating each
+DEFAULT_ACCELERATION_FRACTION = 0.25
+
+def trapezoid_times(count: int, acceleration_fraction: typing.Optional[float]=DEFAULT_ACCELERATION_FRACTION) -> typing.List[float]:
+    """Get the normalized times when a trapezoidal ramp passes the `count`
+    equidistant increments.
+
+    The ramp accelerates during the first `acceleration_fraction` of the
+    time, moves with constant speed and decelerates during the last
+    `acceleration_fraction` of the time. The total time and the total
+    distance are 1.
+
+    Parameters
+    ----------
+    count : int
+        The number of increments
+    acceleration_fraction : float, optional
+        The fraction of the time for accelerating (and for decelerating),
+        between 0 and 0.5, 0 for a linear ramp, default:
+        `DEFAULT_ACCELERATION_FRACTION`
+
+    Returns
+    -------
+    list of float
+        The `count` times when the increments are reached, the last time is
+        always 1
+    """
+    f = min(max(acceleration_fraction, 0), 0.5)
+    # the peak velocity for a distance and duration of 1
+    v = 1 / (1 - f)
+    # the position after accelerating
+    p_f = v * f / 2
+
+    times = []
+    for i in range(1, count + 1):
+        p = i / count
+
+        if f == 0:
+            t = p
+        elif p < p_f:
+            t = math.sqrt(2 * f * p / v)
+        elif p <= 1 - p_f:
+            t = p / v + f / 2
+        else:
+            t = 1 - math.sqrt(2 * f * (1 - p) / v)
+
+        times.append(t)
+
+    if len(times) > 0:
+        times[-1] = 1
+
+    return times
+
+class MotionProfile:
+    """The ramp of one measurement variable from one value to another.
+
+    The ramp is split into increments. The value of an increment is set when
+    the corresponding interval since the previous value has passed, the last
+    value is set at the end of the ramp.
+
+    Attributes
+    ----------
+    variable_id : str
+        The id of the measurement variable
+    start, end : int or float
+        The value the ramp starts at and the value the ramp ends at
+    values : list of int or float
+        The values to set one after another, the last value is the `end`
+    intervals : list of float
+        The time in seconds to wait before setting the value with the same
+        index
+    """
+
+    def __init__(self, variable_id: str, start: typing.Union[int, float],
+                 end: typing.Union[int, float],
+                 values: typing.Sequence[typing.Union[int, float]],
+                 intervals: typing.Sequence[float]) -> None:
+        """Create a motion profile.
+
+        Parameters
+        ----------
+        variable_id : str
+            The id of the measurement variable
+        start, end : int or float
+            The value the ramp starts at and the value the ramp ends at
+        values : sequence of int or float
+            The values to set one after another
+        intervals : sequence of float
+            The time in seconds to wait before setting the value with the same
+            index
+        """
+        self.variable_id = variable_id
+        self.start = start
+        self.end = end
+        self.values = list(values)
+        self.intervals = list(intervals)
+
+    @property
+    def duration(self) -> float:
+        """The time the ramp takes in seconds, without the time for setting
+        the values."""
+        return sum(self.intervals)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return "MotionProfile({}, {} -> {}, {} increments, {:.3f}s)".format(
+            self.variable_id, self.start, self.end, len(self), self.duration)
+
+def get_increment_count(distance: float,
+                        min_increment: typing.Optional[float]=None,
+                        max_count: typing.Optional[int]=1) -> int:
+    """Get the number of increments to cover the `distance`.
+
+    Parameters
+    ----------
+    distance : float
+        The absolute distance to move
+    min_increment : float, optional
+        The smallest increment that is allowed, None for no limit,
+        default: None
+    max_count : int, optional
+        The maximum number of increments, default: 1
+
+    Returns
+    -------
+    int
+        The number of increments, at least 1
+    """
+    count = max(1, max_count)
+
+    if isinstance(min_increment, (int, float)) and min_increment > 0:
+        count = min(count, math.floor(distance / min_increment))
+
+    return max(1, count)
+
+def get_ramp_duration(distance: float,
+                      max_slew_rate: typing.Optional[float]=None,
+                      acceleration_fraction: typing.Optional[float]=DEFAULT_ACCELERATION_FRACTION) -> float:
+    """Get the shortest time for a trapezoidal ramp over the `distance`
+    whose peak velocity does not exceed the `max_slew_rate`.
+
+    Parameters
+    ----------
+    distance : float
+        The absolute distance to move
+    max_slew_rate : float, optional
+        The maximum velocity in units per second, None for no limit,
+        default: None
+    acceleration_fraction : float, optional
+        The fraction of the time for accelerating (and for decelerating),
+        default: `DEFAULT_ACCELERATION_FRACTION`
+
+    Returns
+    -------
+    float
+        The duration in seconds
+    """
+    if not isinstance(max_slew_rate, (int, float)) or max_slew_rate <= 0:
+        return 0
+
+    f = min(max(acceleration_fraction, 0), 0.5)
+    return distance / (max_slew_rate * (1 - f))
+
+def create_profiles(variables: typing.Mapping[str, "MeasurementVariable"],
+                    start: typing.Mapping[str, typing.Union[int, float]],
+                    end: typing.Mapping[str, typing.Union[int, float]],
+                    max_count: typing.Optional[int]=1,
+                    min_duration: typing.Optional[float]=0,
+                    acceleration_fraction: typing.Optional[float]=DEFAULT_ACCELERATION_FRACTION) -> typing.List[MotionProfile]:
+    """Create the motion profiles to move all variables from the `start` to
+    the `end` so that all ramps finish at the same time.
+
+    The number of increments of each variable depends on the distance and
+    the `MeasurementVariable.min_increment`, it is at most `max_count`. The
+    duration is the longest duration that one of the variables needs with its
+    `MeasurementVariable.max_slew_rate` but at least the `min_duration`.
+
+    Parameters
+    ----------
+    variables : mapping
+        The measurement variables with their id as the key
+    start, end : mapping
+        The start and the end values with the variable id as the key, only
+        variables that are contained in both and whose values differ get a
+        profile
+    max_count : int, optional
+        The maximum number of increments of each variable, default: 1
+    min_duration : float, optional
+        The minimum duration of the ramps in seconds, default: 0
+    acceleration_fraction : float, optional
+        The fraction of the time for accelerating (and for decelerating),
+        default: `DEFAULT_ACCELERATION_FRACTION`
+
+    Returns
+    -------
+    list of MotionProfile
+        The profiles in the order of the `end`
+    """
+    moves = []
+    duration = max(0, min_duration)
+
+    for id_, end_value in end.items():
+        if id_ not in start:
+            continue
+
+        start_value = start[id_]
+        if (start_value == end_value or
+            (isinstance(start_value, float) and isinstance(end_value, float) and
+             math.isclose(start_value, end_value))):
+            continue
+
+        distance = abs(end_value - start_value)
+        variable = variables.get(id_, None)
+
+        count = get_increment_count(distance,
+            getattr(variable, "min_increment", None), max_count)
+        duration = max(duration, get_ramp_duration(distance,
+            getattr(variable, "max_slew_rate", None), acceleration_fraction))
+
+        moves.append((id_, start_value, end_value, count))
+
+    profiles = []
+    for id_, start_value, end_value, count in moves:
+        times = trapezoid_times(count, acceleration_fraction)
+        values = [start_value + (end_value - start_value) * (i + 1) / count
+                  for i in range(count)]
+        values[-1] = end_value
+        intervals = [(t - p) * duration for t, p in zip(times, [0] + times)]
+
+        profile = MotionProfile(id_, start_value, end_value, values, intervals)
+        log_debug(logger, "Created profile {!r}".format(profile))
+        profiles.append(profile)
+
+    return profiles
@@ -0,0 +1,391 @@
+import os
+import time
+import shutil
+import typing
+import datetime
+import collections
+
+import numpy as np
+
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import get_logger
+from .adaptive_refinement import AdaptiveSteps
+
+# the modes of the preflight check, 'block' prevents starting the measurement
+# if there is a problem, 'warn' only shows the problems, 'off' skips the check
+PREFLIGHT_MODES = ("block", "warn", "off")
+
+# the bytes per pixel of the file formats that do not save the data type of
+# the image, all other formats are expected to save the raw data
+FILE_FORMAT_BYTES_PER_PIXEL = {"tif": 1, "tiff": 1}
+
+# the bytes of the header and the tags that are added to each file
+FILE_OVERHEAD_BYTES = 4096
+
+def format_bytes(count: typing.Union[int, float]) -> str:
+    """Format the `count` of bytes with a binary prefix.
+
+    Parameters
+    ----------
+    count : int or float
+        The number of bytes
+
+    Returns
+    -------
+    str
+        The human readable size, e.g. "1.5 MiB"
+    """
+    for prefix in ("", "Ki", "Mi", "Gi", "Ti"):
+        if abs(count) < 1024 or prefix == "Ti":
+            break
+        count /= 1024
+
+    return "{:.1f} {}B".format(count, prefix)
+
+class PreflightReport:
+    """The result of the `Preflight` check.
+
+    Attributes
+    ----------
+    step_count : int
+        The number of measurement steps
+    frame_count : int
+        The number of images that will be saved
+    bytes_per_frame : OrderedDict
+        The camera role as the key and the expected file size of one image in
+        bytes as the value, None if the camera does not know its image size
+    total_bytes : int or None
+        The expected bytes of all images, None if no camera knows its image
+        size
+    free_bytes : int or None
+        The free space of the save directory in bytes
+    write_throughput : float or None
+        The measured write throughput of the save directory in bytes per
+        second
+    step_duration : float
+        The modelled hardware time of one step in seconds, zero if it is not
+        known
+    write_duration : float or None
+        The time to save the images of one step in seconds
+    estimated_duration : float or None
+        The estimated duration of the measurement in seconds
+    warnings : list of str
+        The problems that do not prevent the measurement
+    errors : list of str
+        The problems that prevent the measurement if the check blocks
+    """
+
+    def __init__(self) -> None:
+        """Create an empty report."""
+        self.step_count = 0
+        self.frame_count = 0
+        self.bytes_per_frame = collections.OrderedDict()
+        self.total_bytes = None
+        self.free_bytes = None
+        self.write_throughput = None
+        self.step_duration = 0
+        self.write_duration = None
+        self.estimated_duration = None
+        self.warnings = []
+        self.errors = []
+
+    def formatText(self) -> typing.List[str]:
+        """Get the report as human readable lines.
+
+        Returns
+        -------
+        list of str
+            The lines
+        """
+        lines = ["Steps: {}, images: {}".format(self.step_count,
+                                                self.frame_count)]
+
+        if self.total_bytes is not None:
+            lines.append("Expected size: {}".format(format_bytes(
+                         self.total_bytes)))
+        if self.free_bytes is not None:
+            lines.append("Free space: {}".format(format_bytes(
+                         self.free_bytes)))
+        if self.write_throughput is not None:
+            lines.append("Write throughput: {}/s".format(format_bytes(
+                         self.write_throughput)))
+        if self.estimated_duration is not None:
+            lines.append("Estimated duration: {}".format(datetime.timedelta(
+                         seconds=round(self.estimated_duration))))
+
+        lines += ["Warning: {}".format(w) for w in self.warnings]
+        lines += ["Error: {}".format(e) for e in self.errors]
+
+        return lines
+
+class Preflight:
+    """Check whether the storage can take the images of a measurement before
+    it is started.
+
+    The check calculates the number of images from the steps and their sizes
+    from the `CameraInterface.getFrameFormat()` and the file format. It
+    compares the expected bytes with the free space of the save directory and
+    it writes a probe file to measure the write throughput. The time to save
+    the images of one step is compared to the modelled hardware time of one
+    step (the relaxation time and the exposure times of the cameras). Only
+    missing free space and an unwritable save directory are errors, a slow
+    storage is a warning because the images are saved in background threads.
+
+    Attributes
+    ----------
+    measurement : Measurement
+        The measurement to check
+    probe_size : int or None
+        The number of bytes to write for measuring the throughput, None to use
+        the `config.PREFLIGHT_PROBE_SIZE`
+    """
+
+    def __init__(self, measurement: "Measurement",
+                 probe_size: typing.Optional[int]=None) -> None:
+        """Create the check.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The measurement to check
+        probe_size : int, optional
+            The number of bytes to write for measuring the throughput, None to
+            use the `config.PREFLIGHT_PROBE_SIZE`, default: None
+        """
+        self._logger = get_logger(self)
+        self.measurement = measurement
+        self.probe_size = probe_size
+
+    def getStepCount(self) -> int:
+        """Get the number of steps where images are recorded.
+
+        For sweeps, one image per step of the swept series is expected. For
+        adaptive refinements, the refinement budget is expected to be used up.
+
+        Returns
+        -------
+        int
+            The number of steps
+        """
+        steps = self.measurement.steps
+
+        if self.measurement.sweep_series is not None and hasattr(steps, "steps"):
+            return len(steps.steps)
+        elif isinstance(steps, AdaptiveSteps):
+            return steps.getMaximumLength()
+        else:
+            return len(steps)
+
+    def getFileFormat(self) -> str:
+        """Get the file format the images are saved in.
+
+        Returns
+        -------
+        str
+            The lower case extension without the dot
+        """
+        return os.path.splitext(str(self.measurement.name_format))[1].lstrip(
+            ".").lower()
+
+    def getBytesPerFrame(self, camera: "CameraInterface") -> typing.Optional[int]:
+        """Get the expected file size of one image of the `camera`, 
+        including the file of the unrounded mean if bursts are recorded.
+
+        Parameters
+        ----------
+        camera : CameraInterface
+            The camera
+
+        Returns
+        -------
+        int or None
+            The size in bytes, None if the camera does not know its image size
+        """
+        frame_format = camera.getFrameFormat()
+        if frame_format is None:
+            return None
+
+        shape, dtype = frame_format
+        bytes_per_pixel = FILE_FORMAT_BYTES_PER_PIXEL.get(self.getFileFormat(),
+                                                          np.dtype(dtype).itemsize)
+
+        size = int(np.prod(shape)) * bytes_per_pixel + FILE_OVERHEAD_BYTES
+
+        if self.measurement.burst_frames > 1:
+            # CameraInterface.recordBurst() saves the float64 mean too
+            size += (int(np.prod(shape)) * np.dtype(np.float64).itemsize + 
+                     FILE_OVERHEAD_BYTES)
+
+        return size
+
+    def _getExistingDirectory(self) -> str:
+        """Get the save directory or its nearest existing parent.
+
+        Returns
+        -------
+        str
+            The path of the existing directory
+        """
+        path = os.path.abspath(str(self.measurement.save_dir))
+        while not os.path.isdir(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+
+        return path
+
+    def getFreeBytes(self) -> typing.Optional[int]:
+        """Get the free space of the save directory.
+
+        Returns
+        -------
+        int or None
+            The free bytes, None if they cannot be determined
+        """
+        try:
+            return shutil.disk_usage(self._getExistingDirectory()).free
+        except OSError as e:
+            log_error(self._logger, e)
+            return None
+
+    def measureWriteThroughput(self) -> float:
+        """Write a probe file to the save directory and measure how fast it is
+        written to the disk.
+
+        The save directory is created if it does not exist.
+
+        Raises
+        ------
+        OSError
+            When the save directory is not writable
+
+        Returns
+        -------
+        float
+            The throughput in bytes per second
+        """
+        if self.probe_size is not None:
+            size = self.probe_size
+        else:
+            # import as late as possible to allow changes by extensions
+            from .config import PREFLIGHT_PROBE_SIZE
+            size = PREFLIGHT_PROBE_SIZE
+
+        save_dir = str(self.measurement.save_dir)
+        os.makedirs(save_dir, exist_ok=True)
+        path = os.path.join(save_dir, ".preflight-probe-{}".format(os.getpid()))
+
+        chunk = os.urandom(min(size, 1024 * 1024))
+        start = time.perf_counter()
+        try:
+            with open(path, "wb") as f:
+                written = 0
+                while written < size:
+                    written += f.write(chunk[:size - written])
+                f.flush()
+                os.fsync(f.fileno())
+            duration = time.perf_counter() - start
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        log_debug(self._logger, "Wrote '{}' bytes to '{}' in '{}' seconds".format(
+                                size, save_dir, duration))
+
+        return size / max(duration, 1e-6)
+
+    def getStepDuration(self) -> float:
+        """Get the modelled hardware time of one step.
+
+        This is the relaxation time plus the exposure time of the cameras
+        (the longest one if they record concurrently, the sum if they record
+        sequentially) times the burst frames. Cameras without an
+        `exposure_time` are counted with zero.
+
+        Returns
+        -------
+        float
+            The time in seconds
+        """
+        measurement = self.measurement
+        exposures = []
+        for camera in measurement.controller.cameras.values():
+            exposure = getattr(camera, "exposure_time", 0)
+            if isinstance(exposure, (int, float)) and exposure > 0:
+                exposures.append(exposure)
+
+        if len(exposures) == 0:
+            exposure = 0
+        elif measurement.camera_trigger_mode == "sequential":
+            exposure = sum(exposures)
+        else:
+            exposure = max(exposures)
+
+        relaxation = measurement.relaxation_time
+        if not isinstance(relaxation, (int, float)) or relaxation < 0:
+            relaxation = 0
+
+        return relaxation + exposure * max(1, measurement.burst_frames)
+
+    def run(self) -> PreflightReport:
+        """Execute the check.
+
+        Returns
+        -------
+        PreflightReport
+            The report, the problems are contained in the `errors`
+        """
+        report = PreflightReport()
+        cameras = self.measurement.controller.cameras
+
+        report.step_count = self.getStepCount()
+        report.frame_count = report.step_count * len(cameras)
+
+        for role, camera in cameras.items():
+            report.bytes_per_frame[role] = self.getBytesPerFrame(camera)
+
+        known = [b for b in report.bytes_per_frame.values() if b is not None]
+        bytes_per_step = sum(known)
+        if len(known) > 0:
+            report.total_bytes = bytes_per_step * report.step_count
+        if len(known) < len(report.bytes_per_frame):
+            report.warnings.append(("The image size of the cameras '{}' " +
+                                    "is not known, they are not included in " +
+                                    "the expected size.").format(", ".join(
+                                    r for r, b in report.bytes_per_frame.items()
+                                    if b is None)))
+
+        report.free_bytes = self.getFreeBytes()
+        if (report.total_bytes is not None and report.free_bytes is not None and
+            report.total_bytes > report.free_bytes):
+            report.errors.append(("The images need {} but there are only {} " +
+                                  "free in the save directory.").format(
+                                  format_bytes(report.total_bytes),
+                                  format_bytes(report.free_bytes)))
+
+        try:
+            report.write_throughput = self.measureWriteThroughput()
+        except OSError as e:
+            log_error(self._logger, e)
+            report.errors.append("The save directory is not writable: " +
+                                 "{}".format(e))
+
+        report.step_duration = self.getStepDuration()
+        if report.write_throughput is not None:
+            report.write_duration = bytes_per_step / report.write_throughput
+
+            if (report.step_duration > 0 and
+                report.write_duration > report.step_duration):
+                # the images are saved in background threads, a slow probe
+                # does not mean that the measurement cannot be done
+                report.warnings.append(("Saving the images of one step " +
+                    "takes {:.3f} seconds but the step takes {:.3f} seconds " +
+                    "only, the storage may not keep up with the " +
+                    "acquisition.").format(report.write_duration, 
+                    report.step_duration))
+
+            report.estimated_duration = report.step_count * max(
+                report.step_duration, report.write_duration)
+        else:
+            report.estimated_duration = report.step_count * report.step_duration
+
+        return report
@@ -0,0 +1,645 @@
+import os
+import json
+import math
+import typing
+import functools
+import collections
+import concurrent.futures
+
+import numpy as np
+
+from PIL import Image as PILImage
+
+from .events import after_record
+from .events import after_stop
+from .events import measurement_ready
+from .logginglib import log_info
+from .logginglib import log_debug
+from .logginglib import log_error
+from .camera_interface import MAIN_CAMERA_ROLE
+from .processing_stage import ProcessingStage
+from .measurement_steps import MeasurementSteps
+
+CONFIG_PREVIEW_GROUP = "previews"
+
+# the name of the index file in the preview directory
+PREVIEW_INDEX_NAME = "index.jsonl"
+
+def bin_image(image_data: np.ndarray, factor: int) -> np.ndarray:
+    """Average blocks of `factor` x `factor` pixels.
+
+    Pixels that do not fill a complete block at the right and bottom edge are
+    dropped.
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    factor : int
+        The binning factor
+
+    Returns
+    -------
+    numpy.ndarray
+        The binned float data
+    """
+    image_data = np.asarray(image_data, dtype=np.float32)
+    factor = max(1, min(int(factor), *image_data.shape))
+
+    h = image_data.shape[0] // factor
+    w = image_data.shape[1] // factor
+    return image_data[:h * factor, :w * factor].reshape(
+        h, factor, w, factor).mean(axis=(1, 3))
+
+def build_pyramid(image_data: np.ndarray, levels: typing.Optional[int]=3) -> typing.List[typing.Tuple[int, np.ndarray]]:
+    """Get the image binned by 2, 4, 8, ... .
+
+    Each level is binned from the previous level. Levels whose image would
+    be smaller than one pixel are omitted.
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    levels : int, optional
+        The number of levels, default: 3
+
+    Returns
+    -------
+    list of tuple
+        The binning factor and the binned float data of each level
+    """
+    pyramid = []
+    data = np.asarray(image_data, dtype=np.float32)
+    for level in range(1, levels + 1):
+        if min(data.shape) < 2:
+            break
+
+        data = bin_image(data, 2)
+        pyramid.append((2 ** level, data))
+
+    return pyramid
+
+def to_uint8(data: np.ndarray, clip_percent: typing.Optional[float]=0.5) -> np.ndarray:
+    """Stretch the contrast of the `data` to 8 bit.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The data
+    clip_percent : float, optional
+        The percentage of the darkest and the brightest pixels that are
+        clipped, default: 0.5
+
+    Returns
+    -------
+    numpy.ndarray
+        The uint8 data
+    """
+    low, high = np.percentile(data, (clip_percent, 100 - clip_percent))
+    if high <= low:
+        return np.full(data.shape, 0 if high <= 0 else 255, dtype=np.uint8)
+
+    return np.clip((data - low) * (255 / (high - low)), 0, 255).astype(np.uint8)
+
+def create_thumbnail(image_data: np.ndarray, size: typing.Optional[int]=128) -> np.ndarray:
+    """Get the contrast stretched 8 bit thumbnail of the `image_data`.
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    size : int, optional
+        The maximum side length, default: 128
+
+    Returns
+    -------
+    numpy.ndarray
+        The uint8 thumbnail
+    """
+    factor = int(math.ceil(max(np.shape(image_data)) / max(1, size)))
+    return to_uint8(bin_image(image_data, factor))
+
+def create_contact_sheet(thumbnails: typing.Sequence[np.ndarray],
+                         columns: typing.Optional[int]=None,
+                         padding: typing.Optional[int]=2) -> np.ndarray:
+    """Arrange the `thumbnails` in a grid.
+
+    Parameters
+    ----------
+    thumbnails : sequence of numpy.ndarray
+        The 2d uint8 thumbnails, they may have different shapes
+    columns : int, optional
+        The number of columns, None for a square grid, default: None
+    padding : int, optional
+        The black space between the thumbnails in pixels, default: 2
+
+    Returns
+    -------
+    numpy.ndarray
+        The uint8 mosaic
+    """
+    if len(thumbnails) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+
+    if not isinstance(columns, int) or columns <= 0:
+        columns = int(math.ceil(math.sqrt(len(thumbnails))))
+    rows = int(math.ceil(len(thumbnails) / columns))
+
+    cell_h = max(t.shape[0] for t in thumbnails) + padding
+    cell_w = max(t.shape[1] for t in thumbnails) + padding
+    sheet = np.zeros((rows * cell_h - padding, columns * cell_w - padding),
+                     dtype=np.uint8)
+
+    for i, thumbnail in enumerate(thumbnails):
+        y = (i // columns) * cell_h
+        x = (i % columns) * cell_w
+        sheet[y:y + thumbnail.shape[0], x:x + thumbnail.shape[1]] = thumbnail
+
+    return sheet
+
+def read_preview_index(directory: str) -> typing.List[dict]:
+    """Read the index of the previews in the `directory`.
+
+    Lines that cannot be parsed (e.g. the line that is being written) are
+    skipped.
+
+    Parameters
+    ----------
+    directory : str
+        The save directory of the measurement or the preview directory
+
+    Returns
+    -------
+    list of dict
+        The entries in the order they were written, the 'frame' entries
+        contain the 'image', the 'camera', the 'step-index', the 'group', the
+        'thumbnail' and the 'pyramid' with the binning factor as the key, the
+        'contact-sheet' entries contain the 'group', the 'path' and the
+        'images', all paths are relative to the save directory
+    """
+    path = os.path.join(directory, PREVIEW_INDEX_NAME)
+    if not os.path.isfile(path):
+        path = os.path.join(directory, "previews", PREVIEW_INDEX_NAME)
+
+    entries = []
+    if not os.path.isfile(path):
+        return entries
+
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return entries
+
+class PreviewWriter(ProcessingStage):
+    """Write downsampled previews of each saved image.
+
+    The previews are written by the save threads of the images after the
+    image is saved (`Image.addSaveCallback()`). For each image the pyramid
+    (binned by 2, 4, 8, ...) and a contrast stretched 8 bit thumbnail are
+    saved as png files in the preview directory. For each point of the outer
+    series, the thumbnails of the main camera are combined to a contact
+    sheet when the measurement moves to the next point, ends or is stopped.
+    The points are taken from the `Measurement.target_step` so noisy 
+    readbacks do not split a point. Every written file is added to the index
+    in the preview directory which can be read by `read_preview_index()` 
+    while the measurement is running.
+
+    Only the images of the 'after_record' event get previews, the frames of
+    a sweep (`Measurement.sweep_series`) are saved without previews.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    levels : int
+        The number of pyramid levels, 0 for no pyramid
+    thumbnail_size : int
+        The maximum side length of the thumbnails
+    directory : str
+        The preview directory relative to the save directory of the
+        measurement
+    contact_sheets : bool
+        Whether to create the contact sheets
+    """
+
+    config_group = CONFIG_PREVIEW_GROUP
+    event_id = "previews"
+
+    def __init__(self, controller: "Controller",
+                 levels: typing.Optional[int]=None,
+                 thumbnail_size: typing.Optional[int]=None,
+                 directory: typing.Optional[str]=None,
+                 contact_sheets: typing.Optional[bool]=None) -> None:
+        """Create a new preview writer, all values that are not given are
+        taken from the configuration.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        levels : int, optional
+            The number of pyramid levels
+        thumbnail_size : int, optional
+            The maximum side length of the thumbnails
+        directory : str, optional
+            The preview directory relative to the save directory
+        contact_sheets : bool, optional
+            Whether to create the contact sheets
+        """
+        super(PreviewWriter, self).__init__(controller)
+
+        self.levels = max(0, self._getValue("pyramid-levels", levels, int, 3))
+        self.thumbnail_size = max(1, self._getValue("thumbnail-size",
+                                                    thumbnail_size, int, 128))
+        self.directory = self._getValue("directory", directory, str,
+                                        "previews")
+        self.contact_sheets = self._getValue("contact-sheets", contact_sheets,
+                                             bool, True)
+
+        self._group = None
+        self._group_step = None
+        self._group_futures = []
+        self._group_variables = {}
+        self._step_futures = []
+        self._sheet_counter = 0
+
+    def getEventHandlers(self) -> typing.List[typing.Tuple["Event", typing.Callable, dict]]:
+        """Get the event handlers to register.
+
+        Returns
+        -------
+        list of tuple
+            The event, the handler and the keyword arguments for
+            `Event.register()`
+        """
+        # after the other handlers so re-acquired images are used
+        return [(after_record, self.addImages,
+                 {"priority": -10, "isolate_errors": True}),
+                (measurement_ready, self.finishGroup, {"isolate_errors": True}),
+                (after_stop, self.stopGroup, {"isolate_errors": True})]
+
+    def getPreviewDirectory(self, measurement: "Measurement") -> str:
+        """Get the absolute preview directory of the `measurement`.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The measurement
+
+        Returns
+        -------
+        str
+            The directory
+        """
+        return os.path.join(str(measurement.save_dir), self.directory)
+
+    def reset(self, measurement: "Measurement") -> None:
+        """Forget the current group and find the outer series variables of
+        the `measurement`.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The new measurement
+        """
+        super(PreviewWriter, self).reset()
+
+        with self._lock:
+            self._measurement = measurement
+            self._group = None
+            self._group_step = None
+            self._group_futures = []
+            self._step_futures = []
+            self._sheet_counter = 0
+
+            # the outer series variables and half of their step width to
+            # detect the next point in spite of readback noise
+            self._group_variables = {}
+            series = getattr(measurement, "series_definition", None)
+            if isinstance(series, dict):
+                nests = list(MeasurementSteps.getSeriesNests(series))
+                for nest in nests[:-1]:
+                    self._group_variables[nest["variable"]] = (
+                        abs(nest["step-width"]) / 2)
+
+    def _isSameGroup(self, step: dict) -> bool:
+        """Whether the `step` belongs to the current group.
+
+        Parameters
+        ----------
+        step : dict
+            The measurement step
+
+        Returns
+        -------
+        bool
+            Whether the outer series variables are at the same point
+        """
+        if self._group_step is None:
+            return False
+
+        for id_, tolerance in self._group_variables.items():
+            if abs(step[id_] - self._group_step[id_]) > tolerance:
+                return False
+
+        return True
+
+    def addImages(self, controller: "Controller") -> None:
+        """Add the save callbacks to the current images of the measurement.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        measurement = controller.measurement
+        if measurement is not self._measurement:
+            self.reset(measurement)
+
+        if self._executor is None:
+            self.install()
+
+        if isinstance(measurement.target_step, dict):
+            step = dict(measurement.target_step)
+        else:
+            step = dict(measurement.current_step)
+        if not self._isSameGroup(step):
+            self.finishGroup(controller)
+
+            with self._lock:
+                self._group_step = step
+                self._group = collections.OrderedDict(
+                    (id_, step[id_]) for id_ in self._group_variables)
+
+        directory = self.getPreviewDirectory(measurement)
+        group = dict(self._group)
+        with self._lock:
+            self._step_futures = []
+        
+        for role, image in measurement.current_images.items():
+            future = concurrent.futures.Future()
+            name = measurement.formatName(camera=role)
+            image.addSaveCallback(functools.partial(self._saveCallback, future,
+                directory, name, role, measurement.step_index, group))
+
+            with self._lock:
+                self._futures.append(future)
+                self._step_futures.append(future)
+                if role == MAIN_CAMERA_ROLE:
+                    self._group_futures.append((name, future))
+
+    def finishGroup(self, controller: "Controller") -> None:
+        """Create the contact sheet of the current group in the background.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        with self._lock:
+            group = self._group
+            futures = self._group_futures
+            self._group_futures = []
+            index = self._sheet_counter
+
+            if len(futures) == 0 or not self.contact_sheets:
+                return
+
+            self._sheet_counter += 1
+
+            future = self._executor.submit(
+                self._writeContactSheet,
+                self.getPreviewDirectory(self._measurement), index, group,
+                futures)
+            self._futures.append(future)
+
+    def stopGroup(self, controller: "Controller") -> None:
+        """Create the contact sheet of the current group of a stopped 
+        measurement in the background.
+
+        The images of the last step are not saved if the measurement is 
+        stopped before saving them, their previews are dropped when all 
+        other images are saved.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        with self._lock:
+            futures = self._step_futures
+            self._step_futures = []
+            
+            if len(futures) > 0:
+                self._futures.append(self._executor.submit(
+                    self._dropUnsaved, self._measurement, futures))
+        
+        self.finishGroup(controller)
+
+    def _dropUnsaved(self, measurement: "Measurement", 
+                     futures: typing.List[concurrent.futures.Future]) -> None:
+        """Wait for the save threads of the `measurement` and cancel the 
+        `futures` of the images that are not saved, this is executed in the 
+        thread pool.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The stopped measurement
+        futures : list of concurrent.futures.Future
+            The futures of the images of the last step
+        """
+        try:
+            measurement.waitForAllImageSavings()
+        except Exception as e:
+            log_error(self._logger, e)
+        
+        for future in futures:
+            if future.cancel():
+                # notify the waiters of concurrent.futures.wait()
+                future.set_running_or_notify_cancel()
+                log_debug(self._logger, ("Dropped preview of image that is " + 
+                                         "not saved"))
+
+    def _saveCallback(self, future: concurrent.futures.Future,
+                      directory: str, name: str, role: str, step_index: int,
+                      group: dict, image: "Image", file_path: str) -> None:
+        """Write the pyramid and the thumbnail of one image, this is executed
+        in the save thread of the image.
+
+        Parameters
+        ----------
+        future : concurrent.futures.Future
+            The future to set the thumbnail (or the error) as the result to
+        directory : str
+            The preview directory
+        name : str
+            The file name of the image relative to the save directory
+        role : str
+            The camera role
+        step_index : int
+            The index of the step
+        group : dict
+            The values of the outer series variables
+        image : Image
+            The saved image
+        file_path : str
+            The path the image is saved to
+        """
+        if future.cancelled():
+            # the measurement saved the image after it was dropped
+            return
+        
+        image_data = image.image_data
+        try:
+            root, _ = os.path.splitext(name)
+            pyramid = {}
+            for factor, data in build_pyramid(image_data, self.levels):
+                pyramid[str(factor)] = self._saveArray(
+                    directory, "{}.x{}.png".format(root, factor),
+                    np.clip(np.round(data), 0, 255).astype(np.uint8))
+
+            thumbnail = create_thumbnail(image_data, self.thumbnail_size)
+            path = self._saveArray(directory, "{}.thumb.png".format(root),
+                                   thumbnail)
+
+            self._addToIndex(directory, {"type": "frame", "image": name,
+                                         "camera": role,
+                                         "step-index": step_index,
+                                         "group": group, "thumbnail": path,
+                                         "pyramid": pyramid})
+        except Exception as e:
+            future.set_exception(e)
+            raise e
+        else:
+            future.set_result(thumbnail)
+
+    def _writeContactSheet(self, directory: str, index: int, group: dict,
+                           futures: typing.List[typing.Tuple[str, concurrent.futures.Future]]) -> typing.Optional[str]:
+        """Combine the thumbnails of one group, this is executed in the
+        thread pool.
+
+        Parameters
+        ----------
+        directory : str
+            The preview directory
+        index : int
+            The number of the contact sheet
+        group : dict
+            The values of the outer series variables
+        futures : list of tuple
+            The image name and the future returning the thumbnail of each
+            image of the group
+
+        Returns
+        -------
+        str or None
+            The path of the contact sheet relative to the save directory, None
+            if there are no thumbnails
+        """
+        names = []
+        thumbnails = []
+        for name, future in futures:
+            if future.cancelled():
+                continue
+            
+            try:
+                thumbnails.append(future.result())
+                names.append(name)
+            except Exception as e:
+                log_error(self._logger, e)
+
+        if len(thumbnails) == 0:
+            return None
+
+        path = self._saveArray(directory, "contact-sheet-{}.png".format(index),
+                               create_contact_sheet(thumbnails))
+        self._addToIndex(directory, {"type": "contact-sheet", "group": group,
+                                     "path": path, "images": names})
+        log_info(self._logger, "Created contact sheet '{}' of '{}'".format(
+                               path, group))
+
+        return path
+
+    def _saveArray(self, directory: str, name: str, data: np.ndarray) -> str:
+        """Save the uint8 `data` as an 8 bit gray scale png file.
+
+        Parameters
+        ----------
+        directory : str
+            The preview directory
+        name : str
+            The file name relative to the `directory`
+        data : numpy.ndarray
+            The uint8 data
+
+        Returns
+        -------
+        str
+            The path relative to the save directory
+        """
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        PILImage.fromarray(data, mode="L").save(path, format="png")
+
+        return os.path.join(self.directory, name).replace(os.sep, "/")
+
+    def _addToIndex(self, directory: str, entry: dict) -> None:
+        """Append the `entry` to the index file.
+
+        Parameters
+        ----------
+        directory : str
+            The preview directory
+        entry : dict
+            The entry
+        """
+        with self._lock:
+            with open(os.path.join(directory, PREVIEW_INDEX_NAME), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def defineConfigurationOptions(configuration: "AbstractConfiguration") -> None:
+        """Define which configuration options this class requires.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration to define the required options in
+        """
+
+        configuration.addConfigurationOption(
+            CONFIG_PREVIEW_GROUP, "enabled", datatype=bool,
+            default_value=False,
+            description="Whether to save downsampled previews and " +
+            "thumbnails of each image for browsing the series."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_PREVIEW_GROUP, "pyramid-levels", datatype=int,
+            default_value=3,
+            description="The number of preview levels, each level is " +
+            "binned by two more (2x, 4x, 8x, ...), use 0 for thumbnails only."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_PREVIEW_GROUP, "thumbnail-size", datatype=int,
+            default_value=128,
+            description="The maximum side length of the 8 bit thumbnails in " +
+            "pixels."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_PREVIEW_GROUP, "directory", datatype=str,
+            default_value="previews",
+            description="The directory for the previews, relative to the " +
+            "save directory of the measurement."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_PREVIEW_GROUP, "contact-sheets", datatype=bool,
+            default_value=True,
+            description="Whether to combine the thumbnails of each point of " +
+            "the outer series to a contact sheet."
+        )
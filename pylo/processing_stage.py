@@ -0,0 +1,146 @@
+import typing
+import threading
+import concurrent.futures
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+
+class ProcessingStage:
+    """The base class for the processing of the recorded images in the
+    background while the measurement continues.
+
+    The stage reads its settings from the `config_group` of the
+    configuration, owns the executor the work is submitted to and registers
+    the event handlers returned by `ProcessingStage.getEventHandlers()`
+    with the `event_id`. Futures that are added to the `_futures` are
+    awaited by `ProcessingStage.wait()`.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    workers : int
+        The number of workers of the executor
+    config_group : str
+        The group of the settings in the configuration
+    event_id : str
+        The key that is used for the event handlers
+    allow_negative : bool
+        Whether negative numbers are valid settings, if not the default is
+        used instead
+    """
+
+    config_group = None
+    event_id = None
+    allow_negative = True
+
+    def __init__(self, controller: "Controller") -> None:
+        """Create a new processing stage.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        self.controller = controller
+        self._logger = get_logger(self)
+
+        self.workers = 1
+        self._measurement = None
+        self._executor = None
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def _getValue(self, key: str, value: typing.Any, datatype: type,
+                  default: typing.Any) -> typing.Any:
+        """Get the `value` if it is given, otherwise the value from the
+        configuration or the `default`.
+
+        Parameters
+        ----------
+        key : str
+            The key in the `config_group` of the configuration
+        value : any
+            The value to use, None to use the configuration
+        datatype : type
+            The type to convert the value to
+        default : any
+            The value to use if the configuration value does not exist or is
+            invalid
+
+        Returns
+        -------
+        any
+            The value
+        """
+        if value is None:
+            try:
+                value = self.controller.configuration.getValue(
+                    self.config_group, key)
+            except KeyError:
+                return default
+
+        try:
+            value = datatype(value)
+        except (TypeError, ValueError):
+            return default
+
+        if (not self.allow_negative and isinstance(value, (int, float)) and
+            value < 0):
+            return default
+        return value
+
+    def getEventHandlers(self) -> typing.List[typing.Tuple["Event", typing.Callable, dict]]:
+        """Get the event handlers to register.
+
+        Returns
+        -------
+        list of tuple
+            The event, the handler and the keyword arguments for
+            `Event.register()`
+        """
+        return []
+
+    def _createExecutor(self) -> concurrent.futures.Executor:
+        """Create the executor the work is submitted to.
+
+        Returns
+        -------
+        concurrent.futures.Executor
+            A thread pool with `workers` threads
+        """
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, self.workers))
+
+    def install(self) -> None:
+        """Create the executor and register the event handlers."""
+        if self._executor is None:
+            self._executor = self._createExecutor()
+
+        for event, handler, kwargs in self.getEventHandlers():
+            event.register(self.event_id, handler, **kwargs)
+
+        log_debug(self._logger, "Installed '{}'".format(self.event_id))
+
+    def uninstall(self) -> None:
+        """Remove the event handlers and wait for the executor."""
+        for event, handler, kwargs in self.getEventHandlers():
+            if self.event_id in event:
+                del event[self.event_id]
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wait(self) -> None:
+        """Wait until all submitted work is done."""
+        with self._lock:
+            futures = list(self._futures)
+
+        concurrent.futures.wait(futures)
+
+    def reset(self, *args) -> None:
+        """Forget the submitted work, this is called when a new series
+        starts."""
+        with self._lock:
+            self._futures = []
@@ -0,0 +1,213 @@
+import time
+import typing
+import datetime
+import collections
+
+# the timeline phases that are executed for every step, their average
+# durations are used for the eta before the rate is known
+STEP_PHASES = ("approach", "readback", "record", "sweep")
+
+class ProgressModel:
+    """The speed of the measurement, shared by all views.
+
+    The model is updated whenever the progress of the view changes. It
+    calculates the exponentially smoothed number of steps per second and the
+    estimated time until the measurement is finished. The first increment
+    after the start is not used for the rate because it contains the
+    preparation of the measurement.
+
+    Attributes
+    ----------
+    progress : int
+        The current progress
+    progress_max : int or None
+        The maximum progress
+    start_time : float
+        The `time.time()` when the progress was (re)started
+    rate : float or None
+        The smoothed steps per second, None if it is not known yet
+    smoothing : float or None
+        The weight of the newest rate in the smoothed rate between 0 and 1,
+        None to use the `config.PROGRESS_RATE_SMOOTHING`
+    timeline : Timeline or None
+        The timeline of the current measurement to get the phase averages
+        from
+    """
+
+    def __init__(self, smoothing: typing.Optional[float]=None) -> None:
+        """Create the progress model.
+
+        Parameters
+        ----------
+        smoothing : float, optional
+            The weight of the newest rate in the smoothed rate, None to use
+            the `config.PROGRESS_RATE_SMOOTHING`, default: None
+        """
+        self.smoothing = smoothing
+        self.timeline = None
+        self.reset()
+
+    def reset(self, progress: typing.Optional[int]=0,
+              progress_max: typing.Optional[int]=None,
+              now: typing.Optional[float]=None) -> None:
+        """Restart the progress.
+
+        Parameters
+        ----------
+        progress : int, optional
+            The current progress, default: 0
+        progress_max : int, optional
+            The maximum progress, default: None
+        now : float, optional
+            The current `time.time()`, default: None
+        """
+        if now is None:
+            now = time.time()
+
+        self.progress = progress
+        self.progress_max = progress_max
+        self.start_time = now
+        self.rate = None
+        self._last_increment = None
+
+    def update(self, progress: int, progress_max: int,
+               now: typing.Optional[float]=None) -> None:
+        """Set the new progress and update the rate.
+
+        If the `progress` decreases, the progress is restarted. A changed
+        `progress_max` keeps the rate because steps may be added while
+        measuring.
+
+        Parameters
+        ----------
+        progress : int
+            The current progress
+        progress_max : int
+            The maximum progress
+        now : float, optional
+            The current `time.time()`, default: None
+        """
+        if now is None:
+            now = time.time()
+
+        if progress < self.progress:
+            self.reset(progress, progress_max, now)
+            return
+
+        self.progress_max = progress_max
+        if progress == self.progress:
+            return
+
+        if self._last_increment is not None:
+            last_progress, last_time = self._last_increment
+            if now <= last_time:
+                # wait for the next update to get a duration
+                self.progress = progress
+                return
+
+            rate = (progress - last_progress) / (now - last_time)
+
+            if self.rate is None:
+                self.rate = rate
+            else:
+                smoothing = self.getSmoothing()
+                self.rate = smoothing * rate + (1 - smoothing) * self.rate
+
+        self.progress = progress
+        self._last_increment = (progress, now)
+
+    def getSmoothing(self) -> float:
+        """Get the weight of the newest rate in the smoothed rate.
+
+        Returns
+        -------
+        float
+            The smoothing between 0 and 1
+        """
+        if self.smoothing is not None:
+            return self.smoothing
+
+        # import as late as possible to allow changes by extensions
+        from .config import PROGRESS_RATE_SMOOTHING
+        return PROGRESS_RATE_SMOOTHING
+
+    def getElapsed(self, now: typing.Optional[float]=None) -> float:
+        """Get the time since the progress was started.
+
+        Parameters
+        ----------
+        now : float, optional
+            The current `time.time()`, default: None
+
+        Returns
+        -------
+        float
+            The time in seconds
+        """
+        if now is None:
+            now = time.time()
+
+        return now - self.start_time
+
+    def getPhaseAverages(self) -> typing.Dict[str, float]:
+        """Get the average duration of each phase of the `timeline`.
+
+        Returns
+        -------
+        dict
+            The phase as the key, the mean duration in seconds as the value,
+            empty if there is no timeline
+        """
+        if self.timeline is None:
+            return collections.OrderedDict()
+
+        return self.timeline.getAverageDurations()
+
+    def getEta(self) -> typing.Optional[float]:
+        """Get the estimated time until the progress reaches the maximum.
+
+        The eta is calculated from the smoothed rate. If it is not known yet,
+        the average durations of the `STEP_PHASES` in the timeline are used.
+
+        Returns
+        -------
+        float or None
+            The eta in seconds, None if it is not known
+        """
+        if not isinstance(self.progress_max, (int, float)):
+            return None
+
+        remaining = max(0, self.progress_max - self.progress)
+        if remaining == 0:
+            return 0
+        elif self.rate is not None and self.rate > 0:
+            return remaining / self.rate
+
+        averages = self.getPhaseAverages()
+        step_duration = sum(averages.get(p, 0) for p in STEP_PHASES)
+
+        if step_duration > 0:
+            return remaining * step_duration
+        else:
+            return None
+
+    def formatStatus(self) -> str:
+        """Get the rate and the eta as a human readable text.
+
+        Returns
+        -------
+        str
+            The status text
+        """
+        if self.rate is not None:
+            rate = "{:.2f}".format(self.rate)
+        else:
+            rate = "--"
+
+        eta = self.getEta()
+        if eta is not None:
+            eta = str(datetime.timedelta(seconds=round(eta)))
+        else:
+            eta = "--:--"
+
+        return "{} steps/s, ETA {}".format(rate, eta)
@@ -9,13 +9,16 @@ path_like : tuple
 """
 
 import os
+import re
 import sys
 import math
+import string
 import typing
 import inspect
 import logging
 import pathlib
 import datetime
+import collections
 
 from collections import defaultdict
 
@@ -421,6 +424,8 @@ def expand_vars(*text: str, controller: typing.Optional["Controller"]=None,
     - 'tags': The tags depending on the context, only present if the `tags` are 
       given
     - 'counter': The image counter, only present if the `counter` is given
+    - 'camera': The role of the camera that recorded the image, only present 
+      if the `camera` is given as a keyword argument
     - 'time': The current time as a datetime object
 
     Additionally to the python format values, text can be grouped by using 
@@ -454,101 +459,274 @@ def expand_vars(*text: str, controller: typing.Optional["Controller"]=None,
     tuple of str
         The formatted `text`s
     """
-    from .controller import Controller
-    from .measurement_steps import MeasurementSteps
 
-    if isinstance(series, dict):
-        series_nests = list(MeasurementSteps.getSeriesNests(series))
-    else:
-        series_nests = None
+    template = ExpandVarsTemplate(*text, controller=controller, start=start, 
+                                  series=series, **kwargs)
+    return template.render(step=step, tags=tags, counter=counter)
 
-    format_kwargs = kwargs
+class ExpandVarsTemplate:
+    """A compiled `expand_vars()` template.
 
-    if isinstance(step, dict):
-        format_kwargs["humanstep"] = {}
-        format_kwargs["step"] = step
-    
-    if isinstance(start, dict):
-        format_kwargs["humanstart"] = {}
-        format_kwargs["start"] = start
-    
-    if isinstance(series, dict):
-        format_kwargs["humanseries"] = []
-        format_kwargs["series"] = series_nests
+    The `text` is split into its groups once. Only the fields that are 
+    referenced by the `text` are created, the parts that are constant during
+    a measurement (the variable names and units and the human readable 
+    series) are created when compiling, the step dependent parts each time 
+    the template is rendered. The human readable start is created when 
+    rendering too because iterating over the `MeasurementSteps` changes the 
+    start dict.
 
-    if isinstance(controller, Controller):
-        format_kwargs["varname"] = {}
-        format_kwargs["varunit"] = {}
+    Rendering the template returns the same as `expand_vars()` with the same 
+    arguments.
+
+    Attributes
+    ----------
+    text : tuple of str
+        The texts to format
+    fields : dict or None
+        The names of the referenced fields as the keys and a set of the 
+        referenced keys of the field or None if the whole field is referenced 
+        as the value, None if the referenced fields cannot be found
+    """
+
+    def __init__(self, *text: str, 
+                 controller: typing.Optional["Controller"]=None,
+                 start: typing.Optional[dict]=None,
+                 series: typing.Optional[dict]=None, **kwargs) -> None:
+        """Compile the `text`.
+
+        Parameters
+        ----------
+        text : str
+            The text to format
+        controller, start, series
+            The constant values as in `expand_vars()`
+        
+        Keyword Arguments
+        -----------------
+        Any additional constant value to use in the `text`
+        """
+        from .controller import Controller
+        from .measurement_steps import MeasurementSteps
+
+        self.text = text
+        self._groups = [_split_expand_vars_groups(t) for t in text]
+        self.fields = _get_referenced_fields(self._groups)
+
+        self._constants = kwargs
+        self._variables = collections.OrderedDict()
+
+        if isinstance(controller, Controller):
+            for var in controller.microscope.supported_measurement_variables:
+                self._variables[var.unique_id] = var
+
+        self._start = start
+        if isinstance(start, dict):
+            self._constants["start"] = start
+        
+        if isinstance(series, dict):
+            series_nests = list(MeasurementSteps.getSeriesNests(series))
+            self._constants["humanseries"] = []
+            self._constants["series"] = series_nests
+        
+        if isinstance(controller, Controller):
+            if self.isReferenced("varname") or self.isReferenced("varunit"):
+                self._constants["varname"] = {}
+                self._constants["varunit"] = {}
+
+                for var in self._variables.values():
+                    if var.has_calibration and var.calibrated_name is not None:
+                        self._constants["varname"][var.unique_id] = str(var.calibrated_name)
+                    else:
+                        self._constants["varname"][var.unique_id] = str(var.name)
 
-        for var in controller.microscope.supported_measurement_variables:
-            if var.has_calibration and var.calibrated_name is not None:
-                format_kwargs["varname"][var.unique_id] = str(var.calibrated_name)
+                    if var.has_calibration and var.calibrated_unit is not None:
+                        self._constants["varunit"][var.unique_id] = var.calibrated_unit
+                    elif var.unit is not None:
+                        self._constants["varunit"][var.unique_id] = var.unit
             else:
-                format_kwargs["varname"][var.unique_id] = str(var.name)
+                self._constants["varname"] = {}
+                self._constants["varunit"] = {}
+        
+            if isinstance(series, dict) and self.isReferenced("humanseries"):
+                for nest in series_nests:
+                    if ("variable" in nest and "start" in nest and "end" in nest and 
+                        "step-width" in nest):
+                        try:
+                            var = controller.microscope.getMeasurementVariableById(
+                                nest["variable"])
+                            if var.has_calibration and var.calibrated_name is not None:
+                                name = str(var.calibrated_name)
+                            else:
+                                name = str(var.name)
+                            
+                            self._constants["humanseries"].append({
+                                "variable": name,
+                                "start": human_value(var, nest["start"]),
+                                "end": human_value(var, nest["end"]),
+                                "step-width": human_value(var, nest["step-width"]),
+                            })
+                        except KeyError:
+                            pass 
+    
+    def isReferenced(self, field: str) -> bool:
+        """Whether the `field` is used in the text.
+
+        Parameters
+        ----------
+        field : str
+            The name of the field
+
+        Returns
+        -------
+        bool
+            Whether the field is referenced, True if it is not known
+        """
+        return self.fields is None or field in self.fields
+    
+    def _createHumanValues(self, field: str, values: dict) -> dict:
+        """Create the human readable values of the `values` that are 
+        referenced by the `field`.
+
+        Parameters
+        ----------
+        field : str
+            The name of the field, e.g. "humanstep"
+        values : dict
+            The machine values with the variable id as the key
+
+        Returns
+        -------
+        dict
+            The human readable values with the variable id as the key
+        """
+        human_values = {}
+
+        if not self.isReferenced(field):
+            return human_values
+
+        if self.fields is None or self.fields[field] is None:
+            ids = self._variables.keys()
+        else:
+            ids = self.fields[field]
 
-            if var.has_calibration and var.calibrated_unit is not None:
-                format_kwargs["varunit"][var.unique_id] = var.calibrated_unit
-            elif var.unit is not None:
-                format_kwargs["varunit"][var.unique_id] = var.unit
-            
-            if isinstance(step, dict) and var.unique_id in step:
-                format_kwargs["humanstep"][var.unique_id] = human_value(
-                    var, step[var.unique_id])
-            
-            if isinstance(start, dict) and var.unique_id in start:
-                format_kwargs["humanstart"][var.unique_id] = human_value(
-                    var, start[var.unique_id])
+        for id_ in ids:
+            if id_ in self._variables and id_ in values:
+                human_values[id_] = human_value(self._variables[id_], 
+                                                values[id_])
+        
+        return human_values
+    
+    def render(self, step: typing.Optional[dict]=None, 
+               tags: typing.Optional[dict]=None, 
+               counter: typing.Optional[int]=None, 
+               **kwargs) -> typing.Sequence[str]:
+        """Format the text with the given step dependent values.
+
+        Raises
+        ------
+        KeyError
+            When a field in a '{!<...>!}' group does not exist
+
+        Parameters
+        ----------
+        step, tags, counter
+            The values as in `expand_vars()`
         
-        if isinstance(series_nests, (list, tuple)):
-            for nest in series_nests:
-                if ("variable" in nest and "start" in nest and "end" in nest and 
-                    "step-width" in nest):
+        Keyword Arguments
+        -----------------
+        Any additional value to use in the text, they overwrite the constant
+        values
+
+        Returns
+        -------
+        tuple of str
+            The formatted `text`s
+        """
+        format_kwargs = self._constants.copy()
+        format_kwargs.update(kwargs)
+
+        if isinstance(self._start, dict):
+            format_kwargs["humanstart"] = self._createHumanValues("humanstart",
+                                                                  self._start)
+
+        if isinstance(step, dict):
+            format_kwargs["humanstep"] = self._createHumanValues("humanstep", 
+                                                                 step)
+            format_kwargs["step"] = step
+
+        if tags is not None:
+            format_kwargs["tags"] = tags
+
+        if counter is not None:
+            format_kwargs["counter"] = counter
+        
+        format_kwargs["time"] = datetime.datetime.now()
+
+        names = []
+        for groups in self._groups:
+            name = []
+            for modifier, t in groups:
+                if modifier == "_":
+                    t = t.format_map(DefaultWrapper(format_kwargs))
+                else:
                     try:
-                        var = controller.microscope.getMeasurementVariableById(
-                            nest["variable"])
-                        if var.has_calibration and var.calibrated_name is not None:
-                            name = str(var.calibrated_name)
+                        t = t.format(**format_kwargs)
+                    except KeyError as e:
+                        if modifier == "?":
+                            continue
                         else:
-                            name = str(var.name)
-                        
-                        format_kwargs["humanseries"].append({
-                            "variable": name,
-                            "start": human_value(var, nest["start"]),
-                            "end": human_value(var, nest["end"]),
-                            "step-width": human_value(var, nest["step-width"]),
-                        })
-                    except KeyError:
-                        pass 
-
-    if tags is not None:
-        format_kwargs["tags"] = tags
-
-    if counter is not None:
-        format_kwargs["counter"] = counter
-    
-    format_kwargs["time"] = datetime.datetime.now()
+                            raise e
+                name.append(t)
+            
+            names.append("".join(name))
+            
+        return tuple(names)
 
-    names = []
-    for txt in text:
-        groups = _split_expand_vars_groups(txt)
+def _get_referenced_fields(groups: typing.Iterable[typing.Iterable[typing.Tuple[str, str]]]) -> typing.Optional[typing.Dict[str, typing.Optional[typing.Set[str]]]]:
+    """Get the fields that are used in the `groups`.
 
-        name = []
-        for modifier, t in groups:
-            if modifier == "_":
-                t = t.format_map(DefaultWrapper(format_kwargs))
-            else:
-                try:
-                    t = t.format(**format_kwargs)
-                except KeyError as e:
-                    if modifier == "?":
-                        continue
-                    else:
-                        raise e
-            name.append(t)
-        
-        names.append("".join(name))
-        
-    return tuple(names)
+    Parameters
+    ----------
+    groups : iterable of iterables of tuples
+        The groups of each text as returned by `_split_expand_vars_groups()`
+
+    Returns
+    -------
+    dict or None
+        The field names as the keys and a set of the referenced keys as the 
+        value, the value is None if the field is used without a key or with 
+        an attribute, None if the fields cannot be parsed
+    """
+    formatter = string.Formatter()
+    fields = {}
+
+    def add_fields(text):
+        for _, field, format_spec, _ in formatter.parse(text):
+            if field is None:
+                continue
+            
+            match = re.match(r"([^.\[]*)(?:\[([^\]]*)\])?", field)
+            name, key = match.group(1), match.group(2)
+
+            if key is None or (match.end() < len(field) and 
+                               field[match.end()] == "."):
+                fields[name] = None
+            elif name not in fields:
+                fields[name] = {key}
+            elif fields[name] is not None:
+                fields[name].add(key)
+            
+            if format_spec:
+                add_fields(format_spec)
+
+    try:
+        for text_groups in groups:
+            for _, text in text_groups:
+                add_fields(text)
+    except ValueError:
+        return None
+    
+    return fields
 
 def _split_expand_vars_groups(text: str) -> typing.List[typing.Tuple[str, str]]:
     """Split the given `text` into groups.
@@ -652,13 +830,14 @@ def get_expand_vars_text(controller_given: typing.Optional[bool]=True,
                          start_given: typing.Optional[bool]=True,
                          series_given: typing.Optional[bool]=True,
                          tags_given: typing.Optional[bool]=True,
-                         counter_given: typing.Optional[bool]=True) -> str:
+                         counter_given: typing.Optional[bool]=True,
+                         camera_given: typing.Optional[bool]=False) -> str:
     """Get the expand vars help.
 
     Parameters
     ----------
     controller_given, step_given, start_given, series_given, tags_given, 
-    counter_given: bool
+    counter_given, camera_given: bool
         Whether the corresponding parameter was/will be given for the 
         `expand_vars()` call this help is generated for
 
@@ -710,6 +889,9 @@ def get_expand_vars_text(controller_given: typing.Optional[bool]=True,
                                  "{varunit[<variable-id>]} to use the unit.")
     if tags_given:
         placeholder_texts.append("Use {tags[<tagname>]} to access the tags.")
+    if camera_given:
+        placeholder_texts.append("Use {camera} to access the role of the " + 
+                                 "camera that recorded the image.")
     
     placeholder_texts.append("Use {time:%Y-%m-%d, %H:%M:%S} to access the " + 
                              "time. The time can be formatted with a format " + 
@@ -0,0 +1,462 @@
+import math
+import time
+import typing
+import datetime
+import collections
+import concurrent.futures
+
+import numpy as np
+
+from .events import after_record
+from .datatype import Datatype
+from .logginglib import log_info
+from .logginglib import log_debug
+from .logginglib import log_error
+from .processing_stage import ProcessingStage
+from .drift_correction import downsample
+from .drift_correction import get_spectrum
+
+CONFIG_QUALITY_METRICS_GROUP = "quality-metrics"
+QUALITY_TAGS_KEY = "Quality"
+
+# what to do if an image violates a limit, 'warn' logs the violation only,
+# 'reacquire' records the step again, 'pause' asks the operator
+QUALITY_ACTIONS = ("warn", "reacquire", "pause")
+
+# the configuration key, the metric and whether the limit is a minimum (True)
+# or a maximum (False)
+QUALITY_LIMITS = (
+    ("min-mean", "mean", True),
+    ("max-saturation", "saturation", False),
+    ("min-sharpness", "sharpness", True),
+    ("max-defocus", "defocus", False),
+    ("max-astigmatism", "astigmatism", False)
+)
+
+# the rms frequency of white noise in cycles per pixel, images with this
+# spectrum have a defocus of 0
+WHITE_NOISE_RMS_FREQUENCY = math.sqrt(1 / 6)
+
+def compute_metrics(image_data: np.ndarray,
+                    size: typing.Optional[int]=256,
+                    saturation_level: typing.Optional[float]=255) -> typing.Dict[str, float]:
+    """Get the quality metrics of the `image_data`.
+
+    The saturation is calculated of the full image because binning hides
+    single saturated pixels. All other metrics are calculated of a copy that
+    is binned until no side is longer than the `size`.
+
+    The metrics are:
+    - 'mean', 'std': The mean intensity and its standard deviation
+    - 'saturation': The fraction of pixels at or above the `saturation_level`
+    - 'sharpness': The mean squared gradient relative to the squared mean
+      intensity (gradient energy)
+    - 'defocus': 1 minus the rms frequency of the power spectrum relative to
+      white noise, 0 for sharp, 1 for images without high frequencies
+    - 'astigmatism': The anisotropy of the power spectrum, 0 for round, 1
+      for a line shaped spectrum
+
+    Parameters
+    ----------
+    image_data : numpy.ndarray
+        The 2d image data
+    size : int, optional
+        The maximum side length of the binned copy, default: 256
+    saturation_level : float, optional
+        The intensity from on pixels are saturated, default: 255
+
+    Returns
+    -------
+    dict
+        The metric name as the key, the value as the value
+    """
+    image_data = np.asarray(image_data)
+    saturation = float(np.count_nonzero(image_data >= saturation_level) /
+                       max(1, image_data.size))
+
+    factor = max(1, max(image_data.shape) // max(1, int(size)))
+    data = downsample(image_data, factor)
+
+    mean = float(data.mean())
+    std = float(data.std())
+
+    gy, gx = np.gradient(data)
+    sharpness = float((gx ** 2 + gy ** 2).mean() /
+                      max(mean ** 2, np.finfo(np.float64).eps))
+
+    power = np.abs(get_spectrum(data)) ** 2
+    total = power.sum()
+    if total > 0:
+        fy = np.fft.fftfreq(data.shape[0])[:, np.newaxis]
+        fx = np.fft.fftfreq(data.shape[1])[np.newaxis, :]
+        moments = np.array([[(power * fx * fx).sum(), (power * fx * fy).sum()],
+                            [(power * fx * fy).sum(), (power * fy * fy).sum()]]
+                           ) / total
+        low, high = np.linalg.eigvalsh(moments)
+        defocus = float(np.clip(1 - math.sqrt(max(0, low + high)) /
+                                WHITE_NOISE_RMS_FREQUENCY, 0, 1))
+        astigmatism = float((high - low) / max(high + low,
+                                               np.finfo(np.float64).eps))
+    else:
+        # flat images have no structure at all
+        defocus = 1.0
+        astigmatism = 0.0
+
+    return collections.OrderedDict((
+        ("mean", mean), ("std", std), ("saturation", saturation),
+        ("sharpness", sharpness), ("defocus", defocus),
+        ("astigmatism", astigmatism)
+    ))
+
+class QualityMonitor(ProcessingStage):
+    """Calculate quality metrics of each recorded image and react on bad
+    images.
+
+    The metrics (see `compute_metrics()`) are calculated in a thread pool.
+    They are added to the image tags before the image is saved
+    (`Image.addPendingTags()`), as a row to the measurement log and as a
+    'quality' entry to the timeline of the measurement.
+
+    If limits are set and the action is 'reacquire' or 'pause', the
+    measurement waits for the metrics of each step. Images that violate a
+    limit are recorded again ('reacquire', at most `max_reacquire` times) or
+    the operator decides whether to continue, to record again or to stop
+    ('pause'). With the 'warn' action the measurement does not wait, the
+    violations are logged only.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    size : int
+        The maximum side length of the binned copy the metrics are calculated
+        of
+    saturation_level : float
+        The intensity from on pixels are saturated
+    workers : int
+        The number of threads to calculate the metrics in
+    limits : dict
+        The configuration key of the limit as the key, the limit as the value,
+        only enabled limits are contained
+    action : str
+        What to do with images that violate a limit, one of the
+        `QUALITY_ACTIONS`
+    max_reacquire : int
+        The maximum number of times one step is recorded again
+    results : list of dict
+        The metrics of all images of the current measurement in the order
+        they are calculated, each dict contains the 'step-index', the
+        'camera', the 'metrics' and the 'violations'
+    """
+
+    config_group = CONFIG_QUALITY_METRICS_GROUP
+    event_id = "quality_metrics"
+    allow_negative = False
+
+    def __init__(self, controller: "Controller",
+                 size: typing.Optional[int]=None,
+                 workers: typing.Optional[int]=None,
+                 action: typing.Optional[str]=None,
+                 limits: typing.Optional[typing.Dict[str, float]]=None) -> None:
+        """Create a new quality monitor, all values that are not given are
+        taken from the configuration.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        size : int, optional
+            The maximum side length of the binned copy
+        workers : int, optional
+            The number of threads to calculate the metrics in
+        action : str, optional
+            What to do with images that violate a limit
+        limits : dict, optional
+            The configuration key of the limit as the key, the limit as the
+            value, 0 disables a limit
+        """
+        super(QualityMonitor, self).__init__(controller)
+
+        self.size = max(1, self._getValue("thumbnail-size", size, int, 256))
+        self.workers = max(1, self._getValue("workers", workers, int, 2))
+        self.saturation_level = self._getValue("saturation-level", None,
+                                               float, 255)
+        self.max_reacquire = self._getValue("max-reacquire", None, int, 2)
+
+        self.action = self._getValue("action", action, str, QUALITY_ACTIONS[0])
+        if self.action not in QUALITY_ACTIONS:
+            self.action = QUALITY_ACTIONS[0]
+
+        if limits is None:
+            limits = {}
+        self.limits = collections.OrderedDict()
+        for key, metric, is_minimum in QUALITY_LIMITS:
+            value = self._getValue(key, limits.get(key, None), float, 0)
+            if value > 0:
+                self.limits[key] = value
+
+        self.results = []
+
+    def getEventHandlers(self) -> typing.List[typing.Tuple["Event", typing.Callable, dict]]:
+        """Get the event handlers to register.
+
+        Returns
+        -------
+        list of tuple
+            The event, the handler and the keyword arguments for
+            `Event.register()`
+        """
+        # before other image processing so they get the final images
+        return [(after_record, self.processImages, {"priority": 10})]
+
+    def reset(self, *args) -> None:
+        """Forget the metrics and the submitted images, this is called when a
+        new measurement starts."""
+        super(QualityMonitor, self).reset()
+
+        with self._lock:
+            self.results = []
+            self._measurement = self.controller.measurement
+
+    def check(self, metrics: typing.Dict[str, float]) -> typing.List[str]:
+        """Get the limits the `metrics` violate.
+
+        Parameters
+        ----------
+        metrics : dict
+            The metrics as returned by `compute_metrics()`
+
+        Returns
+        -------
+        list of str
+            The human readable violations, empty if all limits are kept
+        """
+        violations = []
+        for key, metric, is_minimum in QUALITY_LIMITS:
+            if key not in self.limits:
+                continue
+
+            limit = self.limits[key]
+            value = metrics[metric]
+            if (is_minimum and value < limit) or (not is_minimum and value > limit):
+                violations.append("{} {:.4g} is {} than {:.4g}".format(
+                    metric, value, "less" if is_minimum else "greater", limit))
+
+        return violations
+
+    def processImages(self, controller: "Controller") -> None:
+        """Submit all current images of the measurement to the thread pool
+        and react on violated limits if the action requires it.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        if self._executor is None:
+            self.install()
+
+        measurement = controller.measurement
+        if measurement is not self._measurement:
+            self.reset()
+
+        wait = self.action != "warn" and len(self.limits) > 0
+
+        attempts = 0
+        while True:
+            futures = self._submit(measurement)
+
+            if not wait:
+                return
+
+            violations = []
+            for role, future in futures.items():
+                try:
+                    tags = future.result()
+                except Exception as e:
+                    # broken metrics must not stop the measurement
+                    log_error(self._logger, e)
+                    continue
+
+                violations += ["{}: {}".format(role, v) for v in
+                               tags[QUALITY_TAGS_KEY]["violations"]]
+
+            if len(violations) == 0:
+                return
+
+            reason = "; ".join(violations)
+            if self.action == "pause":
+                decision = controller.view.askForDecision(("The images of " +
+                    "step {} failed the quality check: {}").format(
+                    measurement.step_index, reason),
+                    ("Continue", "Re-acquire", "Stop measurement"))
+
+                if decision == 2:
+                    measurement.stop()
+                if decision != 1:
+                    return
+            elif attempts >= self.max_reacquire:
+                log_info(self._logger, ("Keeping the images of step '{}' " +
+                                        "after '{}' re-acquisitions: " +
+                                        "{}").format(measurement.step_index,
+                                        attempts, reason))
+                return
+
+            attempts += 1
+            measurement.reacquireImages(reason)
+
+    def _submit(self, measurement: "Measurement") -> typing.Dict[str, concurrent.futures.Future]:
+        """Submit the current images of the `measurement` to the thread pool.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The measurement
+
+        Returns
+        -------
+        OrderedDict
+            The camera role as the key, the future that returns the tags as
+            the value
+        """
+        futures = collections.OrderedDict()
+        for role, image in measurement.current_images.items():
+            future = self._executor.submit(
+                self._processImage, measurement, role, image.image_data,
+                dict(measurement.current_step), measurement.step_index,
+                measurement.formatName(camera=role))
+            image.addPendingTags(future)
+            futures[role] = future
+
+            with self._lock:
+                self._futures.append(future)
+
+        return futures
+
+    def _processImage(self, measurement: "Measurement", role: str,
+                      image_data: np.ndarray, step: dict, step_index: int,
+                      name: str) -> dict:
+        """Calculate the metrics of one image, this is executed in the thread
+        pool.
+
+        Parameters
+        ----------
+        measurement : Measurement
+            The measurement the image is recorded in
+        role : str
+            The camera role
+        image_data : numpy.ndarray
+            The image data
+        step : dict
+            The measurement step the image is recorded at
+        step_index : int
+            The index of the step
+        name : str
+            The file name of the image
+
+        Returns
+        -------
+        dict
+            The tags to add to the image
+        """
+        start = time.time()
+        metrics = compute_metrics(image_data, self.size, self.saturation_level)
+        violations = self.check(metrics)
+
+        text = ", ".join("{}={:.4g}".format(k, v) for k, v in metrics.items())
+        if len(violations) > 0:
+            log_info(self._logger, ("Image '{}' of camera '{}' failed the " +
+                                    "quality check: {}").format(name, role,
+                                    "; ".join(violations)))
+
+        with self._lock:
+            self.results.append({"step-index": step_index, "camera": role,
+                                 "metrics": metrics,
+                                 "violations": violations})
+
+        measurement.timeline.addEntry("quality", start, time.time() - start,
+                                      name=role, step=step_index,
+                                      passed=len(violations) == 0, **metrics)
+
+        if measurement.measurement_logging:
+            try:
+                measurement.addToMeasurementLog(step, "Quality {}{}".format(
+                    text, " (failed)" if len(violations) > 0 else ""), name,
+                    datetime.datetime.now().isoformat())
+            except Exception as e:
+                # the measurement log may be closed already
+                log_error(self._logger, e)
+
+        tags = dict(metrics)
+        tags["passed"] = len(violations) == 0
+        tags["violations"] = violations
+
+        return {QUALITY_TAGS_KEY: tags}
+
+    @staticmethod
+    def defineConfigurationOptions(configuration: "AbstractConfiguration") -> None:
+        """Define which configuration options this class requires.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration to define the required options in
+        """
+
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "enabled", datatype=bool,
+            default_value=False,
+            description="Whether to calculate the quality metrics (mean, " +
+            "standard deviation, saturation, sharpness, defocus and " +
+            "astigmatism) of each image."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "thumbnail-size", datatype=int,
+            default_value=256,
+            description="The images are binned until no side is longer than " +
+            "this size before the metrics are calculated."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "workers", datatype=int,
+            default_value=2,
+            description="The number of threads to calculate the metrics in."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "saturation-level", datatype=float,
+            default_value=255,
+            description="The intensity from on pixels count as saturated."
+        )
+
+        descriptions = {
+            "min-mean": "The minimum mean intensity, e.g. to detect a " +
+                        "blanked beam",
+            "max-saturation": "The maximum fraction of saturated pixels",
+            "min-sharpness": "The minimum gradient energy relative to the " +
+                             "squared mean intensity",
+            "max-defocus": "The maximum defocus estimate between 0 (sharp) " +
+                           "and 1 (no details)",
+            "max-astigmatism": "The maximum anisotropy of the power " +
+                               "spectrum between 0 and 1"
+        }
+        for key, metric, is_minimum in QUALITY_LIMITS:
+            configuration.addConfigurationOption(
+                CONFIG_QUALITY_METRICS_GROUP, key, datatype=float,
+                default_value=0,
+                description=descriptions[key] + ", use 0 to disable the limit."
+            )
+
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "action",
+            datatype=Datatype.options(QUALITY_ACTIONS),
+            default_value=QUALITY_ACTIONS[0],
+            description="What to do if an image violates a limit. 'warn' " +
+            "logs the violation only, 'reacquire' records the step again " +
+            "(at most 'max-reacquire' times), 'pause' asks whether to " +
+            "continue, to record again or to stop the measurement."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_QUALITY_METRICS_GROUP, "max-reacquire", datatype=int,
+            default_value=2,
+            description="The maximum number of times one step is recorded " +
+            "again if the images violate a limit."
+        )
@@ -0,0 +1,290 @@
+import typing
+import collections
+
+import numpy as np
+
+from .logginglib import log_debug
+from .logginglib import log_error
+from .logginglib import get_logger
+
+def _to_python(value: typing.Any) -> typing.Any:
+    """Convert numpy scalars to python values.
+
+    Parameters
+    ----------
+    value : any
+        The value
+
+    Returns
+    -------
+    any
+        The python value for numpy scalars, the `value` otherwise
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    else:
+        return value
+
+class StepTable:
+    """The measurement steps as columns.
+
+    Each column is a numpy array containing the value of one measurement
+    variable for every step. The `derived` columns contain values that are
+    calculated from the steps but that are no measurement variables, they are
+    not set on the microscope but can be used by plugins during the
+    measurement.
+
+    Attributes
+    ----------
+    columns : OrderedDict
+        The measurement variable ids as the keys and the numpy array with the
+        value for each step as the value
+    derived : OrderedDict
+        The names of the derived columns as the keys and the numpy arrays as
+        the values
+    """
+
+    def __init__(self, columns: typing.Dict[str, np.ndarray],
+                 derived: typing.Optional[typing.Dict[str, np.ndarray]]=None) -> None:
+        """Create the table.
+
+        Parameters
+        ----------
+        columns : dict
+            The measurement variable ids as the keys and the values of each
+            step as the values, all columns must have the same length
+        derived : dict, optional
+            The derived columns, default: None
+        """
+        self._logger = get_logger(self)
+        self.columns = collections.OrderedDict()
+        self.derived = collections.OrderedDict()
+        self._length = None
+
+        for key, column in columns.items():
+            self.columns[key] = self._checkColumn(key, column)
+
+        if isinstance(derived, dict):
+            self.update(derived)
+
+    def __len__(self) -> int:
+        """Get the number of steps.
+
+        Returns
+        -------
+        int
+            The number of steps
+        """
+        return self._length if self._length is not None else 0
+    
+    def _checkColumn(self, key: str, column: typing.Sequence) -> np.ndarray:
+        """Convert the `column` to a numpy array and check its length.
+
+        Raises
+        ------
+        ValueError
+            When the length of the column is not equal to the number of steps
+
+        Parameters
+        ----------
+        key : str
+            The name of the column
+        column : sequence
+            The values for each step
+
+        Returns
+        -------
+        np.ndarray
+            The column
+        """
+        column = np.asarray(column)
+
+        if self._length is None:
+            self._length = len(column)
+
+        if column.shape != (self._length, ):
+            err = ValueError(("The column '{}' has to contain '{}' " +
+                              "values but it has the shape '{}'.").format(
+                              key, self._length, column.shape))
+            log_error(self._logger, err)
+            raise err
+        
+        return column
+
+    def update(self, columns: typing.Dict[str, typing.Sequence]) -> None:
+        """Set the `columns`.
+
+        Columns with the id of a measurement variable of this table replace
+        the targets of this variable, all other columns are set as derived
+        columns.
+
+        Raises
+        ------
+        ValueError
+            When the length of a column is not equal to the number of steps
+
+        Parameters
+        ----------
+        columns : dict
+            The column names as the keys and the values for each step as the
+            values
+        """
+        for key, column in columns.items():
+            column = self._checkColumn(key, column)
+
+            if key in self.columns:
+                self.columns[key] = column
+            else:
+                self.derived[key] = column
+
+    def getStep(self, index: int) -> dict:
+        """Get the step at the `index`.
+
+        Parameters
+        ----------
+        index : int
+            The step index
+
+        Returns
+        -------
+        dict
+            The measurement variable ids as the keys and the python values as
+            the values
+        """
+        return {k: _to_python(c[index]) for k, c in self.columns.items()}
+
+    def getDerived(self, index: int) -> dict:
+        """Get the values of the derived columns at the `index`.
+
+        Parameters
+        ----------
+        index : int
+            The step index
+
+        Returns
+        -------
+        dict
+            The derived column names as the keys and the python values as the
+            values
+        """
+        return {k: _to_python(c[index]) for k, c in self.derived.items()}
+
+class StepTransformers(collections.OrderedDict):
+    """The registered step transformers.
+
+    A step transformer is a callable that gets the `controller` and the
+    `StepTable` of all measurement steps. It returns a dict with the columns
+    to change or add (or None to change nothing). Columns of measurement
+    variables replace the targets of this variable, all other columns are
+    added as derived columns. Transformers should use numpy operations on the
+    whole columns instead of iterating over the steps.
+
+    The transformers are applied once before the measurement starts, the
+    transformers with the higher priority are applied first, transformers
+    with the same priority are applied in insertion order. Each transformer
+    gets the table with the changes of the previous transformers.
+
+    Plugins register their transformers in the `step_transformers`, each
+    `MeasurementSteps` object uses a copy of them.
+
+    Example Usage:
+    ```python
+    >>> def double_focus(controller, table):
+    ...     return {"focus": table.columns["focus"] * 2}
+    >>> step_transformers.register("double-focus", double_focus)
+    ```
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create a new transformer registry."""
+        self._priorities = {}
+        self._logger = get_logger(self, create_msg=False)
+
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value) -> None:
+        # directly set transformers always use the default priority
+        self._priorities.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        self._priorities.pop(key, None)
+        super().__delitem__(key)
+
+    def register(self, key: str, transformer: typing.Callable[["Controller", StepTable], typing.Optional[dict]],
+                 priority: typing.Optional[typing.Union[int, float]]=0) -> None:
+        """Add the `transformer`.
+
+        Parameters
+        ----------
+        key : str
+            The key to add the transformer with, an existing transformer with
+            this key is replaced
+        transformer : callable
+            The transformer, it gets the controller and the `StepTable`
+        priority : int or float, optional
+            Transformers with higher priorities are applied first, default: 0
+        """
+        self[key] = transformer
+        self._priorities[key] = priority
+
+    def copy(self) -> "StepTransformers":
+        """Get a copy of the transformers with their priorities.
+
+        Returns
+        -------
+        StepTransformers
+            The copy
+        """
+        transformers = StepTransformers()
+        for key, transformer in self.items():
+            transformers.register(key, transformer, self.getPriority(key))
+        
+        return transformers
+
+    def getPriority(self, key: str) -> typing.Union[int, float]:
+        """Get the priority of the transformer with the `key`.
+
+        Parameters
+        ----------
+        key : str
+            The key of the transformer
+
+        Returns
+        -------
+        int or float
+            The priority
+        """
+        return self._priorities.get(key, 0)
+
+    def apply(self, controller: "Controller", table: StepTable) -> StepTable:
+        """Apply all transformers to the `table`.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        table : StepTable
+            The table to transform, it is changed in place
+
+        Returns
+        -------
+        StepTable
+            The `table`
+        """
+        keys = sorted(self.keys(), key=lambda k: -self.getPriority(k))
+
+        for key in keys:
+            log_debug(self._logger, "Applying step transformer '{}'".format(key))
+            columns = self[key](controller, table)
+
+            if isinstance(columns, dict) and len(columns) > 0:
+                log_debug(self._logger, ("Step transformer '{}' changed the " +
+                                         "columns '{}'").format(key,
+                                         ", ".join(columns.keys())))
+                table.update(columns)
+
+        return table
+
+# the transformers that are copied to each new `MeasurementSteps` object
+step_transformers = StepTransformers()
@@ -0,0 +1,241 @@
+import time
+import typing
+import threading
+import collections.abc
+
+import numpy as np
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+from .exception_thread import ExceptionThread
+from .measurement_steps import MeasurementSteps
+
+SWEEP_TAGS_KEY = "Sweep"
+
+# the default time in seconds between two readbacks of the swept variable
+DEFAULT_POLL_INTERVAL = 0.01
+# the default number of values that are set while the sweep moves by the 
+# spacing of two frames
+DEFAULT_INCREMENTS_PER_SPACING = 10
+
+def get_sweep_series(series: dict) -> dict:
+    """Get the most inner series of the `series`, this is the series that is
+    swept.
+
+    Parameters
+    ----------
+    series : dict
+        The series definition, it may contain nested "on-each-point" series
+
+    Returns
+    -------
+    dict
+        The most inner series
+    """
+    while isinstance(series.get("on-each-point", None), dict):
+        series = series["on-each-point"]
+
+    return series
+
+class SweepSteps(collections.abc.Sequence):
+    """The steps of a measurement whose most inner series is swept.
+
+    This is a view on the `MeasurementSteps` that contains only the steps
+    where the swept variable is at the start of its series. Each of those
+    steps is approached normally, then the swept variable is ramped to the end
+    of its series while the camera records.
+
+    Attributes
+    ----------
+    steps : MeasurementSteps
+        The steps of the complete series
+    series : dict
+        The series definition that is used to create the steps
+    start : dict
+        The start definition that is used to create the steps
+    sweep_series : dict
+        The most inner series that is swept
+    """
+
+    def __init__(self, steps: MeasurementSteps) -> None:
+        """Create the sweep steps.
+
+        Parameters
+        ----------
+        steps : MeasurementSteps
+            The steps of the complete series
+        """
+        self.steps = steps
+        self.series = steps.series
+        self.start = steps.start
+        self.sweep_series = get_sweep_series(steps.series)
+        self._inner_length = list(steps._getNestLengths())[-1]
+
+    def __len__(self) -> int:
+        """Get the number of sweeps.
+
+        Returns
+        -------
+        int
+            The number of steps where a sweep starts
+        """
+        return len(self.steps) // self._inner_length
+
+    def __getitem__(self, index: int) -> dict:
+        """Get the step where the sweep with the given `index` starts.
+
+        Raises
+        ------
+        IndexError
+            When the `index` is out of bounds
+
+        Returns
+        -------
+        dict
+            The measurement step dict
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(("The index has to be 0 <= index < {} but it " +
+                              "is '{}'.").format(len(self), index))
+
+        return self.steps[index * self._inner_length]
+
+class ReadbackPoller:
+    """Read the value of a measurement variable repeatedly in a thread.
+
+    The readbacks are saved with the time they are taken at, the value at any
+    time in between can then be interpolated.
+
+    Attributes
+    ----------
+    microscope : MicroscopeInterface
+        The microscope to read from
+    variable_id : str
+        The id of the measurement variable to read
+    interval : float
+        The time in seconds between two readbacks
+    times, values : list of float
+        The times (as `time.time()`) and the values of the readbacks
+    """
+
+    def __init__(self, microscope: "MicroscopeInterface", variable_id: str,
+                 interval: typing.Optional[float]=DEFAULT_POLL_INTERVAL) -> None:
+        """Create the poller.
+
+        Parameters
+        ----------
+        microscope : MicroscopeInterface
+            The microscope to read from
+        variable_id : str
+            The id of the measurement variable to read
+        interval : float, optional
+            The time in seconds between two readbacks,
+            default: `DEFAULT_POLL_INTERVAL`
+        """
+        self._logger = get_logger(self)
+        self.microscope = microscope
+        self.variable_id = variable_id
+        self.interval = interval
+
+        self.times = []
+        self.values = []
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._finished = False
+        self.thread = None
+
+    def read(self) -> None:
+        """Read the value once, the time is the middle of the read call."""
+        if hasattr(self.microscope, "invalidate"):
+            # never use cached values, the variable is moving
+            self.microscope.invalidate(self.variable_id)
+
+        start = time.time()
+        value = self.microscope.getMeasurementVariableValue(self.variable_id)
+        timestamp = (start + time.time()) / 2
+
+        with self._condition:
+            self.times.append(timestamp)
+            self.values.append(value)
+            self._condition.notify_all()
+
+    def _poll(self) -> None:
+        """Read the value until the poller is stopped, this is executed in the
+        poller thread."""
+        while not self._stop.is_set():
+            self.read()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """Read the first value and start polling in the poller thread."""
+        self._stop.clear()
+        self._finished = False
+        self.read()
+        self.thread = ExceptionThread(target=self._poll,
+                                      name="poll {}".format(self.variable_id))
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop polling and read the last value."""
+        self._stop.set()
+        if isinstance(self.thread, threading.Thread):
+            self.thread.join()
+
+        self.read()
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+        log_debug(self._logger, "Stopped polling '{}' after '{}' reads".format(
+                                self.variable_id, len(self.times)))
+
+    def waitFor(self, timestamp: float, timeout: typing.Optional[float]=None) -> bool:
+        """Wait until there is a readback after the `timestamp`.
+
+        Parameters
+        ----------
+        timestamp : float
+            The time as `time.time()`
+        timeout : float, optional
+            The maximum time to wait in seconds, None to wait until the poller
+            is stopped, default: None
+
+        Returns
+        -------
+        bool
+            Whether there is a readback after the `timestamp` or the poller is
+            stopped
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: (self._finished or (len(self.times) > 0 and 
+                                            self.times[-1] >= timestamp)),
+                timeout)
+
+    def interpolate(self, timestamp: float) -> float:
+        """Get the linearly interpolated value at the `timestamp`.
+
+        Before the first and after the last readback the first or the last
+        value is returned.
+
+        Raises
+        ------
+        ValueError
+            When there are no readbacks yet
+
+        Parameters
+        ----------
+        timestamp : float
+            The time as `time.time()`
+
+        Returns
+        -------
+        float
+            The value
+        """
+        with self._condition:
+            if len(self.times) == 0:
+                raise ValueError(("There are no readbacks of '{}' to " +
+                                  "interpolate.").format(self.variable_id))
+
+            return float(np.interp(timestamp, self.times, self.values))
@@ -0,0 +1,433 @@
+import os
+import math
+import typing
+import concurrent.futures
+
+import numpy as np
+
+from .events import after_record
+from .events import series_ready
+from .logginglib import log_info
+from .logginglib import log_debug
+from .logginglib import log_error
+from .processing_stage import ProcessingStage
+from .measurement_steps import MeasurementSteps
+
+CONFIG_TIE_RECONSTRUCTION_GROUP = "tie-reconstruction"
+
+# physical constants in SI units
+PLANCK_CONSTANT = 6.62607015e-34
+REDUCED_PLANCK_CONSTANT = PLANCK_CONSTANT / (2 * math.pi)
+ELEMENTARY_CHARGE = 1.602176634e-19
+ELECTRON_MASS = 9.1093837015e-31
+SPEED_OF_LIGHT = 299792458
+
+def electron_wavelength(acceleration_voltage: float) -> float:
+    """Get the relativistic wavelength of electrons.
+
+    Parameters
+    ----------
+    acceleration_voltage : float
+        The acceleration voltage in V
+
+    Returns
+    -------
+    float
+        The wavelength in m
+    """
+    energy = ELEMENTARY_CHARGE * acceleration_voltage
+    return PLANCK_CONSTANT / math.sqrt(
+        2 * ELECTRON_MASS * energy *
+        (1 + energy / (2 * ELECTRON_MASS * SPEED_OF_LIGHT ** 2)))
+
+def solve_tie(stack: typing.Sequence[np.ndarray],
+              defoci: typing.Sequence[float], wavelength: float,
+              pixel_size: float,
+              regularization: typing.Optional[float]=1e-3) -> np.ndarray:
+    """Get the phase from a defocus stack by solving the transport of
+    intensity equation.
+
+    The intensity derivative is the least squares slope of the intensities
+    over the defoci, so triplets and larger stacks can be used. The intensity
+    is assumed to be uniform (the mean of the stack), the equation is then
+    solved by an inverse laplacian in fourier space. The `regularization` is
+    added to the squared frequencies (relative to the largest squared
+    frequency) to suppress the low frequency noise.
+
+    Raises
+    ------
+    ValueError
+        When there are less than two images or all defoci are equal
+
+    Parameters
+    ----------
+    stack : sequence of numpy.ndarray
+        The images of the defocus stack
+    defoci : sequence of float
+        The defocus of each image in m
+    wavelength : float
+        The electron wavelength in m
+    pixel_size : float
+        The size of one pixel in the object plane in m
+    regularization : float, optional
+        The regularization parameter, default: 1e-3
+
+    Returns
+    -------
+    numpy.ndarray
+        The phase in rad
+    """
+    if len(stack) < 2 or len(stack) != len(defoci):
+        raise ValueError(("The stack must contain at least two images with " +
+                          "one defocus each but there are {} images and {} " +
+                          "defoci.").format(len(stack), len(defoci)))
+
+    defoci = np.asarray(defoci, dtype=np.float64)
+    dz = defoci - defoci.mean()
+    if np.all(dz == 0):
+        raise ValueError("All images of the stack have the same defocus.")
+
+    intensities = np.asarray(stack, dtype=np.float64)
+    mean_intensity = intensities.mean()
+    if mean_intensity <= 0:
+        mean_intensity = 1
+
+    # least squares slope of the intensity over the defocus
+    derivative = (np.tensordot(dz, intensities - intensities.mean(axis=0),
+                               axes=1) / np.sum(dz ** 2))
+
+    k = 2 * math.pi / wavelength
+    h, w = derivative.shape
+    qy = np.fft.fftfreq(h, pixel_size)[:, np.newaxis]
+    qx = np.fft.fftfreq(w, pixel_size)[np.newaxis, :]
+    q2 = 4 * math.pi ** 2 * (qx ** 2 + qy ** 2)
+    alpha = regularization * q2.max()
+
+    # laplace(phase) = -k / I0 * dI/dz
+    source = np.fft.fft2(-k / mean_intensity * derivative)
+    phase = np.fft.ifft2(-source / (q2 + alpha)).real
+    return phase - phase.mean()
+
+def induction_maps(phase: np.ndarray, pixel_size: float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Get the in-plane magnetic induction integrated along the beam
+    direction from the `phase`.
+
+    Parameters
+    ----------
+    phase : numpy.ndarray
+        The phase in rad
+    pixel_size : float
+        The size of one pixel in the object plane in m
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        The x and y component of the induction times the thickness in T*m
+    """
+    dphase_dy, dphase_dx = np.gradient(phase, pixel_size)
+    factor = REDUCED_PLANCK_CONSTANT / ELEMENTARY_CHARGE
+    return factor * dphase_dy, -factor * dphase_dx
+
+def reconstruct_stack(stack: typing.Sequence[np.ndarray],
+                      defoci: typing.Sequence[float], wavelength: float,
+                      pixel_size: float, regularization: float,
+                      path_root: str) -> typing.List[str]:
+    """Reconstruct the phase and the induction of a defocus stack and save
+    them as numpy files, this is executed in the process pool.
+
+    Parameters
+    ----------
+    stack, defoci, wavelength, pixel_size, regularization
+        The parameters for `solve_tie()`
+    path_root : str
+        The path to save the files to without the extension, the files get
+        the suffixes '-phase.npy', '-induction-x.npy' and '-induction-y.npy'
+
+    Returns
+    -------
+    list of str
+        The saved files
+    """
+    phase = solve_tie(stack, defoci, wavelength, pixel_size, regularization)
+    induction_x, induction_y = induction_maps(phase, pixel_size)
+
+    os.makedirs(os.path.dirname(path_root), exist_ok=True)
+
+    paths = []
+    for suffix, data in (("phase", phase), ("induction-x", induction_x),
+                         ("induction-y", induction_y)):
+        path = "{}-{}.npy".format(path_root, suffix)
+        np.save(path, data)
+        paths.append(path)
+
+    return paths
+
+class TIEReconstructor(ProcessingStage):
+    """Reconstruct the phase of each complete defocus stack of a series while
+    the measurement continues.
+
+    The images are grouped by the values of all series variables except the
+    focus variable. When all focus values of the focus series are recorded for
+    one group (e.g. for one field value), the stack is reconstructed in a
+    process pool. The phase and the induction maps are saved next to the
+    image of the middle focus value.
+
+    Attributes
+    ----------
+    controller : Controller
+        The controller
+    focus_variable_id : str
+        The id of the measurement variable that changes the defocus
+    defocus_per_unit : float
+        The defocus in m of one unit of the focus variable
+    wavelength : float
+        The electron wavelength in m
+    pixel_size : float
+        The size of one pixel in the object plane in m
+    regularization : float
+        The regularization parameter of the `solve_tie()` function
+    workers : int
+        The number of processes to reconstruct in
+    results : list of dict
+        The reconstructed stacks of the current series in the order they
+        are finished, each dict contains the 'group' values and the saved
+        'paths'
+    """
+
+    config_group = CONFIG_TIE_RECONSTRUCTION_GROUP
+    event_id = "tie_reconstruction"
+
+    def __init__(self, controller: "Controller",
+                 focus_variable_id: typing.Optional[str]=None,
+                 defocus_per_unit: typing.Optional[float]=None,
+                 acceleration_voltage: typing.Optional[float]=None,
+                 pixel_size: typing.Optional[float]=None,
+                 regularization: typing.Optional[float]=None,
+                 workers: typing.Optional[int]=None) -> None:
+        """Create a new reconstructor, all values that are not given are taken
+        from the configuration.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        focus_variable_id : str, optional
+            The id of the measurement variable that changes the defocus
+        defocus_per_unit : float, optional
+            The defocus in m of one unit of the focus variable
+        acceleration_voltage : float, optional
+            The acceleration voltage in V
+        pixel_size : float, optional
+            The size of one pixel in the object plane in m
+        regularization : float, optional
+            The regularization parameter
+        workers : int, optional
+            The number of processes to reconstruct in
+        """
+        super(TIEReconstructor, self).__init__(controller)
+
+        self.focus_variable_id = self._getValue("focus-variable-id",
+                                                focus_variable_id, str, "")
+        self.defocus_per_unit = self._getValue("defocus-per-unit",
+                                               defocus_per_unit, float, 1e-9)
+        self.wavelength = electron_wavelength(self._getValue(
+            "acceleration-voltage", acceleration_voltage, float, 300e3))
+        self.pixel_size = self._getValue("pixel-size", pixel_size, float,
+                                         1e-9)
+        self.regularization = self._getValue("regularization", regularization,
+                                             float, 1e-3)
+        self.workers = max(1, self._getValue("workers", workers, int, 1))
+
+        self.results = []
+        self._stacks = {}
+        self._stack_size = None
+        self._group_variables = ()
+
+    def getEventHandlers(self) -> typing.List[typing.Tuple["Event", typing.Callable, dict]]:
+        """Get the event handlers to register.
+
+        Returns
+        -------
+        list of tuple
+            The event, the handler and the keyword arguments for
+            `Event.register()`
+        """
+        return [(series_ready, self.reset, {"isolate_errors": True}),
+                (after_record, self.collectImages, {"isolate_errors": True})]
+
+    def _createExecutor(self) -> concurrent.futures.Executor:
+        """Create the process pool the stacks are reconstructed in.
+
+        Returns
+        -------
+        concurrent.futures.Executor
+            A process pool with `workers` processes
+        """
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
+    def reset(self, *args) -> None:
+        """Forget the collected images and the results and find the focus
+        series in the steps of the current measurement, this is called when
+        a new series starts."""
+        log_debug(self._logger, "Resetting TIE reconstruction")
+        super(TIEReconstructor, self).reset()
+
+        with self._lock:
+            self.results = []
+            self._stacks = {}
+            self._stack_size = None
+            self._group_variables = ()
+
+            measurement = self.controller.measurement
+            self._measurement = measurement
+            if measurement is None:
+                return
+
+            if isinstance(measurement.steps, MeasurementSteps):
+                series = measurement.steps.series
+            else:
+                series = getattr(measurement, "series_definition", None)
+
+            if not isinstance(series, dict):
+                return
+
+            variables = []
+            for nest in MeasurementSteps.getSeriesNests(series):
+                if nest["variable"] == self.focus_variable_id:
+                    self._stack_size = MeasurementSteps._getSeriesLength(nest)
+                else:
+                    variables.append(nest["variable"])
+
+            self._group_variables = tuple(variables)
+
+        if self._stack_size is None or self._stack_size < 2:
+            log_info(self._logger, ("The series does not contain a focus " +
+                                    "series over '{}', nothing is " +
+                                    "reconstructed").format(
+                                    self.focus_variable_id))
+            self._stack_size = None
+
+    def collectImages(self, controller: "Controller") -> None:
+        """Add the current image of the main camera to its stack and start
+        the reconstruction if the stack is complete.
+
+        Parameters
+        ----------
+        controller : Controller
+            The controller
+        """
+        measurement = controller.measurement
+        if measurement is not self._measurement:
+            # the series_ready event is not fired for every measurement
+            self.reset()
+
+        if self._stack_size is None or measurement.current_image is None:
+            return
+
+        if self._executor is None:
+            self.install()
+
+        # the read values differ from step to step, group by the targets
+        step = measurement.target_step
+        group = tuple(step[v] for v in self._group_variables)
+
+        with self._lock:
+            stack = self._stacks.setdefault(group, [])
+            stack.append((step[self.focus_variable_id],
+                          measurement.current_image.image_data,
+                          measurement.formatName()))
+
+            if len(stack) < self._stack_size:
+                return
+
+            del self._stacks[group]
+
+        stack.sort(key=lambda s: s[0])
+        defoci = [s[0] * self.defocus_per_unit for s in stack]
+        path_root, _ = os.path.splitext(os.path.join(
+            measurement.save_dir, stack[len(stack) // 2][2]))
+
+        log_debug(self._logger, ("Starting TIE reconstruction of the stack " +
+                                 "'{}' with the defoci '{}'").format(group,
+                                 defoci))
+        future = self._executor.submit(reconstruct_stack,
+                                       [s[1] for s in stack], defoci,
+                                       self.wavelength, self.pixel_size,
+                                       self.regularization, path_root)
+        group = dict(zip(self._group_variables, group))
+        future.add_done_callback(lambda f: self._addResult(group, f))
+
+        with self._lock:
+            self._futures.append(future)
+
+    def _addResult(self, group: dict, future: concurrent.futures.Future) -> None:
+        """Add the result of a finished reconstruction.
+
+        Parameters
+        ----------
+        group : dict
+            The variable ids and values of the stack
+        future : concurrent.futures.Future
+            The finished future
+        """
+        try:
+            paths = future.result()
+        except Exception as e:
+            log_error(self._logger, e)
+            return
+
+        log_info(self._logger, "Reconstructed stack '{}' to '{}'".format(
+                               group, paths))
+        with self._lock:
+            self.results.append({"group": group, "paths": paths})
+
+    @staticmethod
+    def defineConfigurationOptions(configuration: "AbstractConfiguration") -> None:
+        """Define which configuration options this class requires.
+
+        Parameters
+        ----------
+        configuration : AbstractConfiguration
+            The configuration to define the required options in
+        """
+
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "enabled", datatype=bool,
+            default_value=False,
+            description="Whether to reconstruct the phase of each complete " +
+            "focus series while the measurement is running."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "focus-variable-id",
+            datatype=str, default_value="",
+            description="The id of the measurement variable that changes " +
+            "the defocus."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "defocus-per-unit",
+            datatype=float, default_value=1e-9,
+            description="The defocus in m that one unit of the focus " +
+            "variable causes."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "acceleration-voltage",
+            datatype=float, default_value=300e3,
+            description="The acceleration voltage of the microscope in V."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "pixel-size",
+            datatype=float, default_value=1e-9,
+            description="The size of one pixel in the object plane in m."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "regularization",
+            datatype=float, default_value=1e-3,
+            description="The regularization of the inverse laplacian " +
+            "relative to the highest frequency, higher values suppress more " +
+            "low frequency noise."
+        )
+        configuration.addConfigurationOption(
+            CONFIG_TIE_RECONSTRUCTION_GROUP, "workers", datatype=int,
+            default_value=2,
+            description="The number of processes to reconstruct in."
+        )
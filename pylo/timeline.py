@@ -0,0 +1,207 @@
+import csv
+import time
+import typing
+import pathlib
+import threading
+import contextlib
+import collections
+
+from .logginglib import log_debug
+from .logginglib import get_logger
+
+TimelineEntry = collections.namedtuple("TimelineEntry",
+    ("step", "phase", "name", "start", "duration", "details"))
+TimelineEntry.__doc__ = """One timed action of the measurement.
+
+Attributes
+----------
+step : int or None
+    The index of the measurement step the entry belongs to or None if it does
+    not belong to a step
+phase : str
+    The phase, e.g. "approach", "record" or "event"
+name : str
+    A more detailed name, e.g. the event handler key
+start : float
+    The `time.time()` when the action started
+duration : float
+    The duration of the action in seconds
+details : dict
+    Additional information
+"""
+
+class Timeline:
+    """A thread-safe collection of timed actions of one measurement.
+
+    Example:
+    ```python
+    >>> timeline = Timeline()
+    >>> with timeline.measure("record", step=0):
+    ...     camera.recordImage()
+    >>> timeline.getAverageDurations()
+    {"record": 0.51}
+    ```
+
+    Attributes
+    ----------
+    columns : tuple of str
+        The column headlines used when saving the timeline
+    """
+
+    columns = ("Step", "Phase", "Name", "Start", "Duration", "Details")
+
+    def __init__(self) -> None:
+        """Create a new empty timeline."""
+        self._entries = []
+        self._lock = threading.Lock()
+        self._logger = get_logger(self)
+
+    def addEntry(self, phase: str, start: float, duration: float,
+                 name: typing.Optional[str]="",
+                 step: typing.Optional[int]=None, **details) -> TimelineEntry:
+        """Add an entry to the timeline.
+
+        Parameters
+        ----------
+        phase : str
+            The phase, e.g. "approach", "record" or "event"
+        start : float
+            The `time.time()` when the action started
+        duration : float
+            The duration in seconds
+        name : str, optional
+            A more detailed name, default: ""
+        step : int, optional
+            The index of the measurement step, default: None
+
+        Keyword Arguments
+        -----------------
+        Any additional information to save with the entry
+
+        Returns
+        -------
+        TimelineEntry
+            The added entry
+        """
+
+        entry = TimelineEntry(step, phase, name, start, duration, details)
+
+        with self._lock:
+            self._entries.append(entry)
+
+        return entry
+
+    @contextlib.contextmanager
+    def measure(self, phase: str, name: typing.Optional[str]="",
+                step: typing.Optional[int]=None, **details) -> typing.Iterator[dict]:
+        """Measure the execution time of the `with` block and add it as an
+        entry.
+
+        The entry is added even if the block raises an exception. The yielded
+        dict can be used to add details inside the block.
+
+        Parameters
+        ----------
+        phase : str
+            The phase, e.g. "approach", "record" or "event"
+        name : str, optional
+            A more detailed name, default: ""
+        step : int, optional
+            The index of the measurement step, default: None
+
+        Keyword Arguments
+        -----------------
+        Any additional information to save with the entry
+
+        Yields
+        ------
+        dict
+            The details dict of the entry
+        """
+
+        start = time.time()
+        try:
+            yield details
+        finally:
+            self.addEntry(phase, start, time.time() - start, name, step,
+                          **details)
+
+    @property
+    def entries(self) -> typing.List[TimelineEntry]:
+        """A copy of all entries in the order they were added."""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self) -> int:
+        """Get the number of entries.
+
+        Returns
+        -------
+        int
+            The number of entries
+        """
+        with self._lock:
+            return len(self._entries)
+
+    def getPhaseDurations(self) -> typing.Dict[str, typing.List[float]]:
+        """Get all durations grouped by their phase.
+
+        Returns
+        -------
+        dict
+            The phase as the key, the list of durations as the value
+        """
+
+        durations = collections.OrderedDict()
+        for entry in self.entries:
+            if entry.phase not in durations:
+                durations[entry.phase] = []
+            durations[entry.phase].append(entry.duration)
+
+        return durations
+
+    def getAverageDurations(self) -> typing.Dict[str, float]:
+        """Get the average duration of each phase.
+
+        Returns
+        -------
+        dict
+            The phase as the key, the mean duration in seconds as the value
+        """
+
+        return collections.OrderedDict(
+            (p, sum(d) / len(d)) for p, d in self.getPhaseDurations().items()
+        )
+
+    def saveTo(self, file_path: typing.Union[str, pathlib.PurePath]) -> None:
+        """Save the timeline as a csv file.
+
+        Existing files are overwritten.
+
+        Raises
+        ------
+        OSError
+            When the file cannot be written
+
+        Parameters
+        ----------
+        file_path : str, pathlib.PurePath
+            The path to save the timeline to
+        """
+
+        log_debug(self._logger, "Saving timeline with '{}' entries to '{}'".format(
+                                len(self), file_path))
+
+        with open(file_path, "w", newline="") as f:
+            writer = csv.writer(f, delimiter=",", quotechar="\"",
+                                quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(self.columns)
+
+            for entry in self.entries:
+                writer.writerow((
+                    entry.step if entry.step is not None else "",
+                    entry.phase, entry.name, "{:.6f}".format(entry.start),
+                    "{:.6f}".format(entry.duration),
+                    "; ".join("{}={}".format(k, v)
+                              for k, v in sorted(entry.details.items()))
+                ))
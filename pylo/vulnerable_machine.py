@@ -1,6 +1,9 @@
+import types
+import typing
 import inspect
 import logging
 import traceback
+import concurrent.futures
 
 from .errors import BlockedFunctionError
 
@@ -9,14 +12,56 @@ from .events import emergency
 from .logginglib import do_log
 from .logginglib import get_logger
 from .blocked_function import BlockedFunction
+from .emergency_executor import wait_for_safe_states
+from .emergency_executor import get_emergency_executor
+
+# the priority of the emergency event handler that starts the safe state, this
+# is executed before all other handlers, the handler that waits for the safe
+# state is executed after all other handlers
+EMERGENCY_HANDLER_PRIORITY = 1000
+
+# the names of the methods to block of each class
+_method_tables = {}
+
+def _get_blockable_methods(cls: type) -> typing.Tuple[str, ...]:
+    """Get the names of the methods of the `cls` that are blocked in the 
+    emergency state.
+
+    The names are collected once per class without evaluating any attribute 
+    of an object.
+
+    Parameters
+    ----------
+    cls : type
+        The class
+
+    Returns
+    -------
+    tuple of str
+        The method names
+    """
+    if cls not in _method_tables:
+        names = []
+        for name in dir(cls):
+            if name in ("resolveEmergencyState", "__class__"):
+                continue
+
+            attr = inspect.getattr_static(cls, name)
+            if isinstance(attr, (types.FunctionType, classmethod)):
+                names.append(name)
+
+        _method_tables[cls] = tuple(names)
+
+    return _method_tables[cls]
 
 class VulnerableMachine:
     """
     An abstract class that allows machines to switch off if an error occurres.
 
     This object listens to the emergency event. If the emergency event is
-    executed, the resetToEmergencyState() function is executed. Also the 
-    emergency state will be saved until it is resolved again.
+    executed, the machine is set to the safe state by the emergency executor
+    immediately. Also the emergency state will be saved until it is resolved
+    again.
 
     Attributes
     ----------
@@ -34,24 +79,43 @@ class VulnerableMachine:
         """Create the vulnerable machine object"""
         super(VulnerableMachine, self).__init__()
         self._in_emergency_state = False
+        self._safe_state_future = None
 
         self._logger = get_logger(self)
 
         # add a listener to the emergency event to go in emergency state 
-        # whenever the emergency event is created
+        # whenever the emergency event is created, the safe state is started
+        # first, waiting for it is done after all other handlers
         self.emergency_event_id = "vulnerable_machine_emergency_state"
-        emergency[self.emergency_event_id] = self.resetToEmergencyState
+        emergency.register(self.emergency_event_id, self.startEmergencyState,
+                           priority=EMERGENCY_HANDLER_PRIORITY)
+        emergency.register("vulnerable_machine_wait_for_safe_state",
+                           wait_for_safe_states,
+                           priority=-EMERGENCY_HANDLER_PRIORITY)
     
-    def resetToEmergencyState(self, *args) -> None:
-        """Set the machine to be in emergency state.
+    def startEmergencyState(self, *args) -> concurrent.futures.Future:
+        """Start setting the machine to be in emergency state without waiting.
+
+        The `resetToSafeState()` is started in the emergency executor
+        immediately, after that all functions (except the
+        `resolveEmergencyState()` function) are blocked and throw a
+        `BlockedFunctionError`. The emergency threads can still execute them.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            The future of the `resetToSafeState()` call
+        """
+        if self._in_emergency_state and self._safe_state_future is not None:
+            # the safe state is started already
+            return self._safe_state_future
 
-        This will reset the machine to be in the safe state. In addition the 
-        emergency case will be saved. The user needs to unblock everything 
-        until the program can continue.
+        self._in_emergency_state = True
+        self._safe_state_future = get_emergency_executor().submit(
+            self.__class__.__name__, self, self.resetToSafeState)
 
-        Calling this function will make all functions (except the 
-        resolveEmergencyState() function) to throw a BlockedFunctionError.
-        """
+        for name in _get_blockable_methods(self.__class__):
+            setattr(self, name, BlockedFunction(getattr(self, name), name))
 
         if do_log(self._logger, logging.CRITICAL):
             self._logger.critical("Setting to emergency mode")
@@ -68,20 +132,43 @@ class VulnerableMachine:
         traceback.print_stack()
         print("")
 
-        self._in_emergency_state = True
-        self.resetToSafeState()
+        return self._safe_state_future
+
+    def resetToEmergencyState(self, *args) -> None:
+        """Set the machine to be in emergency state.
 
-        for name, _ in inspect.getmembers(self, predicate=inspect.ismethod):
-            if name != "resolveEmergencyState":
-                setattr(self, name, BlockedFunction(getattr(self, name), name))
+        This will reset the machine to be in the safe state. In addition the
+        emergency case will be saved. The user needs to unblock everything
+        until the program can continue.
+
+        Calling this function will make all functions (except the
+        resolveEmergencyState() function) to throw a BlockedFunctionError.
+
+        This waits until the machine is in the safe state but at most for the
+        `config.EMERGENCY_SAFE_STATE_TIMEOUT`.
+
+        Raises
+        ------
+        Exception
+            The exception of the `resetToSafeState()` if it failed
+        """
+        future = self.startEmergencyState(*args)
+        if get_emergency_executor().wait((future, )):
+            error = future.exception()
+            if error is not None:
+                raise error
     
     def resolveEmergencyState(self) -> None:
         """Unblocks the machine and resolves the emergency state.
 
         The functions can now be used again.
         """
-        for name, _ in inspect.getmembers(self, predicate=lambda x: isinstance(x, BlockedFunction)):
-            setattr(self, name, getattr(self, name).func)
+        for name in _get_blockable_methods(self.__class__):
+            func = getattr(self, name)
+            if isinstance(func, BlockedFunction):
+                setattr(self, name, func.func)
+
+        self._safe_state_future = None
     
     def resetToSafeState(self) -> None:
         """Set the machine into its safe state.
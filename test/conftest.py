@@ -0,0 +1,18 @@
+"""The fixtures that are shared by the tests."""
+
+import pytest
+
+import pylo
+pylo.config.ENABLED_PROGRAM_LOG_LEVELS = []
+
+from pylotestlib import create_controller
+
+@pytest.fixture()
+def controller(tmp_path):
+    """A controller with the `DummyMicroscope` and the `DummyCamera` that 
+    saves in the `tmp_path`."""
+    yield create_controller(tmp_path)
+
+    pylo.init_ready.clear()
+    pylo.user_ready.clear()
+    pylo.series_ready.clear()
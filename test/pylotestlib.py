@@ -1,11 +1,14 @@
 """This file defines classes, mainly dummy classes replacing the real classes
 for testing."""
 
+import os
 import sys
 import math
 import time
 import typing
 
+import numpy as np
+
 realstdout = sys.stdout
 
 import pylo
@@ -157,6 +160,105 @@ class DummyConfiguration(pylo.AbstractConfiguration):
         self.request_log = []
         self.configuration = {}
 
+class DummyMicroscope(pylo.MicroscopeInterface):
+    """A microscope with a focus and a tilt that counts how often the lorentz
+    mode and the safe state are set."""
+
+    def __init__(self, controller):
+        super().__init__(controller)
+
+        self.supported_measurement_variables = [
+            pylo.MeasurementVariable("focus", "Focus", 0, 10, "mA"),
+            pylo.MeasurementVariable("x-tilt", "Tilt (x direction)", -35, 35, "deg")
+        ]
+        self.values = {"focus": 0, "x-tilt": 0}
+        self.lorentz_mode_calls = 0
+        self.safe_state_calls = 0
+
+    def setMeasurementVariableValue(self, id_, value):
+        self.values[id_] = value
+
+    def getMeasurementVariableValue(self, id_):
+        return self.values[id_]
+
+    def setInLorentzMode(self, lorentz_mode):
+        self.lorentz_mode_calls += 1
+
+    def getInLorentzMode(self):
+        return self.lorentz_mode_calls > 0
+
+    def resetToSafeState(self):
+        self.safe_state_calls += 1
+
+class DummyCamera(pylo.CameraInterface):
+    """A camera recording empty images that fails if `fail` is True."""
+
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.fail = False
+        self.safe_state_calls = 0
+
+    def resetToSafeState(self):
+        self.safe_state_calls += 1
+
+    def recordImage(self, *args, **kwargs):
+        if self.fail:
+            raise RuntimeError("The camera failed on purpose.")
+        return pylo.Image(np.zeros((4, 4)), {})
+
+def create_controller(save_dir):
+    """Create a controller with the `DummyMicroscope` and the `DummyCamera` 
+    that saves the images in the `save_dir` without relaxation time."""
+    controller = pylo.Controller(DummyView(), DummyConfiguration())
+    controller.microscope = DummyMicroscope(controller)
+    controller.camera = DummyCamera(controller)
+
+    configuration = controller.configuration
+    configuration.setValue("measurement", "save-directory", str(save_dir))
+    configuration.setValue("measurement", "save-file-format", "{counter}.tif")
+    configuration.setValue("measurement", "log-save-path", 
+                           os.path.join(str(save_dir), "measurement.log"))
+    configuration.setValue("measurement", "relaxation-time", 0)
+    configuration.setValue("measurement",
+                           "microscope-to-safe-state-after-measurement", True)
+    configuration.setValue("measurement",
+                           "camera-to-safe-state-after-measurement", True)
+    
+    return controller
+
+def create_series():
+    """Get a focus series with the three steps 0, 1 and 2."""
+    return {"variable": "focus", "start": 0, "end": 2, "step-width": 1}
+
+def create_jobs(count=2):
+    """Get `count` jobs for the `BatchRunner` with the `create_series()`."""
+    return [{"name": "job-{}".format(i), "start": {"x-tilt": 0},
+             "series": create_series(), "tags": {"job": i}} 
+            for i in range(count)]
+
+def run_measurement(controller, series=None, start=None):
+    """Create the measurement of the `series` (default: `create_series()`) 
+    and run it in the current thread like the `Controller` does.
+    
+    Errors of the measurement are raised, the measurement is returned."""
+    if series is None:
+        series = create_series()
+    if start is None:
+        start = {"x-tilt": 0}
+    
+    measurement = pylo.Measurement(controller, pylo.MeasurementSteps(
+        controller, start, series))
+    controller.measurement = measurement
+
+    pylo.series_ready(controller)
+    controller.view.progress_max = len(measurement.steps)
+    controller.view.progress = 0
+
+    measurement.runPreflight()
+    measurement.start()
+
+    return measurement
+
 def get_equality(v1: typing.Any, v2: typing.Any, 
                  rel_tol: typing.Optional[typing.Union[int, float]]=0, 
                  abs_tol: typing.Optional[typing.Union[int, float]]=1e-6, 
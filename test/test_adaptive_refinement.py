@@ -0,0 +1,168 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import numpy as np
+
+import pylo
+
+from pylo.adaptive_refinement import AdaptiveSteps
+from pylo.adaptive_refinement import downsample
+from pylo.adaptive_refinement import difference_metric
+
+from pylotestlib import DummyCamera
+from pylotestlib import create_series
+from pylotestlib import run_measurement
+
+# the focus from on the images are bright
+EDGE = 1.3
+
+def edge_image(focus):
+    return pylo.Image(np.full((8, 8), 200 if focus > EDGE else 100), {})
+
+class EdgeCamera(DummyCamera):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.images = []
+
+    def recordImage(self, *args, **kwargs):
+        image = edge_image(self.controller.microscope.values["focus"])
+        self.images.append(image)
+        return image
+
+@pytest.fixture()
+def edge_controller(controller):
+    controller.camera = EdgeCamera(controller)
+    controller.configuration.setValue("measurement", "adaptive-refinement",
+                                      True)
+    yield controller
+
+def create_steps(controller):
+    return pylo.MeasurementSteps(controller, {"x-tilt": 0}, create_series())
+
+def measure(steps):
+    """Iterate over the `steps` and pass back the edge images."""
+    values = []
+    for step in steps:
+        values.append(step["focus"])
+        steps.addImage(edge_image(step["focus"]))
+    return values
+
+class TestMetric:
+    def test_downsample(self):
+        """Test that blocks of pixels are averaged."""
+        data = np.arange(16 * 12).reshape((16, 12))
+
+        thumbnail = downsample(data, size=4)
+
+        assert thumbnail.shape == (4, 4)
+        assert thumbnail.dtype == np.float32
+        assert thumbnail[0, 0] == pytest.approx(data[:4, :3].mean())
+
+    def test_difference(self):
+        """Test that the difference is calculated for all pairs at once and
+        is relative to the intensity."""
+        first = np.stack([np.full((2, 2), 100), np.full((2, 2), 100),
+                          np.zeros((2, 2))]).astype(np.float32)
+        second = np.stack([np.full((2, 2), 100), np.full((2, 2), 300),
+                           np.zeros((2, 2))]).astype(np.float32)
+
+        assert difference_metric(first, second) == pytest.approx([0, 1, 0])
+
+class TestAdaptiveSteps:
+    def test_refines_edge(self, controller):
+        """Test that points are inserted around the change only until the
+        minimum step width is reached."""
+        steps = AdaptiveSteps(create_steps(controller))
+
+        values = measure(steps)
+
+        assert values == [0, 1, 2, 1.5, 1.25, 1.375, 1.3125]
+        assert len(steps) == 7
+        assert steps.inserted == 4
+        assert steps.getMaximumLength() == 3 + 2 * 15
+
+    def test_budget(self, controller):
+        """Test that no more points than the budget are inserted."""
+        steps = AdaptiveSteps(create_steps(controller), budget=2)
+
+        assert measure(steps) == [0, 1, 2, 1.5, 1.25]
+        assert steps.getMaximumLength() == 5
+
+    def test_threshold(self, controller):
+        """Test that nothing is inserted if the change is below the
+        threshold."""
+        steps = AdaptiveSteps(create_steps(controller), threshold=1)
+
+        assert measure(steps) == [0, 1, 2]
+
+    def test_missing_image(self, controller):
+        """Test that intervals without images are not refined."""
+        steps = AdaptiveSteps(create_steps(controller))
+
+        values = []
+        for step in steps:
+            values.append(step["focus"])
+            if step["focus"] != 2:
+                steps.addImage(edge_image(step["focus"]))
+
+        assert values == [0, 1, 2]
+
+    def test_integer_variable(self, controller):
+        """Test that the values of integer variables are rounded and their
+        intervals are not refined below the width 1."""
+        controller.microscope.supported_measurement_variables.append(
+            pylo.MeasurementVariable("ol-current", "OL current", 0, 0x20, 
+                                     format=pylo.Datatype.hex_int))
+        steps = AdaptiveSteps(pylo.MeasurementSteps(controller, 
+            {"focus": 0, "x-tilt": 0, "ol-current": 0}, 
+            {"variable": "ol-current", "start": 0, "end": 16, 
+             "step-width": 8}))
+
+        values = []
+        for step in steps:
+            values.append(step["ol-current"])
+            steps.addImage(edge_image(step["ol-current"] / 4))
+
+        assert steps.min_step_width == 1
+        assert values == [0, 8, 16, 4, 6, 5]
+        assert all(isinstance(v, int) for v in values)
+
+class TestMeasurement:
+    def test_measurement(self, edge_controller):
+        """Test that the measurement records the inserted steps with their
+        tags and names."""
+        measurement = run_measurement(edge_controller)
+
+        assert measurement.finished
+        assert len(measurement.steps) == 7
+        assert measurement.adaptive_refinement
+        assert edge_controller.view.progress == 7
+        assert edge_controller.view.progress_max == 7
+
+        images = edge_controller.camera.images
+        key = pylo.adaptive_refinement.REFINEMENT_TAGS_KEY
+        assert [i.tags[key]["Level"] for i in images] == [0, 0, 0, 1, 2, 3, 4]
+        assert "Change" not in images[0].tags[key]
+        assert images[3].tags[key]["Change"] == pytest.approx(2 / 3)
+
+        assert len([e for e in measurement.timeline.entries
+                    if e.phase == "refine"]) == 7
+        assert sorted(f for f in os.listdir(measurement.save_dir)
+                      if f.endswith(".tif")) == ["{}.tif".format(i)
+                                                 for i in range(7)]
+
+    def test_preflight_expects_budget(self, edge_controller):
+        """Test that the preflight check expects the budget to be used."""
+        edge_controller.configuration.setValue("measurement",
+                                               "refinement-budget", 5)
+        measurement = pylo.Measurement(edge_controller,
+                                       create_steps(edge_controller))
+
+        report = pylo.Preflight(measurement, probe_size=1024).run()
+
+        assert report.step_count == 8
@@ -0,0 +1,145 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import threading
+import pytest
+
+import pylo
+
+from pylo.axis_executor import AxisFuture
+from pylo.axis_executor import AxisExecutor
+
+from pylotestlib import DummyMicroscope
+from pylotestlib import create_series
+from pylotestlib import run_measurement
+
+class ParallelMicroscope(DummyMicroscope):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.supports_parallel_measurement_variable_setting = True
+        self.setter_threads = {}
+
+    def setMeasurementVariableValue(self, id_, value):
+        self.setter_threads.setdefault(id_, set()).add(
+            threading.current_thread().ident)
+        super().setMeasurementVariableValue(id_, value)
+
+class TestAxisExecutor:
+    def test_same_axis_is_sequential(self):
+        """Test that the tasks of one axis are executed in order in the same 
+        thread."""
+        executor = AxisExecutor()
+        calls = []
+
+        def task(i):
+            time.sleep(0.01)
+            calls.append((i, threading.current_thread().ident))
+            return i
+
+        futures = [executor.submit("stage", task, i) for i in range(5)]
+        for future in futures:
+            future.join()
+        executor.shutdown()
+
+        assert [f.result() for f in futures] == list(range(5))
+        assert [c[0] for c in calls] == list(range(5))
+        assert len(set(c[1] for c in calls)) == 1
+    
+    def test_axes_are_parallel(self):
+        """Test that different axes are executed in parallel."""
+        executor = AxisExecutor()
+        barrier = threading.Barrier(2, timeout=5)
+
+        futures = [executor.submit(axis, barrier.wait) 
+                   for axis in ("stage", "lens")]
+        for future in futures:
+            future.join()
+        
+        assert sorted(executor.axes) == ["lens", "stage"]
+        executor.shutdown()
+
+        assert all(f.exceptions == [] for f in futures)
+        assert executor.axes == []
+
+    def test_exceptions(self):
+        """Test that errors are collected like in the ExceptionThread."""
+        executor = AxisExecutor()
+
+        def fail():
+            raise ValueError("Failed on purpose.")
+
+        future = executor.submit("stage", fail, name="fail")
+        future.join()
+        executor.shutdown()
+        
+        assert isinstance(future, AxisFuture)
+        assert future.name == "fail"
+        assert not future.is_alive()
+        assert len(future.exceptions) == 1
+        assert isinstance(future.exceptions[0], ValueError)
+
+        with pytest.raises(RuntimeError):
+            executor.submit("stage", fail)
+
+    def test_cancel_pending(self):
+        """Test that tasks that are not started can be cancelled."""
+        executor = AxisExecutor()
+        started = threading.Event()
+        event = threading.Event()
+
+        def wait():
+            started.set()
+            return event.wait(5)
+
+        running = executor.submit("stage", wait)
+        started.wait(5)
+        pending = [executor.submit("stage", time.sleep, 0) for i in range(3)]
+        
+        assert executor.cancelPending() == 3
+        event.set()
+        running.join()
+        executor.shutdown()
+
+        assert running.result() == True
+        assert all(f.cancelled() for f in pending)
+        assert all(f.exceptions == [] for f in pending)
+
+class TestMicroscopeExecutor:
+    def test_measurement_reuses_workers(self, controller):
+        """Test that the measurement sets the variables in one worker per 
+        axis."""
+        controller.microscope = ParallelMicroscope(controller)
+        controller.configuration.setValue("measurement", "substeps", 3)
+        series = create_series()
+        series["end"] = 5
+
+        measurement = run_measurement(controller, series)
+        
+        assert measurement.finished
+        assert controller.microscope.values["focus"] == 5
+        assert len(controller.microscope.setter_threads["focus"]) == 1
+        assert (controller.microscope.setter_threads["focus"] != 
+                {threading.current_thread().ident})
+        assert "focus" in controller.microscope.executor.axes
+        controller.microscope.shutdownExecutor()
+
+    def test_axes(self, controller):
+        """Test that variables of the same axis use the same worker."""
+        microscope = ParallelMicroscope(controller)
+        microscope.measurement_variable_axes = {"focus": "optics", 
+                                                "x-tilt": "optics"}
+        
+        futures = [microscope.submitMeasurementVariableValue("focus", 1),
+                   microscope.submitMeasurementVariableValue("x-tilt", 2)]
+        for future in futures:
+            future.join()
+        
+        assert microscope.executor.axes == ["optics"]
+        assert (microscope.setter_threads["focus"] == 
+                microscope.setter_threads["x-tilt"])
+        microscope.shutdownExecutor()
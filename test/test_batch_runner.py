@@ -0,0 +1,148 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import pytest
+
+import pylo
+
+from pylotestlib import create_jobs
+
+class TestBatchRunner:
+    def test_validate_collects_all_errors(self, controller):
+        """Test that all invalid jobs are shown in the error."""
+        jobs = create_jobs(3)
+        jobs[0]["series"]["end"] = 100
+        del jobs[2]["series"]["variable"]
+
+        runner = pylo.BatchRunner(controller, jobs)
+        runner.setup()
+
+        with pytest.raises(ValueError) as e:
+            runner.validate()
+
+        assert "job-0" in str(e.value)
+        assert "job-1" not in str(e.value)
+        assert "job-2" in str(e.value)
+
+    def test_validate_fills_start(self, controller):
+        """Test that missing start values are taken from the microscope."""
+        controller.microscope.values["x-tilt"] = 5
+        jobs = create_jobs(1)
+        del jobs[0]["start"]
+
+        runner = pylo.BatchRunner(controller, jobs)
+        runner.setup()
+        runner.validate()
+
+        assert runner.jobs[0]["start"]["x-tilt"] == 5
+
+    def test_run_keeps_lorentz_mode(self, controller, tmp_path):
+        """Test that all jobs are executed, the lorentz mode is set only once
+        and the safe state is set after the last job only."""
+        runner = pylo.BatchRunner(controller, create_jobs(3))
+        runner.setup()
+        summaries = runner.run()
+
+        assert [s["status"] for s in summaries] == ["finished"] * 3
+        assert controller.microscope.lorentz_mode_calls == 1
+        assert controller.microscope.safe_state_calls == 1
+        assert controller.camera.safe_state_calls == 1
+
+        for i in range(3):
+            job_dir = os.path.join(str(tmp_path), "job-{}".format(i))
+            assert len([f for f in os.listdir(job_dir)
+                        if f.endswith(".tif")]) == 3
+
+            with open(os.path.join(job_dir, runner.summary_file_name)) as f:
+                summary = json.load(f)
+
+            assert summary["status"] == "finished"
+            assert summary["recorded-images"] == 3
+            assert summary["tags"] == {"job": i}
+
+        # job specific directories are not kept in the configuration
+        save_dir = controller.configuration.getValue("measurement",
+                                                     "save-directory")
+        assert os.path.normpath(save_dir) == os.path.normpath(str(tmp_path))
+
+    def test_configuration_overwrite_is_reset(self, controller):
+        """Test that the job configuration is used for the job only."""
+        jobs = create_jobs(1)
+        jobs[0]["configuration"] = {"measurement": {"relaxation-time": 0.01}}
+        relaxation_times = []
+
+        def series_ready(controller):
+            relaxation_times.append(controller.measurement.relaxation_time)
+        pylo.series_ready["test_batch_runner"] = series_ready
+
+        runner = pylo.BatchRunner(controller, jobs)
+        runner.setup()
+        runner.run()
+
+        assert relaxation_times == [0.01]
+        assert controller.configuration.getValue("measurement",
+                                                 "relaxation-time") == 0
+
+    def test_failed_job_aborts_batch(self, controller):
+        """Test that the remaining jobs are skipped if a job fails and the
+        devices are set to the safe state."""
+        controller.camera.fail = True
+
+        runner = pylo.BatchRunner(controller, create_jobs(3))
+        runner.setup()
+        summaries = runner.run()
+
+        assert summaries[0]["status"] == "failed"
+        assert "The camera failed on purpose." in summaries[0]["error"]
+        assert [s["status"] for s in summaries[1:]] == ["skipped"] * 2
+        assert controller.microscope.safe_state_calls >= 1
+
+    def test_continue_on_error(self, controller):
+        """Test that the next jobs are executed if continue_on_error is set."""
+        runner = pylo.BatchRunner(controller, create_jobs(2),
+                                  continue_on_error=True)
+        runner.setup()
+
+        def fail_once(controller):
+            if controller.measurement.tags["job"] == 0:
+                controller.camera.fail = True
+            else:
+                controller.camera.fail = False
+        pylo.series_ready["test_batch_runner"] = fail_once
+
+        summaries = runner.run()
+
+        assert [s["status"] for s in summaries] == ["failed", "finished"]
+        # the failed job does not keep the lorentz mode
+        assert controller.microscope.lorentz_mode_calls == 2
+
+    def test_from_file(self, controller, tmp_path):
+        """Test that jobs can be loaded from a json file."""
+        path = os.path.join(str(tmp_path), "batch.json")
+        with open(path, "w") as f:
+            json.dump({"jobs": create_jobs(2)}, f)
+
+        runner = pylo.BatchRunner.fromFile(controller, path)
+        assert [j["name"] for j in runner.jobs] == ["job-0", "job-1"]
+
+        with open(path, "w") as f:
+            json.dump({"no-jobs": []}, f)
+
+        with pytest.raises(ValueError):
+            pylo.BatchRunner.fromFile(controller, path)
+
+class TestHeadlessView:
+    def test_ask_raises_stop_program(self):
+        """Test that the headless view never waits for inputs."""
+        view = pylo.HeadlessView(None)
+
+        with pytest.raises(pylo.StopProgram):
+            view.askFor({"name": "Value", "datatype": int})
+
+        with pytest.raises(pylo.StopProgram):
+            view.askForDecision("Continue?")
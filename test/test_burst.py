@@ -0,0 +1,112 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import numpy as np
+
+import pylo
+
+from pylotestlib import run_measurement
+
+class FrameCamera(pylo.CameraInterface):
+    def __init__(self, controller, frames):
+        super().__init__(controller)
+        self.frames = list(frames)
+        self.calls = 0
+
+    def resetToSafeState(self):
+        pass
+
+    def recordImage(self, additional_tags=None, **kwargs):
+        frame = self.frames[self.calls % len(self.frames)]
+        self.calls += 1
+        tags = dict(additional_tags) if isinstance(additional_tags, dict) else {}
+        tags["frame"] = self.calls
+        return pylo.Image(frame, tags)
+
+class TestBurst:
+    def test_average(self, controller):
+        """Test that the frames are averaged."""
+        camera = FrameCamera(controller, [np.full((4, 5), 10), 
+                                          np.full((4, 5), 20)])
+        image = camera.recordBurst(4, {"a": 1})
+
+        assert camera.calls == 4
+        assert image.image_data.shape == (4, 5)
+        assert (image.image_data == 15).all()
+        assert image.tags["a"] == 1
+        assert image.tags["frame"] == 1
+        
+        statistics = image.tags[pylo.camera_interface.BURST_TAGS_KEY]
+        assert statistics["frames"] == 4
+        assert statistics["mean"] == pytest.approx(15)
+        assert statistics["mean variance"] == pytest.approx(100 / 3)
+    
+    def test_save_mean(self, controller, tmp_path):
+        """Test that the unrounded mean is saved next to the image."""
+        camera = FrameCamera(controller, [np.full((4, 5), 10), 
+                                          np.full((4, 5), 11)])
+        image = camera.recordBurst(2)
+
+        assert (image.image_data == 10).all()
+
+        image.saveTo(str(tmp_path / "burst.tif")).join()
+        mean = np.load(str(tmp_path / "burst-mean.npy"))
+        assert mean.shape == (4, 5)
+        assert (mean == 10.5).all()
+    
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def test_variance(self, controller, dtype):
+        """Test that the running variance equals the variance of all frames."""
+        frames = [np.random.randint(0, 256, (8, 8)) for i in range(10)]
+        camera = FrameCamera(controller, frames)
+        image = camera.recordBurst(10, dtype=dtype)
+        
+        statistics = image.tags[pylo.camera_interface.BURST_TAGS_KEY]
+        assert statistics["accumulator"] == np.dtype(dtype).name
+        assert statistics["mean"] == pytest.approx(np.mean(frames), rel=1e-5)
+        assert statistics["mean variance"] == pytest.approx(
+            np.var(frames, axis=0, ddof=1).mean(), rel=1e-4)
+        # the rounding of .5 values may differ because of float errors
+        assert (np.abs(image.image_data - np.mean(frames, axis=0)) 
+                <= 0.5 + 1e-3).all()
+
+    def test_outlier_rejection(self, controller):
+        """Test that single hot pixels are not averaged."""
+        frames = [np.full((4, 4), 10) for i in range(5)]
+        frames[3] = frames[3].copy()
+        frames[3][1, 2] = 255
+        camera = FrameCamera(controller, frames)
+
+        image = camera.recordBurst(5, outlier_sigma=5)
+        assert (image.image_data == 10).all()
+        
+        statistics = image.tags[pylo.camera_interface.BURST_TAGS_KEY]
+        assert statistics["rejected pixels"] == 1
+
+        camera.calls = 0
+        image = camera.recordBurst(5)
+        assert image.image_data[1, 2] == 59
+
+    def test_invalid_count(self, controller):
+        """Test that the count must be at least one."""
+        camera = FrameCamera(controller, [np.zeros((2, 2))])
+
+        with pytest.raises(ValueError):
+            camera.recordBurst(0)
+
+    def test_measurement_uses_burst(self, controller, tmp_path):
+        """Test that the measurement records bursts if the burst frames are 
+        set."""
+        controller.camera = FrameCamera(controller, [np.full((4, 4), 10)])
+        controller.configuration.setValue("measurement", "burst-frames", 3)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert len(measurement.timeline.getPhaseDurations()["record"]) == 3
+        assert controller.camera.calls == 9
@@ -0,0 +1,305 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+import threading
+import collections
+
+import pylo
+
+from pylotestlib import DummyConfiguration
+from pylotestlib import DummyCamera
+from pylotestlib import run_measurement
+
+class HangingMicroscope(pylo.MicroscopeInterface):
+    """A microscope whose setter hangs for `hang_time` seconds (or until the
+    `release` is set) when the focus is set to the `hang_at` value."""
+
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.values = {"focus": 0, "x-tilt": 0}
+        self.hang_at = None
+        self.hang_time = None
+        self.release = threading.Event()
+
+        for id_, name, minimum, maximum in (("focus", "Focus", 0, 10),
+                                            ("x-tilt", "Tilt", -35, 35)):
+            self.registerMeasurementVariable(
+                pylo.MeasurementVariable(id_, name, minimum, maximum),
+                lambda id_=id_: self.values[id_],
+                lambda value, id_=id_: self._setValue(id_, value))
+
+    def _setValue(self, id_, value):
+        if id_ == "focus" and value == self.hang_at:
+            self.release.wait(self.hang_time)
+        self.values[id_] = value
+
+    def setInLorentzMode(self, lorentz_mode):
+        pass
+
+    def resetToSafeState(self):
+        pass
+
+@pytest.fixture()
+def supervisor():
+    supervisor = pylo.CallSupervisor("test-device")
+    yield supervisor
+    supervisor.shutdown()
+
+@pytest.fixture()
+def hanging_controller(controller):
+    controller.microscope = HangingMicroscope(controller)
+    controller.microscope.hang_at = 1
+    controller.configuration.setValue(controller.microscope.config_group_name,
+                                      "set-timeout", 0.2)
+
+    yield controller
+
+    controller.microscope.release.set()
+
+class TestCallSupervisor:
+    def test_direct_call_without_deadline(self, supervisor):
+        """Test that calls without deadline are executed in the calling thread
+        and their durations are recorded."""
+        result = supervisor.call("get", "focus", threading.current_thread)
+
+        assert result is threading.current_thread()
+        assert len(supervisor.history["get focus"]) == 1
+
+    def test_deadline_exceeded(self, supervisor):
+        """Test that a hanging call raises an error after the deadline and the
+        next call uses a new worker."""
+        release = threading.Event()
+        supervisor.deadlines["set"] = 0.05
+
+        start = time.time()
+        with pytest.raises(pylo.DeviceCallTimeoutError) as e:
+            supervisor.call("set", "focus", release.wait)
+
+        assert 0.05 <= time.time() - start < 1
+        assert e.value.name == "set focus"
+        assert e.value.elapsed >= 0.05
+        assert e.value.action is None
+        assert supervisor.hanging
+
+        # the driver is not called while the old call hangs
+        calls = []
+        with pytest.raises(pylo.DeviceCallTimeoutError) as e:
+            supervisor.call("set", "focus", calls.append, 5)
+
+        assert e.value.action == "emergency"
+        assert calls == []
+
+        # the next call waits for the old call and uses a new worker
+        release.set()
+        assert supervisor.call("set", "focus", lambda: 5) == 5
+        assert not supervisor.hanging
+
+    def test_specific_deadline(self, supervisor):
+        """Test that the deadline of the call is used before the deadline of
+        the operation."""
+        supervisor.deadlines["set"] = 10
+        supervisor.deadlines["set focus"] = 0.05
+
+        assert supervisor.getDeadline("set", "set focus") == 0.05
+        assert supervisor.getDeadline("set", "set x-tilt") == 10
+        assert supervisor.getDeadline("get", "get focus") is None
+
+    def test_worker_is_reused(self, supervisor):
+        """Test that the calls are executed in the same worker thread."""
+        supervisor.deadlines["get"] = 1
+
+        threads = [supervisor.call("get", "focus", threading.current_thread)
+                   for i in range(3)]
+
+        assert threads[0] is not threading.current_thread()
+        assert threads[0] is threads[1] is threads[2]
+
+    def test_errors_are_raised(self, supervisor):
+        """Test that errors of supervised calls are raised in the calling
+        thread."""
+        supervisor.deadlines["get"] = 1
+
+        def fail():
+            raise ValueError("Failed on purpose.")
+
+        with pytest.raises(ValueError):
+            supervisor.call("get", "focus", fail)
+
+    def test_retry(self, supervisor):
+        """Test that a retry waits for the same call again instead of calling
+        the driver twice."""
+        calls = []
+        def slow():
+            calls.append(time.time())
+            time.sleep(0.15)
+            return len(calls)
+
+        supervisor.deadlines["set"] = 0.05
+        supervisor.retries = 5
+
+        assert supervisor.call("set", "focus", slow) == 1
+        assert len(calls) == 1
+        assert not supervisor.hanging
+
+    def test_policy(self, supervisor):
+        """Test that the policy gets the attempts and its action is set in the
+        error."""
+        release = threading.Event()
+        attempts = []
+        def policy(error, attempt):
+            attempts.append(attempt)
+            return "retry" if attempt < 2 else "skip-step"
+
+        supervisor.deadlines["set"] = 0.05
+        supervisor.policy = policy
+
+        with pytest.raises(pylo.DeviceCallTimeoutError) as e:
+            supervisor.call("set", "focus", release.wait)
+
+        assert attempts == [1, 2]
+        assert e.value.action == "skip-step"
+        release.set()
+
+    def test_hang_event(self, supervisor, monkeypatch):
+        """Test that the hang event is fired if a call takes much longer than
+        the previous calls."""
+        monkeypatch.setattr(pylo.config, "DEVICE_CALL_HEARTBEAT_INTERVAL", 0.01)
+        supervisor.deadlines["set"] = 1
+        supervisor.history["set focus"] = collections.deque([0.01] * 3)
+
+        hangs = []
+        pylo.device_call_hang["test"] = lambda *args: hangs.append(args)
+        try:
+            supervisor.call("set", "focus", time.sleep, 0.2)
+        finally:
+            del pylo.device_call_hang["test"]
+
+        assert len(hangs) == 1
+        assert hangs[0][0] is supervisor
+        assert hangs[0][1] == "set focus"
+        assert hangs[0][2] > 0.05
+        assert hangs[0][3] == pytest.approx(0.01)
+
+        # the slow call is learned
+        assert supervisor.getExpectedDuration("set focus") > 0.01
+
+    def test_load_configuration(self, supervisor):
+        """Test that the deadlines and the retries are read from the group of
+        the device."""
+        supervisor.deadlines["get"] = 5
+        configuration = DummyConfiguration()
+        configuration.setValue("test-device", "set-timeout", 2)
+        configuration.setValue("test-device", "get-timeout", 0)
+        configuration.setValue("test-device", "call-retries", 3)
+
+        supervisor.loadConfiguration(configuration, "test-device")
+
+        assert supervisor.deadlines == {"set": 2}
+        assert supervisor.retries == 3
+
+    def test_configuration_options(self, supervisor):
+        """Test that the deadline options are defined with their defaults."""
+        configuration = DummyConfiguration()
+        pylo.CallSupervisor.defineDeviceConfigurationOptions(configuration,
+                                                             "test-device")
+
+        supervisor.loadConfiguration(configuration, "test-device")
+
+        assert supervisor.deadlines == pylo.config.DEFAULT_DEVICE_CALL_TIMEOUTS
+        assert supervisor.retries == pylo.config.DEFAULT_DEVICE_CALL_RETRIES
+
+    def test_controller_defines_options(self, controller):
+        """Test that the controller defines the options of its devices."""
+        controller.initialize()
+
+        for device in (controller.microscope, controller.camera):
+            assert (controller.configuration.getValue(device.config_group_name,
+                                                      "set-timeout") ==
+                    pylo.config.DEFAULT_DEVICE_CALL_TIMEOUTS["set"])
+
+class TestDeviceDeadlines:
+    def test_microscope_setter_deadline(self, hanging_controller):
+        """Test that a hanging setter of the microscope raises an error and
+        that the driver is not used again until the call returns."""
+        microscope = hanging_controller.microscope
+        microscope.call_supervisor.deadlines["set"] = 0.05
+
+        with pytest.raises(pylo.DeviceCallTimeoutError):
+            microscope.setMeasurementVariableValue("focus", 1)
+
+        with pytest.raises(pylo.DeviceCallTimeoutError) as e:
+            microscope.setMeasurementVariableValue("focus", 2)
+
+        assert e.value.action == "emergency"
+        assert microscope.values["focus"] == 0
+
+        microscope.release.set()
+        microscope.setMeasurementVariableValue("focus", 2)
+        assert microscope.getMeasurementVariableValue("focus") == 2
+
+    def test_camera_record_deadline(self, controller):
+        """Test that collecting a hanging acquisition raises an error."""
+        release = threading.Event()
+        camera = DummyCamera(controller)
+        camera.recordImage = lambda *args, **kwargs: release.wait()
+        camera.call_supervisor.deadlines["record"] = 0.05
+
+        with pytest.raises(pylo.DeviceCallTimeoutError) as e:
+            camera.collect(camera.startAcquisition())
+
+        assert e.value.name == "record main"
+        release.set()
+
+class TestMeasurementPolicy:
+    def test_skip_step(self, hanging_controller):
+        """Test that the step with the hanging call is skipped and the
+        measurement continues after the call returned."""
+        hanging_controller.microscope.hang_time = 0.3
+        hanging_controller.configuration.setValue("measurement",
+            "device-timeout-policy", "skip-step")
+
+        measurement = run_measurement(hanging_controller)
+
+        assert measurement.finished
+        assert hanging_controller.microscope.values["focus"] == 2
+
+        timeouts = [e for e in measurement.timeline.entries
+                    if e.phase == "device-timeout"]
+        assert len(timeouts) == 1
+        assert timeouts[0].step == 1
+        assert timeouts[0].name == "set focus"
+        assert timeouts[0].details["action"] == "skip-step"
+
+        save_dir = hanging_controller.measurement.save_dir
+        assert sorted(f for f in os.listdir(save_dir)
+                      if f.endswith(".tif")) == ["0.tif", "2.tif"]
+
+    def test_emergency_while_hanging(self, hanging_controller):
+        """Test that the next step fires the emergency if the skipped call
+        still hangs."""
+        hanging_controller.configuration.setValue("measurement",
+            "device-timeout-policy", "skip-step")
+
+        with pytest.raises(pylo.DeviceCallTimeoutError):
+            run_measurement(hanging_controller)
+
+        assert [e.details["action"] for e in 
+                hanging_controller.measurement.timeline.entries
+                if e.phase == "device-timeout"] == ["skip-step", "emergency"]
+
+        save_dir = hanging_controller.measurement.save_dir
+        assert sorted(f for f in os.listdir(save_dir)
+                      if f.endswith(".tif")) == ["0.tif"]
+
+    def test_raise(self, hanging_controller):
+        """Test that the measurement fails by default."""
+        with pytest.raises(pylo.DeviceCallTimeoutError):
+            run_measurement(hanging_controller)
+
+        assert hanging_controller.microscope.values["focus"] == 0
@@ -4,17 +4,80 @@ if __name__ == "__main__":
     import os
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import time
 import pytest
 import pylo
+import numpy as np
 
 class DummyConfiguration(pylo.AbstractConfiguration):
     def getValue(self, *args, **kwargs):
         return "DEFAULT_CONFIGURATION_VALUE"
         
+class SlowCamera(pylo.CameraInterface):
+    def __init__(self, controller, exposure_time=0.1):
+        super().__init__(controller)
+        self.exposure_time = exposure_time
+        self.fail = False
+
+    def resetToSafeState(self):
+        pass
+
+    def recordImage(self, additional_tags=None, **kwargs):
+        time.sleep(self.exposure_time)
+        if self.fail:
+            raise RuntimeError("The camera failed on purpose.")
+        
+        tags = dict(additional_tags) if isinstance(additional_tags, dict) else {}
+        tags["camera"] = "slow"
+        tags["kwargs"] = kwargs
+        return pylo.Image(np.zeros((4, 4)), tags)
+
 class TestCameraInterface:
     def test_for_not_implemented(self):
         camera = pylo.CameraInterface(controller=pylo.Controller(
             pylo.AbstractView(), pylo.AbstractConfiguration()))
 
         with pytest.raises(NotImplementedError):
-            camera.recordImage()
\ No newline at end of file
+            camera.recordImage()
+    
+    def test_start_and_collect(self):
+        """Test that the default implementation records in a worker and adds
+        the tags when collecting."""
+        camera = SlowCamera(None, 0.01)
+
+        handle = camera.startAcquisition(counter=3)
+        assert isinstance(handle, pylo.AcquisitionHandle)
+        image = camera.collect(handle, {"a": 1, "camera": "overwritten"})
+
+        assert image.tags["a"] == 1
+        assert image.tags["camera"] == "slow"
+        assert image.tags["kwargs"] == {"counter": 3}
+    
+    def test_collect_raises_errors(self):
+        """Test that errors while acquiring are raised when collecting."""
+        camera = SlowCamera(None, 0.01)
+        camera.fail = True
+
+        handle = camera.startAcquisition()
+        with pytest.raises(RuntimeError):
+            camera.collect(handle)
+    
+    def test_work_overlaps_exposure(self):
+        """Test that other work can be done while the camera exposes."""
+        camera = SlowCamera(None, 0.1)
+
+        start = time.time()
+        handle = camera.startAcquisition()
+        # e.g. creating the tags
+        time.sleep(0.1)
+        camera.collect(handle)
+        overlapped = time.time() - start
+
+        start = time.time()
+        camera.recordImage()
+        time.sleep(0.1)
+        sequential = time.time() - start
+
+        assert overlapped < 0.15
+        assert sequential >= 0.2
+
@@ -841,13 +841,14 @@ class TestCLIView:
 
         # auto update output
         cliview.progress = 55
+        assert cliview.flushRunning(timeout=5)
 
         realprint(writer.out_buffer)
 
-        # old text gets removed
-        assert "2" not in get_compare_text(writer.out_buffer)
+        # old text gets removed, the rate behind the counter may contain a 2
+        assert "2/100" not in get_compare_text(writer.out_buffer)
         # check new text
-        assert "55" in get_compare_text(writer.out_buffer)
+        assert "55/100" in get_compare_text(writer.out_buffer)
         assert "100" in get_compare_text(writer.out_buffer)
 
         sys.stdout = sys.__stdout__
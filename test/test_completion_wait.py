@@ -0,0 +1,95 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import threading
+import pytest
+
+import pylo
+
+from pylo.completion_wait import CompletionWaiter
+
+from pylotestlib import DummyMicroscope
+from pylotestlib import run_measurement
+
+class WaitingMicroscope(DummyMicroscope):
+    def setMeasurementVariableValue(self, id_, value):
+        reached = time.time() + 0.005
+        self.completion_waiter.wait(id_, lambda: time.time() >= reached, 1)
+        super().setMeasurementVariableValue(id_, value)
+
+class TestCompletionWaiter:
+    def test_fast_hardware_is_not_polled_slowly(self):
+        """Test that a value that is reached after 5ms is detected long
+        before the maximum delay."""
+        waiter = CompletionWaiter(initial_delay=0.001, max_delay=0.5)
+        reached = time.time() + 0.005
+
+        start = time.time()
+        assert waiter.wait("focus", lambda: time.time() >= reached, 2)
+        duration = time.time() - start
+
+        assert duration < 0.05
+        statistics = waiter.getStatistics()["focus"]
+        assert statistics["waits"] == 1
+        assert statistics["checks"] > 1
+        assert statistics["timeouts"] == 0
+
+    def test_backoff_limits_checks(self):
+        """Test that the delay grows so slow hardware is not asked too
+        often."""
+        waiter = CompletionWaiter(initial_delay=0.001, max_delay=0.05)
+
+        assert not waiter.wait("x-tilt", lambda: False, 0.3)
+        statistics = waiter.getStatistics()["x-tilt"]
+
+        # 1, 2, 4, 8, 16, 32 ms and then 50ms steps
+        assert statistics["checks"] < 15
+        assert statistics["timeouts"] == 1
+        assert statistics["total-time"] == pytest.approx(0.3, abs=0.05)
+
+    def test_deadline(self):
+        """Test that the wait ends at the deadline."""
+        waiter = CompletionWaiter(max_delay=10)
+
+        start = time.time()
+        assert not waiter.wait("focus", lambda: False, 0.1)
+        assert time.time() - start == pytest.approx(0.1, abs=0.05)
+
+    def test_notify_wakes_up(self):
+        """Test that the push notification checks the condition
+        immediately."""
+        waiter = CompletionWaiter(initial_delay=5, max_delay=5)
+        done = threading.Event()
+
+        def finish():
+            time.sleep(0.02)
+            done.set()
+            waiter.notify("focus")
+
+        thread = threading.Thread(target=finish)
+        start = time.time()
+        thread.start()
+        assert waiter.wait("focus", done.is_set, 10)
+        thread.join()
+
+        assert time.time() - start < 1
+
+    def test_statistics_in_timeline(self, controller):
+        """Test that the measurement reports the waits in the timeline."""
+        controller.microscope = WaitingMicroscope(controller)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        entries = [e for e in measurement.timeline.entries
+                   if e.phase == "variable-wait"]
+        assert set(e.name for e in entries) == {"focus", "x-tilt"}
+        focus = [e for e in entries if e.name == "focus"][0]
+        assert focus.details["waits"] == 3
+        assert focus.details["timeouts"] == 0
+        assert focus.details["max-time"] < 0.5
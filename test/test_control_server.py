@@ -0,0 +1,136 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import time
+import pytest
+import http.client
+
+import pylo
+
+from pylotestlib import create_jobs
+
+@pytest.fixture()
+def server(controller):
+    controller.initialize()
+    server = controller.startControlServer("127.0.0.1", 0)
+
+    yield server
+
+    controller.stopControlServer()
+
+def request(server, method, path, data=None):
+    connection = http.client.HTTPConnection(server.host, server.port,
+                                            timeout=10)
+    body = json.dumps(data) if data is not None else None
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read().decode("utf-8"))
+    connection.close()
+    return result
+
+def wait_for_job(server, job_id, timeout=10):
+    start = time.time()
+    while time.time() < start + timeout:
+        status, job = request(server, "GET", "/jobs/{}".format(job_id))
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+
+    raise TimeoutError("The job did not finish.")
+
+class TestControlServer:
+    def test_status(self, server):
+        """Test that the status can be requested."""
+        status, data = request(server, "GET", "/status")
+
+        assert status == 200
+        assert data["running"] == False
+        assert data["queued"] == 0
+
+    def test_submit_job(self, server, tmp_path):
+        """Test that a submitted job is executed."""
+        status, data = request(server, "POST", "/jobs", create_jobs(1)[0])
+
+        assert status == 202
+        assert data["status"] in ("queued", "running")
+
+        job = wait_for_job(server, data["id"])
+
+        assert job["status"] == "finished"
+        assert job["summary"]["recorded-images"] == 3
+        assert len([f for f in os.listdir(os.path.join(str(tmp_path), "job-0"))
+                    if f.endswith(".tif")]) == 3
+
+    def test_invalid_job_is_rejected(self, server):
+        """Test that invalid jobs are not queued."""
+        job = create_jobs(1)[0]
+        job["series"]["end"] = 100
+
+        status, data = request(server, "POST", "/jobs", job)
+
+        assert status == 400
+        assert "job-0" in data["error"]
+        assert request(server, "GET", "/jobs")[1] == []
+
+    def test_unknown_path(self, server):
+        """Test that unknown paths return a 404 error."""
+        assert request(server, "GET", "/unknown")[0] == 404
+        assert request(server, "POST", "/status")[0] == 405
+
+    def test_stream(self, server):
+        """Test that the images, log rows and the end of the measurement are
+        streamed."""
+        connection = http.client.HTTPConnection(server.host, server.port,
+                                                timeout=10)
+        connection.request("GET", "/stream")
+        response = connection.getresponse()
+
+        assert response.status == 200
+        assert json.loads(response.readline().decode("utf-8"))["type"] == "status"
+
+        request(server, "POST", "/jobs", create_jobs(1)[0])
+
+        messages = []
+        while len(messages) == 0 or messages[-1]["type"] != "finished":
+            messages.append(json.loads(response.readline().decode("utf-8")))
+        connection.close()
+
+        types = [m["type"] for m in messages]
+        assert types.count("step") == 3
+        assert types.count("image") == 3
+        assert types.count("log") >= 3
+        # the images are announced by their save threads
+        assert sorted(m["step"]["focus"] for m in messages
+                      if m["type"] == "image") == [0, 1, 2]
+        assert all(os.path.isfile(m["path"]) for m in messages
+                   if m["type"] == "image")
+        assert not pylo.after_log_row.getHandlerOptions(
+            server.event_id).blocking
+
+    def test_emergency_cancels_queued_jobs(self, server, controller):
+        """Test that the emergency cancels the queued jobs."""
+        emergencies = []
+        pylo.emergency["test_control_server"] = lambda c: emergencies.append(c)
+
+        try:
+            # add the jobs without queueing them so they are not executed 
+            # before the emergency request
+            with server._jobs_lock:
+                for job in create_jobs(2):
+                    server._jobs[len(server._jobs) + 1] = {
+                        "id": len(server._jobs) + 1, "name": job["name"],
+                        "status": "queued", "summary": None}
+
+            status, data = request(server, "POST", "/emergency")
+
+            assert status == 200
+            assert emergencies == [controller]
+            assert all(j["status"] == "cancelled"
+                       for j in request(server, "GET", "/jobs")[1])
+        finally:
+            del pylo.emergency["test_control_server"]
@@ -0,0 +1,163 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import csv
+import pytest
+import numpy as np
+
+import pylo
+
+from pylo.drift_correction import get_spectrum
+from pylo.drift_correction import phase_correlation
+from pylo.drift_correction import DRIFT_TAGS_KEY
+
+from pylotestlib import run_measurement
+
+def create_pattern(shape=(64, 64), seed=0):
+    """Create a smooth random pattern with values between 0 and 255."""
+    random = np.random.RandomState(seed)
+    spectrum = np.fft.fft2(random.rand(*shape))
+    ky = np.fft.fftfreq(shape[0])[:, np.newaxis]
+    kx = np.fft.fftfreq(shape[1])[np.newaxis, :]
+    pattern = np.fft.ifft2(spectrum * np.exp(-(kx ** 2 + ky ** 2) / 0.01)).real
+    pattern -= pattern.min()
+    return pattern / pattern.max() * 255
+
+def fourier_shift(data, dy, dx):
+    """Shift the data by sub-pixel values."""
+    ky = np.fft.fftfreq(data.shape[0])[:, np.newaxis]
+    kx = np.fft.fftfreq(data.shape[1])[np.newaxis, :]
+    return np.fft.ifft2(np.fft.fft2(data) * 
+                        np.exp(-2j * np.pi * (ky * dy + kx * dx))).real
+
+class DriftingCamera(pylo.CameraInterface):
+    """A camera that moves the pattern by `drift` pixels in x direction with 
+    each image, the x-tilt of the microscope moves the image back."""
+    def __init__(self, controller, drift=3):
+        super().__init__(controller)
+        self.pattern = create_pattern((256, 256))
+        self.drift = drift
+        self.images = []
+
+    def resetToSafeState(self):
+        pass
+
+    def recordImage(self, additional_tags=None, **kwargs):
+        dx = (self.drift * len(self.images) + 
+              self.controller.microscope.values["x-tilt"])
+        dx = int(round(dx))
+        image = pylo.Image(self.pattern[64:192, 64 - dx:192 - dx], 
+                           dict(additional_tags))
+        self.images.append(image)
+        return image
+
+class TestPhaseCorrelation:
+    @pytest.mark.parametrize("dy,dx", [(0, 0), (5, -3), (-20, 17)])
+    def test_integer_shift(self, dy, dx):
+        """Test that integer shifts are found."""
+        pattern = create_pattern((256, 256))
+        reference = pattern[64:192, 64:192]
+        shifted = pattern[64 - dy:192 - dy, 64 - dx:192 - dx]
+
+        shift = phase_correlation(get_spectrum(reference), 
+                                  get_spectrum(shifted))
+        assert shift == pytest.approx((dy, dx), abs=0.25)
+    
+    @pytest.mark.parametrize("dy,dx", [(2.3, -1.6), (0.45, 7.75)])
+    def test_sub_pixel_shift(self, dy, dx):
+        """Test that sub-pixel shifts are found in noisy images."""
+        random = np.random.RandomState(1)
+        pattern = create_pattern((256, 256))
+        shifted = fourier_shift(pattern, dy, dx)
+
+        reference = pattern[64:192, 64:192] + random.randn(128, 128) * 5
+        shifted = shifted[64:192, 64:192] + random.randn(128, 128) * 5
+
+        shift = phase_correlation(get_spectrum(reference), 
+                                  get_spectrum(shifted))
+        assert shift == pytest.approx((dy, dx), abs=0.2)
+    
+    def test_pyramid(self, controller):
+        """Test that the shift is found with binned images."""
+        corrector = pylo.DriftCorrector(controller, downsample=1, levels=3,
+                                        workers=1, feedback_threshold=0)
+        assert corrector.factors == (4, 2, 1)
+
+        pattern = create_pattern((256, 256))
+        reference = corrector._createReference(pattern[64:192, 64:192])
+        shift = corrector.estimateShift(reference, pattern[55:183, 78:206])
+        assert shift == pytest.approx((9, -14), abs=0.1)
+
+class TestDriftCorrector:
+    def run(self, controller, corrector, wait=False):
+        camera = DriftingCamera(controller)
+        controller.camera = camera
+
+        corrector.install()
+        if wait:
+            # wait for the drift after each image to make the feedback 
+            # deterministic
+            pylo.after_record.register("test_drift_correction", 
+                                       lambda c: corrector.wait(), priority=-1)
+        
+        try:
+            measurement = run_measurement(controller)
+        finally:
+            corrector.uninstall()
+            if "test_drift_correction" in pylo.after_record:
+                del pylo.after_record["test_drift_correction"]
+        
+        assert measurement.finished
+        return camera, measurement
+
+    def test_drift_in_tags_and_log(self, controller):
+        """Test that the drift is added to the tags and the log."""
+        corrector = pylo.DriftCorrector(controller, downsample=1, levels=2,
+                                        workers=2, feedback_threshold=0)
+        camera, measurement = self.run(controller, corrector)
+
+        assert [i.tags[DRIFT_TAGS_KEY]["x"] for i in camera.images] == (
+            pytest.approx([0, 3, 6], abs=0.3))
+        assert [i.tags[DRIFT_TAGS_KEY]["y"] for i in camera.images] == (
+            pytest.approx([0, 0, 0], abs=0.3))
+        assert camera.images[0].tags[DRIFT_TAGS_KEY]["reference"]
+        assert len(corrector.shifts) == 2
+        # no feedback
+        assert controller.microscope.values["x-tilt"] == 0
+
+        log_path = os.path.join(measurement.save_dir, "measurement.log")
+        with open(log_path) as f:
+            actions = [row[0] for row in csv.reader(f)]
+        
+        assert len([a for a in actions if a.startswith("Drift")]) == 2
+
+    def test_feedback(self, controller):
+        """Test that the drift is corrected if it exceeds the threshold."""
+        controller.configuration.setValue("drift-correction", 
+                                          "feedback-x-variable-id", "x-tilt")
+        corrector = pylo.DriftCorrector(controller, downsample=1, levels=1,
+                                        workers=1, feedback_threshold=2)
+        camera, measurement = self.run(controller, corrector, True)
+
+        # second image drifted by 3, corrected before the third image
+        assert controller.microscope.values["x-tilt"] == pytest.approx(-3, 
+                                                                       abs=0.3)
+        assert camera.images[2].tags[DRIFT_TAGS_KEY]["x"] == pytest.approx(3, 
+                                                                           abs=0.3)
+
+    def test_enabled_by_configuration(self, controller):
+        """Test that the controller installs the drift correction."""
+        controller.configuration.setValue("drift-correction", "enabled", True)
+        controller.initialize()
+
+        try:
+            assert isinstance(controller.drift_corrector, pylo.DriftCorrector)
+            assert pylo.DriftCorrector.event_id in pylo.after_record
+        finally:
+            controller.drift_corrector.uninstall()
+        
+        assert pylo.DriftCorrector.event_id not in pylo.after_record
@@ -0,0 +1,113 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import threading
+import pytest
+
+import pylo
+
+from pylo.emergency_executor import EmergencyExecutor
+from pylo.emergency_executor import inherit_emergency
+from pylo.emergency_executor import get_emergency_executor
+
+class SlowMachine(pylo.VulnerableMachine):
+    def __init__(self, duration=0.2):
+        self.duration = duration
+        self.safe_state_calls = []
+        super().__init__()
+
+    def move(self):
+        return "moved"
+
+    def resetToSafeState(self):
+        time.sleep(self.duration)
+        # the emergency thread can use the blocked functions
+        self.safe_state_calls.append(self.move())
+
+@pytest.fixture(autouse=True)
+def clear_events():
+    pylo.emergency.clear()
+    yield
+    pylo.emergency.clear()
+    pylo.safe_state_timeout.clear()
+    get_emergency_executor().timeout = None
+
+class TestEmergencyExecutor:
+    def test_safe_state_is_parallel(self):
+        """Test that the safe state of all machines is started before waiting
+        for any of them."""
+        machines = [SlowMachine(), SlowMachine()]
+
+        start = time.time()
+        futures = [m.startEmergencyState() for m in machines]
+        assert get_emergency_executor().wait(futures)
+
+        assert time.time() - start < 0.35
+        assert all(m.safe_state_calls == ["moved"] for m in machines)
+
+    def test_blocking_after_start(self):
+        """Test that the functions are blocked immediately while the safe 
+        state is still running."""
+        machine = SlowMachine(0.1)
+        future = machine.startEmergencyState()
+
+        assert not future.done()
+        with pytest.raises(pylo.BlockedFunctionError):
+            machine.move()
+        
+        future.result()
+        assert machine.safe_state_calls == ["moved"]
+
+    def test_inherit_emergency(self):
+        """Test that helper threads of the emergency thread can use the 
+        blocked functions."""
+        machine = SlowMachine(0)
+        results = []
+
+        def reset():
+            thread = threading.Thread(
+                target=inherit_emergency(lambda: results.append(machine.move())))
+            thread.start()
+            thread.join()
+        
+        machine.resetToSafeState = reset
+        machine.resetToEmergencyState()
+
+        assert results == ["moved"]
+
+    def test_watchdog_escalates(self):
+        """Test that the safe_state_timeout event is fired when a device takes
+        too long."""
+        timeouts = []
+        pylo.safe_state_timeout["test"] = lambda d, t: timeouts.append((d, t))
+
+        executor = EmergencyExecutor(timeout=0.05)
+        device = object()
+        future = executor.submit("slow", device, time.sleep, 0.2)
+
+        assert not executor.wait((future, ))
+        future.result()
+        assert len(timeouts) == 1
+        assert timeouts[0][0] is device
+        assert timeouts[0][1] >= 0.05
+        assert executor.durations["slow"] >= 0.2
+
+    def test_hanging_device_does_not_block_emergency(self):
+        """Test that the emergency event returns after the timeout even if a
+        device hangs."""
+        get_emergency_executor().timeout = 0.05
+        timeouts = []
+        pylo.safe_state_timeout["test"] = lambda d, t: timeouts.append(d)
+        machine = SlowMachine(0.5)
+
+        start = time.time()
+        pylo.emergency()
+
+        assert time.time() - start < 0.3
+        assert machine._in_emergency_state
+        assert timeouts == [machine]
@@ -4,7 +4,10 @@ if __name__ == "__main__":
     import os
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import time
 import pytest
+import threading
+
 import pylo
 
 class TestEvent:
@@ -88,4 +91,116 @@ class TestEvent:
 
         # check if both handlers are executed again
         assert self.handler_1_triggered
-        assert self.handler_2_triggered
\ No newline at end of file
+        assert self.handler_2_triggered
+    
+    def test_priority_order(self):
+        """Test if handlers with higher priorities are executed first and 
+        equal priorities keep the insertion order."""
+        calls = []
+        self.event.clear()
+        self.event["a"] = lambda: calls.append("a")
+        self.event.register("b", lambda: calls.append("b"), priority=5)
+        self.event["c"] = lambda: calls.append("c")
+        self.event.register("d", lambda: calls.append("d"), priority=-1)
+
+        self.event()
+
+        assert calls == ["b", "a", "c", "d"]
+    
+    def test_setting_item_resets_options(self):
+        """Test if overwriting a registered handler by setting the item uses
+        the default options again."""
+        self.event.clear()
+        self.event.register("handler_1", self.handler1, priority=3, 
+                            blocking=False)
+        self.event["handler_1"] = self.handler1
+
+        options = self.event.getHandlerOptions("handler_1")
+        assert options.blocking
+        assert options.priority == 0
+    
+    def test_non_blocking_handler_does_not_block(self):
+        """Test if non-blocking handlers are executed in the background."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        self.event.clear()
+        self.event.register("slow", slow, blocking=False)
+        self.event.register("handler_1", self.handler1)
+
+        start = time.time()
+        self.event()
+
+        assert time.time() - start < 1
+        assert self.handler_1_triggered
+        assert started.wait(5)
+        release.set()
+    
+    def test_timeout_raises_error(self):
+        """Test if a blocking handler that takes too long raises a 
+        TimeoutError."""
+        self.event.clear()
+        self.event.register("slow", lambda: time.sleep(0.5), timeout=0.05)
+
+        with pytest.raises(TimeoutError):
+            self.event()
+    
+    def test_isolated_timeout_is_logged_once(self, monkeypatch):
+        """Test if an isolated handler that takes too long is logged once and
+        does not stop the other handlers."""
+        errors = []
+        monkeypatch.setattr(pylo.event, "log_error", 
+                            lambda logger, error, *args: errors.append(error))
+        self.event.clear()
+        self.event.register("slow", lambda: time.sleep(0.5), timeout=0.05,
+                            isolate_errors=True)
+        self.event["handler_2"] = self.handler2
+
+        self.event()
+
+        assert self.handler_2_triggered
+        assert len(errors) == 1
+        assert isinstance(errors[0], TimeoutError)
+    
+    def test_isolated_errors_are_not_raised(self):
+        """Test if isolated handler errors do not stop the other handlers."""
+        def raise_error():
+            raise ValueError("Test error")
+
+        self.event.clear()
+        self.event.register("error", raise_error, isolate_errors=True)
+        self.event["handler_2"] = self.handler2
+
+        self.event()
+
+        assert self.handler_2_triggered
+    
+    def test_not_isolated_errors_are_raised(self):
+        """Test if handler errors are raised by default."""
+        def raise_error():
+            raise ValueError("Test error")
+
+        self.event.clear()
+        self.event["error"] = raise_error
+
+        with pytest.raises(ValueError):
+            self.event()
+    
+    def test_timings_are_recorded(self):
+        """Test if each handler execution is timed."""
+        self.event.clear()
+        self.event.popTimings()
+        self.event["handler_1"] = self.handler1
+        self.event.register("sleep", lambda: time.sleep(0.05))
+
+        self.event()
+        timings = self.event.popTimings()
+
+        assert [t.key for t in timings] == ["handler_1", "sleep"]
+        assert timings[1].duration >= 0.04
+        assert all(t.blocking and t.error is None for t in timings)
+        assert self.event.popTimings() == []
@@ -0,0 +1,190 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import random
+import threading
+import pytest
+
+import pylo
+
+from pylo.domain_locks import DomainLocks
+
+class DomainMicroscope(pylo.MicroscopeInterface):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.supports_parallel_measurement_variable_setting = False
+        self.values = {"focus": 0, "ol-current": 0, "x-tilt": 0}
+        self.block = {}
+
+        for id_, domain in (("focus", ("eos", "lens")),
+                            ("ol-current", "lens"), ("x-tilt", "stage")):
+            self.registerMeasurementVariable(
+                pylo.MeasurementVariable(id_, id_, -100, 100),
+                lambda i=id_: self._get(i), lambda v, i=id_: self._set(i, v))
+            self.measurement_variable_lock_domains[id_] = domain
+
+        self.registerMeasurementVariable(
+            pylo.MeasurementVariable("other", "other", -100, 100),
+            lambda: 0, lambda v: None)
+
+    def _get(self, id_):
+        return self.values[id_]
+
+    def _set(self, id_, value):
+        if id_ in self.block:
+            self.block[id_][0].set()
+            self.block[id_][1].wait(5)
+        self.values[id_] = value
+
+def start_blocked_setting(microscope, id_, value):
+    """Start setting the `id_` in a thread, the setter is blocked until the
+    returned event is set."""
+    started = threading.Event()
+    release = threading.Event()
+    microscope.block[id_] = (started, release)
+
+    thread = threading.Thread(target=microscope.setMeasurementVariableValue,
+                              args=(id_, value))
+    thread.start()
+    assert started.wait(5)
+
+    return thread, release
+
+def is_locked(lock):
+    if lock.acquire(False):
+        lock.release()
+        return False
+    return True
+
+class TestDomainLocks:
+    def test_domains_are_locked_sorted(self):
+        """Test that the domains are acquired in the sorted order and the
+        default domain always exists."""
+        locks = DomainLocks(("stage", "lens"))
+
+        assert locks.domains == ["lens", pylo.DEFAULT_LOCK_DOMAIN, "stage"]
+        assert locks.acquire(("stage", "eos", "lens")) == ["eos", "lens",
+                                                           "stage"]
+        locks.release(["eos", "lens", "stage"])
+
+    def test_failed_acquire_releases_locks(self):
+        """Test that the already locked domains are released again if one of
+        the domains cannot be acquired."""
+        locks = DomainLocks()
+        stage = locks.getLock(("stage", ))
+        acquired = []
+
+        def acquire():
+            acquired.append(locks.acquire(("lens", "stage"), timeout=0.05))
+
+        with stage:
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            thread.join()
+
+        assert acquired == [None]
+        assert not is_locked(locks.getLock(("lens", )))
+
+    def test_opposite_order_does_not_deadlock(self):
+        """Test that many threads locking overlapping domains in different
+        orders do not deadlock."""
+        locks = DomainLocks()
+        domains = ["lens", "stage", "eos", "gun"]
+        finished = []
+
+        def work():
+            for i in range(50):
+                d = random.sample(domains, 2)
+                with locks.getLock(d):
+                    time.sleep(0.0005)
+            finished.append(True)
+
+        threads = [threading.Thread(target=work) for i in range(6)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(20)
+
+        assert len(finished) == len(threads)
+
+class TestMicroscopeLockDomains:
+    def test_lock_domains_of_variables(self):
+        """Test that the domains of the variables are returned as tuples."""
+        microscope = DomainMicroscope(None)
+
+        assert microscope.getMeasurementVariableLockDomains("focus") == (
+            "eos", "lens")
+        assert microscope.getMeasurementVariableLockDomains("x-tilt") == (
+            "stage", )
+        assert microscope.getMeasurementVariableLockDomains("other") == (
+            pylo.DEFAULT_LOCK_DOMAIN, )
+
+    def test_independent_domains_are_concurrent(self):
+        """Test that a variable of another domain can be accessed while a
+        variable is set."""
+        microscope = DomainMicroscope(None)
+        thread, release = start_blocked_setting(microscope, "x-tilt", 10)
+
+        try:
+            microscope.setMeasurementVariableValue("ol-current", 5)
+            assert microscope.getMeasurementVariableValue("focus") == 0
+            assert microscope.getMeasurementVariableValue("other") == 0
+            assert is_locked(microscope.lockDomains("stage"))
+        finally:
+            release.set()
+            thread.join()
+
+        assert microscope.values == {"focus": 0, "ol-current": 5, "x-tilt": 10}
+        assert not is_locked(microscope.lockDomains("stage"))
+
+    def test_shared_domain_is_sequential(self):
+        """Test that variables sharing a domain are not accessed at the same
+        time."""
+        microscope = DomainMicroscope(None)
+        thread, release = start_blocked_setting(microscope, "ol-current", 5)
+        results = []
+        reader = threading.Thread(target=lambda: results.append(
+            microscope.getMeasurementVariableValue("focus")))
+
+        try:
+            reader.start()
+            reader.join(0.1)
+
+            assert reader.is_alive()
+            assert is_locked(microscope.lockMeasurementVariable("focus"))
+        finally:
+            release.set()
+            thread.join()
+            reader.join()
+
+        assert results == [0]
+
+    def test_action_lock_blocks_all_domains(self):
+        """Test that the action lock blocks all the domains."""
+        microscope = DomainMicroscope(None)
+
+        with microscope.action_lock:
+            for domain in ("eos", "lens", "stage", pylo.DEFAULT_LOCK_DOMAIN):
+                checked = []
+                thread = threading.Thread(target=lambda: checked.append(
+                    is_locked(microscope.lockDomains(domain))))
+                thread.start()
+                thread.join()
+                assert checked == [True]
+
+        assert not is_locked(microscope.action_lock)
+
+    def test_error_releases_domains(self):
+        """Test that the domains are released if setting fails."""
+        microscope = DomainMicroscope(None)
+
+        with pytest.raises(ValueError):
+            microscope.setMeasurementVariableValue("x-tilt", 1000)
+
+        assert not is_locked(microscope.action_lock)
@@ -746,6 +746,23 @@ class TestMeasurement:
         assert os.path.exists(performed_measurement.measurement._measurement_log_path)
         assert os.path.isfile(performed_measurement.measurement._measurement_log_path)
     
+    @pytest.mark.slow()
+    @pytest.mark.usefixtures("performed_measurement")
+    def test_timeline_is_saved(self, performed_measurement):
+        """Test if the timeline is saved and contains the phases of each step
+        and the event handlers."""
+        measurement = performed_measurement.measurement
+        assert os.path.isfile(measurement._timeline_path)
+
+        entries = measurement.timeline.entries
+        step_count = len(performed_measurement.measurement_steps)
+        for phase in ("approach", "readback", "record"):
+            assert len([e for e in entries if e.phase == phase]) == step_count
+        
+        handler_names = [e.name for e in entries if e.phase == "event"]
+        assert (handler_names.count("before_record:performed_measurement_handler") == 
+                step_count)
+    
     @pytest.mark.slow()
     @pytest.mark.usefixtures("performed_measurement")
     def test_log_row_count_is_correct(self, performed_measurement):
@@ -891,7 +908,7 @@ class TestMeasurement:
         # check if no image is recorded
         file_found = False
         for f in os.listdir(performed_measurement.root):
-            if f != "." and f != ".." and f != "measurement.log":
+            if f not in (".", "..", "measurement.log", "measurement.timeline.csv"):
                 file_found = True
                 break
         assert not file_found
@@ -917,7 +934,7 @@ class TestMeasurement:
         # check if no image is recorded
         file_found = False
         for f in os.listdir(performed_measurement.root):
-            if f != "." and f != ".." and f != "measurement.log":
+            if f not in (".", "..", "measurement.log", "measurement.timeline.csv"):
                 file_found = True
                 break
         assert not file_found
@@ -944,7 +961,7 @@ class TestMeasurement:
         # starts!
         file_found = False
         for f in os.listdir(performed_measurement.root):
-            if f != "." and f != ".." and f != "measurement.log":
+            if f not in (".", "..", "measurement.log", "measurement.timeline.csv"):
                 file_found = True
                 break
         assert not file_found
@@ -1335,7 +1352,10 @@ class TestMeasurement:
         print("Expected duration:", total_duration, 
               "Actual duration:", end_time - start_time)
 
-        assert math.isclose(end_time - start_time - total_duration, 0, abs_tol=0.2)
+        # the ramps of different variables overlap, so the measurement is at
+        # most as long as setting all substeps one after another
+        assert (perf_m.measurement.relaxation_time * step_number <= 
+                end_time - start_time <= total_duration + 0.2)
 
         lt = None
         for step, t in perf_m.controller.microscope.measurement_variable_set_log:
@@ -132,6 +132,35 @@ class TestPyJEMMicroscope:
         # check if the new state is equal to the initial state
         assert microscope.getCurrentState() == state
     
+    @pytest.mark.parametrize("microscope", microscopes)
+    def test_restore_unchanged_state(self, microscope):
+        """Test if restoring the current state does not write anything and if
+        restoring a changed state writes the changed values only."""
+
+        microscope = microscope()
+
+        if not hasattr(microscope, "_writeStateValue"):
+            pytest.skip("The microscope does not write its state value by " + 
+                        "value so it cannot be tested.")
+
+        writes = []
+        write = microscope._writeStateValue
+        def log_write(key, value):
+            writes.append(key)
+            write(key, value)
+        microscope._writeStateValue = log_write
+
+        state = microscope.getCurrentState()
+        microscope.setCurrentState(state)
+        assert writes == []
+
+        state["pl1"] += 1
+        state["cl1"] += 1
+        microscope.setCurrentState(state)
+        # written from the gun to the screen
+        assert writes == ["cl1", "pl1"]
+        assert microscope.getCurrentState() == state
+    
     @pytest.mark.parametrize("microscope", microscopes)
     def test_reset_to_safe_state(self, microscope):
         """Test if there is no error in the safe state. Note that this does not
@@ -0,0 +1,139 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+
+import pylo
+
+from pylo.motion_profile import create_profiles
+from pylo.motion_profile import trapezoid_times
+from pylo.motion_profile import get_ramp_duration
+from pylo.motion_profile import get_increment_count
+
+from pylotestlib import DummyMicroscope
+from pylotestlib import run_measurement
+
+class LoggingMicroscope(DummyMicroscope):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.set_log = []
+
+    def setMeasurementVariableValue(self, id_, value):
+        self.set_log.append((id_, value, time.time()))
+        super().setMeasurementVariableValue(id_, value)
+
+class TestMotionProfile:
+    @pytest.mark.parametrize("fraction", [0, 0.1, 0.25, 0.5])
+    def test_trapezoid_times(self, fraction):
+        """Test that the times are increasing and end at 1."""
+        times = trapezoid_times(10, fraction)
+
+        assert len(times) == 10
+        assert times[-1] == 1
+        assert all(a < b for a, b in zip([0] + times, times))
+
+        if fraction == 0:
+            assert times == pytest.approx([(i + 1) / 10 for i in range(10)])
+
+    def test_trapezoid_is_slow_at_the_ends(self):
+        """Test that the first and the last increments take longer than the
+        ones in the middle."""
+        times = trapezoid_times(10, 0.25)
+        intervals = [b - a for a, b in zip([0] + times, times)]
+
+        assert intervals[0] > intervals[5]
+        assert intervals[-1] > intervals[5]
+        assert intervals[4] == pytest.approx(intervals[5])
+
+    def test_increment_count(self):
+        """Test that small moves use less increments."""
+        assert get_increment_count(10, None, 5) == 5
+        assert get_increment_count(10, 1, 5) == 5
+        assert get_increment_count(2, 1, 5) == 2
+        assert get_increment_count(0.5, 1, 5) == 1
+
+    def test_ramp_duration(self):
+        """Test that the peak velocity of the ramp is the slew rate."""
+        assert get_ramp_duration(10, None) == 0
+        assert get_ramp_duration(10, 5, 0) == pytest.approx(2)
+        # the peak velocity of the trapezoid is distance / (T * (1 - f))
+        assert 10 / (get_ramp_duration(10, 5, 0.25) * 0.75) == pytest.approx(5)
+
+    def test_profiles_finish_together(self):
+        """Test that all profiles take the duration of the slowest variable
+        and unchanged variables have no profile."""
+        variables = {
+            "focus": pylo.MeasurementVariable("focus", "Focus",
+                                              min_increment=1),
+            "x-tilt": pylo.MeasurementVariable("x-tilt", "Tilt",
+                                               max_slew_rate=2),
+            "y-tilt": pylo.MeasurementVariable("y-tilt", "Tilt")
+        }
+        profiles = create_profiles(variables,
+                                   {"focus": 0, "x-tilt": 0, "y-tilt": 1},
+                                   {"focus": 2, "x-tilt": 4, "y-tilt": 1},
+                                   max_count=8, acceleration_fraction=0)
+
+        assert [p.variable_id for p in profiles] == ["focus", "x-tilt"]
+        assert profiles[0].values == [1, 2]
+        assert len(profiles[1]) == 8
+        assert profiles[1].values[-1] == 4
+        for profile in profiles:
+            assert profile.duration == pytest.approx(2)
+
+    def test_min_duration(self):
+        """Test that the profiles take at least the minimum duration."""
+        profiles = create_profiles({}, {"focus": 0}, {"focus": 1},
+                                   max_count=2, min_duration=0.5)
+
+        assert profiles[0].values == [0.5, 1]
+        assert profiles[0].duration == pytest.approx(0.5)
+
+class TestMeasurementRamps:
+    def test_small_moves_use_less_calls(self, controller):
+        """Test that the minimum increment reduces the number of calls."""
+        controller.microscope = LoggingMicroscope(controller)
+        controller.microscope.supported_measurement_variables[0].min_increment = 0.5
+        controller.configuration.setValue("measurement", "substeps", 10)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        focus_values = [v for i, v, t in controller.microscope.set_log
+                        if i == "focus"]
+        # 0 directly, then two increments to 1 and two to 2
+        assert focus_values == [0, 0.5, 1, 1.5, 2]
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_slew_rate_limits_approach(self, controller, parallel):
+        """Test that the slew rate defines the approach time."""
+        controller.microscope = LoggingMicroscope(controller)
+        controller.microscope.supports_parallel_measurement_variable_setting = parallel
+        controller.microscope.supported_measurement_variables[0].max_slew_rate = 10
+        controller.configuration.setValue("measurement", "substeps", 4)
+        controller.configuration.setValue("measurement",
+                                          "ramp-acceleration-fraction", 0)
+
+        measurement = run_measurement(controller)
+        controller.microscope.shutdownExecutor()
+
+        assert measurement.finished
+        log = [(v, t) for i, v, t in controller.microscope.set_log
+               if i == "focus"]
+        assert [v for v, t in log] == [0, 0.25, 0.5, 0.75, 1, 1.25, 1.5,
+                                       1.75, 2]
+
+        # each increment of 0.25 takes 0.025s with 10 units per second, value
+        # k is set after k increments, the last one after the full ramp
+        approaches = [e for e in measurement.timeline.entries
+                      if e.phase == "approach"]
+        for entry in approaches[1:]:
+            values = log[1 + 4 * (entry.step - 1):1 + 4 * entry.step]
+            for k, (v, t) in enumerate(values, 1):
+                assert t - entry.start >= k * 0.025 - 1e-3
+            assert entry.duration >= 0.1 - 1e-3
@@ -0,0 +1,151 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+
+import pylo
+
+from pylo.controller import parseCameraRoles
+
+from pylotestlib import DummyCamera
+from pylotestlib import run_measurement
+
+class RecordingCamera(DummyCamera):
+    def __init__(self, controller, records, delay=0):
+        super().__init__(controller)
+        self.records = records
+        self.delay = delay
+
+    def recordImage(self, *args, **kwargs):
+        self.records.append(("start", self.role))
+        time.sleep(self.delay)
+        image = super().recordImage(*args, **kwargs)
+        self.records.append(("end", self.role))
+        return image
+
+def add_cameras(controller, records, *roles, delay=0):
+    controller.camera = RecordingCamera(controller, records, delay)
+    for role in roles:
+        camera = RecordingCamera(controller, records, delay)
+        camera.role = role
+        controller.additional_cameras[role] = camera
+
+def list_images(tmp_path):
+    return sorted(f for f in os.listdir(str(tmp_path)) if f.endswith(".tif"))
+
+class TestMultiCamera:
+    def test_parse_camera_roles(self):
+        """Test that the camera roles are parsed in order."""
+        roles = parseCameraRoles("preview = Dummy Camera,eels=DM Camera, ")
+
+        assert list(roles.items()) == [("preview", "Dummy Camera"),
+                                       ("eels", "DM Camera")]
+        assert len(parseCameraRoles("")) == 0
+
+    @pytest.mark.parametrize("definition", [
+        "preview", "=Dummy Camera", "a=Dummy Camera, a=DM Camera", 
+        "{}=Dummy Camera".format(pylo.MAIN_CAMERA_ROLE)
+    ])
+    def test_parse_camera_roles_invalid(self, definition):
+        """Test that invalid camera definitions raise an error."""
+        with pytest.raises(ValueError):
+            parseCameraRoles(definition)
+
+    def test_cameras_order(self, controller):
+        """Test that the main camera is always the first camera."""
+        add_cameras(controller, [], "preview", "eels")
+
+        assert list(controller.cameras.keys()) == [pylo.MAIN_CAMERA_ROLE, 
+                                                   "preview", "eels"]
+        assert controller.cameras[pylo.MAIN_CAMERA_ROLE] is controller.camera
+
+    def test_single_camera_names(self, controller, tmp_path):
+        """Test that the file names do not change with one camera only."""
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert list_images(tmp_path) == ["0.tif", "1.tif", "2.tif"]
+
+    def test_concurrent_recording(self, controller, tmp_path):
+        """Test that all cameras record in parallel and the images are saved 
+        with the camera role."""
+        records = []
+        add_cameras(controller, records, "preview", delay=0.05)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert list_images(tmp_path) == ["0-preview.tif", "0.tif", 
+                                         "1-preview.tif", "1.tif", 
+                                         "2-preview.tif", "2.tif"]
+        # both cameras start before one of them ends
+        assert [r[0] for r in records[:2]] == ["start", "start"]
+        assert controller.camera.safe_state_calls == 1
+        assert controller.additional_cameras["preview"].safe_state_calls == 1
+
+    def test_camera_placeholder(self, controller, tmp_path):
+        """Test that the camera placeholder can be used in the file name."""
+        controller.configuration.setValue("measurement", "save-file-format", 
+                                          "{camera}_{counter}.tif")
+        add_cameras(controller, [], "preview")
+
+        run_measurement(controller)
+
+        assert list_images(tmp_path) == ["main_0.tif", "main_1.tif", 
+                                         "main_2.tif", "preview_0.tif", 
+                                         "preview_1.tif", "preview_2.tif"]
+
+    def test_sequential_recording(self, controller):
+        """Test that the cameras record after each other in the sequential 
+        mode."""
+        controller.configuration.setValue("measurement", "camera-trigger-mode", 
+                                          "sequential")
+        records = []
+        add_cameras(controller, records, "preview", "eels")
+
+        run_measurement(controller)
+
+        assert records[:6] == [("start", "main"), ("end", "main"), 
+                               ("start", "preview"), ("end", "preview"), 
+                               ("start", "eels"), ("end", "eels")]
+
+    def test_synchronised_recording(self, controller, tmp_path):
+        """Test that the synchronised mode records with all cameras."""
+        controller.configuration.setValue("measurement", "camera-trigger-mode", 
+                                          "synchronised")
+        add_cameras(controller, [], "preview")
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert len(list_images(tmp_path)) == 6
+
+    def test_additional_camera_error_is_isolated(self, controller, tmp_path):
+        """Test that an error of an additional camera does not stop the 
+        measurement."""
+        lines = []
+        controller.view.print = lambda *v, **kwargs: lines.append(" ".join(v))
+        add_cameras(controller, [], "preview")
+        controller.additional_cameras["preview"].fail = True
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert list_images(tmp_path) == ["0.tif", "1.tif", "2.tif"]
+        assert len([l for l in lines 
+                    if "The camera failed on purpose." in l]) == 3
+
+    def test_main_camera_error_stops(self, controller):
+        """Test that an error of the main camera stops the measurement."""
+        add_cameras(controller, [], "preview")
+        controller.camera.fail = True
+
+        with pytest.raises(RuntimeError) as e:
+            run_measurement(controller)
+
+        assert "The camera failed on purpose." in str(e.value)
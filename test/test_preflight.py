@@ -0,0 +1,133 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import numpy as np
+
+import pylo
+
+from pylotestlib import DummyCamera
+from pylotestlib import create_series
+from pylotestlib import run_measurement
+
+class SizedCamera(DummyCamera):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.exposure_time = 0
+        self.records = 0
+
+    def getFrameFormat(self):
+        return (100, 200), np.dtype(np.uint16)
+
+    def recordImage(self, *args, **kwargs):
+        self.records += 1
+        return super().recordImage(*args, **kwargs)
+
+@pytest.fixture()
+def sized_controller(controller):
+    controller.camera = SizedCamera(controller)
+    yield controller
+
+def create_measurement(controller):
+    return pylo.Measurement(controller, pylo.MeasurementSteps(controller,
+                                                              {"x-tilt": 0},
+                                                              create_series()))
+
+class TestPreflight:
+    def test_report(self, sized_controller):
+        """Test that the sizes are calculated from the steps, the camera and
+        the file format."""
+        measurement = create_measurement(sized_controller)
+        report = pylo.Preflight(measurement, probe_size=64 * 1024).run()
+
+        bytes_per_frame = 100 * 200 + pylo.preflight.FILE_OVERHEAD_BYTES
+        assert report.step_count == 3
+        assert report.frame_count == 3
+        assert report.bytes_per_frame["main"] == bytes_per_frame
+        assert report.total_bytes == 3 * bytes_per_frame
+        assert report.free_bytes > 0
+        assert report.write_throughput > 0
+        assert report.errors == []
+        assert not any(f.startswith(".preflight-probe")
+                       for f in os.listdir(measurement.save_dir))
+
+    def test_raw_formats_use_data_type(self, sized_controller):
+        """Test that formats other than tif save two bytes per pixel for
+        uint16 images."""
+        measurement = create_measurement(sized_controller)
+        measurement.name_format = "{counter}.dm4"
+
+        assert (pylo.Preflight(measurement).getBytesPerFrame(
+                sized_controller.camera) ==
+                100 * 200 * 2 + pylo.preflight.FILE_OVERHEAD_BYTES)
+
+    def test_burst_mean(self, sized_controller):
+        """Test that the unrounded mean of bursts is included."""
+        measurement = create_measurement(sized_controller)
+        measurement.burst_frames = 4
+
+        assert (pylo.Preflight(measurement).getBytesPerFrame(
+                sized_controller.camera) ==
+                100 * 200 * 9 + 2 * pylo.preflight.FILE_OVERHEAD_BYTES)
+
+    def test_unknown_frame_size(self, controller):
+        """Test that cameras without a frame format are reported."""
+        measurement = create_measurement(controller)
+        report = pylo.Preflight(measurement, probe_size=1024).run()
+
+        assert report.total_bytes is None
+        assert len(report.warnings) == 1
+        assert report.errors == []
+
+    def test_slow_storage(self, sized_controller, monkeypatch):
+        """Test that it is a warning only if saving takes longer than a
+        step."""
+        sized_controller.camera.exposure_time = 0.5
+        monkeypatch.setattr(pylo.Preflight, "measureWriteThroughput",
+                            lambda self: 1000)
+
+        report = pylo.Preflight(create_measurement(sized_controller)).run()
+
+        assert report.step_duration == pytest.approx(0.5)
+        assert report.write_duration > 20
+        assert report.estimated_duration == pytest.approx(
+            3 * report.write_duration)
+        assert report.errors == []
+        assert len(report.warnings) == 1
+        assert "may not keep up" in report.warnings[0]
+
+class TestPreflightModes:
+    def test_block(self, sized_controller, monkeypatch):
+        """Test that the measurement fails before recording if the disk is 
+        full."""
+        monkeypatch.setattr(pylo.Preflight, "getFreeBytes", lambda self: 1000)
+
+        with pytest.raises(pylo.PreflightError):
+            run_measurement(sized_controller)
+
+        assert sized_controller.camera.records == 0
+
+    def test_warn(self, sized_controller, monkeypatch):
+        """Test that the measurement is started anyway in the warn mode."""
+        monkeypatch.setattr(pylo.Preflight, "getFreeBytes", lambda self: 1000)
+        sized_controller.configuration.setValue("measurement",
+                                                "preflight-check", "warn")
+
+        measurement = run_measurement(sized_controller)
+
+        assert measurement.finished
+        assert sized_controller.camera.records == 3
+        assert len(sized_controller.measurement.preflight_report.errors) == 1
+
+    def test_off(self, sized_controller):
+        """Test that the check can be switched off."""
+        sized_controller.configuration.setValue("measurement",
+                                                "preflight-check", "off")
+        measurement = create_measurement(sized_controller)
+
+        assert measurement.runPreflight() is None
+        assert measurement.preflight_report is None
@@ -0,0 +1,181 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import threading
+import numpy as np
+
+from PIL import Image as PILImage
+
+import pylo
+
+from pylo.preview import to_uint8
+from pylo.preview import bin_image
+from pylo.preview import build_pyramid
+from pylo.preview import create_thumbnail
+from pylo.preview import create_contact_sheet
+
+from pylotestlib import DummyCamera
+from pylotestlib import create_series
+from pylotestlib import run_measurement
+
+class PatternCamera(DummyCamera):
+    def recordImage(self, *args, **kwargs):
+        data = np.random.RandomState(0).randint(0, 100, (64, 48))
+        return pylo.Image(data, {})
+
+def run(controller, writer, series=None):
+    controller.camera = PatternCamera(controller)
+
+    writer.install()
+    try:
+        measurement = run_measurement(controller, series)
+        writer.wait()
+    finally:
+        writer.uninstall()
+
+    return measurement
+
+class TestPreviewFunctions:
+    def test_pyramid(self):
+        """Test that each level is binned by two."""
+        data = np.arange(64 * 48).reshape((64, 48))
+
+        pyramid = build_pyramid(data, 3)
+
+        assert [f for f, d in pyramid] == [2, 4, 8]
+        assert [d.shape for f, d in pyramid] == [(32, 24), (16, 12), (8, 6)]
+        assert pyramid[2][1][0, 0] == pytest.approx(data[:8, :8].mean())
+        assert len(build_pyramid(np.zeros((4, 4)), 5)) == 2
+
+    def test_bin_image_drops_edges(self):
+        """Test that incomplete blocks are dropped."""
+        assert bin_image(np.ones((10, 7)), 3).shape == (3, 2)
+
+    def test_thumbnail(self):
+        """Test that the thumbnail fits the size and uses the full 8 bit
+        range."""
+        data = np.linspace(1000, 2000, 300 * 200).reshape((300, 200))
+
+        thumbnail = create_thumbnail(data, 64)
+
+        assert max(thumbnail.shape) <= 64
+        assert thumbnail.dtype == np.uint8
+        assert thumbnail.min() == 0
+        assert thumbnail.max() == 255
+        assert to_uint8(np.full((4, 4), 5)).max() == 255
+
+    def test_contact_sheet(self):
+        """Test that the thumbnails are arranged in a square grid."""
+        thumbnails = [np.full((10, 8), i + 1, dtype=np.uint8) for i in range(5)]
+
+        sheet = create_contact_sheet(thumbnails, padding=2)
+
+        assert sheet.shape == (2 * 12 - 2, 3 * 10 - 2)
+        assert sheet[0, 0] == 1
+        assert sheet[12, 10] == 5
+        assert sheet[10, 0] == 0
+
+class TestSaveCallback:
+    def test_callback_in_save_thread(self, tmp_path):
+        """Test that the callbacks are executed in the save thread even if
+        saving fails."""
+        calls = []
+        image = pylo.Image(np.zeros((4, 4)), {})
+        image.addSaveCallback(lambda i, p: calls.append(
+            (i, p, threading.current_thread())))
+
+        thread = image.saveTo(str(tmp_path / "image.unsupported"))
+        thread.join()
+
+        assert len(thread.exceptions) == 1
+        assert len(calls) == 1
+        assert calls[0][0] is image
+        assert calls[0][1].endswith("image.unsupported")
+        assert calls[0][2] is thread
+
+class TestPreviewWriter:
+    def test_previews_and_index(self, controller):
+        """Test that the pyramid, the thumbnails and the contact sheet are
+        written and indexed."""
+        writer = pylo.PreviewWriter(controller, levels=2, thumbnail_size=16)
+        measurement = run(controller, writer)
+
+        assert measurement.finished
+        save_dir = measurement.save_dir
+        entries = pylo.read_preview_index(save_dir)
+
+        frames = [e for e in entries if e["type"] == "frame"]
+        assert sorted(e["image"] for e in frames) == ["0.tif", "1.tif", "2.tif"]
+        assert frames[0]["pyramid"] == {
+            "2": "previews/{}.x2.png".format(frames[0]["image"][0]),
+            "4": "previews/{}.x4.png".format(frames[0]["image"][0])}
+
+        with PILImage.open(os.path.join(save_dir, frames[0]["pyramid"]["4"])) as i:
+            assert i.size == (12, 16)
+        with PILImage.open(os.path.join(save_dir, frames[0]["thumbnail"])) as i:
+            assert max(i.size) <= 16
+            assert i.mode == "L"
+
+        sheets = [e for e in entries if e["type"] == "contact-sheet"]
+        assert len(sheets) == 1
+        assert sheets[0]["images"] == ["0.tif", "1.tif", "2.tif"]
+        assert os.path.isfile(os.path.join(save_dir, sheets[0]["path"]))
+
+    def test_contact_sheet_per_outer_point(self, controller):
+        """Test that one contact sheet is created for each point of the
+        outer series."""
+        series = {"variable": "x-tilt", "start": 0, "end": 10, 
+                  "step-width": 10, "on-each-point": create_series()}
+        writer = pylo.PreviewWriter(controller, levels=1)
+        measurement = run(controller, writer, series)
+
+        assert measurement.finished
+        sheets = [e for e in pylo.read_preview_index(measurement.save_dir)
+                  if e["type"] == "contact-sheet"]
+
+        assert [s["group"] for s in sheets] == [{"x-tilt": 0}, {"x-tilt": 10}]
+        assert [len(s["images"]) for s in sheets] == [3, 3]
+
+    def test_contact_sheet_when_stopped(self, controller):
+        """Test that the saved images of a stopped measurement are in a 
+        contact sheet and the image that is not saved is dropped."""
+        def stop(controller):
+            if controller.measurement.step_index == 4:
+                controller.measurement.stop()
+
+        series = {"variable": "x-tilt", "start": 0, "end": 10, 
+                  "step-width": 10, "on-each-point": create_series()}
+        writer = pylo.PreviewWriter(controller, levels=1)
+        pylo.after_record.register("test_preview_stop", stop, priority=-20)
+        try:
+            measurement = run(controller, writer, series)
+        finally:
+            del pylo.after_record["test_preview_stop"]
+
+        assert not measurement.finished
+        assert writer.event_id not in pylo.after_stop
+        entries = pylo.read_preview_index(measurement.save_dir)
+        sheets = [e for e in entries if e["type"] == "contact-sheet"]
+
+        # the image of the step 4 is not saved because the measurement stops
+        assert len([e for e in entries if e["type"] == "frame"]) == 4
+        assert [s["group"] for s in sheets] == [{"x-tilt": 0}, {"x-tilt": 10}]
+        assert [len(s["images"]) for s in sheets] == [3, 1]
+
+    def test_enabled_by_configuration(self, controller):
+        """Test that the controller installs the previews."""
+        controller.configuration.setValue("previews", "enabled", True)
+        controller.initialize()
+
+        try:
+            assert isinstance(controller.preview_writer, pylo.PreviewWriter)
+            assert pylo.PreviewWriter.event_id in pylo.after_record
+        finally:
+            controller.preview_writer.uninstall()
+
+        assert pylo.PreviewWriter.event_id not in pylo.after_record
@@ -0,0 +1,80 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import concurrent.futures
+
+import pylo
+
+from pylo.events import after_record
+
+class CountingStage(pylo.ProcessingStage):
+    config_group = "counting-stage"
+    event_id = "counting_stage"
+    allow_negative = False
+
+    def __init__(self, controller):
+        super(CountingStage, self).__init__(controller)
+        self.workers = self._getValue("workers", None, int, 2)
+        self.calls = 0
+
+    def getEventHandlers(self):
+        return [(after_record, self.count, {"isolate_errors": True})]
+
+    def count(self, controller):
+        with self._lock:
+            self._futures.append(self._executor.submit(lambda: None))
+            self.calls += 1
+
+class TestProcessingStage:
+    def test_value_from_configuration(self, controller):
+        """Test that the values are taken from the configuration group and
+        invalid and negative values fall back to the default."""
+        controller.configuration.setValue("counting-stage", "workers", 3)
+        stage = CountingStage(controller)
+
+        assert stage.workers == 3
+        assert stage._getValue("workers", 5, int, 2) == 5
+        assert stage._getValue("workers", -1, int, 2) == 2
+        assert stage._getValue("workers", "x", int, 2) == 2
+        assert stage._getValue("missing", None, int, 2) == 2
+
+        stage.allow_negative = True
+        assert stage._getValue("workers", -1, int, 2) == -1
+
+    def test_install_and_uninstall(self, controller):
+        """Test that the handlers are registered with the event id and the
+        executor exists while the stage is installed only."""
+        stage = CountingStage(controller)
+
+        stage.install()
+        try:
+            assert stage.event_id in after_record
+            assert isinstance(stage._executor,
+                              concurrent.futures.ThreadPoolExecutor)
+
+            after_record(controller)
+            stage.wait()
+
+            assert stage.calls == 1
+            assert all(f.done() for f in stage._futures)
+        finally:
+            stage.uninstall()
+
+        assert stage.event_id not in after_record
+        assert stage._executor is None
+
+    def test_reset_forgets_futures(self, controller):
+        """Test that the submitted work is forgotten on reset."""
+        stage = CountingStage(controller)
+        stage._futures.append(concurrent.futures.Future())
+
+        stage.reset()
+
+        assert stage._futures == []
+        # does not block on the dropped future
+        stage.wait()
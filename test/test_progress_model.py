@@ -0,0 +1,119 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+import threading
+
+import pylo
+
+from pylotestlib import run_measurement
+
+class CountingView(pylo.AbstractView):
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+        self.threads = set()
+
+    def _updateRunning(self):
+        time.sleep(0.01)
+        self.updates.append(self.progress)
+        self.threads.add(threading.current_thread())
+
+class TestProgressModel:
+    def test_rate(self):
+        """Test that the first increment is skipped and the following ones
+        are smoothed."""
+        model = pylo.ProgressModel(smoothing=0.5)
+        model.reset(0, 10, now=100)
+
+        model.update(1, 10, now=110)
+        assert model.rate is None
+
+        model.update(2, 10, now=111)
+        assert model.rate == pytest.approx(1)
+
+        model.update(4, 10, now=112)
+        assert model.rate == pytest.approx(1.5)
+        assert model.getEta() == pytest.approx(6 / 1.5)
+
+    def test_restart(self):
+        """Test that the progress restarts if it decreases and that the rate
+        is kept if the maximum changes."""
+        model = pylo.ProgressModel()
+        model.reset(0, 10, now=0)
+        model.update(1, 10, now=1)
+        model.update(2, 10, now=2)
+        assert model.rate is not None
+
+        model.update(3, 15, now=3)
+        assert model.rate == pytest.approx(1)
+        assert model.progress_max == 15
+
+        model.update(0, 20, now=4)
+        assert model.rate is None
+        assert model.progress_max == 20
+        assert model.getElapsed(now=5) == pytest.approx(1)
+
+    def test_eta_from_timeline(self):
+        """Test that the step phases of the timeline are used until the rate
+        is known."""
+        model = pylo.ProgressModel()
+        model.reset(0, 10)
+        assert model.getEta() is None
+        assert "ETA --:--" in model.formatStatus()
+
+        model.timeline = pylo.Timeline()
+        model.timeline.addEntry("approach", 0, 2)
+        model.timeline.addEntry("record", 2, 1)
+        model.timeline.addEntry("record", 3, 3)
+        model.timeline.addEntry("event", 0, 100)
+
+        assert model.getPhaseAverages()["record"] == pytest.approx(2)
+        assert model.getEta() == pytest.approx(10 * 4)
+        assert "ETA 0:00:40" in model.formatStatus()
+
+class TestRunningUpdates:
+    def test_updates_are_coalesced(self):
+        """Test that many progress changes are combined into few updates in
+        the running update thread."""
+        view = CountingView()
+        view.progress_max = 10000
+        view.progress = 0
+        view.show_running = True
+
+        start = time.time()
+        for i in range(1, 10001):
+            view.progress = i
+        duration = time.time() - start
+
+        assert view.flushRunning(timeout=5)
+        assert view.updates[-1] == 10000
+        assert len(view.updates) < 20
+        assert threading.current_thread() not in view.threads
+        # the update thread does not slow down setting the progress
+        assert duration < 5
+
+    def test_no_updates_when_hidden(self):
+        """Test that the running indicator is not updated if it is hidden."""
+        view = CountingView()
+        view.progress = 5
+
+        assert view.flushRunning(timeout=5)
+        assert view.updates == []
+        assert view.progress_model.progress == 5
+
+    def test_measurement_timeline(self, controller):
+        """Test that the model of the view gets the timeline of the
+        measurement."""
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        model = controller.view.progress_model
+        assert model.timeline is measurement.timeline
+        assert model.progress == 3
+        assert model.getEta() == 0
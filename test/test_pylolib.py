@@ -180,3 +180,98 @@ class TestPylolib:
     def test_expand_vars_raise_error(self, text):
         with pytest.raises(KeyError):
             pylolib.expand_vars(text)
+    
+    def createController(self):
+        controller = pylo.Controller(pylo.AbstractView(), 
+                                     pylo.AbstractConfiguration())
+        controller.microscope = pylo.loader.getDevice("Dummy Microscope", 
+                                                      controller)
+        controller.camera = pylo.loader.getDevice("Dummy Camera", controller)
+        return controller
+    
+    @pytest.mark.parametrize("text,fields", [
+        ("{varname[focus]}: {humanstep[focus]}", 
+         {"varname": {"focus"}, "humanstep": {"focus"}}),
+        ("{humanstep}", {"humanstep": None}),
+        ("{humanstep[focus]}{humanstep}", {"humanstep": None}),
+        ("{step[focus]:{counter}}", {"step": {"focus"}, "counter": None}),
+        ("{series[0][start]}{time:%Y}", {"series": {"0"}, "time": None}),
+        ("{tags[a].real}", {"tags": None}),
+        ("no fields", {}),
+        ("A{broken", None),
+    ])
+    def test_template_fields(self, text, fields):
+        assert pylolib.ExpandVarsTemplate(text).fields == fields
+    
+    @pytest.mark.parametrize("text", [
+        "{counter}-{humanstep[focus]}{?-{varunit[focus]}?}-{camera}.tif",
+        "{varname[ol-current]}: {humanstep[ol-current]} {varunit[ol-current]}",
+        "{humanstep}|{varname}|{varunit}",
+        "{humanstart[focus]}{humanseries[0][variable]}{series[0][end]}",
+        "{_{humanstep[notexisting]}_}{?{tags[key]}?}{tags[value]}",
+        "{step[focus]} {step[ol-current]:.2f} {humanstep[focus]!r:>12}",
+    ])
+    def test_template_equals_expand_vars(self, text):
+        """Test that rendering a compiled template gives the same as 
+        `expand_vars()` for multiple steps."""
+        controller = self.createController()
+        start = {"focus": 0, "ol-current": 0, "pressure": 100}
+        series = {"variable": "focus", "start": 0, "end": 100, 
+                  "step-width": 25, "on-each-point": {
+                      "variable": "ol-current", "start": 0, "end": 20,
+                      "step-width": 5}}
+        tags = {"value": 1, "key": "value"}
+
+        template = pylolib.ExpandVarsTemplate(text, controller=controller,
+                                              start=start, series=series,
+                                              camera="main")
+        
+        for counter, step in enumerate(pylo.MeasurementSteps(controller, 
+                                                             start, series)):
+            expected = pylolib.expand_vars(text, controller=controller, 
+                                           step=step, start=start, 
+                                           series=series, tags=tags,
+                                           counter=counter, camera="main")
+            assert template.render(step=step, tags=tags, 
+                                   counter=counter) == expected
+    
+    def test_template_creates_referenced_values_only(self):
+        """Test that only the referenced human values are created."""
+        controller = self.createController()
+        template = pylolib.ExpandVarsTemplate("{humanstep[focus]}", 
+                                              controller=controller)
+        
+        assert (template._createHumanValues("humanstep", 
+                                            {"focus": 1, "ol-current": 2}).keys() 
+                == {"focus"})
+        assert template._createHumanValues("humanstart", {"focus": 1}) == {}
+    
+    @pytest.mark.slow
+    def test_template_equals_expand_vars(self):
+        """Test that the compiled template formats the names of a measurement
+        like `expand_vars()`."""
+        controller = self.createController()
+        name_format = ("{counter}-{humanstep[focus]}{?-{varunit[focus]}?}-" + 
+                       "{humanstep[ol-current]}-{camera}.tif")
+        start = {"focus": 0, "ol-current": 0, "pressure": 100}
+        series = {"variable": "focus", "start": 0, "end": 100, 
+                  "step-width": 1, "on-each-point": {
+                      "variable": "ol-current", "start": 0, "end": 20,
+                      "step-width": 5}}
+        steps = [dict(s) for s in pylo.MeasurementSteps(controller, 
+                                                         dict(start), series)]
+
+        expected = [pylolib.expand_vars(name_format, controller=controller,
+                                        step=step, start=start, 
+                                        series=series, counter=i, 
+                                        camera="main")
+                    for i, step in enumerate(steps)]
+
+        template = pylolib.ExpandVarsTemplate(name_format, 
+                                              controller=controller, 
+                                              start=start, series=series, 
+                                              camera="main")
+        names = [template.render(step=step, counter=i)
+                 for i, step in enumerate(steps)]
+        
+        assert names == expected
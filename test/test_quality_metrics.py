@@ -0,0 +1,175 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import csv
+import pytest
+import numpy as np
+
+import pylo
+
+from pylo.quality_metrics import compute_metrics
+from pylo.quality_metrics import QUALITY_TAGS_KEY
+
+from pylotestlib import DummyCamera
+from pylotestlib import run_measurement
+
+def create_noise(shape=(64, 64)):
+    return np.random.RandomState(0).randint(50, 200, shape)
+
+class BlankingCamera(DummyCamera):
+    """A camera whose beam is blanked for the `blanked` record calls."""
+
+    def __init__(self, controller, blanked=()):
+        super().__init__(controller)
+        self.blanked = blanked
+        self.images = []
+
+    def recordImage(self, *args, **kwargs):
+        if len(self.images) in self.blanked:
+            data = np.zeros((64, 64))
+        else:
+            data = create_noise()
+
+        image = pylo.Image(data, {})
+        self.images.append(image)
+        return image
+
+def run(controller, monitor, blanked=()):
+    camera = BlankingCamera(controller, blanked)
+    controller.camera = camera
+
+    monitor.install()
+    try:
+        measurement = run_measurement(controller)
+    finally:
+        monitor.uninstall()
+
+    return camera, measurement
+
+class TestMetrics:
+    def test_sharp_and_blurred(self):
+        """Test that blurred images are less sharp and more defocused."""
+        noise = create_noise((128, 128)).astype(float)
+        blurred = noise.copy()
+        for axis in (0, 1):
+            for i in range(4):
+                blurred = (blurred + np.roll(blurred, 1, axis=axis)) / 2
+
+        sharp = compute_metrics(noise)
+        blur = compute_metrics(blurred)
+
+        assert sharp["mean"] == pytest.approx(noise.mean())
+        assert sharp["sharpness"] > 10 * blur["sharpness"]
+        assert sharp["defocus"] < 0.1
+        assert blur["defocus"] > 0.5
+        assert sharp["astigmatism"] < 0.1
+
+    def test_astigmatism(self):
+        """Test that a spectrum in one direction only is anisotropic."""
+        stripes = np.tile(create_noise((1, 128)), (128, 1))
+
+        assert compute_metrics(stripes)["astigmatism"] > 0.9
+
+    def test_saturation(self):
+        """Test that the saturation is calculated of the full image."""
+        data = np.full((512, 512), 100)
+        data[0, :64] = 255
+
+        metrics = compute_metrics(data, size=16)
+
+        assert metrics["saturation"] == pytest.approx(64 / 512 ** 2)
+
+    def test_flat(self):
+        """Test that images without structure are defocused."""
+        metrics = compute_metrics(np.zeros((32, 32)))
+
+        assert metrics["mean"] == 0
+        assert metrics["defocus"] == 1
+
+class TestQualityMonitor:
+    def test_tags_log_and_timeline(self, controller):
+        """Test that the metrics are added to the tags, the log and the
+        timeline without re-acquiring in the warn mode."""
+        monitor = pylo.QualityMonitor(controller, workers=2, action="warn",
+                                      limits={"min-mean": 10})
+        camera, measurement = run(controller, monitor, blanked=(1, ))
+
+        assert measurement.finished
+        assert len(camera.images) == 3
+        assert [i.tags[QUALITY_TAGS_KEY]["passed"] for i in camera.images] == [
+            True, False, True]
+        assert "mean" in camera.images[1].tags[QUALITY_TAGS_KEY]["violations"][0]
+        assert len(monitor.results) == 3
+
+        entries = [e for e in measurement.timeline.entries
+                   if e.phase == "quality"]
+        assert sorted(e.step for e in entries) == [0, 1, 2]
+        assert all("sharpness" in e.details for e in entries)
+
+        log_path = os.path.join(measurement.save_dir, "measurement.log")
+        with open(log_path) as f:
+            actions = [row[0] for row in csv.reader(f)]
+
+        assert len([a for a in actions if a.startswith("Quality")]) == 3
+
+    def test_reacquire(self, controller):
+        """Test that a blanked image is recorded again."""
+        monitor = pylo.QualityMonitor(controller, workers=1,
+                                      action="reacquire",
+                                      limits={"min-mean": 10})
+        camera, measurement = run(controller, monitor, blanked=(1, ))
+
+        assert measurement.finished
+        assert len(camera.images) == 4
+
+        saved = [camera.images[i] for i in (0, 2, 3)]
+        assert all(i.tags[QUALITY_TAGS_KEY]["passed"] for i in saved)
+        assert len([e for e in measurement.timeline.entries
+                    if e.phase == "record" and e.name == "reacquire"]) == 1
+
+    def test_max_reacquire(self, controller):
+        """Test that bad images are kept after the maximum re-acquisitions."""
+        controller.configuration.setValue("quality-metrics", "max-reacquire", 1)
+        monitor = pylo.QualityMonitor(controller, workers=1,
+                                      action="reacquire",
+                                      limits={"min-mean": 10})
+        camera, measurement = run(controller, monitor, blanked=range(100))
+
+        assert measurement.finished
+        assert len(camera.images) == 6
+
+    def test_pause(self, controller, monkeypatch):
+        """Test that the operator can stop the measurement."""
+        decisions = []
+        def decide(text, options):
+            decisions.append(text)
+            return 2
+
+        monkeypatch.setattr(controller.view, "askForDecision", decide,
+                            raising=False)
+        monitor = pylo.QualityMonitor(controller, workers=1, action="pause",
+                                      limits={"min-mean": 10})
+        camera, measurement = run(controller, monitor, blanked=(1, ))
+
+        assert len(decisions) == 1
+        assert "step 1" in decisions[0]
+        assert len(camera.images) == 2
+        assert not measurement.finished
+
+    def test_enabled_by_configuration(self, controller):
+        """Test that the controller installs the quality metrics."""
+        controller.configuration.setValue("quality-metrics", "enabled", True)
+        controller.initialize()
+
+        try:
+            assert isinstance(controller.quality_monitor, pylo.QualityMonitor)
+            assert controller.quality_monitor.workers == 2
+            assert pylo.QualityMonitor.event_id in pylo.after_record
+        finally:
+            controller.quality_monitor.uninstall()
+
+        assert pylo.QualityMonitor.event_id not in pylo.after_record
@@ -0,0 +1,148 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import pylo
+
+from pylotestlib import run_measurement
+
+@pytest.fixture()
+def measurement_steps(controller):
+    return pylo.MeasurementSteps(controller, {"focus": 0, "x-tilt": 0},
+        {"variable": "focus", "start": 0, "end": 2, "step-width": 0.5,
+         "on-each-point": {"variable": "x-tilt", "start": -10, "end": 10,
+                           "step-width": 5}})
+
+def shift_tilt(controller, table):
+    return {"x-tilt": table.columns["x-tilt"] + 1,
+            "tilt-is-positive": table.columns["x-tilt"] + 1 > 0}
+
+class TestStepTable:
+    def test_create_table(self, measurement_steps):
+        """Test that the table contains the same steps as the sequence."""
+        table = measurement_steps.createTable()
+
+        assert len(table) == len(measurement_steps) == 25
+        for i in range(len(measurement_steps)):
+            assert table.getStep(i) == measurement_steps[i]
+
+    def test_update(self):
+        """Test that unknown columns are added as derived columns."""
+        table = pylo.StepTable({"a": [1, 2, 3]})
+        table.update({"a": [4, 5, 6], "b": [True, False, True]})
+
+        assert list(table.columns.keys()) == ["a"]
+        assert table.getStep(1) == {"a": 5}
+        assert table.getDerived(2) == {"b": True}
+        assert type(table.getStep(1)["a"]) == int
+
+    def test_wrong_length_raises_error(self):
+        """Test that columns with a different length are not accepted."""
+        table = pylo.StepTable({"a": [1, 2, 3]})
+
+        with pytest.raises(ValueError):
+            table.update({"a": [1, 2]})
+
+class TestStepTransformers:
+    def test_apply(self, measurement_steps):
+        """Test that the transformed steps are returned by the index access
+        and the iteration."""
+        expected = [s.copy() for s in measurement_steps]
+        for s in expected:
+            s["x-tilt"] += 1
+
+        transformers = pylo.StepTransformers()
+        transformers["shift"] = shift_tilt
+        measurement_steps.applyTransformers(transformers)
+
+        assert list(measurement_steps) == expected
+        assert measurement_steps[3] == expected[3]
+        assert (measurement_steps.getDerived(3) ==
+                {"tilt-is-positive": expected[3]["x-tilt"] > 0})
+
+    def test_priority(self, measurement_steps):
+        """Test that the transformers with the higher priority are applied
+        first and get the changes of the previous ones."""
+        order = []
+        def double(controller, table):
+            order.append("double")
+            return {"x-tilt": table.columns["x-tilt"] * 2}
+        def shift(controller, table):
+            order.append("shift")
+            return shift_tilt(controller, table)
+
+        tilt = measurement_steps[0]["x-tilt"]
+        transformers = pylo.StepTransformers()
+        transformers.register("double", double)
+        transformers.register("shift", shift, priority=1)
+        measurement_steps.applyTransformers(transformers)
+
+        assert order == ["shift", "double"]
+        assert measurement_steps[0]["x-tilt"] == (tilt + 1) * 2
+
+    def test_transformers_per_instance(self, controller, measurement_steps):
+        """Test that each steps object has its own copy of the registered
+        transformers."""
+        pylo.step_transformers.register("shift", shift_tilt, priority=2)
+        try:
+            steps = pylo.MeasurementSteps(controller, {"x-tilt": 0}, 
+                                          {"variable": "focus", "start": 0,
+                                           "end": 2, "step-width": 1})
+        finally:
+            del pylo.step_transformers["shift"]
+        
+        steps.transformers["double"] = lambda c, t: None
+
+        assert steps.transformers.getPriority("shift") == 2
+        assert "shift" not in pylo.step_transformers
+        assert "shift" not in measurement_steps.transformers
+        assert "double" not in pylo.step_transformers
+
+    @pytest.mark.parametrize("value", [float("inf"), float("nan"), 11])
+    def test_invalid_values(self, measurement_steps, value):
+        """Test that transformed values that cannot be set raise an error."""
+        def invalid(controller, table):
+            focus = table.columns["focus"].astype(float)
+            focus[3] = value
+            return {"focus": focus}
+        
+        transformers = pylo.StepTransformers()
+        transformers["invalid"] = invalid
+
+        with pytest.raises(ValueError):
+            measurement_steps.applyTransformers(transformers)
+        
+        assert measurement_steps.table is None
+
+    def test_no_transformers(self, measurement_steps):
+        """Test that the steps are not changed without transformers."""
+        measurement_steps.applyTransformers(pylo.StepTransformers())
+
+        assert measurement_steps.table is None
+        assert measurement_steps.getDerived(0) == {}
+
+    def test_measurement_uses_transformed_steps(self, controller):
+        """Test that the measurement applies the registered transformers
+        before it starts."""
+        calls = []
+        def double(controller, table):
+            calls.append(len(table))
+            return {"focus": table.columns["focus"] * 2}
+
+        pylo.step_transformers["double"] = double
+        try:
+            measurement = run_measurement(controller)
+        finally:
+            del pylo.step_transformers["double"]
+
+        assert measurement.finished
+        assert calls == [3]
+        assert list(measurement.steps) == [
+            {"focus": 0, "x-tilt": 0}, {"focus": 2, "x-tilt": 0},
+            {"focus": 4, "x-tilt": 0}]
+        assert controller.microscope.values["focus"] == 4
@@ -0,0 +1,132 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+import numpy as np
+
+import pylo
+
+from pylo.sweep import SweepSteps
+from pylo.sweep import ReadbackPoller
+from pylo.sweep import SWEEP_TAGS_KEY
+
+from pylotestlib import DummyCamera
+from pylotestlib import run_measurement
+
+class FrameCamera(DummyCamera):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.images = []
+
+    def recordImage(self, *args, **kwargs):
+        time.sleep(0.005)
+        image = super().recordImage(*args, **kwargs)
+        self.images.append(image)
+        return image
+
+class TestSweepSteps:
+    def test_outer_steps(self, controller):
+        """Test that only the steps where the inner series starts are
+        contained."""
+        steps = pylo.MeasurementSteps(controller, {"focus": 0, "x-tilt": 0},
+            {"variable": "x-tilt", "start": 0, "end": 10, "step-width": 5,
+             "on-each-point": {"variable": "focus", "start": 1, "end": 3,
+                               "step-width": 1}})
+        sweep_steps = SweepSteps(steps)
+
+        assert len(steps) == 9
+        assert len(sweep_steps) == 3
+        assert list(sweep_steps) == [{"focus": 1, "x-tilt": 0},
+                                     {"focus": 1, "x-tilt": 5},
+                                     {"focus": 1, "x-tilt": 10}]
+        assert sweep_steps.sweep_series["variable"] == "focus"
+
+    def test_single_series(self, controller):
+        """Test that a single series is one sweep."""
+        steps = pylo.MeasurementSteps(controller, {"focus": 0, "x-tilt": 0},
+            {"variable": "focus", "start": 0, "end": 2, "step-width": 1})
+
+        assert list(SweepSteps(steps)) == [{"focus": 0, "x-tilt": 0}]
+
+class TestReadbackPoller:
+    def test_interpolate(self, controller):
+        """Test that the values between the readbacks are interpolated."""
+        poller = ReadbackPoller(controller.microscope, "focus")
+        poller.times = [10, 11, 12]
+        poller.values = [0, 1, 3]
+
+        assert poller.interpolate(10.5) == pytest.approx(0.5)
+        assert poller.interpolate(11.5) == pytest.approx(2)
+        assert poller.interpolate(5) == 0
+        assert poller.interpolate(20) == 3
+
+    def test_polling(self, controller):
+        """Test that the values are read repeatedly."""
+        poller = ReadbackPoller(controller.microscope, "focus", 0.001)
+        poller.start()
+        time.sleep(0.02)
+        controller.microscope.values["focus"] = 5
+        poller.stop()
+
+        assert len(poller.times) > 3
+        assert poller.values[-1] == 5
+        assert poller.waitFor(time.time() + 10)
+
+class TestSweep:
+    def test_sweep(self, controller):
+        """Test that the frames are recorded while sweeping and saved with
+        increasing interpolated values."""
+        controller.camera = FrameCamera(controller)
+        controller.configuration.setValue("measurement", "sweep", True)
+        controller.configuration.setValue("measurement", "sweep-rate", 20)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        assert controller.microscope.values["focus"] == 2
+
+        sweeps = [e for e in measurement.timeline.entries
+                  if e.phase == "sweep"]
+        assert len(sweeps) == 1
+        frames = sweeps[0].details["frames"]
+        # 2 units with 20 units per second take 0.1 seconds
+        assert sweeps[0].duration >= 0.1
+        assert frames > 5
+        assert len(controller.camera.images) == frames
+        assert len([f for f in os.listdir(measurement.save_dir)
+                    if f.endswith(".tif")]) == frames
+
+        readbacks = [i.tags[SWEEP_TAGS_KEY]["Readback"]
+                     for i in controller.camera.images]
+        # the first frame is recorded before the ramp starts but the next 
+        # readback may be taken while ramping already
+        assert readbacks[0] == pytest.approx(0, abs=0.2)
+        assert readbacks[-1] == pytest.approx(2, abs=0.1)
+        assert all(a <= b for a, b in zip(readbacks, readbacks[1:]))
+        assert len(set(readbacks)) > 2
+        assert ([i.tags[SWEEP_TAGS_KEY]["Frame"]
+                 for i in controller.camera.images] == list(range(frames)))
+        assert (controller.camera.images[1].tags["Measurement Values"]
+                ["Machine values"]["focus"] == readbacks[1])
+
+    def test_rate_from_frame_time(self, controller):
+        """Test that the rate is the step width per frame if no rate is
+        given."""
+        controller.camera = FrameCamera(controller)
+        controller.configuration.setValue("measurement", "sweep", True)
+        controller.configuration.setValue("measurement", "sweep-rate", 0)
+
+        measurement = run_measurement(controller)
+
+        assert measurement.finished
+        sweep = [e for e in measurement.timeline.entries
+                 if e.phase == "sweep"][0]
+        # the frames take a bit more than 5ms, one step width per frame
+        assert sweep.details["rate"] <= 1 / 0.005
+        # start, about one frame per step width and the end
+        assert 3 <= sweep.details["frames"] <= 8
@@ -0,0 +1,162 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import numpy as np
+
+import pylo
+
+from pylo.tie_reconstruction import solve_tie
+from pylo.tie_reconstruction import induction_maps
+from pylo.tie_reconstruction import electron_wavelength
+
+from pylotestlib import create_series
+from pylotestlib import run_measurement
+
+PIXEL_SIZE = 1e-9
+DEFOCUS_PER_UNIT = 1e-7
+
+def create_phase(shape=(64, 64)):
+    """Create a smooth periodic phase."""
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    return (np.sin(2 * np.pi * 3 * x / shape[1]) + 
+            0.5 * np.cos(2 * np.pi * 2 * y / shape[0]))
+
+def defocused_image(phase, defocus, wavelength, intensity=100):
+    """Get the image of the `phase` at the `defocus` with the linearized 
+    transport of intensity equation."""
+    h, w = phase.shape
+    qy = np.fft.fftfreq(h, PIXEL_SIZE)[:, np.newaxis]
+    qx = np.fft.fftfreq(w, PIXEL_SIZE)[np.newaxis, :]
+    laplacian = np.fft.ifft2(-4 * np.pi ** 2 * (qx ** 2 + qy ** 2) * 
+                             np.fft.fft2(phase)).real
+    k = 2 * np.pi / wavelength
+    return intensity * (1 - defocus / k * laplacian)
+
+class PhaseCamera(pylo.CameraInterface):
+    """A camera that records the defocused images of a phase object, the 
+    focus of the microscope is the defocus."""
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.phase = create_phase()
+        self.wavelength = electron_wavelength(300e3)
+
+    def resetToSafeState(self):
+        pass
+
+    def recordImage(self, additional_tags=None, **kwargs):
+        defocus = (self.controller.microscope.values["focus"] - 1) * DEFOCUS_PER_UNIT
+        return pylo.Image(defocused_image(self.phase, defocus, self.wavelength), 
+                          dict(additional_tags))
+
+class TestSolveTIE:
+    @pytest.mark.parametrize("defoci", [(-1e-6, 0, 1e-6), 
+                                        (-2e-6, -1e-6, 0, 1e-6, 2e-6)])
+    def test_phase(self, defoci):
+        """Test that the phase is reconstructed from triplets and larger 
+        stacks."""
+        phase = create_phase()
+        wavelength = electron_wavelength(300e3)
+        stack = [defocused_image(phase, d, wavelength) for d in defoci]
+
+        result = solve_tie(stack, defoci, wavelength, PIXEL_SIZE, 1e-6)
+        assert np.corrcoef(result.ravel(), phase.ravel())[0, 1] > 0.99
+        assert np.abs(result - (phase - phase.mean())).max() < 0.05
+
+    def test_invalid_stack(self):
+        """Test that stacks without different defoci are rejected."""
+        with pytest.raises(ValueError):
+            solve_tie([np.ones((4, 4))], [0], 1e-12, PIXEL_SIZE)
+        with pytest.raises(ValueError):
+            solve_tie([np.ones((4, 4))] * 2, [1, 1], 1e-12, PIXEL_SIZE)
+    
+    def test_induction(self):
+        """Test that a linear phase gives a constant induction."""
+        y, x = np.mgrid[:16, :16]
+        bx, by = induction_maps(2.0 * x, PIXEL_SIZE)
+
+        assert np.allclose(bx, 0)
+        assert np.allclose(by, -pylo.tie_reconstruction.REDUCED_PLANCK_CONSTANT / 
+                           pylo.tie_reconstruction.ELEMENTARY_CHARGE * 
+                           2.0 / PIXEL_SIZE)
+
+class TestTIEReconstructor:
+    def test_reconstruct_during_series(self, controller):
+        """Test that each complete focus stack of a field series is 
+        reconstructed and saved next to the images."""
+        controller.camera = PhaseCamera(controller)
+        controller.configuration.setValue("measurement", "save-file-format", 
+                                          "{counter}-{step[x-tilt]}.tif")
+        reconstructor = pylo.TIEReconstructor(controller, "focus", 
+                                              DEFOCUS_PER_UNIT, 300e3, 
+                                              PIXEL_SIZE, 1e-6, 2)
+        reconstructor.install()
+
+        series = {"variable": "x-tilt", "start": 0, "end": 10, 
+                  "step-width": 10, "on-each-point": create_series()}
+        
+        try:
+            measurement = run_measurement(controller, series, 
+                                          {"x-tilt": 0, "focus": 0})
+            reconstructor.wait()
+        finally:
+            reconstructor.uninstall()
+
+        assert measurement.finished
+        assert len(reconstructor.results) == 2
+        assert (sorted(r["group"]["x-tilt"] for r in reconstructor.results) == 
+                [0, 10])
+        
+        files = sorted(os.listdir(measurement.save_dir))
+        for name in ("1-0", "4-10"):
+            for suffix in ("phase", "induction-x", "induction-y"):
+                assert "{}-{}.npy".format(name, suffix) in files
+        
+        phase = np.load(os.path.join(measurement.save_dir, "1-0-phase.npy"))
+        expected = create_phase()
+        assert np.corrcoef(phase.ravel(), expected.ravel())[0, 1] > 0.95
+
+    def test_noisy_readback(self, controller, monkeypatch):
+        """Test that the stacks are grouped by the target values if the read
+        values are noisy."""
+        controller.camera = PhaseCamera(controller)
+        noise = iter(np.random.RandomState(0).uniform(-0.01, 0.01, 100))
+        get_value = controller.microscope.getMeasurementVariableValue
+        monkeypatch.setattr(controller.microscope, 
+                            "getMeasurementVariableValue", 
+                            lambda id_: get_value(id_) + next(noise))
+        reconstructor = pylo.TIEReconstructor(controller, "focus", 
+                                              DEFOCUS_PER_UNIT, 300e3, 
+                                              PIXEL_SIZE, 1e-6, 2)
+        reconstructor.install()
+
+        series = {"variable": "x-tilt", "start": 0, "end": 10, 
+                  "step-width": 10, "on-each-point": create_series()}
+        
+        try:
+            measurement = run_measurement(controller, series, 
+                                          {"x-tilt": 0, "focus": 0})
+            reconstructor.wait()
+        finally:
+            reconstructor.uninstall()
+
+        assert measurement.finished
+        assert (sorted(r["group"]["x-tilt"] for r in reconstructor.results) == 
+                [0, 10])
+
+    def test_no_focus_series(self, controller):
+        """Test that nothing is reconstructed without a focus series."""
+        reconstructor = pylo.TIEReconstructor(controller, "x-tilt")
+        reconstructor.install()
+
+        try:
+            run_measurement(controller)
+            reconstructor.wait()
+        finally:
+            reconstructor.uninstall()
+        
+        assert reconstructor.results == []
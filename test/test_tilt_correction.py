@@ -0,0 +1,108 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import math
+import pytest
+import importlib.util
+
+import pylo
+
+from pylotestlib import DummyMicroscope
+
+plugin_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                           "pylo-plugins", "tilt_correction.py")
+
+class StageMicroscope(DummyMicroscope):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.supported_measurement_variables.append(
+            pylo.MeasurementVariable("stage-x", "Stage x", -1000, 1000, "um"))
+        self.values["stage-x"] = 0
+        self.set_values = []
+
+    def setMeasurementVariableValue(self, id_, value):
+        self.set_values.append((id_, value))
+        super().setMeasurementVariableValue(id_, value)
+
+@pytest.fixture()
+def plugin():
+    spec = importlib.util.spec_from_file_location("tilt_correction", 
+                                                  plugin_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    yield module
+
+    for event, key in ((pylo.init_ready, module.tilt_corrector_create_event_id),
+                       (pylo.before_record, module.tilt_corrector_correct_tilt_event_id),
+                       (pylo.step_transformers, module.tilt_corrector_transform_id)):
+        if key in event:
+            del event[key]
+
+@pytest.fixture()
+def corrector(controller, plugin):
+    controller.microscope = StageMicroscope(controller)
+    plugin.create_tilt_corrector(controller)
+
+    configuration = controller.configuration
+    configuration.setValue("tilt-correction-x", "correction-type", "Automatic")
+    configuration.setValue("tilt-correction-x", "tilt-id", "x-tilt")
+    configuration.setValue("tilt-correction-x", "stage-x-variable-id", "stage-x")
+    configuration.setValue("tilt-correction-x", "stage-x", 100)
+    configuration.setValue("tilt-correction-y", "correction-type", "Off")
+
+    return plugin.tilt_corrector
+
+def incremental_targets(start, l, tilts):
+    """The stage values the old read-modify-write correction created."""
+    stage = start
+    last = tilts[0]
+    targets = []
+    for tilt in tilts:
+        stage += l * (math.cos(math.radians(last)) - math.cos(math.radians(tilt)))
+        last = tilt
+        targets.append(stage)
+    return targets
+
+class TestTiltCorrection:
+    def test_stage_targets(self, controller, corrector):
+        """Test that the precomputed targets are the values the old step by
+        step correction created."""
+        steps = pylo.MeasurementSteps(controller, 
+            {"focus": 0, "x-tilt": 0, "stage-x": 5},
+            {"variable": "x-tilt", "start": 0, "end": 30, "step-width": 10,
+             "on-each-point": {"variable": "focus", "start": 0, "end": 1,
+                               "step-width": 1}})
+        steps.applyTransformers()
+        tilts = [s["x-tilt"] for s in steps]
+
+        assert ([s["stage-x"] for s in steps] == 
+                pytest.approx(incremental_targets(5, 100, tilts)))
+        assert ([steps.getDerived(i)["tilt-correction-x-changed"] 
+                 for i in range(len(steps))] == 
+                [False, False, True, False, True, False, True, False])
+
+    def test_stage_is_set_with_tilt(self, controller, corrector):
+        """Test that the stage is moved while approaching the step and not
+        after recording."""
+        steps = pylo.MeasurementSteps(controller, 
+            {"focus": 0, "x-tilt": 0, "stage-x": 0},
+            {"variable": "x-tilt", "start": 0, "end": 20, "step-width": 10})
+        measurement = pylo.Measurement(controller, steps)
+        controller.measurement = measurement
+        measurement.start()
+        measurement.waitForAllImageSavings()
+
+        set_values = controller.microscope.set_values
+        # the stage is set right after the tilt of the same step
+        for tilt in (10, 20):
+            i = set_values.index(("x-tilt", tilt))
+            id_, value = set_values[i + 1]
+            assert id_ == "stage-x"
+            assert value == pytest.approx(100 * (1 - math.cos(math.radians(tilt))))
+        
+        assert len([v for v in set_values if v[0] == "stage-x"]) == 3
@@ -0,0 +1,67 @@
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import csv
+import time
+import pytest
+import pylo
+
+class TestTimeline:
+    def test_measure_adds_entry(self):
+        """Test if the measure context adds an entry with the duration."""
+        timeline = pylo.Timeline()
+
+        with timeline.measure("record", name="camera", step=3) as details:
+            time.sleep(0.05)
+            details["frames"] = 1
+        
+        entry, = timeline.entries
+        assert entry.phase == "record"
+        assert entry.name == "camera"
+        assert entry.step == 3
+        assert entry.duration >= 0.04
+        assert entry.details == {"frames": 1}
+    
+    def test_measure_adds_entry_on_error(self):
+        """Test if the entry is added if the measured block raises an 
+        error."""
+        timeline = pylo.Timeline()
+
+        with pytest.raises(ValueError):
+            with timeline.measure("approach"):
+                raise ValueError("Test error")
+        
+        assert len(timeline) == 1
+    
+    def test_average_durations(self):
+        """Test if the average durations are calculated per phase."""
+        timeline = pylo.Timeline()
+        timeline.addEntry("approach", 0, 1)
+        timeline.addEntry("approach", 1, 3)
+        timeline.addEntry("record", 4, 0.5)
+
+        assert timeline.getPhaseDurations() == {"approach": [1, 3], 
+                                                "record": [0.5]}
+        assert timeline.getAverageDurations() == {"approach": 2, 
+                                                  "record": 0.5}
+    
+    def test_save(self, tmp_path):
+        """Test if the timeline is saved as a csv file."""
+        timeline = pylo.Timeline()
+        timeline.addEntry("approach", 10, 1, step=0)
+        timeline.addEntry("event", 11, 0.25, name="before_record:x", 
+                          blocking=False)
+
+        path = tmp_path / "timeline.csv"
+        timeline.saveTo(str(path))
+
+        with open(str(path), "r", newline="") as f:
+            rows = list(csv.reader(f))
+        
+        assert rows[0] == list(pylo.Timeline.columns)
+        assert rows[1][:3] == ["0", "approach", ""]
+        assert rows[2][:3] == ["", "event", "before_record:x"]
+        assert rows[2][5] == "blocking=False"
@@ -0,0 +1,140 @@
+import os
+
+if __name__ == "__main__":
+    # For direct call only
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import pytest
+
+import pylo
+
+from pylotestlib import run_measurement
+
+class CachingMicroscope(pylo.MicroscopeInterface):
+    def __init__(self, controller):
+        super().__init__(controller)
+        self.values = {"focus": 0, "ol-current": 0, "x-tilt": 0}
+        self.reads = {"focus": 0, "ol-current": 0, "x-tilt": 0}
+
+        for id_ in self.values:
+            self.registerMeasurementVariable(
+                pylo.MeasurementVariable(id_, id_, -35, 35),
+                lambda i=id_: self._get(i),
+                lambda v, i=id_: self.values.__setitem__(i, v))
+
+        self.measurement_variable_lock_domains = {"focus": "lens",
+                                                  "ol-current": "lens",
+                                                  "x-tilt": "stage"}
+        self.measurement_variable_cache_ttl = {"focus": 10, "ol-current": 10,
+                                               "x-tilt": 10}
+
+    def _get(self, id_):
+        self.reads[id_] += 1
+        return self.values[id_]
+
+    def setInLorentzMode(self, lorentz_mode):
+        pass
+
+    def getInLorentzMode(self):
+        return True
+
+    def resetToSafeState(self):
+        pass
+
+class TestValueCache:
+    def test_reads_are_cached(self):
+        """Test that repeated reads use the cached value."""
+        microscope = CachingMicroscope(None)
+
+        assert [microscope.getMeasurementVariableValue("focus")
+                for i in range(3)] == [0, 0, 0]
+        assert microscope.reads["focus"] == 1
+        assert microscope.getValueCacheStatistics()["focus"] == {
+            "hits": 2, "misses": 1, "forced": 0, "invalidations": 0}
+
+    def test_uncached_variable(self):
+        """Test that variables without a ttl are read every time."""
+        microscope = CachingMicroscope(None)
+        del microscope.measurement_variable_cache_ttl["focus"]
+
+        for i in range(3):
+            microscope.getMeasurementVariableValue("focus")
+
+        assert microscope.reads["focus"] == 3
+        assert "focus" not in microscope.getValueCacheStatistics()
+
+    def test_ttl_expires(self):
+        """Test that the value is read again after the ttl."""
+        microscope = CachingMicroscope(None)
+        microscope.measurement_variable_cache_ttl["focus"] = 0.05
+
+        microscope.getMeasurementVariableValue("focus")
+        microscope.values["focus"] = 3
+        assert microscope.getMeasurementVariableValue("focus") == 0
+
+        time.sleep(0.06)
+        assert microscope.getMeasurementVariableValue("focus") == 3
+        assert microscope.reads["focus"] == 2
+
+    def test_forced_read(self):
+        """Test that a forced read ignores the cache and updates it."""
+        microscope = CachingMicroscope(None)
+
+        microscope.getMeasurementVariableValue("focus")
+        microscope.values["focus"] = 3
+
+        assert microscope.getMeasurementVariableValue("focus", force=True) == 3
+        assert microscope.getMeasurementVariableValue("focus") == 3
+        assert microscope.reads["focus"] == 2
+        assert microscope.getValueCacheStatistics()["focus"]["forced"] == 1
+
+    def test_write_invalidates_domain(self):
+        """Test that writing invalidates the variables of the same domain
+        only."""
+        microscope = CachingMicroscope(None)
+        for id_ in microscope.values:
+            microscope.getMeasurementVariableValue(id_)
+
+        microscope.setMeasurementVariableValue("ol-current", 5)
+        for id_ in microscope.values:
+            microscope.getMeasurementVariableValue(id_)
+
+        assert microscope.reads == {"focus": 2, "ol-current": 2, "x-tilt": 1}
+        assert microscope.getMeasurementVariableValue("ol-current") == 5
+
+    def test_invalidate(self):
+        """Test the explicit invalidation."""
+        microscope = CachingMicroscope(None)
+        for id_ in microscope.values:
+            microscope.getMeasurementVariableValue(id_)
+
+        microscope.invalidate("x-tilt")
+        microscope.getMeasurementVariableValue("x-tilt")
+        microscope.getMeasurementVariableValue("focus")
+        assert microscope.reads == {"focus": 1, "ol-current": 1, "x-tilt": 2}
+
+        microscope.invalidate()
+        for id_ in microscope.values:
+            microscope.getMeasurementVariableValue(id_)
+        assert microscope.reads == {"focus": 2, "ol-current": 2, "x-tilt": 3}
+        assert microscope.getValueCacheStatistics()["x-tilt"]["invalidations"] == 2
+
+    def test_statistics_in_timeline(self, controller):
+        """Test that the measurement reports the statistics in the
+        timeline."""
+        controller.microscope = CachingMicroscope(controller)
+
+        measurement = run_measurement(controller, 
+                                      start={"x-tilt": 0, "ol-current": 0})
+
+        assert measurement.finished
+        entries = [e for e in measurement.timeline.entries
+                   if e.phase == "value-cache"]
+        assert set(e.name for e in entries) == {"focus", "ol-current", 
+                                                "x-tilt"}
+        focus = [e for e in entries if e.name == "focus"][0]
+        # the focus is changed in every step so it is read from the hardware
+        assert focus.details["misses"] >= 3
+        assert controller.microscope.values["focus"] == 2